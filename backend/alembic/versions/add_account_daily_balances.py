@@ -0,0 +1,131 @@
+"""Add account daily balance ledger
+
+Revision ID: account_daily_balances_001
+Revises: add_unified_models
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.types import DECIMAL
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'account_daily_balances_001'
+down_revision = 'add_unified_models'
+branch_labels = None
+depends_on = None
+
+# Daily balance rows inserted per statement while backfilling
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def upgrade():
+    op.create_table('account_daily_balances',
+        sa.Column('id', GUID(), nullable=False),
+        sa.Column('account_id', GUID(), nullable=False),
+        sa.Column('balance_date', sa.Date(), nullable=False),
+        sa.Column('period_debit', DECIMAL(15, 2), nullable=False, server_default='0'),
+        sa.Column('period_credit', DECIMAL(15, 2), nullable=False, server_default='0'),
+        sa.Column('closing_balance', DECIMAL(15, 2), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.ForeignKeyConstraint(['account_id'], ['chart_of_accounts.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'balance_date', name='uq_account_daily_balances_account_date')
+    )
+    op.create_index('ix_account_daily_balances_account_date', 'account_daily_balances',
+                    ['account_id', 'balance_date'])
+
+    _backfill_daily_balances()
+
+
+def downgrade():
+    op.drop_index('ix_account_daily_balances_account_date', table_name='account_daily_balances')
+    op.drop_table('account_daily_balances')
+
+
+def _backfill_daily_balances():
+    """
+    Fill the ledger from posted journal entries, one row per account and
+    posting day with the running closing balance, as
+    AccountBalanceLedger.rebuild() does.
+
+    Journal tables differ between deployments: entries are dated by posted_at
+    where that column exists (entry_date otherwise), and lines carry either
+    debit/credit amounts or an is_debit flag with an amount.
+    """
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    entry_columns = {column['name'] for column in inspector.get_columns('journal_entries')}
+    line_columns = {column['name'] for column in inspector.get_columns('journal_entry_lines')}
+
+    entries = sa.table('journal_entries', *(sa.column(name) for name in entry_columns))
+    lines = sa.table('journal_entry_lines', *(sa.column(name) for name in line_columns))
+
+    if 'posted_at' in entry_columns:
+        posted_day = sa.func.date(sa.func.coalesce(entries.c.posted_at, entries.c.entry_date))
+    else:
+        posted_day = sa.func.date(entries.c.entry_date)
+    if 'debit_amount' in line_columns:
+        debit = sa.func.coalesce(lines.c.debit_amount, 0)
+        credit = sa.func.coalesce(lines.c.credit_amount, 0)
+    else:
+        debit = sa.case((lines.c.is_debit == sa.true(), lines.c.amount), else_=0)
+        credit = sa.case((lines.c.is_debit == sa.false(), lines.c.amount), else_=0)
+
+    totals = sa.select(
+        lines.c.account_id,
+        posted_day.label('balance_date'),
+        sa.func.sum(debit).label('period_debit'),
+        sa.func.sum(credit).label('period_credit')
+    ).select_from(
+        lines.join(entries, entries.c.id == lines.c.journal_entry_id)
+    ).where(
+        sa.func.lower(entries.c.status) == 'posted'
+    ).group_by(
+        lines.c.account_id, posted_day
+    ).order_by(
+        lines.c.account_id, posted_day
+    )
+
+    daily_balances = sa.table(
+        'account_daily_balances',
+        sa.column('id', GUID()),
+        sa.column('account_id', GUID()),
+        sa.column('balance_date', sa.Date()),
+        sa.column('period_debit', DECIMAL(15, 2)),
+        sa.column('period_credit', DECIMAL(15, 2)),
+        sa.column('closing_balance', DECIMAL(15, 2)),
+    )
+
+    chunk = []
+    current_account = None
+    running = Decimal('0')
+    for account_id, balance_date, period_debit, period_credit in bind.execute(totals):
+        if account_id != current_account:
+            current_account = account_id
+            running = Decimal('0')
+        period_debit = Decimal(str(period_debit or 0))
+        period_credit = Decimal(str(period_credit or 0))
+        running += period_debit - period_credit
+        if isinstance(balance_date, str):
+            balance_date = date.fromisoformat(balance_date)
+        chunk.append({
+            'id': uuid.uuid4(),
+            'account_id': account_id,
+            'balance_date': balance_date,
+            'period_debit': period_debit,
+            'period_credit': period_credit,
+            'closing_balance': running,
+        })
+        if len(chunk) >= BACKFILL_CHUNK_SIZE:
+            op.bulk_insert(daily_balances, chunk)
+            chunk = []
+
+    if chunk:
+        op.bulk_insert(daily_balances, chunk)
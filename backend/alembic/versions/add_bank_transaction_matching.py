@@ -0,0 +1,60 @@
+"""Add statement matching and import fingerprint columns to cm_bank_transactions
+
+Revision ID: cm_bank_transaction_matching_001
+Revises: tax_liability_rollup_001
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'cm_bank_transaction_matching_001'
+down_revision = 'tax_liability_rollup_001'
+branch_labels = None
+depends_on = None
+
+
+def _has_transactions_table():
+    # The cash management tables are not created by an earlier revision, so
+    # databases without the module are left alone
+    return 'cm_bank_transactions' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if not _has_transactions_table():
+        return
+
+    with op.batch_alter_table('cm_bank_transactions') as batch_op:
+        batch_op.add_column(sa.Column('statement_import_id', sa.Integer()))
+        batch_op.add_column(sa.Column('statement_transaction_id', sa.Integer()))
+        batch_op.add_column(sa.Column('match_type', sa.String(20)))
+        batch_op.add_column(sa.Column('fingerprint', sa.String(64)))
+        batch_op.create_foreign_key(
+            'fk_cm_bank_transactions_statement_import', 'cm_bank_statement_imports',
+            ['statement_import_id'], ['id'], ondelete='SET NULL'
+        )
+        batch_op.create_foreign_key(
+            'fk_cm_bank_transactions_statement_transaction', 'cm_bank_transactions',
+            ['statement_transaction_id'], ['id'], ondelete='SET NULL'
+        )
+        batch_op.create_index('ix_cm_bank_transactions_statement_import_id', ['statement_import_id'])
+        batch_op.create_index('ix_cm_bank_transactions_statement_transaction_id', ['statement_transaction_id'])
+        # Imported rows are written with ON CONFLICT (account_id, fingerprint) DO NOTHING
+        batch_op.create_unique_constraint('uq_transaction_account_fingerprint', ['account_id', 'fingerprint'])
+
+
+def downgrade():
+    if not _has_transactions_table():
+        return
+
+    with op.batch_alter_table('cm_bank_transactions') as batch_op:
+        batch_op.drop_constraint('uq_transaction_account_fingerprint', type_='unique')
+        batch_op.drop_index('ix_cm_bank_transactions_statement_transaction_id')
+        batch_op.drop_index('ix_cm_bank_transactions_statement_import_id')
+        batch_op.drop_constraint('fk_cm_bank_transactions_statement_transaction', type_='foreignkey')
+        batch_op.drop_constraint('fk_cm_bank_transactions_statement_import', type_='foreignkey')
+        batch_op.drop_column('fingerprint')
+        batch_op.drop_column('match_type')
+        batch_op.drop_column('statement_transaction_id')
+        batch_op.drop_column('statement_import_id')
@@ -0,0 +1,41 @@
+"""Ensure chart_of_accounts.parent_id for trial balance roll-up
+
+Revision ID: chart_of_accounts_parent_001
+Revises: payroll_tax_ytd_001
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'chart_of_accounts_parent_001'
+down_revision = 'payroll_tax_ytd_001'
+branch_labels = None
+depends_on = None
+
+PARENT_INDEX = 'ix_chart_of_accounts_parent_id'
+
+
+def upgrade():
+    # Earlier revisions create parent_id, but databases built from the
+    # unified model before it defined the column lack it
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('chart_of_accounts')}
+    indexes = {index['name'] for index in inspector.get_indexes('chart_of_accounts')}
+
+    if 'parent_id' not in columns:
+        with op.batch_alter_table('chart_of_accounts') as batch_op:
+            batch_op.add_column(sa.Column('parent_id', GUID()))
+            batch_op.create_foreign_key(
+                'fk_chart_of_accounts_parent', 'chart_of_accounts', ['parent_id'], ['id']
+            )
+    if PARENT_INDEX not in indexes:
+        op.create_index(PARENT_INDEX, 'chart_of_accounts', ['parent_id'])
+
+
+def downgrade():
+    # parent_id predates this revision on most databases, so only the index is dropped
+    op.drop_index(PARENT_INDEX, table_name='chart_of_accounts')
@@ -0,0 +1,40 @@
+"""Add document number sequences
+
+Revision ID: document_sequences_001
+Revises: period_close_task_checkpoints_001
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'document_sequences_001'
+down_revision = 'period_close_task_checkpoints_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sequences are created on first use, seeded from the highest number
+    # already in use, so there is nothing to backfill
+    op.create_table('document_sequences',
+        sa.Column('id', GUID(), nullable=False),
+        sa.Column('tenant_key', sa.String(100), nullable=False),
+        sa.Column('prefix', sa.String(50), nullable=False),
+        sa.Column('next_value', sa.BigInteger(), nullable=False, server_default='1'),
+        sa.Column('gapless', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_key', 'prefix', name='uq_document_sequence_tenant_prefix')
+    )
+    op.create_index('ix_document_sequences_tenant_key', 'document_sequences', ['tenant_key'])
+
+
+def downgrade():
+    op.drop_index('ix_document_sequences_tenant_key', table_name='document_sequences')
+    op.drop_table('document_sequences')
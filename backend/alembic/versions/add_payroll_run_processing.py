@@ -0,0 +1,86 @@
+"""Add pay run processing columns, payroll tax brackets and payslip lines
+
+Revision ID: payroll_run_processing_001
+Revises: cm_legacy_statement_links_001
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'payroll_run_processing_001'
+down_revision = 'cm_legacy_statement_links_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    op.add_column('payroll_runs', sa.Column('pay_frequency', sa.String(20), server_default='monthly'))
+    op.add_column('payroll_runs', sa.Column('process_taxes', sa.Boolean(), server_default=sa.true()))
+    op.add_column('payroll_runs', sa.Column('process_benefits', sa.Boolean(), server_default=sa.true()))
+    op.add_column('payroll_runs', sa.Column('processed_by', sa.String()))
+    op.add_column('payroll_runs', sa.Column('processed_at', sa.DateTime()))
+    op.add_column('payroll_runs', sa.Column('completed_at', sa.DateTime()))
+    op.add_column('payroll_runs', sa.Column('error_message', sa.Text()))
+
+    # Payroll items and payslips are created with the models; where they do
+    # not exist yet, the tables below are created together with them
+    if 'payroll_items' in tables:
+        op.add_column('payroll_items', sa.Column('is_employer_tax', sa.Boolean(), server_default=sa.false()))
+        op.create_table('payroll_tax_brackets',
+            sa.Column('id', GUID(), nullable=False),
+            sa.Column('payroll_item_id', GUID(), nullable=False),
+            sa.Column('lower_bound', sa.Numeric(precision=18, scale=2), nullable=False, server_default='0'),
+            sa.Column('upper_bound', sa.Numeric(precision=18, scale=2)),
+            sa.Column('rate_type', sa.String(20), server_default='PERCENTAGE'),
+            sa.Column('rate', sa.Numeric(precision=10, scale=4), nullable=False, server_default='0'),
+            sa.Column('additional_amount', sa.Numeric(precision=18, scale=2)),
+            sa.Column('is_active', sa.Boolean(), server_default=sa.true()),
+            sa.Column('effective_date', sa.Date()),
+            sa.Column('end_date', sa.Date()),
+            sa.ForeignKeyConstraint(['payroll_item_id'], ['payroll_items.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_payroll_tax_brackets_payroll_item_id', 'payroll_tax_brackets', ['payroll_item_id'])
+
+    if 'payroll_slips' in tables and 'payroll_items' in tables:
+        op.create_table('payroll_slip_lines',
+            sa.Column('id', GUID(), nullable=False),
+            sa.Column('payslip_id', GUID(), nullable=False),
+            sa.Column('payroll_item_id', GUID()),
+            sa.Column('line_type', sa.String(20), nullable=False),
+            sa.Column('category', sa.String(50)),
+            sa.Column('name', sa.String(100), nullable=False),
+            sa.Column('amount', sa.Numeric(precision=18, scale=2), nullable=False),
+            sa.Column('taxable_amount', sa.Numeric(precision=18, scale=2)),
+            sa.Column('ytd_amount', sa.Numeric(precision=18, scale=2)),
+            sa.Column('is_taxable', sa.Boolean(), server_default=sa.false()),
+            sa.Column('is_pre_tax', sa.Boolean(), server_default=sa.false()),
+            sa.Column('is_employer_tax', sa.Boolean(), server_default=sa.false()),
+            sa.Column('gl_account', sa.String(20)),
+            sa.ForeignKeyConstraint(['payslip_id'], ['payroll_slips.id']),
+            sa.ForeignKeyConstraint(['payroll_item_id'], ['payroll_items.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_payroll_slip_lines_payslip_id', 'payroll_slip_lines', ['payslip_id'])
+
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'payroll_slip_lines' in tables:
+        op.drop_index('ix_payroll_slip_lines_payslip_id', table_name='payroll_slip_lines')
+        op.drop_table('payroll_slip_lines')
+    if 'payroll_tax_brackets' in tables:
+        op.drop_index('ix_payroll_tax_brackets_payroll_item_id', table_name='payroll_tax_brackets')
+        op.drop_table('payroll_tax_brackets')
+        op.drop_column('payroll_items', 'is_employer_tax')
+
+    for column in ('error_message', 'completed_at', 'processed_at', 'processed_by',
+                   'process_benefits', 'process_taxes', 'pay_frequency'):
+        op.drop_column('payroll_runs', column)
@@ -0,0 +1,36 @@
+"""Add payroll tax year-to-date accumulator
+
+Revision ID: payroll_tax_ytd_001
+Revises: workflow_instance_company_001
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'payroll_tax_ytd_001'
+down_revision = 'workflow_instance_company_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The (employee_id, tax_code_id, year) key is the conflict target of
+    # PayrollTaxCalculator.post_ytd_taxes' INSERT ... ON CONFLICT DO UPDATE
+    op.create_table('payroll_tax_ytd',
+        sa.Column('employee_id', GUID(), nullable=False),
+        sa.Column('tax_code_id', GUID(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('taxable_wages', sa.Numeric(precision=18, scale=2), nullable=False, server_default='0'),
+        sa.Column('amount', sa.Numeric(precision=18, scale=2), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.ForeignKeyConstraint(['employee_id'], ['employees.id']),
+        sa.PrimaryKeyConstraint('employee_id', 'tax_code_id', 'year', name='pk_payroll_tax_ytd')
+    )
+
+
+def downgrade():
+    op.drop_table('payroll_tax_ytd')
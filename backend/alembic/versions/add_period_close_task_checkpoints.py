@@ -0,0 +1,74 @@
+"""Add dependency and checkpoint columns to period_close_tasks
+
+Revision ID: period_close_task_checkpoints_001
+Revises: chart_of_accounts_parent_001
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'period_close_task_checkpoints_001'
+down_revision = 'chart_of_accounts_parent_001'
+branch_labels = None
+depends_on = None
+
+# Task name -> (task key, upstream task keys) of the standard close tasks,
+# as defined by CLOSE_TASKS in the close orchestrator
+STANDARD_TASKS = {
+    'Review Journal Entries': ('review_journals', []),
+    'Run Depreciation': ('depreciation', []),
+    'Process Accruals': ('accruals', []),
+    'Revalue Foreign Currency': ('revaluation', []),
+    'Process Allocations': ('allocations', ['depreciation', 'accruals']),
+    'Reconcile Bank Accounts': ('bank_reconciliation', []),
+    'Generate Financial Statements': (
+        'statements', ['review_journals', 'allocations', 'revaluation', 'bank_reconciliation']
+    ),
+    'Review Financial Statements': ('review_statements', ['statements']),
+}
+
+
+def _has_close_tasks_table():
+    # period_close_tasks is not created by an earlier revision
+    return 'period_close_tasks' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if not _has_close_tasks_table():
+        return
+
+    with op.batch_alter_table('period_close_tasks') as batch_op:
+        batch_op.add_column(sa.Column('task_key', sa.String(50)))
+        batch_op.add_column(sa.Column('depends_on', sa.JSON()))
+        batch_op.add_column(sa.Column('attempt_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('duration_ms', sa.Integer()))
+        batch_op.add_column(sa.Column('output', sa.JSON()))
+
+    # Existing closes keep running through the orchestrator, which only
+    # schedules tasks with a key
+    tasks = sa.table(
+        'period_close_tasks',
+        sa.column('task_name', sa.String()),
+        sa.column('task_key', sa.String()),
+        sa.column('depends_on', sa.JSON()),
+    )
+    for task_name, (task_key, upstream) in STANDARD_TASKS.items():
+        op.execute(
+            tasks.update()
+            .where(tasks.c.task_name == task_name)
+            .values(task_key=task_key, depends_on=upstream)
+        )
+
+
+def downgrade():
+    if not _has_close_tasks_table():
+        return
+
+    with op.batch_alter_table('period_close_tasks') as batch_op:
+        batch_op.drop_column('output')
+        batch_op.drop_column('duration_ms')
+        batch_op.drop_column('attempt_count')
+        batch_op.drop_column('depends_on')
+        batch_op.drop_column('task_key')
@@ -0,0 +1,112 @@
+"""Add tax liability daily rollup and dirty day markers
+
+Revision ID: tax_liability_rollup_001
+Revises: account_daily_balances_001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+import uuid
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'tax_liability_rollup_001'
+down_revision = 'account_daily_balances_001'
+branch_labels = None
+depends_on = None
+
+# Dirty day markers inserted per statement while backfilling
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def upgrade():
+    op.create_table('tax_liability_daily',
+        sa.Column('id', GUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('company_id', GUID(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('tax_type', sa.String(50), nullable=False),
+        sa.Column('jurisdiction_code', sa.String(20), nullable=False, server_default=''),
+        sa.Column('is_reported', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('taxable_amount', sa.Numeric(19, 4), nullable=False, server_default='0'),
+        sa.Column('tax_amount', sa.Numeric(19, 4), nullable=False, server_default='0'),
+        sa.Column('transaction_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('company_id', 'day', 'tax_type', 'jurisdiction_code', 'is_reported',
+                            name='uq_tax_liability_daily_key')
+    )
+    op.create_index('idx_tax_liability_daily_company_day', 'tax_liability_daily', ['company_id', 'day'])
+    op.create_index('ix_tax_liability_daily_refreshed_at', 'tax_liability_daily', ['refreshed_at'])
+
+    op.create_table('tax_liability_dirty_days',
+        sa.Column('id', GUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('company_id', GUID(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('marked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('company_id', 'day', name='uq_tax_liability_dirty_days_key')
+    )
+    op.create_index('ix_tax_liability_dirty_days_marked_at', 'tax_liability_dirty_days', ['marked_at'])
+
+    _mark_existing_days()
+
+
+def downgrade():
+    op.drop_index('ix_tax_liability_dirty_days_marked_at', table_name='tax_liability_dirty_days')
+    op.drop_table('tax_liability_dirty_days')
+    op.drop_index('ix_tax_liability_daily_refreshed_at', table_name='tax_liability_daily')
+    op.drop_index('idx_tax_liability_daily_company_day', table_name='tax_liability_daily')
+    op.drop_table('tax_liability_daily')
+
+
+def _mark_existing_days():
+    """
+    Mark every company day with tax transactions as dirty, so the first run
+    of the incremental rollup job fills tax_liability_daily.
+    """
+    bind = op.get_bind()
+    transactions = sa.table('tax_transactions', sa.column('company_id'), sa.column('transaction_date'))
+    day = sa.func.date(transactions.c.transaction_date)
+    days = sa.select(transactions.c.company_id, day).distinct()
+
+    markers = sa.table(
+        'tax_liability_dirty_days',
+        sa.column('id', GUID()),
+        sa.column('created_at', sa.DateTime()),
+        sa.column('updated_at', sa.DateTime()),
+        sa.column('is_active', sa.Boolean()),
+        sa.column('company_id', GUID()),
+        sa.column('day', sa.Date()),
+        sa.column('marked_at', sa.DateTime()),
+    )
+
+    now = datetime.utcnow()
+    chunk = []
+    for company_id, marked_day in bind.execute(days):
+        if isinstance(marked_day, str):
+            marked_day = date.fromisoformat(marked_day)
+        chunk.append({
+            'id': uuid.uuid4(),
+            'created_at': now,
+            'updated_at': now,
+            'is_active': True,
+            'company_id': company_id,
+            'day': marked_day,
+            'marked_at': now,
+        })
+        if len(chunk) >= BACKFILL_CHUNK_SIZE:
+            op.bulk_insert(markers, chunk)
+            chunk = []
+
+    if chunk:
+        op.bulk_insert(markers, chunk)
@@ -0,0 +1,54 @@
+"""Add tax type, jurisdiction and reporting state to tax transactions
+
+Revision ID: tax_transaction_reporting_001
+Revises: document_sequences_001
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'tax_transaction_reporting_001'
+down_revision = 'document_sequences_001'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    ('tax_type', sa.String(50)),
+    ('jurisdiction_code', sa.String(20)),
+    ('is_reported', sa.Boolean()),
+    ('reported_at', sa.DateTime()),
+    ('reporting_period', sa.String(50)),
+)
+INDEXED = ('tax_type', 'jurisdiction_code', 'is_reported')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'tax_transactions' not in inspector.get_table_names():
+        return
+    existing = {column['name'] for column in inspector.get_columns('tax_transactions')}
+
+    with op.batch_alter_table('tax_transactions') as batch_op:
+        for name, type_ in COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, type_))
+    for name in INDEXED:
+        if name not in existing:
+            op.create_index(f'ix_tax_transactions_{name}', 'tax_transactions', [name])
+
+    # Transactions recorded so far have not been reported
+    op.execute("UPDATE tax_transactions SET is_reported = false WHERE is_reported IS NULL")
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'tax_transactions' not in inspector.get_table_names():
+        return
+
+    for name in INDEXED:
+        op.drop_index(f'ix_tax_transactions_{name}', table_name='tax_transactions')
+    with op.batch_alter_table('tax_transactions') as batch_op:
+        for name, _ in reversed(COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,40 @@
+"""Add company_id to workflow_instances
+
+Revision ID: workflow_instance_company_001
+Revises: cm_bank_transaction_matching_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.base import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'workflow_instance_company_001'
+down_revision = 'cm_bank_transaction_matching_001'
+branch_labels = None
+depends_on = None
+
+
+def _has_workflow_table():
+    # workflow_instances is not created by an earlier revision
+    return 'workflow_instances' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if not _has_workflow_table():
+        return
+
+    # Existing workflows have no company and only count in the all-companies dashboard
+    op.add_column('workflow_instances', sa.Column('company_id', GUID()))
+    op.create_index('ix_workflow_instances_company_id', 'workflow_instances', ['company_id'])
+
+
+def downgrade():
+    if not _has_workflow_table():
+        return
+
+    op.drop_index('ix_workflow_instances_company_id', table_name='workflow_instances')
+    with op.batch_alter_table('workflow_instances') as batch_op:
+        batch_op.drop_column('company_id')
@@ -0,0 +1,50 @@
+"""Link bank transactions imported before fingerprints to their statement import
+
+Revision ID: cm_legacy_statement_links_001
+Revises: tax_transaction_reporting_001
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'cm_legacy_statement_links_001'
+down_revision = 'tax_transaction_reporting_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'cm_bank_transactions' not in tables or 'cm_bank_statement_imports' not in tables:
+        return
+
+    # The old importer wrote the import record and its lines in one database
+    # transaction, so they share account, creator and created_at (now() is
+    # the transaction start time). Book entries never match an import.
+    op.execute("""
+        UPDATE cm_bank_transactions
+        SET statement_import_id = (
+            SELECT MAX(i.id)
+            FROM cm_bank_statement_imports i
+            WHERE i.account_id = cm_bank_transactions.account_id
+            AND i.created_at = cm_bank_transactions.created_at
+            AND i.created_by = cm_bank_transactions.created_by
+        )
+        WHERE statement_import_id IS NULL
+        AND fingerprint IS NULL
+        AND EXISTS (
+            SELECT 1
+            FROM cm_bank_statement_imports i
+            WHERE i.account_id = cm_bank_transactions.account_id
+            AND i.created_at = cm_bank_transactions.created_at
+            AND i.created_by = cm_bank_transactions.created_by
+        )
+    """)
+
+
+def downgrade():
+    # Links are data; rows linked here cannot be told apart from rows the
+    # importer linked itself, so they are kept
+    pass
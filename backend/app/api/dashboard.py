@@ -1,25 +1,48 @@
 """
 Dashboard API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core.auth_enhanced import get_current_user
+from app.core.auth_enhanced import get_current_user, user_can_access_company
 from app.services.dashboard_service import *
 from typing import Optional
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
+def get_dashboard_company(
+    company_id: Optional[UUID] = Query(None, description="Company to show; the caller's company by default"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+) -> Optional[str]:
+    """
+    Company whose KPIs are shown: the requested one if the caller may see it,
+    else the caller's own. Only superusers get the summed view of all
+    companies.
+    """
+    if company_id is not None:
+        if not user_can_access_company(db, current_user, company_id):
+            raise HTTPException(status_code=403, detail="Access to company denied")
+        return str(company_id)
+    
+    company_id = getattr(current_user, "company_id", None)
+    if company_id:
+        return str(company_id)
+    if getattr(current_user, "is_superuser", False):
+        return None
+    raise HTTPException(status_code=400, detail="company_id is required")
+
 # KPI Endpoints
 @router.get("/kpis")
 async def get_financial_kpis(
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    company_id: Optional[str] = Depends(get_dashboard_company)
 ):
-    """Get real-time financial KPIs"""
+    """Get financial KPIs from the company's snapshot, with its staleness"""
     try:
-        kpis = DashboardService.get_financial_kpis(db)
-        return {"kpis": kpis}
+        return await DashboardService.get_kpi_snapshot(db, company_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -182,19 +205,22 @@ async def get_recent_activity(
 @router.get("/summary")
 async def get_dashboard_summary(
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    company_id: Optional[str] = Depends(get_dashboard_company)
 ):
     """Get complete dashboard summary"""
     try:
         # Get all dashboard data in one call
-        kpis = DashboardService.get_financial_kpis(db)
+        kpi_snapshot = await DashboardService.get_kpi_snapshot(db, company_id)
         alerts = AlertService.get_active_alerts(db, current_user.id)
         quick_actions = QuickActionsService.get_quick_actions(db, current_user.id)
         recent_activity = ActivityFeedService.get_recent_activity(db, current_user.id, 10)
         ratios = DashboardMetrics.calculate_financial_ratios(db)
         
         return {
-            "kpis": kpis,
+            "kpis": kpi_snapshot["kpis"],
+            "kpis_as_of": kpi_snapshot["as_of"],
+            "kpis_stale": kpi_snapshot["stale"],
             "alerts": alerts,
             "quick_actions": quick_actions,
             "recent_activity": recent_activity,
@@ -209,20 +235,23 @@ async def get_dashboard_summary(
 async def get_dashboard_updates(
     last_update: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    company_id: Optional[str] = Depends(get_dashboard_company)
 ):
     """Get dashboard updates since last check"""
     try:
         # In production, implement WebSocket or Server-Sent Events for real-time updates
         # For now, return current data
-        kpis = DashboardService.get_financial_kpis(db)
+        kpi_snapshot = await DashboardService.get_kpi_snapshot(db, company_id)
         alerts = AlertService.get_active_alerts(db, current_user.id)
         
         return {
-            "kpis": kpis,
+            "kpis": kpi_snapshot["kpis"],
+            "kpis_as_of": kpi_snapshot["as_of"],
+            "kpis_stale": kpi_snapshot["stale"],
             "alerts": alerts,
             "timestamp": datetime.now().isoformat(),
-            "has_updates": True
+            "has_updates": last_update is None or kpi_snapshot["as_of"] > last_update
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -14,7 +14,9 @@ from app.schemas.period_close_schemas import (
     AccountingPeriodCreate,
     AccountingPeriodResponse,
     PeriodCloseResponse,
-    PeriodCloseTaskResponse
+    PeriodCloseRunRequest,
+    PeriodCloseTaskResponse,
+    PeriodCloseTelemetryResponse
 )
 from app.services.period_close.period_close_service import PeriodCloseService
 
@@ -134,7 +136,7 @@ async def execute_close_task(
     service = get_period_close_service(db)
     
     try:
-        return service.execute_close_task(task_id, current_user.id)
+        return service.execute_close_task(task_id, current_user.id, current_user.company_id)
     except Exception as e:
         if "not found" in str(e).lower():
             raise HTTPException(
@@ -147,6 +149,61 @@ async def execute_close_task(
         )
 
 
+@router.post(
+    "/closes/{close_id}/run",
+    response_model=PeriodCloseResponse,
+    summary="Run period close",
+    description="Run the automated close tasks in dependency order, independent tasks in parallel.",
+    tags=["Period Close"]
+)
+def run_period_close(
+    close_id: UUID,
+    run_request: PeriodCloseRunRequest = PeriodCloseRunRequest(),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> PeriodCloseResponse:
+    """Run period close tasks."""
+    # Not async: the run blocks until its tasks finish, so it goes to the threadpool
+    service = get_period_close_service(db)
+    
+    try:
+        return service.run_period_close(close_id, current_user.id, current_user.company_id, run_request.rerun_tasks)
+    except Exception as e:
+        if "not found" in str(e).lower():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=str(e)
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get(
+    "/closes/{close_id}/telemetry",
+    response_model=PeriodCloseTelemetryResponse,
+    summary="Period close telemetry",
+    description="Per-task close durations and the critical path of the close.",
+    tags=["Period Close"]
+)
+async def get_close_telemetry(
+    close_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> PeriodCloseTelemetryResponse:
+    """Get period close telemetry."""
+    service = get_period_close_service(db)
+    
+    try:
+        return service.get_close_telemetry(close_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+
 @router.post(
     "/closes/{close_id}/complete",
     response_model=PeriodCloseResponse,
@@ -1,13 +1,12 @@
 from datetime import date
-from typing import Any
+from typing import Any, Optional
+from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import io
-import csv
 
 from app.core.db.session import get_db
-from app.services.gl.trial_balance_service import TrialBalanceService
+from app.services.gl.trial_balance_service import EXPORT_MEDIA_TYPES, TrialBalanceService
 
 router = APIRouter()
 
@@ -16,6 +15,8 @@ async def get_trial_balance(
     start_date: date = Query(..., description="Start date of the reporting period"),
     end_date: date = Query(..., description="End date of the reporting period"),
     include_zeros: bool = Query(False, description="Include accounts with zero balance"),
+    company_id: Optional[UUID] = Query(None, description="Limit the trial balance to one company"),
+    roll_up: bool = Query(False, description="Roll balances up the account hierarchy"),
     format: str = Query("json", description="Output format (json, csv, excel)"),
     db: Session = Depends(get_db)
 ) -> Any:
@@ -23,65 +24,34 @@ async def get_trial_balance(
     Generate a trial balance report for the specified date range.
     """
     try:
-        # Get trial balance data
-        trial_balance = TrialBalanceService.get_trial_balance(
-            db=db,
-            start_date=start_date,
-            end_date=end_date,
-            include_zeros=include_zeros
-        )
-        
         # Return in requested format
         if format.lower() == 'json':
-            return trial_balance
+            return TrialBalanceService.get_trial_balance(
+                db=db,
+                start_date=start_date,
+                end_date=end_date,
+                include_zeros=include_zeros,
+                company_id=company_id,
+                roll_up=roll_up
+            )
             
         elif format.lower() in ['csv', 'excel']:
-            # Convert to CSV
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                'Account Code', 'Account Name', 'Account Type',
-                'Opening Balance', 'Period Activity', 'Ending Balance',
-                'Debit Amount', 'Credit Amount'
-            ])
-            
-            # Write data rows
-            for entry in trial_balance.entries:
-                writer.writerow([
-                    entry.account_code,
-                    entry.account_name,
-                    entry.account_type,
-                    entry.opening_balance,
-                    entry.period_activity,
-                    entry.ending_balance,
-                    entry.debit_amount,
-                    entry.credit_amount
-                ])
-            
-            # Write totals
-            writer.writerow([])
-            writer.writerow(['', '', 'TOTALS:', '', '', '', 
-                           trial_balance.total_debit, trial_balance.total_credit])
-            
-            # Prepare response
-            output.seek(0)
-            
-            if format.lower() == 'csv':
-                return Response(
-                    content=output.getvalue(),
-                    media_type="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=trial_balance_{start_date}_to_{end_date}.csv"}
-                )
-            else:  # excel
-                # For Excel, we'd typically use openpyxl or similar
-                # This is a simplified version that returns CSV with .xlsx extension
-                return Response(
-                    content=output.getvalue(),
-                    media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    headers={"Content-Disposition": f"attachment;filename=trial_balance_{start_date}_to_{end_date}.xlsx"}
-                )
+            # Stream the file as accounts are read
+            content = TrialBalanceService.export_trial_balance(
+                db=db,
+                start_date=start_date,
+                end_date=end_date,
+                format=format,
+                include_zeros=include_zeros,
+                company_id=company_id,
+                roll_up=roll_up
+            )
+            extension = 'csv' if format.lower() == 'csv' else 'xlsx'
+            return StreamingResponse(
+                content,
+                media_type=EXPORT_MEDIA_TYPES[format.lower()],
+                headers={"Content-Disposition": f"attachment;filename=trial_balance_{start_date}_to_{end_date}.{extension}"}
+            )
         
         else:
             raise HTTPException(
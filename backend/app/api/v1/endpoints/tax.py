@@ -10,6 +10,9 @@ from ....core.tax.tax_policy_service import (
     TaxType, TaxJurisdiction, TaxRate, TaxRule, TaxExemption, 
     TaxCalculationResult, tax_policy_service
 )
+from ....core.tax.tax_calculation_service import (
+    BulkTaxCalculationRequest, BulkTaxCalculationResponse, tax_calculation_service
+)
 from ....models.user import User
 from ....schemas.common import PaginatedResponse, PaginationParams
 
@@ -184,6 +187,45 @@ async def calculate_tax(
             detail="An error occurred while calculating tax"
         )
 
+@router.post("/tax/calculate/bulk", response_model=BulkTaxCalculationResponse)
+async def calculate_tax_bulk(
+    request: Request,
+    bulk_request: BulkTaxCalculationRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Calculate taxes for a batch of transactions, such as a billing run.
+    
+    Tax rules are resolved once per jurisdiction, tax code and date across the
+    whole batch. Returns one result per transaction, in request order, and
+    tax totals per jurisdiction. Transactions that fail are listed in
+    ``errors`` without failing the batch.
+    """
+    try:
+        logger.info(
+            f"Bulk tax calculation request from {request.client.host} - "
+            f"User: {current_user.username}, Transactions: {len(bulk_request.requests)}"
+        )
+        
+        result = await tax_calculation_service.calculate_taxes_bulk(bulk_request.requests)
+        
+        logger.info(
+            f"Bulk tax calculation result - "
+            f"Transactions: {result.request_count}, Rule groups: {result.rule_groups}, "
+            f"Errors: {len(result.errors)}"
+        )
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating bulk tax: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while calculating tax"
+        )
+
 @router.post("/tax/validate", response_model=TaxValidationResponse)
 async def validate_tax_id(
     request: Request,
@@ -453,7 +495,7 @@ async def create_tax_rule(
         # In a real implementation, this would save to a database
         # For now, we'll just add it to the in-memory cache
         new_rule = TaxRule(**rule_data.dict())
-        tax_policy_service.tax_rules_cache[new_rule.code] = new_rule
+        tax_policy_service.upsert_tax_rule(new_rule)
         
         # Log the creation for audit purposes
         logger.info(f"Created new tax rule: {new_rule.code}")
@@ -513,7 +555,7 @@ async def update_tax_rule(
         
         # In a real implementation, this would save to a database
         # For now, we'll just update the in-memory cache
-        tax_policy_service.tax_rules_cache[rule_id] = updated_rule
+        tax_policy_service.upsert_tax_rule(updated_rule)
         
         # Log the update for audit purposes
         logger.info(f"Updated tax rule: {rule_id}")
@@ -559,7 +601,7 @@ async def delete_tax_rule(
         )
         
         # Check if the rule exists
-        if rule_id not in tax_policy_service.tax_rules_cache:
+        if not await tax_policy_service.get_tax_rule(rule_id):
             logger.warning(f"Tax rule not found for deletion: {rule_id}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -568,7 +610,7 @@ async def delete_tax_rule(
         
         # In a real implementation, this would delete from the database
         # For now, we'll just remove it from the in-memory cache
-        del tax_policy_service.tax_rules_cache[rule_id]
+        tax_policy_service.remove_tax_rule(rule_id)
         
         # Log the deletion for audit purposes
         logger.info(f"Deleted tax rule: {rule_id}")
@@ -4,7 +4,7 @@ Workflow API endpoints
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core.auth_enhanced import get_current_user
+from app.core.auth_enhanced import get_current_user, user_can_access_company
 from app.services.workflow_engine import *
 from app.models.workflow import *
 from typing import List, Dict, Optional
@@ -18,6 +18,7 @@ class WorkflowCreateRequest(BaseModel):
     entity_id: str
     amount: float
     priority: str = "normal"
+    company_id: Optional[str] = None
 
 class ApprovalRequest(BaseModel):
     action: str  # approved, rejected
@@ -37,10 +38,14 @@ async def create_workflow(
     current_user = Depends(get_current_user)
 ):
     """Create new workflow instance"""
+    company_id = request.company_id or getattr(current_user, "company_id", None)
+    if company_id and not user_can_access_company(db, current_user, company_id):
+        raise HTTPException(status_code=403, detail="Access to company denied")
     try:
         workflow_id = WorkflowEngine.create_workflow(
             db, request.workflow_type, request.entity_id, 
-            request.amount, current_user.id
+            request.amount, current_user.id,
+            company_id=company_id
         )
         return {"workflow_id": workflow_id, "status": "created"}
     except Exception as e:
@@ -350,8 +355,8 @@ async def get_workflow_metrics(
 @router.post("/bulk/approve")
 async def bulk_approve_workflows(
     workflow_ids: List[str],
-    comments: Optional[str] = None,
     background_tasks: BackgroundTasks,
+    comments: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
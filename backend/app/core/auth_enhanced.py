@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from jose import JWTError, jwt
@@ -12,6 +13,7 @@ import secrets
 import re
 from app.core.database import get_db
 from app.models.user import User
+from app.models.user_activity import CrossCompanyAccess
 from app.core.config.settings import settings
 
 # Security setup
@@ -135,4 +137,18 @@ def require_role(required_role: str):
                 detail=f"Access denied. Required role: {required_role}"
             )
         return current_user
-    return role_checker
\ No newline at end of file
+    return role_checker
+
+def user_can_access_company(db: Session, user: User, company_id: Any) -> bool:
+    """Superusers reach every company, others their own and those granted to them"""
+    if getattr(user, "is_superuser", False):
+        return True
+    own_company_id = getattr(user, "company_id", None)
+    if own_company_id is not None and str(own_company_id) == str(company_id):
+        return True
+    return db.query(CrossCompanyAccess.id).filter(
+        CrossCompanyAccess.user_id == str(user.id),
+        CrossCompanyAccess.target_company_id == str(company_id),
+        CrossCompanyAccess.is_active == True,
+        or_(CrossCompanyAccess.expires_at.is_(None), CrossCompanyAccess.expires_at > datetime.utcnow())
+    ).first() is not None
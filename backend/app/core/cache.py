@@ -1,6 +1,6 @@
 """Redis caching configuration and utilities"""
 
-from typing import Optional, Any, Callable
+from typing import Optional, Any, Callable, Dict, List, Tuple
 from functools import wraps
 import json
 import redis
@@ -45,12 +45,32 @@ class CacheManager:
         except Exception:
             return None
 
-    def set(self, key: str, value: Any, ttl: int = 300):
-        """Set value in cache"""
+    def get_many_with_ttl(self, keys: List[str]) -> Dict[str, Tuple[Any, Optional[float]]]:
+        """Get several values and their remaining ttl in seconds (None without expiry); missing keys are omitted"""
+        if not self.client or not keys:
+            return {}
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.mget(keys)
+            for key in keys:
+                pipe.pttl(key)
+            values, *ttls = pipe.execute()
+            return {
+                key: (json.loads(value), None if ttl == -1 else max(ttl, 0) / 1000)
+                for key, value, ttl in zip(keys, values, ttls) if value
+            }
+        except Exception:
+            return {}
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = 300):
+        """Set value in cache; a ttl of None stores the value without expiry"""
         if not self.client:
             return
         try:
-            self.client.setex(key, ttl, json.dumps(value))
+            if ttl is None:
+                self.client.set(key, json.dumps(value))
+            else:
+                self.client.setex(key, ttl, json.dumps(value))
         except Exception:
             pass
 
@@ -67,6 +67,98 @@ def reconcile_bank_account_task(account_id: int, statement_data: dict):
     service = ReconciliationService()
     return service.auto_reconcile(account_id, statement_data)
 
+@celery_app.task(
+    name="app.tasks.reports.generate_tax_liability_report",
+    bind=True,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    max_retries=None,
+)
+def generate_tax_liability_report_task(self, **params):
+    """Generate a tax liability report queued by TaxReportingService"""
+    from app.core.tax.tax_reporting_service import tax_reporting_service
+    outcome = tax_reporting_service.run_report_job(**params)
+    if outcome == "throttled":
+        # The tenant is at its concurrency limit; wait for a slot
+        raise self.retry(countdown=30)
+    return outcome
+
+@celery_app.task(name="refresh_tax_liability_rollup")
+def refresh_tax_liability_rollup_task():
+    """Recompute tax liability rollup days with recently changed transactions"""
+    from app.core.db.session import SessionLocal
+    from app.core.tax.tax_liability_rollup import refresh_changed_tax_liability
+    db = SessionLocal()
+    try:
+        return refresh_changed_tax_liability(db)
+    finally:
+        db.close()
+
+@celery_app.task(name="app.tasks.calculations.train_ap_models")
+def train_ap_models_task(tenant_id: str = None, only_if_drifted: bool = False):
+    """Train and publish the AP fraud and categorization models"""
+    from app.core.db.session import SessionLocal
+    from app.core.db.tenant_middleware import set_tenant_context, clear_tenant_context
+    from app.modules.core_financials.accounts_payable.ai_services import APAIService
+    set_tenant_context(tenant_id)
+    db = SessionLocal()
+    try:
+        service = APAIService(db)
+        if only_if_drifted:
+            return service.retrain_if_drifted()
+        return service.train_models()
+    finally:
+        db.close()
+        clear_tenant_context()
+
+@celery_app.task(name="app.tasks.calculations.retrain_drifted_ap_models")
+def retrain_drifted_ap_models_task():
+    """Queue a drift check and retraining for every tenant with published AP models"""
+    from app.modules.core_financials.accounts_payable.model_registry import registered_tenants
+    tenants = registered_tenants()
+    for tenant_key in tenants:
+        # Models trained without a tenant are kept under 'default'
+        tenant_id = None if tenant_key == "default" else tenant_key
+        train_ap_models_task.delay(tenant_id=tenant_id, only_if_drifted=True)
+    return len(tenants)
+
+@celery_app.task(name="app.tasks.calculations.score_ap_invoices")
+def score_ap_invoices_task(invoice_ids: list, tenant_id: str = None):
+    """Score a batch of imported AP invoices for fraud and duplicates"""
+    from app.core.db.session import SessionLocal
+    from app.core.db.tenant_middleware import set_tenant_context, clear_tenant_context
+    from app.modules.core_financials.accounts_payable.ai_services import APAIService
+    set_tenant_context(tenant_id)
+    db = SessionLocal()
+    try:
+        service = APAIService(db)
+        fraud = service.score_fraud_batch(invoice_ids)
+        duplicates = service.detect_duplicates_batch(invoice_ids)
+        return {
+            "scored": len(fraud),
+            "high_risk": sum(1 for r in fraud if r.risk_level in ("high", "critical")),
+            "possible_duplicates": sum(1 for r in duplicates if r.potential_duplicates),
+        }
+    finally:
+        db.close()
+        clear_tenant_context()
+
+@celery_app.task(name="app.tasks.calculations.refresh_dashboard_kpis")
+def refresh_dashboard_kpis_task(sections: list, company_id: str = None, tenant_id: str = None):
+    """Recompute changed sections of a company's dashboard KPI snapshot"""
+    import asyncio
+    from app.core.db.session import SessionLocal
+    from app.core.db.tenant_middleware import set_tenant_context, clear_tenant_context
+    from app.services.dashboard_service import DashboardService
+    set_tenant_context(tenant_id)
+    db = SessionLocal()
+    try:
+        snapshot = asyncio.run(DashboardService.refresh_kpi_snapshot(db, company_id, sections))
+        return snapshot["as_of"]
+    finally:
+        db.close()
+        clear_tenant_context()
+
 # Periodic tasks
 from celery.schedules import crontab
 
@@ -79,6 +171,14 @@ celery_app.conf.beat_schedule = {
         "task": "cleanup_sessions",
         "schedule": crontab(hour=2, minute=0),  # Daily at 2 AM
     },
+    "refresh-tax-liability-rollup": {
+        "task": "refresh_tax_liability_rollup",
+        "schedule": crontab(minute="*/15"),  # Every 15 minutes
+    },
+    "retrain-ap-models-on-drift": {
+        "task": "app.tasks.calculations.retrain_drifted_ap_models",
+        "schedule": crontab(hour=3, minute=0),  # Daily at 3 AM
+    },
     "generate-daily-reports": {
         "task": "generate_daily_reports",
         "schedule": crontab(hour=6, minute=0),  # Daily at 6 AM
@@ -82,6 +82,12 @@ class Settings(BaseSettings):
     PLAID_SECRET: str = os.getenv("PLAID_SECRET", "")
     PLAID_ENVIRONMENT: str = os.getenv("PLAID_ENVIRONMENT", "sandbox")
     
+    # Currency Exchange
+    BASE_CURRENCY: str = os.getenv("BASE_CURRENCY", "USD")
+    EXCHANGE_RATE_PROVIDERS: List[str] = ["fallback"]
+    OPENEXCHANGERATES_APP_ID: str = os.getenv("OPENEXCHANGERATES_APP_ID", "")
+    FIXER_API_KEY: str = os.getenv("FIXER_API_KEY", "")
+    
     # Tax Integrations
     AVALARA_ACCOUNT_ID: str = os.getenv("AVALARA_ACCOUNT_ID", "")
     AVALARA_LICENSE_KEY: str = os.getenv("AVALARA_LICENSE_KEY", "")
@@ -94,6 +100,11 @@ class Settings(BaseSettings):
     PAYPAL_CLIENT_ID: str = os.getenv("PAYPAL_CLIENT_ID", "")
     PAYPAL_CLIENT_SECRET: str = os.getenv("PAYPAL_CLIENT_SECRET", "")
     
+    # Reports
+    # Generated report files; must be shared by the API and the report
+    # workers (e.g. a mounted volume), since workers write what the API serves
+    REPORT_STORAGE_DIR: Optional[str] = os.getenv("REPORT_STORAGE_DIR")
+    
     # Notifications
     SLACK_WEBHOOK_URL: str = os.getenv("SLACK_WEBHOOK_URL", "")
     
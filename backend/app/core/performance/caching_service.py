@@ -1,12 +1,21 @@
 import redis
 import json
 import hashlib
-from typing import Any, Optional
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from datetime import timedelta
 import logging
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Dashboard data is cached for this long even without invalidation
+DASHBOARD_TTL = 900
+# Budget cubes are replaced by version on writes; unused versions expire after this long
+BUDGET_CUBE_TTL = 3600
+
 class CachingService:
     """Redis-based caching service for performance optimization"""
     
@@ -81,7 +90,7 @@ class CachingService:
             period_start=period_start, 
             period_end=period_end
         )
-        await self.set(cache_key, data, ttl=900)  # 15 minutes
+        await self.set(cache_key, data, ttl=DASHBOARD_TTL)
     
     async def get_dashboard_data(self, company_id: int, period_start: str, period_end: str) -> Optional[dict]:
         """Get cached dashboard data"""
@@ -93,6 +102,123 @@ class CachingService:
         )
         return await self.get(cache_key)
     
+    def mark_dashboard_stale(self, company_id: str, sections: Iterable[str]) -> bool:
+        """
+        Record that cached dashboard sections of a company are out of date.
+
+        Each section keeps the time it first went stale and the time of the
+        latest change; returns True if any section was not already stale.
+        """
+        cache_key = self._generate_cache_key("dashboard_stale", company_id=company_id)
+        sections = list(sections)
+        now = time.time()
+        if not self.available:
+            stale = self.local_cache.setdefault(cache_key, {})
+            added = [section for section in sections if section not in stale]
+            for section in sections:
+                stale.setdefault(section, now)
+                stale[f"{section}:last"] = now
+            return bool(added)
+
+        try:
+            pipe = self.redis_client.pipeline()
+            for section in sections:
+                pipe.hsetnx(cache_key, section, now)
+                pipe.hset(cache_key, f"{section}:last", now)
+            pipe.expire(cache_key, DASHBOARD_TTL)
+            return any(pipe.execute()[:-1:2])
+        except Exception as e:
+            logger.error(f"Cache stale mark error: {e}")
+            return False
+
+    def _dashboard_stale_entries(self, cache_key: str) -> Dict[str, float]:
+        if not self.available:
+            return dict(self.local_cache.get(cache_key, {}))
+        try:
+            return {field: float(value) for field, value in self.redis_client.hgetall(cache_key).items()}
+        except Exception as e:
+            logger.error(f"Cache stale get error: {e}")
+            return {}
+
+    def get_dashboard_stale(self, company_id: str) -> Dict[str, float]:
+        """Stale dashboard sections of a company and when they first went stale"""
+        cache_key = self._generate_cache_key("dashboard_stale", company_id=company_id)
+        return {
+            field: since for field, since in self._dashboard_stale_entries(cache_key).items()
+            if not field.endswith(":last")
+        }
+
+    def clear_dashboard_stale(self, company_id: str, sections: Iterable[str], refreshed_at: float):
+        """
+        Unmark sections refreshed by a recomputation that started at
+        ``refreshed_at``; sections changed since then stay stale.
+        """
+        cache_key = self._generate_cache_key("dashboard_stale", company_id=company_id)
+        entries = self._dashboard_stale_entries(cache_key)
+        done = [
+            section for section in sections
+            if section in entries and entries.get(f"{section}:last", 0) <= refreshed_at
+        ]
+        if not done:
+            return
+        fields = done + [f"{section}:last" for section in done]
+        if not self.available:
+            stale = self.local_cache.get(cache_key, {})
+            for field in fields:
+                stale.pop(field, None)
+            return
+
+        try:
+            self.redis_client.hdel(cache_key, *fields)
+        except Exception as e:
+            logger.error(f"Cache stale clear error: {e}")
+
+    def get_budget_cube(self, company_id: str) -> Tuple[int, Optional[List]]:
+        """Current budget cube version of a company and the cube cached for that version, if any"""
+        version_key = self._generate_cache_key("budget_cube_version", company_id=company_id)
+        if not self.available:
+            version = self.local_cache.get(version_key, 0)
+            return version, self.local_cache.get(
+                self._generate_cache_key("budget_cube", company_id=company_id, version=version)
+            )
+
+        try:
+            version = int(self.redis_client.get(version_key) or 0)
+            cached = self.redis_client.get(
+                self._generate_cache_key("budget_cube", company_id=company_id, version=version)
+            )
+            return version, json.loads(cached) if cached else None
+        except Exception as e:
+            logger.error(f"Cache budget cube get error: {e}")
+            return 0, None
+
+    def cache_budget_cube(self, company_id: str, version: int, cells: List):
+        """
+        Cache a company's budget cube under the version that was current when
+        its computation started; a write since then has already moved on.
+        """
+        cache_key = self._generate_cache_key("budget_cube", company_id=company_id, version=version)
+        if not self.available:
+            self.local_cache[cache_key] = cells
+            return
+
+        try:
+            self.redis_client.setex(cache_key, BUDGET_CUBE_TTL, json.dumps(cells, default=str))
+        except Exception as e:
+            logger.error(f"Cache budget cube set error: {e}")
+
+    def invalidate_budget_cube(self, company_id: str):
+        """Move a company to a new budget cube version"""
+        version_key = self._generate_cache_key("budget_cube_version", company_id=company_id)
+        if not self.available:
+            self.local_cache[version_key] = self.local_cache.get(version_key, 0) + 1
+            return
+
+        try:
+            self.redis_client.incr(version_key)
+        except Exception as e:
+            logger.error(f"Cache budget cube invalidation error: {e}")
+
     async def invalidate_company_cache(self, company_id: int):
         """Invalidate all cache entries for a company"""
         if not self.available:
@@ -131,4 +257,21 @@ class CachingService:
                 "type": "redis"
             }
         except Exception as e:
-            return {"status": "error", "message": str(e)}
\ No newline at end of file
+            return {"status": "error", "message": str(e)}
+
+
+_caching_service: Optional[CachingService] = None
+_caching_service_lock = threading.Lock()
+
+
+def get_caching_service() -> CachingService:
+    """Process-wide caching service, connected on first use"""
+    global _caching_service
+    if _caching_service is None:
+        with _caching_service_lock:
+            if _caching_service is None:
+                _caching_service = CachingService(getattr(
+                    settings, 'REDIS_URL',
+                    f"redis://{getattr(settings, 'REDIS_HOST', 'localhost')}:{getattr(settings, 'REDIS_PORT', 6379)}"
+                ))
+    return _caching_service
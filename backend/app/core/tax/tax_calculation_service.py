@@ -7,11 +7,12 @@ It handles complex tax scenarios including multi-jurisdictional taxes, exemption
 
 from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Dict, List, Optional, Tuple, Union, Any, Callable, TypeVar
+from typing import Dict, List, Optional, Tuple, Union, Any
 from enum import Enum
+import asyncio
 import logging
-import hashlib
 import json
+import threading
 import time
 from functools import wraps
 
@@ -21,39 +22,28 @@ from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
 
-# Type variable for generic return type
-T = TypeVar('T')
-
-def cache_key_builder(
-    func: Callable[..., T],
-    *args,
-    **kwargs
-) -> str:
-    """Generate a cache key from function name and arguments."""
-    # Convert args and kwargs to a consistent string representation
-    args_str = ",".join(str(arg) for arg in args)
-    kwargs_str = ",".join(f"{k}={v}" for k, v in sorted(kwargs.items()))
-    key_str = f"{func.__module__}:{func.__name__}:{args_str}:{kwargs_str}"
-    
-    # Create a hash of the key string to ensure it's a valid cache key
-    return f"tax:{hashlib.md5(key_str.encode('utf-8')).hexdigest()}"
-
 from app.core.tax.tax_policy_service import (
     TaxType, 
-    TaxRateType, 
     TaxRule, 
-    TaxRuleType,
-    TaxExemptionCertificate as TaxExemptionCertificateModel,
     TaxRate as TaxRateModel,
-    TaxRule as TaxRuleModel
+    TaxRule as TaxRuleModel,
+    tax_policy_service
 )
+from app.core.tax.tax_rule_index import LRUCache, TaxRuleIndex, get_tax_rule_index
 from app.core.config import settings
+from app.core.db.tenant_middleware import tenant_context
 from app.core.db.session import get_db_context
 from app.crud import tax_exemption as tax_exemption_crud
 from app.crud import tax_exemption_certificate
 
 logger = logging.getLogger(__name__)
 
+# Exemption certificates and other lookups, shared by all service instances
+# and threads; keys are tenant-scoped and every access holds the lock
+LOCAL_CACHE_SIZE = getattr(settings, 'TAX_LOCAL_CACHE_SIZE', 10000)
+_local_cache = LRUCache(LOCAL_CACHE_SIZE)
+_local_cache_lock = threading.Lock()
+
 class TaxCalculationMode(str, Enum):
     """Modes for tax calculation"""
     INCLUSIVE = "inclusive"  # Tax is included in the price
@@ -150,6 +140,34 @@ class TaxCalculationResponse(BaseModel):
         }
 
 
+class BulkTaxCalculationRequest(BaseModel):
+    """Batch of tax calculation requests, e.g. a whole billing run"""
+    requests: List[TaxCalculationRequest] = Field(..., min_items=1)
+    
+    class Config:
+        json_encoders = {
+            Decimal: lambda v: str(v)
+        }
+
+
+class BulkTaxCalculationResponse(BaseModel):
+    """Per-request results of a bulk tax calculation"""
+    # One entry per request, in request order; None where the request failed
+    responses: List[Optional[TaxCalculationResponse]] = Field(..., description="Results in request order")
+    jurisdiction_totals: List[Dict] = Field(
+        default_factory=list,
+        description="Taxable and tax amounts per currency, jurisdiction, tax type and tax code"
+    )
+    errors: List[Dict] = Field(default_factory=list, description="Index and error message of failed requests")
+    request_count: int = Field(0, description="Number of requests received")
+    rule_groups: int = Field(0, description="Distinct jurisdiction/tax code/date groups resolved")
+    
+    class Config:
+        json_encoders = {
+            Decimal: lambda v: str(v)
+        }
+
+
 class TaxCalculationService:
     """Service for calculating taxes on transactions."""
     
@@ -165,7 +183,8 @@ class TaxCalculationService:
         self._cache_enabled = settings.REDIS_URL is not None and getattr(settings, 'USE_REDIS', False)
         self._cache_ttl = settings.CACHE_TTL_SECONDS if hasattr(settings, 'CACHE_TTL_SECONDS') else 300  # 5 minutes default
         self._last_cache_refresh = datetime.min
-        self._local_cache = {}
+        self._local_cache = _local_cache
+        self._rule_index: Optional[TaxRuleIndex] = None
         
         # Initialize Redis cache if available
         if self._cache_enabled and getattr(settings, 'USE_REDIS', False) and not hasattr(self, '_redis_initialized'):
@@ -189,112 +208,42 @@ class TaxCalculationService:
             self.db = SessionLocal()
         return self.db
         
-    def _generate_tax_rules_cache_key(
-        self,
-        item: TaxLineItem,
-        billing_country: str,
-        billing_state: Optional[str],
-        billing_city: Optional[str],
-        shipping_country: str,
-        shipping_state: Optional[str],
-        shipping_city: Optional[str],
-        transaction_date: date,
-        customer_id: Optional[str],
-        customer_type: Optional[str],
-        exemption_certificate_id: Optional[str]
-    ) -> str:
-        """Generate a cache key for tax rules lookup."""
-        key_parts = [
-            f"item:{item.tax_code}:{item.product_type}",
-            f"bill:{billing_country}:{billing_state or ''}:{billing_city or ''}",
-            f"ship:{shipping_country}:{shipping_state or ''}:{shipping_city or ''}",
-            f"date:{transaction_date}",
-            f"cust:{customer_id or ''}:{customer_type or ''}",
-            f"exempt:{exemption_certificate_id or ''}"
-        ]
-        return f"tax_rules:{hashlib.sha256('|'.join(key_parts).encode('utf-8')).hexdigest()}"
-        
-    async def _cache_tax_rules_result(self, cache_key: str, rules: List[Dict]) -> None:
-        """Cache the result of a tax rules lookup."""
-        if not rules:
-            expiry = 60  # 1 minute for empty results
-        else:
-            expiry = self._cache_ttl
-            
-        # Update local cache
-        self._local_cache[cache_key] = (
-            rules,
-            datetime.now() + timedelta(seconds=expiry)
-        )
-        
-        # Update Redis cache if enabled
-        if self._cache_enabled:
-            try:
-                await FastAPICache.set(cache_key, rules, expire=expiry)
-            except Exception as e:
-                logger.warning(f"Error updating Redis cache: {str(e)}")
+    @property
+    def tenant_key(self) -> str:
+        return str(tenant_context.tenant_id or 'default')
     
-    async def _get_tax_rules_with_cache(
-        self,
-        country_code: str,
-        state_code: Optional[str] = None,
-        city: Optional[str] = None
-    ) -> List[Dict]:
-        """
-        Get tax rules with caching support.
-        
-        Args:
-            country_code: Country code (e.g., 'US')
-            state_code: Optional state/province code
-            city: Optional city name
-            
-        Returns:
-            List of tax rules
-        """
-        cache_key = f"tax_rules_jurisdiction:{country_code}:{state_code or ''}:{city or ''}"
-        
-        # Try local cache first
-        if cache_key in self._local_cache:
-            rules, expiry = self._local_cache[cache_key]
+    def _local_cache_get(self, cache_key: str) -> Tuple[bool, Any]:
+        """(hit, value) for a local cache entry; expired entries are dropped."""
+        with _local_cache_lock:
+            entry = self._local_cache.get(cache_key)
+            if entry is None:
+                return False, None
+            value, expiry = entry
             if datetime.now() < expiry:
-                return rules
+                return True, value
             del self._local_cache[cache_key]
-            
-        # Try Redis cache
-        if self._cache_enabled:
-            try:
-                cached_rules = await FastAPICache.get(cache_key)
-                if cached_rules is not None:
-                    # Update local cache
-                    self._local_cache[cache_key] = (
-                        cached_rules,
-                        datetime.now() + timedelta(minutes=15)
-                    )
-                    return cached_rules
-            except Exception as e:
-                logger.warning(f"Error getting tax rules from Redis cache: {str(e)}")
-        
-        # Get from database
-        db = self._get_db()
-        rules = await self.tax_policy_service.search_tax_rules(
-            tax_type=None,
-            country_code=country_code,
-            state_code=state_code,
-            city=city,
-            is_active=True
+        return False, None
+    
+    def _local_cache_set(self, cache_key: str, value: Any, ttl: timedelta) -> None:
+        with _local_cache_lock:
+            self._local_cache[cache_key] = (value, datetime.now() + ttl)
+    
+    def _current_rule_index(self) -> TaxRuleIndex:
+        """Compiled rule index for the policy service's current rules version."""
+        policy = self.tax_policy_service
+        self._rule_index = get_tax_rule_index(
+            self.tenant_key,
+            policy.rules_version,
+            list(policy.tax_rules_cache.values()),
+            list(policy.tax_exemptions_cache.values())
         )
-        
-        # Cache the result
-        expiry = 3600  # 1 hour for jurisdiction-based rules
-        self._local_cache[cache_key] = (rules, datetime.now() + timedelta(seconds=expiry))
-        
-        if self._cache_enabled:
-            try:
-                await FastAPICache.set(cache_key, rules, expire=expiry)
-            except Exception as e:
-                logger.warning(f"Error setting Redis cache: {str(e)}")
-                
-        return rules
+        return self._rule_index
+    
+    async def _get_rule_index(self) -> TaxRuleIndex:
+        """Refresh the policy rules if due, then return the compiled rule index."""
+        version, rules, exemptions = await self.tax_policy_service.get_rules_snapshot()
+        self._rule_index = get_tax_rule_index(self.tenant_key, version, rules, exemptions)
+        return self._rule_index
     
     async def calculate_taxes(
         self, 
@@ -310,55 +259,137 @@ class TaxCalculationService:
             TaxCalculationResponse with calculated tax amounts
         """
         try:
-            # Initialize response
-            response = TaxCalculationResponse(
-                transaction_id=self._generate_transaction_id(),
-                transaction_date=request.transaction_date,
-                currency=request.currency,
-                subtotal=Decimal('0'),
-                tax_amount=Decimal('0'),
-                total=Decimal('0'),
-                line_items=[],
-                jurisdictions=[],
-                is_exempt=False,
-                reference_id=request.reference_id,
-                metadata=request.metadata
-            )
-            
-            # Process line items
-            for item in request.line_items:
-                line_result = await self._process_line_item(item, request)
-                response.line_items.append(line_result)
-                
-                # Update totals
-                response.subtotal += line_result['amount']
-                response.tax_amount += line_result.get('tax_amount', Decimal('0'))
-            
-            # Calculate total
-            response.total = response.subtotal + response.tax_amount
-            
-            # Apply any transaction-level adjustments
-            response = self._apply_transaction_adjustments(response, request)
-            
-            # Round amounts to currency precision
-            response = self._round_amounts(response, request.currency)
-            
-            return response
+            # A batch of one over the bulk path, so both share the arithmetic
+            rule_index = await self._get_rule_index()
+            return await self._calculate_with_index(request, rule_index, {}, {})
             
         except Exception as e:
             logger.error(f"Error calculating taxes: {str(e)}", exc_info=True)
             raise
     
-    async def _process_line_item(
-        self, 
-        item: TaxLineItem, 
-        request: TaxCalculationRequest
-    ) -> Dict:
-        """Process a single line item for tax calculation"""
-        try:
-            # Initialize line result
+    async def calculate_taxes_bulk(
+        self,
+        requests: List[TaxCalculationRequest],
+        yield_every: int = 1000
+    ) -> BulkTaxCalculationResponse:
+        """
+        Calculate taxes for many transactions at once.
+        
+        Line items are grouped by (jurisdiction, tax code, date, product code,
+        customer type) and the applicable rules and rates are resolved once per
+        group from the compiled rule index; exemption checks are made once per
+        distinct customer, certificate, tax code, date and billing address.
+        Amounts are then computed in a single pass over the line items.
+        calculate_taxes runs the same path for a single request.
+        
+        A request that fails is reported in ``errors`` and leaves None in its
+        slot of ``responses``; the rest of the batch is still calculated.
+        
+        Args:
+            requests: Tax calculation requests
+            yield_every: Hand control back to the event loop after this many
+                requests, so a large batch does not starve other tasks
+            
+        Returns:
+            BulkTaxCalculationResponse with per-request responses and totals
+            by currency, jurisdiction, tax type and tax code
+        """
+        rule_index = await self._get_rule_index()
+        
+        exemptions: Dict[Tuple, bool] = {}
+        groups: Dict[Tuple, List[Tuple[Decimal, Dict]]] = {}
+        totals: Dict[Tuple, Dict] = {}
+        result = BulkTaxCalculationResponse(responses=[], request_count=len(requests))
+        
+        for position, request in enumerate(requests):
+            if yield_every and position and position % yield_every == 0:
+                await asyncio.sleep(0)
+            try:
+                response = await self._calculate_with_index(
+                    request, rule_index, exemptions, groups
+                )
+            except Exception as e:
+                logger.error(f"Error calculating taxes for bulk request {position}: {str(e)}", exc_info=True)
+                result.responses.append(None)
+                result.errors.append({
+                    'index': position,
+                    'reference_id': request.reference_id,
+                    'error': str(e)
+                })
+                continue
+            
+            result.responses.append(response)
+            
+            # Transaction-level exemptions (tax holidays) void the line taxes
+            if response.is_exempt:
+                continue
+            for line in response.line_items:
+                for tax in line['tax_breakdown']:
+                    key = (
+                        response.currency, tax['jurisdiction'], tax['jurisdiction_level'],
+                        tax['tax_type'], tax['tax_code']
+                    )
+                    total = totals.get(key)
+                    if total is None:
+                        total = totals[key] = {
+                            'currency': key[0],
+                            'jurisdiction': key[1],
+                            'jurisdiction_level': key[2],
+                            'tax_type': key[3],
+                            'tax_code': key[4],
+                            'taxable_amount': Decimal('0'),
+                            'tax_amount': Decimal('0'),
+                            'line_count': 0
+                        }
+                    total['taxable_amount'] += line['amount']
+                    total['tax_amount'] += Decimal(str(tax['amount']))
+                    total['line_count'] += 1
+        
+        for total in totals.values():
+            total['tax_amount'] = total['tax_amount'].quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        result.jurisdiction_totals = list(totals.values())
+        result.rule_groups = len(groups)
+        return result
+    
+    async def _calculate_with_index(
+        self,
+        request: TaxCalculationRequest,
+        rule_index: TaxRuleIndex,
+        exemptions: Dict[Tuple, bool],
+        groups: Dict[Tuple, List[Tuple[Decimal, Dict]]]
+    ) -> TaxCalculationResponse:
+        """
+        Calculate one request of a batch, sharing exemption results and
+        resolved rule groups with the other requests of the batch.
+        """
+        response = TaxCalculationResponse(
+            transaction_id=self._generate_transaction_id(),
+            transaction_date=request.transaction_date,
+            currency=request.currency,
+            subtotal=Decimal('0'),
+            tax_amount=Decimal('0'),
+            total=Decimal('0'),
+            line_items=[],
+            jurisdictions=[],
+            is_exempt=False,
+            reference_id=request.reference_id,
+            metadata=dict(request.metadata)
+        )
+        
+        shipping_country = request.shipping_country or request.billing_country
+        if self._should_use_destination_based_tax(request.billing_country, shipping_country):
+            jurisdiction = (
+                shipping_country,
+                request.shipping_state or request.billing_state,
+                request.shipping_city or request.billing_city
+            )
+        else:
+            jurisdiction = (request.billing_country, request.billing_state, request.billing_city)
+        
+        for item in request.line_items:
+            amount = item.amount * item.quantity
             line_result = {
-                'amount': item.amount * item.quantity,
+                'amount': amount,
                 'quantity': item.quantity,
                 'tax_code': item.tax_code,
                 'product_code': item.product_code,
@@ -368,162 +399,99 @@ class TaxCalculationService:
                 'tax_breakdown': [],
                 'tax_amount': Decimal('0')
             }
+            response.line_items.append(line_result)
+            response.subtotal += amount
             
-            # Skip tax calculation for non-taxable items
             if not item.is_taxable:
-                return line_result
+                continue
             
-            # Get applicable tax rules for this item
-            tax_rules = await self._get_applicable_tax_rules(
-                item=item,
-                billing_country=request.billing_country,
-                billing_state=request.billing_state,
-                billing_city=request.billing_city,
-                shipping_country=request.shipping_country or request.billing_country,
-                shipping_state=request.shipping_state or request.billing_state,
-                shipping_city=request.shipping_city or request.billing_city,
-                transaction_date=request.transaction_date,
-                customer_id=request.customer_id,
-                customer_tax_id=request.customer_tax_id,
-                customer_type=request.customer_type,
-                exemption_certificate_id=request.exemption_certificate_id
+            exemption_key = (
+                request.customer_id, request.customer_tax_id, request.customer_type,
+                request.exemption_certificate_id, item.tax_code, request.transaction_date,
+                request.billing_country, request.billing_state, request.billing_city
             )
+            is_exempt = exemptions.get(exemption_key)
+            if is_exempt is None:
+                is_exempt = exemptions[exemption_key] = await self._check_tax_exemption(
+                    customer_id=request.customer_id,
+                    customer_tax_id=request.customer_tax_id,
+                    customer_type=request.customer_type,
+                    exemption_certificate_id=request.exemption_certificate_id,
+                    tax_code=item.tax_code,
+                    transaction_date=request.transaction_date,
+                    country_code=request.billing_country,
+                    state_code=request.billing_state,
+                    city=request.billing_city
+                )
+            if is_exempt:
+                continue
             
-            # Apply tax rules to the line item
-            for rule in tax_rules:
-                tax_result = self._apply_tax_rule(
-                    rule=rule,
-                    amount=item.amount,
-                    quantity=item.quantity,
-                    is_tax_included=item.tax_included
+            group_key = (
+                jurisdiction, item.tax_code, request.transaction_date,
+                item.product_code, request.customer_type
+            )
+            rules = groups.get(group_key)
+            if rules is None:
+                rules = groups[group_key] = self._resolve_rule_group(
+                    rule_index, jurisdiction, item.tax_code, request.transaction_date,
+                    item.product_code, request.customer_type
                 )
-                
-                if tax_result:
-                    line_result['tax_breakdown'].append(tax_result)
-                    line_result['tax_amount'] += tax_result['amount']
             
-            return line_result
+            for fraction, template in rules:
+                if item.tax_included:
+                    tax_amount = amount - (amount / (1 + fraction))
+                else:
+                    tax_amount = amount * fraction
+                tax_amount = tax_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                
+                tax_result = dict(template)
+                tax_result['amount'] = tax_amount
+                line_result['tax_breakdown'].append(tax_result)
+                line_result['tax_amount'] += tax_amount
             
-        except Exception as e:
-            logger.error(f"Error processing line item: {str(e)}", exc_info=True)
-            raise
+            response.tax_amount += line_result['tax_amount']
+        
+        response.total = response.subtotal + response.tax_amount
+        response = self._apply_transaction_adjustments(response, request)
+        return self._round_amounts(response, request.currency)
     
-    async def _get_applicable_tax_rules(
+    def _resolve_rule_group(
         self,
-        item: TaxLineItem,
-        billing_country: str,
-        billing_state: Optional[str],
-        billing_city: Optional[str],
-        shipping_country: str,
-        shipping_state: Optional[str],
-        shipping_city: Optional[str],
+        rule_index: TaxRuleIndex,
+        jurisdiction: Tuple[str, Optional[str], Optional[str]],
+        tax_code: Optional[str],
         transaction_date: date,
-        customer_id: Optional[str] = None,
-        customer_tax_id: Optional[str] = None,
-        customer_type: Optional[str] = None,
-        exemption_certificate_id: Optional[str] = None
-    ) -> List[Dict]:
+        product_code: Optional[str],
+        customer_type: Optional[str]
+    ) -> List[Tuple[Decimal, Dict]]:
         """
-        Get applicable tax rules for a line item based on various criteria.
-        
-        This method determines which tax rules apply to a given line item
-        based on location, product type, customer information, and other factors.
+        Rules applying to a group of line items, as (rate fraction, tax
+        breakdown template) pairs; the template lacks only the amount.
         """
-        # Generate a cache key based on the function arguments
-        cache_key = self._generate_tax_rules_cache_key(
-            item=item,
-            billing_country=billing_country,
-            billing_state=billing_state,
-            billing_city=billing_city,
-            shipping_country=shipping_country,
-            shipping_state=shipping_state,
-            shipping_city=shipping_city,
-            transaction_date=transaction_date,
-            customer_id=customer_id,
-            customer_type=customer_type,
-            exemption_certificate_id=exemption_certificate_id
-        )
-        
-        # Try to get from local cache first
-        if cache_key in self._local_cache:
-            cached_rules, expiry = self._local_cache[cache_key]
-            if datetime.now() < expiry:
-                return cached_rules
-            # Cache expired, remove it
-            del self._local_cache[cache_key]
-        
-        # Try to get from Redis cache if enabled
-        if self._cache_enabled:
-            try:
-                cached_rules = await FastAPICache.get(cache_key)
-                if cached_rules is not None:
-                    # Cache for 15 minutes in local cache after getting from Redis
-                    self._local_cache[cache_key] = (
-                        cached_rules,
-                        datetime.now() + timedelta(minutes=15)
-                    )
-                    return cached_rules
-            except Exception as e:
-                logger.warning(f"Error getting tax rules from Redis cache: {str(e)}")
-        
-        # Not in cache, proceed with calculation
-        try:
-            # Check for tax exemption first
-            is_exempt = await self._check_tax_exemption(
-                customer_id=customer_id,
-                customer_tax_id=customer_tax_id,
-                customer_type=customer_type,
-                exemption_certificate_id=exemption_certificate_id,
-                tax_code=item.tax_code,
-                transaction_date=transaction_date,
-                country_code=billing_country,
-                state_code=billing_state,
-                city=billing_city
-            )
-            
-            if is_exempt:
-                result = []
-                # Cache the empty result
-                self._cache_tax_rules_result(cache_key, result)
-                return result
-            
-            # Determine which jurisdiction to use (origin vs. destination)
-            use_destination = self._should_use_destination_based_tax(
-                billing_country=billing_country,
-                shipping_country=shipping_country
-            )
-            
-            # Get tax rules for the appropriate jurisdiction
-            if use_destination:
-                country = shipping_country
-                state = shipping_state
-                city = shipping_city
-            else:
-                country = billing_country
-                state = billing_state
-                city = billing_city
-            
-            # Get tax rules from the tax policy service with caching
-            tax_rules = await self._get_tax_rules_with_cache(
-                country_code=country,
-                state_code=state,
-                city=city
-            )
-            
-            # Filter rules based on product type, customer type, etc.
-            filtered_rules = []
-            for rule in tax_rules:
-                if self._does_rule_apply(rule, item, customer_type, transaction_date):
-                    filtered_rules.append(rule)
-            
-            # Cache the result
-            self._cache_tax_rules_result(cache_key, filtered_rules)
-            
-            return filtered_rules
-            
-        except Exception as e:
-            logger.error(f"Error getting applicable tax rules: {str(e)}", exc_info=True)
-            raise
+        country, state, city = jurisdiction
+        resolved = []
+        for rule in rule_index.match(
+            country_code=country,
+            state_code=state,
+            city=city,
+            tax_code=tax_code,
+            on_date=transaction_date,
+            product_code=product_code,
+            customer_type=customer_type
+        ):
+            rate = self._get_applicable_tax_rate(rule)
+            if not rate:
+                continue
+            resolved.append((rate / 100, {
+                'jurisdiction': rule.get('jurisdiction', {}).get('name', 'Unknown'),
+                'jurisdiction_level': rule.get('jurisdiction', {}).get('level', 'country'),
+                'tax_type': rule.get('type', 'sales'),
+                'tax_name': rule.get('name', 'Tax'),
+                'rate': float(rate),
+                'is_compound': rule.get('is_compound', False),
+                'tax_code': rule.get('code')
+            }))
+        return resolved
     
     async def _check_tax_exemption(
         self,
@@ -671,27 +639,21 @@ class TaxCalculationService:
         Returns:
             Dict containing the certificate data, or None if not found
         """
-        # Generate cache key
-        cache_key = f"exemption_cert:{certificate_id}"
+        # Certificate numbers are only unique within a tenant
+        cache_key = f"exemption_cert:{self.tenant_key}:{certificate_id}"
         
         # Try to get from local cache first
-        if cache_key in self._local_cache:
-            cert_data, expiry = self._local_cache[cache_key]
-            if datetime.now() < expiry:
-                return cert_data
-            # Cache expired, remove it
-            del self._local_cache[cache_key]
+        hit, cert_data = self._local_cache_get(cache_key)
+        if hit:
+            return cert_data
         
         # Try to get from Redis cache if enabled
         if self._cache_enabled:
             try:
                 cached_cert = await FastAPICache.get(cache_key)
                 if cached_cert:
-                    # Cache for 1 hour in local cache after getting from Redis
-                    self._local_cache[cache_key] = (
-                        cached_cert, 
-                        datetime.now() + timedelta(minutes=5)  # Local cache for 5 minutes
-                    )
+                    # Local cache for 5 minutes after getting from Redis
+                    self._local_cache_set(cache_key, cached_cert, timedelta(minutes=5))
                     return cached_cert
             except Exception as e:
                 logger.warning(f"Error getting from Redis cache: {str(e)}")
@@ -704,7 +666,7 @@ class TaxCalculationService:
             if not cert:
                 logger.warning(f"Exemption certificate not found: {certificate_id}")
                 # Cache negative result for a short time to prevent repeated lookups
-                self._local_cache[cache_key] = (None, datetime.now() + timedelta(minutes=1))
+                self._local_cache_set(cache_key, None, timedelta(minutes=1))
                 return None
                 
             # Convert SQLAlchemy model to dict
@@ -731,8 +693,7 @@ class TaxCalculationService:
             }
             
             # Cache the result
-            expiry = datetime.now() + timedelta(minutes=30)  # Cache for 30 minutes
-            self._local_cache[cache_key] = (cert_dict, expiry)
+            self._local_cache_set(cache_key, cert_dict, timedelta(minutes=30))  # Cache for 30 minutes
             
             # Also cache in Redis if available
             if self._cache_enabled:
@@ -915,84 +876,6 @@ class TaxCalculationService:
         # For now, default to origin-based (billing address)
         return False
     
-    def _does_rule_apply(
-        self,
-        rule: Dict,
-        item: TaxLineItem,
-        customer_type: Optional[str],
-        transaction_date: date
-    ) -> bool:
-        """Determine if a tax rule applies to a given line item"""
-        # Check if rule is active
-        if not rule.get('is_active', True):
-            return False
-            
-        # Check effective dates
-        effective_from = rule.get('effective_from')
-        if effective_from and effective_from > transaction_date:
-            return False
-            
-        effective_to = rule.get('effective_to')
-        if effective_to and effective_to < transaction_date:
-            return False
-        
-        # Check customer type restrictions
-        customer_types = rule.get('customer_types', [])
-        if customer_types and customer_type and customer_type not in customer_types:
-            return False
-            
-        # Check product restrictions
-        product_codes = rule.get('product_codes', [])
-        if product_codes and item.product_code and item.product_code not in product_codes:
-            return False
-            
-        # Check tax code restrictions
-        tax_codes = rule.get('tax_codes', [])
-        if tax_codes and item.tax_code and item.tax_code not in tax_codes:
-            return False
-            
-        return True
-    
-    def _apply_tax_rule(
-        self,
-        rule: Dict,
-        amount: Decimal,
-        quantity: int,
-        is_tax_included: bool
-    ) -> Dict:
-        """Apply a tax rule to a line item amount"""
-        try:
-            # Get the applicable tax rate
-            rate = self._get_applicable_tax_rate(rule)
-            if not rate:
-                return {}
-            
-            # Calculate tax amount
-            taxable_amount = amount * quantity
-            
-            if is_tax_included:
-                # Tax is included in the amount, calculate the tax amount
-                tax_amount = taxable_amount - (taxable_amount / (1 + (rate / 100)))
-            else:
-                # Tax is added to the amount
-                tax_amount = taxable_amount * (rate / 100)
-            
-            # Prepare tax breakdown
-            return {
-                'jurisdiction': rule.get('jurisdiction', {}).get('name', 'Unknown'),
-                'jurisdiction_level': rule.get('jurisdiction', {}).get('level', 'country'),
-                'tax_type': rule.get('type', 'sales'),
-                'tax_name': rule.get('name', 'Tax'),
-                'rate': float(rate),
-                'amount': tax_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-                'is_compound': rule.get('is_compound', False),
-                'tax_code': rule.get('code')
-            }
-            
-        except Exception as e:
-            logger.error(f"Error applying tax rule: {str(e)}", exc_info=True)
-            return {}
-    
     def _get_applicable_tax_rate(self, rule: Dict) -> Optional[Decimal]:
         """Get the applicable tax rate from a tax rule"""
         rates = rule.get('rates', [])
@@ -1020,34 +903,8 @@ class TaxCalculationService:
         Returns:
             bool: True if the date is a tax holiday, False otherwise
         """
-        # TODO: Implement actual tax holiday lookup from database
-        # This is a simplified implementation that checks a few common holidays
-        
-        # Example: Check for end-of-year tax holidays (common in some countries)
-        if transaction_date.month == 12 and transaction_date.day in [24, 25, 26, 31]:
-            return True
-            
-        # Example: Check for national holidays that might be tax-free days
-        national_holidays = {
-            'US': [
-                (1, 1),   # New Year's Day
-                (7, 4),   # Independence Day
-                (12, 25), # Christmas
-            ],
-            'GB': [
-                (1, 1),   # New Year's Day
-                (12, 25), # Christmas
-                (12, 26), # Boxing Day
-            ],
-            # Add more countries as needed
-        }
-        
-        # Check if the date matches any national holidays for the country
-        if country_code in national_holidays:
-            if (transaction_date.month, transaction_date.day) in national_holidays[country_code]:
-                return True
-        
-        return False
+        rule_index = self._rule_index or self._current_rule_index()
+        return rule_index.is_holiday(transaction_date, country_code, state_code)
     
     def _is_special_tax_regime(
         self,
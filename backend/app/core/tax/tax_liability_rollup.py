@@ -0,0 +1,305 @@
+"""
+Tax Liability Rollup
+
+Maintains ``tax_liability_daily``: one row per company, day, tax type,
+jurisdiction and reported flag, summing the matching tax transactions.
+Liability reports read these rows and derive weeks, months, quarters and
+years from them instead of aggregating raw transactions.
+
+Days are always recomputed from ``tax_transactions`` rather than adjusted
+by deltas, so refreshing a day is idempotent and safe to repeat. Every ORM
+insert, update and delete of a tax transaction marks its company day (and
+the old one when it moves) in ``tax_liability_dirty_days`` within the
+writing transaction. ``refresh_changed_tax_liability`` recomputes the
+marked days; it runs periodically from Celery beat and before a liability
+report reads the rollup. Bulk statements that bypass the ORM must call
+``mark_tax_liability_days`` themselves.
+"""
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.core_models import TaxTransaction
+from app.models.tax_liability_rollup import TaxLiabilityDaily, TaxLiabilityDirtyDay
+
+# Days refreshed per statement
+DAY_CHUNK_SIZE = 500
+
+GROUPINGS = ("day", "week", "month", "quarter", "year")
+
+
+def _transaction_day():
+    return func.date(TaxTransaction.transaction_date)
+
+
+def refresh_tax_liability_days(
+    db: Session,
+    company_id,
+    days: Optional[Iterable[date]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    """
+    Recompute the rollup rows of a company for the given days (dates or
+    datetimes), or for every day between ``start_date`` and ``end_date``,
+    within the caller's transaction.
+
+    Returns:
+        Number of rollup rows written
+    """
+    if days is not None:
+        days = sorted({_as_date(day) for day in days})
+        written = 0
+        for i in range(0, len(days), DAY_CHUNK_SIZE):
+            written += _refresh(db, company_id, days=days[i:i + DAY_CHUNK_SIZE])
+        return written
+    return _refresh(db, company_id, start_date=start_date, end_date=end_date)
+
+
+def _refresh(
+    db: Session,
+    company_id,
+    days: Optional[List[date]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    tx = TaxTransaction
+    rollup = TaxLiabilityDaily.__table__
+    markers = TaxLiabilityDirtyDay.__table__
+    day = _transaction_day()
+    tax_type = func.coalesce(tx.tax_type, '')
+    jurisdiction_code = func.coalesce(tx.jurisdiction_code, '')
+    is_reported = func.coalesce(tx.is_reported, False)
+
+    # Markers set after this point may concern changes the recompute misses
+    refreshed_at = datetime.utcnow()
+
+    clear = delete(rollup).where(rollup.c.company_id == company_id)
+    unmark = delete(markers).where(
+        markers.c.company_id == company_id,
+        markers.c.marked_at <= refreshed_at
+    )
+    source = db.query(
+        day,
+        tax_type,
+        jurisdiction_code,
+        is_reported,
+        func.sum(tx.taxable_amount),
+        func.sum(tx.tax_amount),
+        func.count()
+    ).filter(tx.company_id == company_id)
+
+    if days is not None:
+        clear = clear.where(rollup.c.day.in_(days))
+        unmark = unmark.where(markers.c.day.in_(days))
+        source = source.filter(day.in_(days))
+    if start_date is not None:
+        clear = clear.where(rollup.c.day >= start_date)
+        unmark = unmark.where(markers.c.day >= start_date)
+        source = source.filter(day >= start_date)
+    if end_date is not None:
+        clear = clear.where(rollup.c.day <= end_date)
+        unmark = unmark.where(markers.c.day <= end_date)
+        source = source.filter(day <= end_date)
+
+    rows = [
+        {
+            'company_id': company_id,
+            'day': _as_date(row_day),
+            'tax_type': row_tax_type,
+            'jurisdiction_code': row_jurisdiction_code,
+            'is_reported': bool(row_is_reported),
+            'taxable_amount': taxable_amount or Decimal('0'),
+            'tax_amount': tax_amount or Decimal('0'),
+            'transaction_count': transaction_count,
+            'refreshed_at': refreshed_at
+        }
+        for row_day, row_tax_type, row_jurisdiction_code, row_is_reported, taxable_amount, tax_amount, transaction_count
+        in source.group_by(day, tax_type, jurisdiction_code, is_reported)
+    ]
+
+    db.execute(clear)
+    db.execute(unmark)
+    if rows:
+        db.bulk_insert_mappings(TaxLiabilityDaily, rows)
+    return len(rows)
+
+
+def refresh_changed_tax_liability(
+    db: Session,
+    company_id=None,
+    batch_size: int = DAY_CHUNK_SIZE
+) -> int:
+    """
+    Recompute every company day marked in ``tax_liability_dirty_days``,
+    committing after each batch of ``batch_size`` markers.
+
+    Only markers set before the call are processed, so a steady stream of
+    writes cannot keep the job running.
+
+    Returns:
+        Number of company-days refreshed
+    """
+    markers = TaxLiabilityDirtyDay.__table__
+    pending = select(markers.c.company_id, markers.c.day).where(
+        markers.c.marked_at <= datetime.utcnow()
+    ).order_by(markers.c.marked_at).limit(batch_size)
+    if company_id is not None:
+        pending = pending.where(markers.c.company_id == company_id)
+
+    refreshed = 0
+    while True:
+        days_by_company: Dict[object, Set[date]] = defaultdict(set)
+        for marked_company_id, day in db.execute(pending):
+            days_by_company[marked_company_id].add(_as_date(day))
+        if not days_by_company:
+            break
+
+        # Refreshing clears the markers; ones set again meanwhile are newer
+        # than the cutoff and left for the next run
+        for marked_company_id, days in days_by_company.items():
+            refresh_tax_liability_days(db, marked_company_id, days=days)
+        db.commit()
+        refreshed += sum(len(days) for days in days_by_company.values())
+    return refreshed
+
+
+def mark_tax_liability_days(
+    connection: Union[Connection, Session],
+    company_id,
+    days: Iterable
+) -> None:
+    """
+    Flag company days (dates or datetimes) for the next incremental refresh,
+    within the caller's transaction.
+    """
+    days = {_as_date(day) for day in days if day is not None}
+    if company_id is None or not days:
+        return
+
+    bind = connection.get_bind() if isinstance(connection, Session) else connection
+    if bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+
+    marked_at = datetime.utcnow()
+    stmt = insert(TaxLiabilityDirtyDay.__table__).values([
+        {
+            'id': uuid.uuid4(),
+            'company_id': company_id,
+            'day': day,
+            'marked_at': marked_at,
+            'created_at': marked_at,
+            'updated_at': marked_at,
+            'is_active': True
+        }
+        for day in sorted(days)
+    ])
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['company_id', 'day'],
+        set_={'marked_at': stmt.excluded.marked_at, 'updated_at': stmt.excluded.updated_at}
+    ))
+
+
+@event.listens_for(TaxTransaction, 'after_insert')
+@event.listens_for(TaxTransaction, 'after_delete')
+def _mark_written_transaction(mapper, connection, target) -> None:
+    mark_tax_liability_days(connection, target.company_id, [target.transaction_date])
+
+
+@event.listens_for(TaxTransaction, 'before_update')
+def _mark_moved_transaction(mapper, connection, target) -> None:
+    # A transaction moved to another company or day also changes the old
+    # one; the old values are read from the row since they may not be loaded
+    state = inspect(target)
+    if not (state.attrs.company_id.history.has_changes()
+            or state.attrs.transaction_date.history.has_changes()):
+        return
+    table = mapper.local_table
+    old = connection.execute(
+        select(table.c.company_id, table.c.transaction_date).where(table.c.id == target.id)
+    ).first()
+    if old is not None:
+        mark_tax_liability_days(connection, old.company_id, [old.transaction_date])
+
+
+@event.listens_for(TaxTransaction, 'after_update')
+def _mark_updated_transaction(mapper, connection, target) -> None:
+    mark_tax_liability_days(connection, target.company_id, [target.transaction_date])
+
+
+def _as_date(value) -> date:
+    # func.date() returns a string on SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def period_start(day: date, group_by: str) -> date:
+    """First day of the ``group_by`` period containing ``day`` (weeks start on Monday)."""
+    if group_by == "day":
+        return day
+    if group_by == "week":
+        return day - timedelta(days=day.weekday())
+    if group_by == "quarter":
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    if group_by == "year":
+        return date(day.year, 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def period_label(start: date, group_by: str) -> str:
+    """Report label of a period, e.g. ``2024-03``, ``2024-W09`` or ``2024-Q1``."""
+    if group_by == "day":
+        return start.strftime("%Y-%m-%d")
+    if group_by == "week":
+        return start.strftime("%Y-W%W")
+    if group_by == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    if group_by == "year":
+        return start.strftime("%Y")
+    return start.strftime("%Y-%m")
+
+
+def roll_up(
+    rows: Iterable[Tuple[date, str, str, Decimal, Decimal, int]],
+    group_by: str
+) -> List[Dict]:
+    """
+    Aggregate daily (day, tax_type, jurisdiction_code, taxable_amount,
+    tax_amount, transaction_count) rows into ``group_by`` periods.
+
+    Returns one item per period, tax type and jurisdiction, ordered by
+    period start, tax type and jurisdiction code.
+    """
+    buckets: Dict[Tuple[date, str, str], List] = {}
+    for day, tax_type, jurisdiction_code, taxable_amount, tax_amount, transaction_count in rows:
+        key = (period_start(_as_date(day), group_by), tax_type, jurisdiction_code or '')
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [Decimal("0.00"), Decimal("0.00"), 0]
+        bucket[0] += taxable_amount or Decimal("0.00")
+        bucket[1] += tax_amount or Decimal("0.00")
+        bucket[2] += transaction_count or 0
+
+    return [
+        {
+            "period": period_label(start, group_by),
+            "tax_type": tax_type,
+            "jurisdiction_code": jurisdiction_code or None,
+            "taxable_amount": taxable_amount,
+            "tax_amount": tax_amount,
+            "transaction_count": transaction_count
+        }
+        for (start, tax_type, jurisdiction_code), (taxable_amount, tax_amount, transaction_count)
+        in sorted(buckets.items())
+    ]
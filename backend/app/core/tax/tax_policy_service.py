@@ -2,7 +2,7 @@ import os
 import json
 import logging
 from datetime import datetime, date
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from pydantic import BaseModel, Field, validator, HttpUrl
 from enum import Enum
 import httpx
@@ -100,6 +100,9 @@ class TaxPolicyService:
         self.tax_exemptions_cache: Dict[str, TaxExemption] = {}
         self.last_updated = datetime.min
         self.update_interval = 3600  # 1 hour in seconds
+        # Bumped whenever the rule or exemption caches change, so compiled
+        # rule indexes know when to rebuild
+        self.rules_version = 0
         self.external_sources = [
             "https://taxee.io/api/v2/global/standard_rates",
             # Add more authoritative tax rate sources here
@@ -122,9 +125,10 @@ class TaxPolicyService:
                     for rule_data in rules_data.get('rules', []):
                         try:
                             rule = TaxRule(**rule_data)
-                            self.tax_rules_cache[rule.code] = rule
+                            self.tax_rules_cache[rule.code.upper()] = rule
                         except Exception as e:
                             logger.error(f"Error loading tax rule {rule_data.get('code')}: {str(e)}")
+                    self.rules_version += 1
             
             logger.info(f"Loaded {len(self.tax_rules_cache)} default tax rules")
             
@@ -171,6 +175,26 @@ class TaxPolicyService:
         # For example, TaxJar, Avalara, or other tax API responses
         pass
     
+    def upsert_tax_rule(self, rule: TaxRule) -> None:
+        """Add or replace a tax rule"""
+        self.tax_rules_cache[rule.code.upper()] = rule
+        self.rules_version += 1
+    
+    def remove_tax_rule(self, code: str) -> None:
+        """Remove a tax rule"""
+        if self.tax_rules_cache.pop(code.upper(), None) is not None:
+            self.rules_version += 1
+    
+    async def get_rules_snapshot(self) -> Tuple[int, List[TaxRule], List[TaxExemption]]:
+        """Current rules version with the active rules and exemptions"""
+        if self.cache_enabled:
+            await self._refresh_cache()
+        return (
+            self.rules_version,
+            list(self.tax_rules_cache.values()),
+            list(self.tax_exemptions_cache.values())
+        )
+    
     async def calculate_tax(
         self,
         amount: float,
@@ -11,10 +11,13 @@ from decimal import Decimal
 import logging
 import io
 import csv
+from io import BytesIO
 import pandas as pd
 import asyncio
 import json
-from fastapi.responses import StreamingResponse
+import os
+import aiohttp
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi import HTTPException, status, Response, BackgroundTasks
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, or_, select, text
@@ -25,8 +28,11 @@ import aioredis
 from app import crud, models, schemas
 from app.core.tax.tax_policy_service import TaxType, TaxJurisdiction, tax_policy_service
 from app.core.tax.tax_calculation_service import tax_calculation_service
+from app.core.tax.tax_liability_rollup import (
+    GROUPINGS, refresh_changed_tax_liability, roll_up
+)
 from app.core.config import settings
-from app.core.redis_utils import redis_manager, ReportManager, cache
+from app.core.redis_utils import redis_manager, ReportManager, close_redis
 from app.core.db.session import async_session
 
 # Type variable for generic function return type
@@ -35,7 +41,33 @@ T = TypeVar('T')
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-logger = logging.getLogger(__name__)
+# Generated report files, one directory per report. Report workers write the
+# files the API serves, so this must be storage both can reach; there is no
+# local default.
+REPORT_STORAGE_DIR = getattr(settings, 'REPORT_STORAGE_DIR', None)
+
+# Reports generated at the same time per tenant; further reports wait in the queue
+REPORT_TENANT_CONCURRENCY = getattr(settings, 'TAX_REPORT_TENANT_CONCURRENCY', 2)
+
+# Slots are released by the worker; each slot's own expiry frees it if a
+# worker dies
+REPORT_SLOT_TTL = 3600
+
+REPORT_ARTIFACT_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _report_storage_dir() -> str:
+    """The shared report storage directory; raises if it is not configured."""
+    if not REPORT_STORAGE_DIR:
+        raise RuntimeError(
+            "REPORT_STORAGE_DIR is not set; point it at storage shared by the API "
+            "and the report workers"
+        )
+    return REPORT_STORAGE_DIR
 
 class TaxReportingService:
     def __init__(self, db: Session = None):
@@ -96,7 +128,6 @@ class TaxReportingService:
         except Exception as e:
             logger.warning(f"Cache set error: {e}")
     
-    @cache(key_prefix="tax_liability_report")
     async def generate_tax_liability_report(
         self,
         company_id: str,
@@ -106,12 +137,16 @@ class TaxReportingService:
         jurisdiction_codes: Optional[List[str]] = None,
         group_by: str = "month",
         page: int = 1,
-        page_size: int = 1000,
+        page_size: Optional[int] = 1000,
         force_refresh: bool = False
     ) -> Dict[str, Any]:
         """
         Generate a tax liability report showing tax collected and owed for a given period.
         
+        The report is aggregated from the daily tax liability rollup rather than
+        from raw transactions. The full aggregate for a company, period, filter
+        set and grouping is cached once and every page is a slice of it.
+        
         Args:
             company_id: ID of the company
             start_date: Start date of the reporting period
@@ -120,7 +155,8 @@ class TaxReportingService:
             jurisdiction_codes: Optional list of jurisdiction codes to filter by
             group_by: How to group the results (day, week, month, quarter, year)
             page: Page number for pagination (1-based)
-            page_size: Number of items per page
+            page_size: Number of items per page, or None for the whole report
+            force_refresh: Recompute instead of using the cached aggregate
             
         Returns:
             Dict containing the tax liability report data with pagination info
@@ -128,7 +164,16 @@ class TaxReportingService:
         # Initialize Redis if not already done
         await self.initialize_redis()
         
-        # Generate cache key
+        # Input validation
+        if end_date < start_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="End date must be after start date"
+            )
+        if group_by not in GROUPINGS:
+            group_by = "month"
+        
+        # The aggregate is cached independently of pagination
         cache_key = self._get_cache_key(
             "generate_tax_liability_report",
             company_id=company_id,
@@ -136,94 +181,44 @@ class TaxReportingService:
             end_date=end_date.isoformat(),
             tax_types=tax_types,
             jurisdiction_codes=jurisdiction_codes,
-            group_by=group_by,
-            page=page,
-            page_size=page_size
+            group_by=group_by
         )
         
-        # Try to get from cache if not forcing refresh
+        items = None
+        cached = False
         if not force_refresh:
-            cached_result = await self._get_cached_result(cache_key)
-            if cached_result:
+            cached_items = await self._get_cached_result(cache_key)
+            if cached_items is not None:
                 logger.info(f"Cache hit for tax liability report: {cache_key}")
-                return cached_result
+                cached = True
+                items = [
+                    {
+                        **item,
+                        "taxable_amount": Decimal(item["taxable_amount"]),
+                        "tax_amount": Decimal(item["tax_amount"])
+                    }
+                    for item in cached_items
+                ]
         
-        # Input validation
-        if end_date < start_date:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="End date must be after start date"
+        if items is None:
+            items = await self._load_liability_items(
+                company_id, start_date, end_date, tax_types, jurisdiction_codes, group_by
             )
+            await self._set_cached_result(cache_key, items)
         
-        # Use async session for better concurrency
-        async with async_session() as session:
-            # Determine the date truncation function based on group_by
-            if group_by == "day":
-                trunc_expr = func.date_trunc('day', models.TaxTransaction.transaction_date)
-                date_format = "%Y-%m-%d"
-            elif group_by == "week":
-                # For week, we'll use date_trunc with 'week' and adjust to start on Monday
-                trunc_expr = func.date_trunc('week', models.TaxTransaction.transaction_date)
-                date_format = "%Y-W%W"
-            elif group_by == "quarter":
-                trunc_expr = func.date_trunc('quarter', models.TaxTransaction.transaction_date)
-                date_format = "%Y-Q%q"
-            elif group_by == "year":
-                trunc_expr = func.date_trunc('year', models.TaxTransaction.transaction_date)
-                date_format = "%Y"
-            else:  # month (default)
-                trunc_expr = func.date_trunc('month', models.TaxTransaction.transaction_date)
-                date_format = "%Y-%m"
-            
-            # Build the base query with server-side aggregation
-            stmt = select(
-                trunc_expr.label('period'),
-                models.TaxTransaction.tax_type,
-                models.TaxTransaction.jurisdiction_code,
-                func.sum(models.TaxTransaction.taxable_amount).label('taxable_amount'),
-                func.sum(models.TaxTransaction.tax_amount).label('tax_amount'),
-                func.count().label('transaction_count')
-            ).where(
-                models.TaxTransaction.company_id == company_id,
-                models.TaxTransaction.transaction_date >= start_date,
-                models.TaxTransaction.transaction_date <= end_date,
-                models.TaxTransaction.is_reported == False
-            )
-            
-            # Apply filters
-            if tax_types:
-                stmt = stmt.where(models.TaxTransaction.tax_type.in_(tax_types))
-                
-            if jurisdiction_codes:
-                stmt = stmt.where(models.TaxTransaction.jurisdiction_code.in_(jurisdiction_codes))
-            
-            # Group by period, tax_type, and jurisdiction_code
-            stmt = stmt.group_by(
-                trunc_expr,
-                models.TaxTransaction.tax_type,
-                models.TaxTransaction.jurisdiction_code
-            )
-            
-            # Get total count for pagination (using a subquery for better performance)
-            count_stmt = select(func.count()).select_from(stmt.subquery())
-            total_count = (await session.execute(count_stmt)).scalar() or 0
-            
-            # Apply pagination
-            stmt = stmt.offset((page - 1) * page_size).limit(page_size)
-            
-            # Execute the query
-            result = await session.execute(stmt)
-            results = result.all()
+        # Apply pagination to the aggregate
+        total_count = len(items)
+        if page_size is None:
+            page, page_items = 1, items
+        else:
+            offset = (page - 1) * page_size
+            page_items = items[offset:offset + page_size]
         
         # Process results into period_totals structure
         period_totals = {}
         
-        # Process results using list comprehension for better performance
-        for row in results:
-            period_key = row.period.strftime(date_format)
-            
-            # Initialize period if not exists using dict.setdefault
-            period = period_totals.setdefault(period_key, {
+        for item in page_items:
+            period = period_totals.setdefault(item["period"], {
                 "taxable_amount": Decimal("0.00"),
                 "tax_amount": Decimal("0.00"),
                 "transaction_count": 0,
@@ -231,18 +226,16 @@ class TaxReportingService:
                 "jurisdictions": {}
             })
             
-            # Convert None to 0 for calculations
-            taxable_amount = row.taxable_amount or Decimal("0.00")
-            tax_amount = row.tax_amount or Decimal("0.00")
-            transaction_count = row.transaction_count or 0
+            taxable_amount = item["taxable_amount"]
+            tax_amount = item["tax_amount"]
             
             # Update period totals
             period["taxable_amount"] += taxable_amount
             period["tax_amount"] += tax_amount
-            period["transaction_count"] += transaction_count
+            period["transaction_count"] += item["transaction_count"]
             
             # Update tax type breakdown
-            tax_type_data = period["tax_types"].setdefault(row.tax_type, {
+            tax_type_data = period["tax_types"].setdefault(item["tax_type"], {
                 "taxable_amount": Decimal("0.00"),
                 "tax_amount": Decimal("0.00")
             })
@@ -250,7 +243,7 @@ class TaxReportingService:
             tax_type_data["tax_amount"] += tax_amount
             
             # Update jurisdiction breakdown
-            jurisdiction_data = period["jurisdictions"].setdefault(row.jurisdiction_code, {
+            jurisdiction_data = period["jurisdictions"].setdefault(item["jurisdiction_code"], {
                 "taxable_amount": Decimal("0.00"),
                 "tax_amount": Decimal("0.00")
             })
@@ -272,13 +265,16 @@ class TaxReportingService:
             "total_transactions": total_transactions,
             "periods": [
                 {"period": period, **data} 
-                for period, data in sorted(period_totals.items())
+                for period, data in period_totals.items()
             ],
             "pagination": {
                 "page": page,
                 "page_size": page_size,
                 "total_items": total_count,
-                "total_pages": (total_count + page_size - 1) // page_size if page_size > 0 else 0
+                "total_pages": (
+                    1 if page_size is None
+                    else (total_count + page_size - 1) // page_size if page_size > 0 else 0
+                )
             },
             "metadata": {
                 "generated_at": datetime.utcnow().isoformat(),
@@ -286,14 +282,56 @@ class TaxReportingService:
                 "jurisdiction_codes": jurisdiction_codes or "All",
                 "group_by": group_by,
                 "cache_key": cache_key,
-                "cached": False
+                "cached": cached
             }
         }
         
-        # Cache the result
-        await self._set_cached_result(cache_key, response_data)
-        
         return response_data
+    
+    async def _load_liability_items(
+        self,
+        company_id: str,
+        start_date: date,
+        end_date: date,
+        tax_types: Optional[List[str]],
+        jurisdiction_codes: Optional[List[str]],
+        group_by: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Unreported liability per period, tax type and jurisdiction, from the
+        daily rollup after recomputing the company's changed days.
+        """
+        rollup = models.TaxLiabilityDaily
+        
+        async with async_session() as session:
+            await session.run_sync(
+                lambda sync_session: refresh_changed_tax_liability(sync_session, company_id=company_id)
+            )
+            
+            stmt = select(
+                rollup.day,
+                rollup.tax_type,
+                rollup.jurisdiction_code,
+                rollup.taxable_amount,
+                rollup.tax_amount,
+                rollup.transaction_count
+            ).where(
+                rollup.company_id == company_id,
+                rollup.day >= start_date,
+                rollup.day <= end_date,
+                rollup.is_reported == False
+            )
+            
+            # Apply filters
+            if tax_types:
+                stmt = stmt.where(rollup.tax_type.in_(tax_types))
+                
+            if jurisdiction_codes:
+                stmt = stmt.where(rollup.jurisdiction_code.in_(jurisdiction_codes))
+            
+            rows = (await session.execute(stmt)).all()
+        
+        return roll_up(rows, group_by)
         
     def generate_tax_filing(
         self,
@@ -1469,7 +1507,12 @@ class TaxReportingService:
         callback_url: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Generate a tax liability report asynchronously and store the result in Redis.
+        Queue a tax liability report for generation by a report worker.
+        
+        The report is generated by a Celery task on the ``reports`` queue, so
+        aggregation and rendering never run in the API process and queued
+        reports survive API restarts. Progress is published through
+        ReportManager and the rendered files are written to REPORT_STORAGE_DIR.
         
         Args:
             company_id: ID of the company
@@ -1483,6 +1526,18 @@ class TaxReportingService:
         Returns:
             Dict containing the report ID and status endpoint
         """
+        from app.core.celery_app import generate_tax_liability_report_task
+        
+        # Refuse to queue a report no worker could store
+        try:
+            _report_storage_dir()
+        except RuntimeError as e:
+            logger.error(str(e))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Report storage is not configured"
+            )
+        
         # Generate a unique report ID
         report_id = await ReportManager.generate_report_id(
             company_id=company_id,
@@ -1500,20 +1555,27 @@ class TaxReportingService:
         await ReportManager.store_report_status(
             report_id=report_id,
             status="pending",
-            result=None
+            result={"progress": 0, "message": "Queued for generation"}
         )
         
-        # Start background task
-        asyncio.create_task(self._generate_report_background(
-            report_id=report_id,
-            company_id=company_id,
-            start_date=start_date,
-            end_date=end_date,
-            tax_types=tax_types,
-            jurisdiction_codes=jurisdiction_codes,
-            group_by=group_by,
-            callback_url=callback_url
-        ))
+        try:
+            generate_tax_liability_report_task.apply_async(kwargs={
+                "report_id": report_id,
+                "company_id": company_id,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "tax_types": tax_types,
+                "jurisdiction_codes": jurisdiction_codes,
+                "group_by": group_by,
+                "callback_url": callback_url
+            })
+        except Exception as e:
+            logger.error(f"Failed to queue report {report_id}: {e}")
+            await ReportManager.store_report_status(report_id=report_id, status="failed", error=str(e))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Report workers are unavailable, please try again later"
+            )
         
         return {
             "report_id": report_id,
@@ -1523,27 +1585,87 @@ class TaxReportingService:
             "created_at": datetime.utcnow().isoformat()
         }
     
+    def run_report_job(self, **params) -> str:
+        """
+        Entry point for report workers: generate a queued liability report.
+        
+        Returns:
+            "completed", "failed", or "throttled" when the tenant already has
+            REPORT_TENANT_CONCURRENCY reports in progress and the job should
+            be retried later
+        """
+        async def run() -> str:
+            try:
+                return await self._generate_report_background(**params)
+            finally:
+                # Redis connections are bound to this job's event loop
+                await close_redis()
+        
+        return asyncio.run(run())
+    
+    @staticmethod
+    def _report_slot_keys(tenant_key: str) -> List[str]:
+        return [f"report:slots:{tenant_key}:{slot}" for slot in range(REPORT_TENANT_CONCURRENCY)]
+    
+    async def _acquire_report_slot(self, tenant_key: str, report_id: str) -> bool:
+        """
+        Take one of the tenant's report generation slots, if one is free.
+        
+        Each slot is a key of its own holding the report ID, created with
+        its expiry, so a slot leaked by a dead worker frees itself.
+        """
+        redis = await redis_manager.redis()
+        if redis is None:
+            return True
+        for key in self._report_slot_keys(tenant_key):
+            if await redis.set(key, report_id, nx=True, ex=REPORT_SLOT_TTL):
+                return True
+        return False
+    
+    async def _release_report_slot(self, tenant_key: str, report_id: str) -> None:
+        """Free the slot held by a report, unless it already expired."""
+        redis = await redis_manager.redis()
+        if redis is None:
+            return
+        for key in self._report_slot_keys(tenant_key):
+            if await redis.get(key) == report_id:
+                await redis.delete(key)
+                return
+    
     async def _generate_report_background(
         self,
         report_id: str,
         company_id: str,
-        start_date: date,
-        end_date: date,
+        start_date: Union[date, str],
+        end_date: Union[date, str],
         tax_types: Optional[List[str]] = None,
         jurisdiction_codes: Optional[List[str]] = None,
         group_by: str = "month",
         callback_url: Optional[str] = None
-    ) -> None:
-        """Background task to generate a tax liability report."""
+    ) -> str:
+        """Generate a tax liability report and write its artifacts to disk."""
+        if isinstance(start_date, str):
+            start_date = date.fromisoformat(start_date)
+        if isinstance(end_date, str):
+            end_date = date.fromisoformat(end_date)
+        
+        if not await self._acquire_report_slot(company_id, report_id):
+            await ReportManager.store_report_status(
+                report_id=report_id,
+                status="pending",
+                result={"progress": 0, "message": "Waiting for other reports of this company to finish"}
+            )
+            return "throttled"
+        
         try:
             # Update status to in_progress
             await ReportManager.store_report_status(
                 report_id=report_id,
                 status="in_progress",
-                result={"progress": 0, "message": "Starting report generation..."}
+                result={"progress": 10, "message": "Aggregating tax liability..."}
             )
             
-            # Generate the report
+            # Generate the whole report, not just the first page
             report = await self.generate_tax_liability_report(
                 company_id=company_id,
                 start_date=start_date,
@@ -1551,37 +1673,42 @@ class TaxReportingService:
                 tax_types=tax_types,
                 jurisdiction_codes=jurisdiction_codes,
                 group_by=group_by,
+                page_size=None,
                 force_refresh=True
             )
             
-            # Store the result
+            await ReportManager.store_report_status(
+                report_id=report_id,
+                status="in_progress",
+                result={"progress": 50, "message": "Rendering report files..."}
+            )
+            
+            artifacts = self._write_report_artifacts(report_id, report)
+            
+            # Only the summary and artifact locations go to Redis
             await ReportManager.store_report_status(
                 report_id=report_id,
                 status="completed",
                 result={
                     "progress": 100,
                     "message": "Report generated successfully",
-                    "report": report
+                    "artifacts": artifacts,
+                    "summary": {
+                        key: report[key] for key in (
+                            "company_id", "start_date", "end_date", "total_taxable_amount",
+                            "total_tax_amount", "total_transactions"
+                        )
+                    }
                 }
             )
             
             # Call the callback URL if provided
-            if callback_url:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(
-                            callback_url,
-                            json={
-                                "report_id": report_id,
-                                "status": "completed",
-                                "download_url": f"/api/v1/tax/reports/download/{report_id}"
-                            },
-                            timeout=10
-                        ) as response:
-                            if response.status >= 400:
-                                logger.error(f"Callback to {callback_url} failed with status {response.status}")
-                except Exception as e:
-                    logger.error(f"Error calling callback URL {callback_url}: {e}")
+            await self._notify_callback(callback_url, {
+                "report_id": report_id,
+                "status": "completed",
+                "download_url": f"/api/v1/tax/reports/download/{report_id}"
+            })
+            return "completed"
             
         except Exception as e:
             logger.exception(f"Error generating report {report_id}")
@@ -1592,20 +1719,49 @@ class TaxReportingService:
             )
             
             # Call the callback URL with error if provided
-            if callback_url:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        await session.post(
-                            callback_url,
-                            json={
-                                "report_id": report_id,
-                                "status": "failed",
-                                "error": str(e)
-                            },
-                            timeout=10
-                        )
-                except Exception as callback_error:
-                    logger.error(f"Error calling callback URL on error: {callback_error}")
+            await self._notify_callback(callback_url, {
+                "report_id": report_id,
+                "status": "failed",
+                "error": str(e)
+            })
+            return "failed"
+            
+        finally:
+            await self._release_report_slot(company_id, report_id)
+    
+    def _write_report_artifacts(self, report_id: str, report: Dict[str, Any]) -> Dict[str, str]:
+        """Render the report in every artifact format; returns file paths by format."""
+        directory = os.path.join(_report_storage_dir(), report_id)
+        os.makedirs(directory, exist_ok=True)
+        
+        renderers = {
+            "json": lambda data: json.dumps(data, default=str).encode("utf-8"),
+            "csv": self._render_csv,
+            "xlsx": self._render_excel,
+        }
+        artifacts = {}
+        for format, render in renderers.items():
+            try:
+                content = render(report)
+            except Exception as e:
+                logger.error(f"Failed to render {format} for report {report_id}: {e}")
+                continue
+            path = os.path.join(directory, f"tax_report.{format}")
+            with open(path, "wb") as f:
+                f.write(content)
+            artifacts[format] = path
+        return artifacts
+    
+    async def _notify_callback(self, callback_url: Optional[str], payload: Dict[str, Any]) -> None:
+        if not callback_url:
+            return
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(callback_url, json=payload, timeout=10) as response:
+                    if response.status >= 400:
+                        logger.error(f"Callback to {callback_url} failed with status {response.status}")
+        except Exception as e:
+            logger.error(f"Error calling callback URL {callback_url}: {e}")
     
     async def get_report_status(self, report_id: str) -> Dict[str, Any]:
         """Get the status of a report generation task."""
@@ -1630,30 +1786,62 @@ class TaxReportingService:
         """
         # Get the report status
         status_data = await self.get_report_status(report_id)
+        result = status_data.get("result") or {}
         
-        if status_data["status"] != "completed" or "report" not in status_data.get("result", {}):
+        if status_data["status"] != "completed" or not ("artifacts" in result or "report" in result):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Report {report_id} not found or not yet complete"
             )
         
-        report_data = status_data["result"]["report"]
-        
-        # Return in the requested format
-        if format.lower() == "json":
-            return report_data
-        elif format.lower() == "csv":
-            return await self._convert_to_csv(report_data)
-        elif format.lower() in ["xlsx", "excel"]:
-            return await self._convert_to_excel(report_data)
-        else:
+        format = format.lower()
+        if format == "excel":
+            format = "xlsx"
+        if format not in REPORT_ARTIFACT_TYPES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Unsupported format: {format}. Supported formats: json, csv, xlsx"
             )
+        
+        # Reports stored inline in the status record
+        if "report" in result:
+            report_data = result["report"]
+            if format == "json":
+                return report_data
+            elif format == "csv":
+                return await self._convert_to_csv(report_data)
+            return await self._convert_to_excel(report_data)
+        
+        path = result["artifacts"].get(format)
+        if not path or not os.path.exists(path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Report {report_id} is not available as {format}"
+            )
+        
+        if format == "json":
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        
+        summary = result.get("summary", {})
+        return FileResponse(
+            path,
+            media_type=REPORT_ARTIFACT_TYPES[format],
+            filename=f"tax_report_{summary.get('start_date')}_to_{summary.get('end_date')}.{format}"
+        )
     
     async def _convert_to_csv(self, report_data: Dict[str, Any]) -> StreamingResponse:
         """Convert report data to CSV format."""
+        return StreamingResponse(
+            iter([self._render_csv(report_data)]),
+            media_type="text/csv",
+            headers={
+                "Content-Disposition": f"attachment; filename=tax_report_{report_data['start_date']}_to_{report_data['end_date']}.csv"
+            }
+        )
+    
+    def _render_csv(self, report_data: Dict[str, Any]) -> bytes:
+        """Render report data as CSV."""
         # Flatten the report data for CSV
         rows = []
         for period in report_data["periods"]:
@@ -1673,18 +1861,20 @@ class TaxReportingService:
         writer.writeheader()
         writer.writerows(rows)
         
-        # Return as streaming response
-        response = StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
+        return output.getvalue().encode("utf-8")
+    
+    async def _convert_to_excel(self, report_data: Dict[str, Any]) -> StreamingResponse:
+        """Convert report data to Excel format."""
+        return StreamingResponse(
+            iter([self._render_excel(report_data)]),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={
-                "Content-Disposition": f"attachment; filename=tax_report_{report_data['start_date']}_to_{report_data['end_date']}.csv"
+                "Content-Disposition": f"attachment; filename=tax_report_{report_data['start_date']}_to_{report_data['end_date']}.xlsx"
             }
         )
-        return response
     
-    async def _convert_to_excel(self, report_data: Dict[str, Any]) -> StreamingResponse:
-        """Convert report data to Excel format."""
+    def _render_excel(self, report_data: Dict[str, Any]) -> bytes:
+        """Render report data as an Excel workbook."""
         # Create a DataFrame from the report data
         rows = []
         for period in report_data["periods"]:
@@ -1728,16 +1918,7 @@ class TaxReportingService:
             worksheet.set_column('C:C', 20)  # Jurisdiction
             worksheet.set_column('D:E', 15)  # Numeric columns
         
-        # Prepare the response
-        output.seek(0)
-        
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename=tax_report_{report_data['start_date']}_to_{report_data['end_date']}.xlsx"
-            }
-        )
+        return output.getvalue()
 
 # Singleton instance
 tax_reporting_service = TaxReportingService()
@@ -0,0 +1,317 @@
+"""
+Compiled Tax Rule Index
+
+Tax rules from the tax policy service are compiled into a jurisdiction trie
+(country -> state -> city). Each node holds its rules keyed by tax code,
+the blanket exemption overlays declared for that jurisdiction and any tax
+holiday windows, with rate effective-date intervals sorted ahead of time.
+Resolving the rules for a line item is a walk of at most three nodes plus a
+binary search per rule over its rate intervals.
+
+Indexes are shared across TaxCalculationService instances, kept per tenant
+in a bounded LRU, and rebuilt when the policy service's rules version
+changes. Each index memoizes recent lookups in its own bounded LRU.
+"""
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+from app.core.tax.tax_policy_service import TaxExemption, TaxRule
+
+# Recurring tax holidays as (month, day), by country; '*' applies everywhere
+RECURRING_TAX_HOLIDAYS: Dict[str, FrozenSet[Tuple[int, int]]] = {
+    '*': frozenset({(12, 24), (12, 25), (12, 26), (12, 31)}),
+    'US': frozenset({(1, 1), (7, 4), (12, 25)}),
+    'GB': frozenset({(1, 1), (12, 25), (12, 26)}),
+}
+
+MAX_TENANT_INDEXES = 64
+MAX_CACHED_LOOKUPS = 8192
+
+
+class LRUCache(OrderedDict):
+    """Dict bounded to ``maxsize`` entries, evicting the least recently used."""
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value))
+
+
+def _path(country_code: Optional[str], state_code: Optional[str], city: Optional[str]) -> Tuple[str, ...]:
+    """Normalized trie path; stops at the first missing level."""
+    parts = []
+    for part, normalize in ((country_code, str.upper), (state_code, str.upper), (city, str.lower)):
+        if not part:
+            break
+        parts.append(normalize(part.strip()))
+    return tuple(parts)
+
+
+class CompiledTaxRule:
+    """A tax rule with its applicability sets and rate intervals precomputed."""
+
+    __slots__ = (
+        'code', 'name', 'tax_type', 'level', 'jurisdiction_name', 'is_compound',
+        'gl_account_code', 'tax_codes', 'product_codes', 'customer_types',
+        '_starts', '_intervals'
+    )
+
+    def __init__(self, rule: TaxRule):
+        jurisdiction = rule.jurisdiction
+        metadata = rule.metadata or {}
+
+        self.code = rule.code
+        self.name = rule.name
+        self.tax_type = getattr(rule.type, 'value', rule.type)
+        self.level = 'city' if jurisdiction.city else 'state' if jurisdiction.state_code else 'country'
+        self.jurisdiction_name = '-'.join(
+            part for part in (jurisdiction.country_code, jurisdiction.state_code, jurisdiction.city) if part
+        )
+        self.is_compound = bool(metadata.get('is_compound', False))
+        self.gl_account_code = rule.gl_account_code
+        self.tax_codes = frozenset(metadata.get('tax_codes') or ())
+        self.product_codes = frozenset(metadata.get('product_codes') or ())
+        self.customer_types = frozenset(metadata.get('customer_types') or ())
+
+        intervals = sorted(
+            (rate.effective_from, rate.effective_to, Decimal(str(rate.rate)))
+            for rate in rule.rates
+        )
+        self._starts = [interval[0] for interval in intervals]
+        self._intervals = intervals
+
+    def rate_on(self, on_date: date) -> Optional[Decimal]:
+        """Rate in effect on a date: the latest-starting interval covering it."""
+        position = bisect_right(self._starts, on_date)
+        while position > 0:
+            position -= 1
+            _, effective_to, rate = self._intervals[position]
+            if effective_to is None or effective_to >= on_date:
+                return rate
+        return None
+
+    def applies_to(self, product_code: Optional[str], customer_type: Optional[str]) -> bool:
+        if self.product_codes and product_code and product_code not in self.product_codes:
+            return False
+        if self.customer_types and customer_type and customer_type not in self.customer_types:
+            return False
+        return True
+
+    def as_dict(self, rate: Decimal) -> Dict[str, Any]:
+        """The rule in the shape TaxCalculationService applies, with its dated rate."""
+        return {
+            'code': self.code,
+            'name': self.name,
+            'type': self.tax_type,
+            'jurisdiction': {'name': self.jurisdiction_name, 'level': self.level},
+            'rates': [{'rate': rate}],
+            'is_compound': self.is_compound,
+            'is_active': True,
+            'gl_account_code': self.gl_account_code,
+        }
+
+
+class _Node:
+    __slots__ = ('children', 'rules', 'coded_rules', 'rules_by_code', 'overlays', 'holidays')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.rules: List[CompiledTaxRule] = []
+        # Rules restricted to tax codes, also listed under each of their codes
+        self.coded_rules: List[CompiledTaxRule] = []
+        self.rules_by_code: Dict[str, List[CompiledTaxRule]] = {}
+        self.overlays: List[Tuple[date, Optional[date], FrozenSet[str]]] = []
+        self.holidays: List[Tuple[date, date]] = []
+
+
+class TaxRuleIndex:
+    """Jurisdiction trie of compiled tax rules for one rules version."""
+
+    def __init__(
+        self,
+        rules: Iterable[TaxRule],
+        exemptions: Iterable[TaxExemption] = (),
+        version: Hashable = None,
+        max_lookups: int = MAX_CACHED_LOOKUPS
+    ):
+        self.version = version
+        self._root = _Node()
+        self._lookups = LRUCache(max_lookups)
+        self._lock = threading.Lock()
+
+        for rule in rules:
+            if not rule.is_active:
+                continue
+            compiled = CompiledTaxRule(rule)
+            node = self._node_for(_path(
+                rule.jurisdiction.country_code, rule.jurisdiction.state_code, rule.jurisdiction.city
+            ))
+            if compiled.tax_codes:
+                node.coded_rules.append(compiled)
+                for tax_code in compiled.tax_codes:
+                    node.rules_by_code.setdefault(tax_code, []).append(compiled)
+            else:
+                node.rules.append(compiled)
+            for window in (rule.metadata or {}).get('tax_holidays', []):
+                node.holidays.append((_parse_date(window['from']), _parse_date(window['to'])))
+
+        for exemption in exemptions:
+            if exemption.certificate_required:
+                continue
+            tax_types = frozenset(getattr(t, 'value', t) for t in exemption.tax_types)
+            for jurisdiction in exemption.jurisdictions:
+                node = self._node_for(_path(
+                    jurisdiction.country_code, jurisdiction.state_code, jurisdiction.city
+                ))
+                node.overlays.append((exemption.valid_from, exemption.valid_to, tax_types))
+
+    def _node_for(self, path: Tuple[str, ...]) -> _Node:
+        node = self._root
+        for part in path:
+            node = node.children.setdefault(part, _Node())
+        return node
+
+    def _walk(self, path: Tuple[str, ...]) -> List[_Node]:
+        nodes = []
+        node = self._root
+        for part in path:
+            node = node.children.get(part)
+            if node is None:
+                break
+            nodes.append(node)
+        return nodes
+
+    def _resolve(
+        self,
+        path: Tuple[str, ...],
+        tax_code: Optional[str],
+        on_date: date
+    ) -> Tuple[Tuple[CompiledTaxRule, Decimal], ...]:
+        nodes = self._walk(path)
+
+        exempt_types = set()
+        for node in nodes:
+            for valid_from, valid_to, tax_types in node.overlays:
+                if valid_from <= on_date and (valid_to is None or valid_to >= on_date):
+                    # An overlay without tax types exempts every tax type
+                    exempt_types.update(tax_types or {'*'})
+
+        resolved = []
+        for node in nodes:
+            # Tax code restrictions only exclude lines carrying another code
+            candidates = node.rules + (node.rules_by_code.get(tax_code, []) if tax_code else node.coded_rules)
+            for rule in candidates:
+                if '*' in exempt_types or rule.tax_type in exempt_types:
+                    continue
+                rate = rule.rate_on(on_date)
+                if rate is not None:
+                    resolved.append((rule, rate))
+        return tuple(resolved)
+
+    def match(
+        self,
+        country_code: str,
+        state_code: Optional[str],
+        city: Optional[str],
+        tax_code: Optional[str],
+        on_date: date,
+        product_code: Optional[str] = None,
+        customer_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rules applying to a line in a jurisdiction on a date, country level
+        first, each with the rate in effect on that date.
+        """
+        path = _path(country_code, state_code, city)
+        key = (path, tax_code, on_date)
+        with self._lock:
+            resolved = self._lookups.get(key)
+        if resolved is None:
+            resolved = self._resolve(path, tax_code, on_date)
+            with self._lock:
+                self._lookups[key] = resolved
+
+        return [
+            rule.as_dict(rate) for rule, rate in resolved
+            if rule.applies_to(product_code, customer_type)
+        ]
+
+    def is_holiday(
+        self,
+        on_date: date,
+        country_code: str,
+        state_code: Optional[str] = None,
+        city: Optional[str] = None
+    ) -> bool:
+        """Whether a date falls on a recurring holiday or a jurisdiction holiday window."""
+        month_day = (on_date.month, on_date.day)
+        if month_day in RECURRING_TAX_HOLIDAYS['*']:
+            return True
+        if month_day in RECURRING_TAX_HOLIDAYS.get((country_code or '').upper(), ()):
+            return True
+        for node in self._walk(_path(country_code, state_code, city)):
+            for start, end in node.holidays:
+                if start <= on_date <= end:
+                    return True
+        return False
+
+
+_indexes: LRUCache = LRUCache(MAX_TENANT_INDEXES)
+_indexes_lock = threading.Lock()
+
+
+def get_tax_rule_index(
+    tenant_key: str,
+    version: Hashable,
+    rules: Iterable[TaxRule],
+    exemptions: Iterable[TaxExemption] = ()
+) -> TaxRuleIndex:
+    """
+    Shared index for a tenant, rebuilt from ``rules`` and ``exemptions`` only
+    when the cached index was compiled for a different rules version.
+    """
+    with _indexes_lock:
+        index = _indexes.get(tenant_key)
+    if index is not None and index.version == version:
+        return index
+
+    index = TaxRuleIndex(rules, exemptions, version)
+    with _indexes_lock:
+        _indexes[tenant_key] = index
+    return index
+
+
+def invalidate_tax_rule_index(tenant_key: Optional[str] = None) -> None:
+    """Drop the compiled index for a tenant, or for every tenant."""
+    with _indexes_lock:
+        if tenant_key is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(tenant_key, None)
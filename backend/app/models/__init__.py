@@ -57,6 +57,7 @@ from .core_models import (
     
     # Tax Management
     TaxRate,
+    TaxTransaction,
     SalesTaxNexus,
     TaxAutomationRule,
     TaxEFilingIntegration,
@@ -107,6 +108,12 @@ from .cash_management import (
     ReconciliationItem,
 )
 
+# Import document numbering models
+from .document_sequence import DocumentSequence
+
+# Import tax reporting rollup models
+from .tax_liability_rollup import TaxLiabilityDaily, TaxLiabilityDirtyDay
+
 # Import Notification models
 from .notification import (
     Notification,
@@ -118,6 +125,7 @@ from .notification import (
 from .gl_models import (
     AccountingPeriod,
     LedgerBalance,
+    AccountDailyBalance,
     TrialBalance,
     TrialBalanceAccount,
     FinancialStatement,
@@ -189,6 +197,7 @@ __all__ = [
     
     # Tax Management
     'TaxRate',
+    'TaxTransaction',
     'SalesTaxNexus',
     'TaxAutomationRule',
     'TaxEFilingIntegration',
@@ -226,6 +235,7 @@ __all__ = [
     'GLJournalEntryLine',
     'AccountingPeriod',
     'LedgerBalance',
+    'AccountDailyBalance',
     'TrialBalance',
     'TrialBalanceAccount',
     'FinancialStatement',
@@ -245,6 +255,13 @@ __all__ = [
     'BankReconciliation',
     'ReconciliationItem',
     
+    # Document numbering
+    'DocumentSequence',
+    
+    # Tax reporting rollups
+    'TaxLiabilityDaily',
+    'TaxLiabilityDirtyDay',
+    
     # Notification models
     'Notification',
     'NotificationType',
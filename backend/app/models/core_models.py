@@ -120,6 +120,7 @@ class ChartOfAccounts(Base):
     account_code = Column(String(20), nullable=False, unique=True, index=True)
     account_name = Column(String(255), nullable=False)
     account_type = Column(String(50), nullable=False)  # Asset, Liability, Equity, Revenue, Expense
+    parent_id = Column(GUID(), ForeignKey("chart_of_accounts.id"), index=True)
     balance = Column(Numeric(15, 2), default=0)
     is_active = Column(Boolean, default=True)
 
@@ -582,6 +583,15 @@ class PayrollRun(Base, AuditMixin):
     total_net = Column(Numeric(15, 2), default=0)
     employee_count = Column(Integer, default=0)
     
+    # Processing
+    pay_frequency = Column(String(20), default='monthly')
+    process_taxes = Column(Boolean, default=True)
+    process_benefits = Column(Boolean, default=True)
+    processed_by = Column(String)
+    processed_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    error_message = Column(Text)
+    
     # Relationships
     entries = relationship("PayrollEntry", back_populates="payroll_run", cascade="all, delete-orphan")
 
@@ -767,9 +777,14 @@ class TaxTransaction(Base, AuditMixin):
     tax_amount = Column(Numeric(15, 2), nullable=False)
     total_amount = Column(Numeric(15, 2), nullable=False)
     tax_rate = Column(Numeric(5, 4), nullable=False)
+    tax_type = Column(String(50), index=True)
+    jurisdiction_code = Column(String(20), index=True)
     jurisdiction_name = Column(String(100))
     reference_number = Column(String(100))
     description = Column(Text)
+    is_reported = Column(Boolean, default=False, index=True)
+    reported_at = Column(DateTime)
+    reporting_period = Column(String(50))
 
 
 class SalesTaxNexus(Base, AuditMixin):
@@ -48,15 +48,15 @@ class Currency(BaseModel):
     
     # Exchange rate entries where this is the target currency
     exchange_rates = relationship(
-        "ExchangeRate", 
-        foreign_keys="[ExchangeRate.target_currency_id]",
+        "app.models.currency.ExchangeRate",
+        foreign_keys="[app.models.currency.ExchangeRate.target_currency_id]",
         back_populates="target_currency"
     )
     
     # Exchange rate entries where this is the source currency
     source_exchange_rates = relationship(
-        "ExchangeRate",
-        foreign_keys="[ExchangeRate.source_currency_id]",
+        "app.models.currency.ExchangeRate",
+        foreign_keys="[app.models.currency.ExchangeRate.source_currency_id]",
         back_populates="source_currency"
     )
     
@@ -106,13 +106,13 @@ class ExchangeRate(BaseModel):
     
     # Relationships
     source_currency = relationship(
-        "Currency", 
+        "app.models.currency.Currency",
         foreign_keys=[source_currency_id],
         back_populates="source_exchange_rates"
     )
     
     target_currency = relationship(
-        "Currency", 
+        "app.models.currency.Currency",
         foreign_keys=[target_currency_id],
         back_populates="exchange_rates"
     )
@@ -0,0 +1,29 @@
+"""
+Document number sequence models.
+"""
+from sqlalchemy import Column, String, Boolean, BigInteger, UniqueConstraint
+
+from .base import BaseModel
+
+
+class DocumentSequence(BaseModel):
+    """
+    Counter backing a family of document numbers (journal entries,
+    allocations, rule codes, ...) for one tenant and prefix.
+
+    ``next_value`` is the first number not yet handed out. Non-gapless
+    sequences advance it a block at a time; gapless sequences advance it
+    inside the transaction that consumes the number.
+    """
+    __tablename__ = "document_sequences"
+    __table_args__ = (
+        UniqueConstraint('tenant_key', 'prefix', name='uq_document_sequence_tenant_prefix'),
+    )
+
+    tenant_key = Column(String(100), nullable=False, index=True)
+    prefix = Column(String(50), nullable=False)
+    next_value = Column(BigInteger, nullable=False, default=1)
+    gapless = Column(Boolean, nullable=False, default=False)
+
+    def __repr__(self) -> str:
+        return f"<DocumentSequence(tenant='{self.tenant_key}', prefix='{self.prefix}', next={self.next_value})>"
@@ -1,7 +1,7 @@
 """
 Enhanced General Ledger models with enterprise features.
 """
-from sqlalchemy import Column, String, DateTime, Boolean, Text, ForeignKey, Integer, Numeric
+from sqlalchemy import Column, String, DateTime, Date, Boolean, Text, ForeignKey, Integer, Numeric, Index, UniqueConstraint
 from app.models.base import GUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import DECIMAL as Decimal
@@ -50,6 +50,26 @@ class LedgerBalance(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class AccountDailyBalance(Base):
+    """Running per-account, per-day balance ledger maintained on posting and voiding."""
+    
+    __tablename__ = "account_daily_balances"
+    
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    account_id = Column(GUID(), ForeignKey("chart_of_accounts.id"), nullable=False)
+    balance_date = Column(Date, nullable=False)
+    period_debit = Column(Decimal(15, 2), default=0, nullable=False)
+    period_credit = Column(Decimal(15, 2), default=0, nullable=False)
+    # Net debit balance (debits minus credits) at the end of balance_date
+    closing_balance = Column(Decimal(15, 2), default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('account_id', 'balance_date', name='uq_account_daily_balances_account_date'),
+        Index('ix_account_daily_balances_account_date', 'account_id', 'balance_date'),
+    )
+
+
 class TrialBalance(Base):
     """Trial Balance snapshots."""
     
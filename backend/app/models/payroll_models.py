@@ -27,6 +27,8 @@ class PayrollStatus(str, Enum):
     APPROVED = "approved"
     PAID = "paid"
     CANCELLED = "cancelled"
+    COMPLETED = "completed"
+    FAILED = "failed"
 
 class PayFrequency(str, Enum):
     WEEKLY = "weekly"
@@ -131,7 +133,8 @@ class PayrollItem(Base):
     # Calculation
     is_taxable = Column(Boolean, default=True)
     is_pre_tax = Column(Boolean, default=False)
-    calculation_method = Column(String(20), default="fixed")  # fixed, percentage, formula
+    is_employer_tax = Column(Boolean, default=False)
+    calculation_method = Column(String(20), default="fixed")  # fixed, percentage, formula, bracketed (taxes)
     default_amount = Column(Numeric(precision=18, scale=2), default=0)
     percentage = Column(Numeric(precision=5, scale=4), default=0)
     
@@ -172,4 +175,72 @@ class EmployeePayrollItem(Base):
     payroll_item = relationship("PayrollItem")
     
     def __repr__(self):
-        return f"<EmployeePayrollItem {self.employee.full_name}: {self.payroll_item.name}>"
\ No newline at end of file
+        return f"<EmployeePayrollItem {self.employee.full_name}: {self.payroll_item.name}>"
+
+class PayrollTaxBracket(Base):
+    """Income bracket of a bracketed payroll tax item, in pay period amounts."""
+    
+    __tablename__ = "payroll_tax_brackets"
+    
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    payroll_item_id = Column(GUID(), ForeignKey("payroll_items.id"), nullable=False, index=True)
+    
+    # Bracket
+    lower_bound = Column(Numeric(precision=18, scale=2), nullable=False, default=0)
+    upper_bound = Column(Numeric(precision=18, scale=2))  # open-ended if empty
+    rate_type = Column(String(20), default="PERCENTAGE")  # PERCENTAGE, FIXED_AMOUNT
+    rate = Column(Numeric(precision=10, scale=4), nullable=False, default=0)
+    additional_amount = Column(Numeric(precision=18, scale=2))
+    is_active = Column(Boolean, default=True)
+    
+    # Effective dates
+    effective_date = Column(Date, default=date.today)
+    end_date = Column(Date)
+    
+    def __repr__(self):
+        return f"<PayrollTaxBracket {self.payroll_item_id}: {self.lower_bound}-{self.upper_bound}>"
+
+class PayslipLine(Base):
+    """Earning, deduction or tax line of a payslip."""
+    
+    __tablename__ = "payroll_slip_lines"
+    
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    payslip_id = Column(GUID(), ForeignKey("payroll_slips.id"), nullable=False, index=True)
+    payroll_item_id = Column(GUID(), ForeignKey("payroll_items.id"))  # empty for regular pay
+    line_type = Column(String(20), nullable=False)  # earning, deduction, tax
+    category = Column(String(50))
+    name = Column(String(100), nullable=False)
+    
+    # Amounts
+    amount = Column(Numeric(precision=18, scale=2), nullable=False)
+    taxable_amount = Column(Numeric(precision=18, scale=2))
+    ytd_amount = Column(Numeric(precision=18, scale=2))
+    
+    # Treatment
+    is_taxable = Column(Boolean, default=False)
+    is_pre_tax = Column(Boolean, default=False)
+    is_employer_tax = Column(Boolean, default=False)
+    gl_account = Column(String(20))
+    
+    def __repr__(self):
+        return f"<PayslipLine {self.line_type} {self.name}: {self.amount}>"
+
+class PayrollTaxYTD(Base):
+    """Year-to-date taxes per employee and tax code, posted from completed pay runs."""
+    
+    __tablename__ = "payroll_tax_ytd"
+    
+    employee_id = Column(GUID(), ForeignKey("employees.id"), primary_key=True)
+    tax_code_id = Column(GUID(), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    
+    # Accumulated amounts
+    taxable_wages = Column(Numeric(precision=18, scale=2), nullable=False, default=0)
+    amount = Column(Numeric(precision=18, scale=2), nullable=False, default=0)
+    
+    # Audit
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<PayrollTaxYTD {self.employee_id} {self.tax_code_id} {self.year}: {self.amount}>"
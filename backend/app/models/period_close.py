@@ -6,7 +6,7 @@ from enum import Enum
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import Column, String, Date, DateTime, ForeignKey, Enum as SQLEnum, Boolean, Text, Integer
+from sqlalchemy import Column, String, Date, DateTime, ForeignKey, Enum as SQLEnum, Boolean, Text, Integer, JSON
 from sqlalchemy.orm import relationship
 
 from .base import BaseModel, GUID
@@ -104,11 +104,13 @@ class PeriodCloseTask(BaseModel):
     period_close_id = Column(GUID(), ForeignKey("period_closes.id"), nullable=False)
     task_name = Column(String(100), nullable=False)
     task_description = Column(Text, nullable=True)
+    task_key = Column(String(50), nullable=True)
     
     # Task configuration
     task_order = Column(Integer, nullable=False)
     is_required = Column(Boolean, nullable=False, default=True)
     is_automated = Column(Boolean, nullable=False, default=False)
+    depends_on = Column(JSON, nullable=True)  # task_keys of upstream tasks
     
     # Task status
     status = Column(SQLEnum(CloseTaskStatus), nullable=False, default=CloseTaskStatus.PENDING)
@@ -118,10 +120,13 @@ class PeriodCloseTask(BaseModel):
     completed_at = Column(DateTime, nullable=True)
     assigned_to = Column(GUID(), nullable=True)
     completed_by = Column(GUID(), nullable=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    duration_ms = Column(Integer, nullable=True)
     
     # Results
     result_message = Column(Text, nullable=True)
     error_message = Column(Text, nullable=True)
+    output = Column(JSON, nullable=True)  # Checkpointed output, passed to downstream tasks
     
     # Relationships
     period_close = relationship("PeriodClose", back_populates="close_tasks")
@@ -0,0 +1,68 @@
+"""
+Tax liability rollup models.
+"""
+from sqlalchemy import Column, String, Boolean, Date, DateTime, Integer, Numeric, UniqueConstraint, Index
+
+from .base import BaseModel, GUID
+
+
+class TaxLiabilityDaily(BaseModel):
+    """
+    Daily totals of tax transactions per company, tax type and jurisdiction.
+
+    Maintained from ``tax_transactions`` by the tax liability rollup, which
+    recomputes the days marked in ``tax_liability_dirty_days``, so liability
+    reports read one row per day and group instead of every transaction.
+    Transactions without a tax type or jurisdiction are stored under an
+    empty ``tax_type`` or ``jurisdiction_code``.
+    """
+    __tablename__ = "tax_liability_daily"
+    __table_args__ = (
+        UniqueConstraint(
+            'company_id', 'day', 'tax_type', 'jurisdiction_code', 'is_reported',
+            name='uq_tax_liability_daily_key'
+        ),
+        Index('idx_tax_liability_daily_company_day', 'company_id', 'day'),
+    )
+
+    company_id = Column(GUID(), nullable=False)
+    day = Column(Date, nullable=False)
+    tax_type = Column(String(50), nullable=False)
+    jurisdiction_code = Column(String(20), nullable=False, default='')
+    is_reported = Column(Boolean, nullable=False, default=False)
+
+    taxable_amount = Column(Numeric(19, 4), nullable=False, default=0)
+    tax_amount = Column(Numeric(19, 4), nullable=False, default=0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+
+    # When the row was last recomputed
+    refreshed_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"<TaxLiabilityDaily(company='{self.company_id}', day={self.day}, "
+            f"tax_type='{self.tax_type}', jurisdiction='{self.jurisdiction_code}')>"
+        )
+
+
+class TaxLiabilityDirtyDay(BaseModel):
+    """
+    A company day whose ``tax_liability_daily`` rows are out of date.
+
+    Written in the same transaction as every ORM insert, update or delete
+    of a tax transaction, and removed when the day is recomputed. The
+    incremental rollup job refreshes exactly the marked days, so hard
+    deletes are picked up as well.
+    """
+    __tablename__ = "tax_liability_dirty_days"
+    __table_args__ = (
+        UniqueConstraint('company_id', 'day', name='uq_tax_liability_dirty_days_key'),
+    )
+
+    company_id = Column(GUID(), nullable=False)
+    day = Column(Date, nullable=False)
+    # Latest change to the day; a refresh only clears markers it has seen
+    marked_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<TaxLiabilityDirtyDay(company='{self.company_id}', day={self.day})>"
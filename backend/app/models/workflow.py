@@ -3,7 +3,7 @@ Workflow Models - Approval Workflows, Steps, Approvals, Delegations
 """
 from sqlalchemy import Column, String, Integer, Numeric, DateTime, Boolean, Text, ForeignKey
 from sqlalchemy.orm import relationship
-from app.models.base import BaseModel, AuditMixin
+from app.models.base import BaseModel, AuditMixin, GUID
 from datetime import datetime
 
 class WorkflowInstance(BaseModel, AuditMixin):
@@ -19,6 +19,7 @@ class WorkflowInstance(BaseModel, AuditMixin):
     priority = Column(String(10), default='normal')  # low, normal, high, urgent
     workflow_data = Column(Text)  # JSON workflow definition
     completed_at = Column(DateTime)
+    company_id = Column(GUID(), index=True)  # Company the approved entity belongs to
     
     # Relationships
     steps = relationship("WorkflowStep", back_populates="workflow", cascade="all, delete-orphan")
@@ -9,8 +9,15 @@ from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 import logging
+import math
+import threading
+import time
+import zlib
 
-from .models import Vendor, Invoice, Payment, VendorPerformanceMetrics, APAnalytics
+from app.core.config import settings
+from app.core.db.tenant_middleware import tenant_context
+from .models import Vendor, Invoice, InvoiceLine, Payment, VendorPerformanceMetrics, APAnalytics
+from .model_registry import ModelRegistry, feature_drift, get_ap_model_registry
 from .schemas import (
     FraudDetectionResponse, DuplicateDetectionResponse, 
     SmartCategorizationResponse, CashFlowForecastResponse
@@ -18,83 +25,269 @@ from .schemas import (
 
 logger = logging.getLogger(__name__)
 
+FRAUD_MODEL = "ap_fraud_isolation_forest"
+CATEGORIZATION_MODEL = "ap_line_categorizer"
+
+# Fraud feature columns left out of drift checks: invoice age grows with the
+# clock, so data newer than the model always looks younger than its training
+# data
+FRAUD_TIME_FEATURES = (6,)
+
+# Retrain when a feature mean of data newer than the model's watermark moves
+# this many training standard deviations, or when the model gets too old
+MODEL_DRIFT_THRESHOLD = getattr(settings, 'AP_MODEL_DRIFT_THRESHOLD', 0.5)
+MIN_DRIFT_SAMPLES = 50
+MAX_MODEL_AGE_DAYS = getattr(settings, 'AP_MODEL_MAX_AGE_DAYS', 30)
+
+# Minimum seconds between training requests from one process, per tenant
+TRAINING_REQUEST_INTERVAL = 600
+_training_requested: Dict[str, float] = {}
+_training_lock = threading.Lock()
+
+# Ids bound per IN list in batch queries
+BATCH_QUERY_SIZE = 1000
+
+# Invoices of the same vendor within this window and amount tolerance are
+# flagged as possible duplicates
+DUPLICATE_DATE_WINDOW = timedelta(days=7)
+DUPLICATE_AMOUNT_TOLERANCE = Decimal('0.05')
+
+# Blocking buckets: amounts on a log scale one tolerance wide, so amounts
+# within tolerance of each other are at most two buckets apart, and dates
+# in windows of DUPLICATE_DATE_WINDOW days
+AMOUNT_BUCKET_WIDTH = math.log(1 + float(DUPLICATE_AMOUNT_TOLERANCE))
+AMOUNT_BUCKET_REACH = 2
+
+
+def _chunks(values: List[Any], size: int = BATCH_QUERY_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _amount_bucket(amount: Decimal) -> Optional[int]:
+    if amount is None or amount <= 0:
+        return None
+    return math.floor(math.log(float(amount)) / AMOUNT_BUCKET_WIDTH)
+
+
+def _date_bucket(day: date) -> int:
+    return day.toordinal() // DUPLICATE_DATE_WINDOW.days
+
+
+def _category_code(category) -> int:
+    """Stable numeric code of a vendor category (str hashes vary per process)."""
+    if not category:
+        return 0
+    return zlib.crc32(category.value.encode('utf-8')) % 1000
+
+
 class APAIService:
-    """AI/ML service for Accounts Payable module"""
+    """
+    AI/ML service for Accounts Payable module
+    
+    Fraud and categorization models are trained offline by ``train_models``
+    (run from the ``train_ap_models`` Celery task) and published to the model
+    registry; the service only loads the current published versions.
+    """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, registry: Optional[ModelRegistry] = None):
         self.db = db
-        self.fraud_model = None
-        self.categorization_model = None
+        self.registry = registry or get_ap_model_registry()
         self.cash_flow_model = None
-        self._initialize_models()
     
-    def _initialize_models(self):
-        """Initialize ML models"""
+    @property
+    def fraud_model(self) -> Optional[IsolationForest]:
+        return self._published_model(FRAUD_MODEL)
+    
+    @property
+    def categorization_model(self) -> Optional[RandomForestClassifier]:
+        return self._published_model(CATEGORIZATION_MODEL)
+    
+    def _published_model(self, name: str):
+        """Current version of a model; requests training if none is published yet."""
+        try:
+            model, _ = self.registry.load(name)
+        except Exception as e:
+            logger.error(f"Error loading AI model {name}: {str(e)}")
+            return None
+        if model is None:
+            self._request_training()
+        return model
+    
+    def _request_training(self, only_if_drifted: bool = False):
+        """Queue background training, at most once per interval per tenant."""
+        tenant_key = self.registry.tenant_key
+        now = time.monotonic()
+        with _training_lock:
+            last = _training_requested.get(tenant_key)
+            if last is not None and now - last < TRAINING_REQUEST_INTERVAL:
+                return
+            _training_requested[tenant_key] = now
+        
         try:
-            # Initialize fraud detection model
-            self.fraud_model = IsolationForest(
+            from app.core.celery_app import train_ap_models_task
+            train_ap_models_task.delay(tenant_id=tenant_context.tenant_id, only_if_drifted=only_if_drifted)
+        except Exception as e:
+            logger.warning(f"Could not queue AP model training: {str(e)}")
+    
+    def train_models(self) -> Dict[str, Any]:
+        """
+        Train the fraud and categorization models on the last year of data
+        and publish them as new registry versions.
+        
+        Returns:
+            Published version and sample count per model
+        """
+        published = {}
+        watermark = self.db.query(func.max(Invoice.created_at)).scalar()
+        
+        # Train fraud detection model
+        fraud_features = self._extract_fraud_features(until=watermark)
+        if len(fraud_features) > 10:
+            fraud_model = IsolationForest(
                 contamination=0.1,
                 random_state=42,
                 n_estimators=100
             )
-            
-            # Initialize categorization model
-            self.categorization_model = RandomForestClassifier(
+            fraud_model.fit(fraud_features)
+            version = self.registry.publish(FRAUD_MODEL, fraud_model, fraud_features, watermark)
+            published[FRAUD_MODEL] = {"version": version.version, "samples": version.n_samples}
+        
+        # Train categorization model
+        cat_features, cat_labels = self._extract_categorization_features(until=watermark)
+        if len(cat_features) > 10:
+            categorization_model = RandomForestClassifier(
                 n_estimators=100,
                 random_state=42,
                 max_depth=10
             )
-            
-            # Train models with existing data
-            self._train_models()
-            
-        except Exception as e:
-            logger.error(f"Error initializing AI models: {str(e)}")
+            categorization_model.fit(cat_features, cat_labels)
+            version = self.registry.publish(CATEGORIZATION_MODEL, categorization_model, cat_features, watermark)
+            published[CATEGORIZATION_MODEL] = {"version": version.version, "samples": version.n_samples}
+        
+        logger.info(f"Trained AP models for tenant {self.registry.tenant_key}: {published}")
+        return published
     
-    def _train_models(self):
-        """Train ML models with historical data"""
-        try:
-            # Train fraud detection model
-            fraud_features = self._extract_fraud_features()
-            if len(fraud_features) > 10:
-                self.fraud_model.fit(fraud_features)
-            
-            # Train categorization model
-            cat_features, cat_labels = self._extract_categorization_features()
-            if len(cat_features) > 10:
-                self.categorization_model.fit(cat_features, cat_labels)
-                
-        except Exception as e:
-            logger.error(f"Error training models: {str(e)}")
+    def check_drift(self) -> Dict[str, Any]:
+        """
+        Compare data created since each model's training watermark with the
+        data it was trained on.
+        
+        Returns:
+            Drift, new sample count, age and whether retraining is due, per model
+        """
+        report = {}
+        for name, extract, exclude in (
+            (FRAUD_MODEL, lambda since: self._extract_fraud_features(since=since), FRAUD_TIME_FEATURES),
+            (CATEGORIZATION_MODEL, lambda since: self._extract_categorization_features(since=since)[0], ()),
+        ):
+            version = self.registry.current(name)
+            if version is None:
+                report[name] = {"retrain": True, "reason": "not trained"}
+                continue
+            
+            recent = extract(version.watermark_datetime)
+            drift = feature_drift(version, recent, exclude) if len(recent) >= MIN_DRIFT_SAMPLES else 0.0
+            report[name] = {
+                "version": version.version,
+                "new_samples": int(len(recent)),
+                "drift": drift,
+                "age_days": version.age_days,
+                "retrain": drift > MODEL_DRIFT_THRESHOLD or version.age_days > MAX_MODEL_AGE_DAYS
+            }
+        return report
+    
+    def retrain_if_drifted(self) -> Dict[str, Any]:
+        """Retrain the models if any of them has drifted or aged out."""
+        drift = self.check_drift()
+        if not any(model["retrain"] for model in drift.values()):
+            return {"retrained": False, "drift": drift}
+        return {"retrained": True, "drift": drift, "published": self.train_models()}
     
-    def _extract_fraud_features(self) -> np.ndarray:
+    def _fraud_feature_query(self):
+        """Fraud feature columns, one row per invoice, without loading lines or vendors."""
+        line_counts = self.db.query(
+            InvoiceLine.invoice_id.label('invoice_id'),
+            func.count(InvoiceLine.id).label('line_count')
+        ).group_by(InvoiceLine.invoice_id).subquery()
+        
+        return self.db.query(
+            Invoice.id,
+            Invoice.total_amount,
+            Invoice.invoice_date,
+            Invoice.due_date,
+            Invoice.received_date.isnot(None),
+            Vendor.risk_level,
+            func.coalesce(line_counts.c.line_count, 0)
+        ).join(
+            Vendor, Invoice.vendor_id == Vendor.id
+        ).outerjoin(
+            line_counts, line_counts.c.invoice_id == Invoice.id
+        )
+    
+    @staticmethod
+    def _fraud_columns(rows: List[Tuple]) -> Dict[str, np.ndarray]:
+        """
+        Column arrays of ``_fraud_feature_query`` rows, with the model's
+        feature matrix under ``features``.
+        """
+        ids, amounts, invoice_dates, due_dates, received, risk_levels, line_counts = (
+            zip(*rows) if rows else ((),) * 7
+        )
+        amount = np.array(amounts, dtype=float)
+        invoice_date = np.array(invoice_dates, dtype='datetime64[D]')
+        terms = (np.array(due_dates, dtype='datetime64[D]') - invoice_date).astype(int)
+        line_count = np.array(line_counts, dtype=float)
+        has_receipt = np.array(received, dtype=bool)
+        risk_level = np.array([getattr(level, 'value', level) for level in risk_levels], dtype=object)
+        age = (np.datetime64(datetime.now().date(), 'D') - invoice_date).astype(int)
+        
+        features = np.column_stack([
+            amount,
+            terms,
+            line_count,
+            np.divide(amount, line_count, out=np.zeros_like(amount), where=line_count > 0),
+            has_receipt,
+            risk_level == 'high',
+            age,
+        ]).astype(float) if rows else np.array([]).reshape(0, 7)
+        
+        return {
+            "ids": np.array(ids, dtype=object),
+            "amount": amount,
+            "terms": terms,
+            "has_receipt": has_receipt,
+            "risky_vendor": np.isin(risk_level, ['high', 'critical']),
+            "features": features,
+        }
+    
+    def _extract_fraud_features(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> np.ndarray:
         """Extract features for fraud detection"""
         try:
             # Get invoice data for fraud detection
-            invoices = self.db.query(Invoice).filter(
+            query = self._fraud_feature_query().filter(
                 Invoice.created_at >= datetime.now() - timedelta(days=365)
-            ).all()
-            
-            features = []
-            for invoice in invoices:
-                feature_vector = [
-                    float(invoice.total_amount),
-                    (invoice.due_date - invoice.invoice_date).days,
-                    len(invoice.lines),
-                    float(invoice.total_amount / len(invoice.lines)) if invoice.lines else 0,
-                    1 if invoice.received_date else 0,
-                    invoice.vendor.risk_level.value == 'high',
-                    (datetime.now().date() - invoice.invoice_date).days,
-                ]
-                features.append(feature_vector)
+            )
+            if since is not None:
+                query = query.filter(Invoice.created_at > since)
+            if until is not None:
+                query = query.filter(Invoice.created_at <= until)
             
-            return np.array(features) if features else np.array([]).reshape(0, 7)
+            return self._fraud_columns(query.all())["features"]
             
         except Exception as e:
             logger.error(f"Error extracting fraud features: {str(e)}")
             return np.array([]).reshape(0, 7)
     
-    def _extract_categorization_features(self) -> Tuple[np.ndarray, np.ndarray]:
+    def _extract_categorization_features(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """Extract features for expense categorization"""
         try:
             # Get invoice line data
@@ -106,10 +299,14 @@ class APAIService:
                 JOIN ap_vendors v ON i.vendor_id = v.id
                 WHERE il.category IS NOT NULL
                 AND il.created_at >= :date_limit
+                AND (:since IS NULL OR il.created_at > :since)
+                AND (:until IS NULL OR il.created_at <= :until)
             """)
             
             result = self.db.execute(query, {
-                'date_limit': datetime.now() - timedelta(days=365)
+                'date_limit': datetime.now() - timedelta(days=365),
+                'since': since,
+                'until': until
             }).fetchall()
             
             features = []
@@ -123,12 +320,14 @@ class APAIService:
                     float(row.unit_price) if row.unit_price else 0,
                     float(row.quantity) if row.quantity else 0,
                     float(row.line_total) if row.line_total else 0,
-                    hash(row.vendor_category.value) % 1000 if row.vendor_category else 0,
+                    _category_code(row.vendor_category),
                 ]
                 features.append(feature_vector)
                 labels.append(row.category)
             
-            return np.array(features), np.array(labels)
+            if not features:
+                return np.array([]).reshape(0, 5), np.array([])
+            return np.array(features, dtype=float), np.array(labels)
             
         except Exception as e:
             logger.error(f"Error extracting categorization features: {str(e)}")
@@ -137,69 +336,10 @@ class APAIService:
     def detect_fraud(self, invoice_id: int) -> FraudDetectionResponse:
         """Detect potential fraud in invoice"""
         try:
-            invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-            if not invoice:
+            responses = self.score_fraud_batch([invoice_id])
+            if not responses:
                 raise ValueError(f"Invoice {invoice_id} not found")
-            
-            # Extract features for this invoice
-            feature_vector = np.array([[
-                float(invoice.total_amount),
-                (invoice.due_date - invoice.invoice_date).days,
-                len(invoice.lines),
-                float(invoice.total_amount / len(invoice.lines)) if invoice.lines else 0,
-                1 if invoice.received_date else 0,
-                invoice.vendor.risk_level.value == 'high',
-                (datetime.now().date() - invoice.invoice_date).days,
-            ]])
-            
-            # Predict fraud score
-            if self.fraud_model and hasattr(self.fraud_model, 'decision_function'):
-                fraud_score = self.fraud_model.decision_function(feature_vector)[0]
-                # Normalize to 0-100 scale
-                fraud_score = max(0, min(100, (fraud_score + 1) * 50))
-            else:
-                fraud_score = 0
-            
-            # Determine risk level
-            if fraud_score > 80:
-                risk_level = "critical"
-            elif fraud_score > 60:
-                risk_level = "high"
-            elif fraud_score > 40:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
-            
-            # Generate risk factors
-            risk_factors = []
-            if invoice.total_amount > 10000:
-                risk_factors.append("High invoice amount")
-            if invoice.vendor.risk_level.value in ['high', 'critical']:
-                risk_factors.append("High-risk vendor")
-            if (invoice.due_date - invoice.invoice_date).days < 7:
-                risk_factors.append("Unusually short payment terms")
-            if not invoice.received_date:
-                risk_factors.append("No receipt date recorded")
-            
-            # Generate recommendations
-            recommendations = []
-            if fraud_score > 60:
-                recommendations.append("Require additional approval")
-                recommendations.append("Verify invoice with vendor")
-            if fraud_score > 40:
-                recommendations.append("Review supporting documents")
-            
-            # Update invoice with fraud score
-            invoice.fraud_risk_score = Decimal(str(fraud_score))
-            self.db.commit()
-            
-            return FraudDetectionResponse(
-                invoice_id=invoice_id,
-                fraud_risk_score=Decimal(str(fraud_score)),
-                risk_level=risk_level,
-                risk_factors=risk_factors,
-                recommendations=recommendations
-            )
+            return responses[0]
             
         except Exception as e:
             logger.error(f"Error in fraud detection: {str(e)}")
@@ -211,26 +351,154 @@ class APAIService:
                 recommendations=[]
             )
     
+    def score_fraud_batch(self, invoice_ids: List[int], commit: bool = True) -> List[FraudDetectionResponse]:
+        """
+        Score a batch of invoices for fraud and store the scores.
+        
+        Feature columns are read with one projection query per
+        BATCH_QUERY_SIZE ids and scored with a single model call. Invoices
+        that do not exist are skipped; responses follow ``invoice_ids`` order.
+        """
+        rows = []
+        for chunk in _chunks(list(invoice_ids)):
+            rows.extend(self._fraud_feature_query().filter(Invoice.id.in_(chunk)).all())
+        if not rows:
+            return []
+        
+        columns = self._fraud_columns(rows)
+        
+        # Predict fraud scores, normalized to a 0-100 scale
+        fraud_model = self.fraud_model
+        if fraud_model is not None:
+            scores = np.clip((fraud_model.decision_function(columns["features"]) + 1) * 50, 0, 100)
+        else:
+            scores = np.zeros(len(rows))
+        
+        risk_levels = np.select(
+            [scores > 80, scores > 60, scores > 40],
+            ["critical", "high", "medium"],
+            default="low"
+        )
+        risk_factor_masks = [
+            (columns["amount"] > 10000, "High invoice amount"),
+            (columns["risky_vendor"], "High-risk vendor"),
+            (columns["terms"] < 7, "Unusually short payment terms"),
+            (~columns["has_receipt"], "No receipt date recorded"),
+        ]
+        
+        responses = {}
+        updates = []
+        for i, invoice_id in enumerate(columns["ids"]):
+            fraud_score = Decimal(str(float(scores[i])))
+            
+            recommendations = []
+            if scores[i] > 60:
+                recommendations.append("Require additional approval")
+                recommendations.append("Verify invoice with vendor")
+            if scores[i] > 40:
+                recommendations.append("Review supporting documents")
+            
+            responses[invoice_id] = FraudDetectionResponse(
+                invoice_id=invoice_id,
+                fraud_risk_score=fraud_score,
+                risk_level=str(risk_levels[i]),
+                risk_factors=[factor for mask, factor in risk_factor_masks if mask[i]],
+                recommendations=recommendations
+            )
+            updates.append({"id": invoice_id, "fraud_risk_score": fraud_score})
+        
+        # Update invoices with fraud scores
+        self.db.bulk_update_mappings(Invoice, updates)
+        if commit:
+            self.db.commit()
+        
+        return [responses[invoice_id] for invoice_id in invoice_ids if invoice_id in responses]
+    
     def detect_duplicates(self, invoice_id: int) -> DuplicateDetectionResponse:
         """Detect potential duplicate invoices"""
         try:
-            invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-            if not invoice:
+            responses = self.detect_duplicates_batch([invoice_id])
+            if not responses:
                 raise ValueError(f"Invoice {invoice_id} not found")
+            return responses[0]
             
-            # Find potential duplicates based on multiple criteria
-            potential_duplicates = []
-            
-            # Check for exact invoice number match
-            exact_matches = self.db.query(Invoice).filter(
-                and_(
-                    Invoice.id != invoice_id,
-                    Invoice.vendor_id == invoice.vendor_id,
-                    Invoice.invoice_number == invoice.invoice_number
+        except Exception as e:
+            logger.error(f"Error in duplicate detection: {str(e)}")
+            return DuplicateDetectionResponse(
+                invoice_id=invoice_id,
+                potential_duplicates=[],
+                confidence_score=Decimal('0'),
+                matching_criteria=[]
+            )
+    
+    def detect_duplicates_batch(
+        self,
+        invoice_ids: List[int],
+        commit: bool = True
+    ) -> List[DuplicateDetectionResponse]:
+        """
+        Detect potential duplicates for a batch of invoices and store the
+        duplicate risk scores.
+        
+        Invoices of the batch's vendors are loaded once and blocked by
+        (vendor, amount bucket, date bucket); each invoice is compared only
+        with the invoices in its neighbouring blocks. Exact invoice number
+        matches are looked up by (vendor, invoice number). Invoices that do
+        not exist are skipped; responses follow ``invoice_ids`` order.
+        """
+        def projection():
+            return self.db.query(
+                Invoice.id,
+                Invoice.vendor_id,
+                Invoice.invoice_number,
+                Invoice.total_amount,
+                Invoice.invoice_date
+            )
+        
+        invoices = []
+        for chunk in _chunks(list(invoice_ids)):
+            invoices.extend(projection().filter(Invoice.id.in_(chunk)).all())
+        if not invoices:
+            return []
+        
+        vendor_ids = list({invoice.vendor_id for invoice in invoices})
+        numbers = list({invoice.invoice_number for invoice in invoices if invoice.invoice_number})
+        first_date = min(invoice.invoice_date for invoice in invoices) - DUPLICATE_DATE_WINDOW
+        last_date = max(invoice.invoice_date for invoice in invoices) + DUPLICATE_DATE_WINDOW
+        
+        # Exact invoice number matches, at any date
+        batch_keys = {(invoice.vendor_id, invoice.invoice_number) for invoice in invoices}
+        by_number: Dict[Tuple, List] = {}
+        for chunk in _chunks(numbers):
+            for match in projection().filter(Invoice.invoice_number.in_(chunk)):
+                key = (match.vendor_id, match.invoice_number)
+                if key in batch_keys:
+                    by_number.setdefault(key, []).append(match)
+        
+        # Blocking index of the vendors' invoices around the batch dates
+        blocks: Dict[Tuple, List] = {}
+        for chunk in _chunks(vendor_ids):
+            candidates = projection().filter(
+                Invoice.vendor_id.in_(chunk),
+                Invoice.invoice_date >= first_date,
+                Invoice.invoice_date <= last_date
+            )
+            for candidate in candidates:
+                key = (
+                    candidate.vendor_id,
+                    _amount_bucket(candidate.total_amount),
+                    _date_bucket(candidate.invoice_date)
                 )
-            ).all()
+                blocks.setdefault(key, []).append(candidate)
+        
+        responses = {}
+        updates = []
+        for invoice in invoices:
+            potential_duplicates = []
             
-            for match in exact_matches:
+            for match in by_number.get((invoice.vendor_id, invoice.invoice_number), []):
+                if match.id == invoice.id:
+                    continue
                 potential_duplicates.append({
                     "invoice_id": match.id,
                     "invoice_number": match.invoice_number,
@@ -240,37 +508,41 @@ class APAIService:
                     "date": match.invoice_date.isoformat()
                 })
             
-            # Check for similar amount and date
-            date_range = timedelta(days=7)
-            amount_tolerance = invoice.total_amount * Decimal('0.05')  # 5% tolerance
-            
-            similar_matches = self.db.query(Invoice).filter(
-                and_(
-                    Invoice.id != invoice_id,
-                    Invoice.vendor_id == invoice.vendor_id,
-                    Invoice.invoice_date >= invoice.invoice_date - date_range,
-                    Invoice.invoice_date <= invoice.invoice_date + date_range,
-                    Invoice.total_amount >= invoice.total_amount - amount_tolerance,
-                    Invoice.total_amount <= invoice.total_amount + amount_tolerance
-                )
-            ).all()
+            # Similar amount and date, from the neighbouring blocks
+            seen = {invoice.id} | {d["invoice_id"] for d in potential_duplicates}
+            amount_tolerance = invoice.total_amount * DUPLICATE_AMOUNT_TOLERANCE
+            amount_bucket = _amount_bucket(invoice.total_amount)
+            date_bucket = _date_bucket(invoice.invoice_date)
+            amount_buckets = (
+                [None] if amount_bucket is None
+                else range(amount_bucket - AMOUNT_BUCKET_REACH, amount_bucket + AMOUNT_BUCKET_REACH + 1)
+            )
             
-            for match in similar_matches:
-                if match.id not in [d["invoice_id"] for d in potential_duplicates]:
-                    confidence = 70
-                    if abs(match.total_amount - invoice.total_amount) < amount_tolerance * Decimal('0.1'):
-                        confidence += 15
-                    if abs((match.invoice_date - invoice.invoice_date).days) <= 1:
-                        confidence += 10
-                    
-                    potential_duplicates.append({
-                        "invoice_id": match.id,
-                        "invoice_number": match.invoice_number,
-                        "match_type": "similar_amount_date",
-                        "confidence": confidence,
-                        "amount": float(match.total_amount),
-                        "date": match.invoice_date.isoformat()
-                    })
+            for bucket in amount_buckets:
+                for day_bucket in (date_bucket - 1, date_bucket, date_bucket + 1):
+                    for match in blocks.get((invoice.vendor_id, bucket, day_bucket), []):
+                        if match.id in seen:
+                            continue
+                        if abs(match.total_amount - invoice.total_amount) > amount_tolerance:
+                            continue
+                        if abs((match.invoice_date - invoice.invoice_date).days) > DUPLICATE_DATE_WINDOW.days:
+                            continue
+                        seen.add(match.id)
+                        
+                        confidence = 70
+                        if abs(match.total_amount - invoice.total_amount) < amount_tolerance * Decimal('0.1'):
+                            confidence += 15
+                        if abs((match.invoice_date - invoice.invoice_date).days) <= 1:
+                            confidence += 10
+                        
+                        potential_duplicates.append({
+                            "invoice_id": match.id,
+                            "invoice_number": match.invoice_number,
+                            "match_type": "similar_amount_date",
+                            "confidence": confidence,
+                            "amount": float(match.total_amount),
+                            "date": match.invoice_date.isoformat()
+                        })
             
             # Calculate overall confidence
             if potential_duplicates:
@@ -285,25 +557,20 @@ class APAIService:
             if any(d["match_type"] == "similar_amount_date" for d in potential_duplicates):
                 matching_criteria.append("Similar amount and date")
             
-            # Update invoice with duplicate risk score
-            invoice.duplicate_risk_score = Decimal(str(confidence_score))
-            self.db.commit()
-            
-            return DuplicateDetectionResponse(
-                invoice_id=invoice_id,
+            responses[invoice.id] = DuplicateDetectionResponse(
+                invoice_id=invoice.id,
                 potential_duplicates=potential_duplicates,
                 confidence_score=Decimal(str(confidence_score)),
                 matching_criteria=matching_criteria
             )
-            
-        except Exception as e:
-            logger.error(f"Error in duplicate detection: {str(e)}")
-            return DuplicateDetectionResponse(
-                invoice_id=invoice_id,
-                potential_duplicates=[],
-                confidence_score=Decimal('0'),
-                matching_criteria=[]
-            )
+            updates.append({"id": invoice.id, "duplicate_risk_score": Decimal(str(confidence_score))})
+        
+        # Update invoices with duplicate risk scores
+        self.db.bulk_update_mappings(Invoice, updates)
+        if commit:
+            self.db.commit()
+        
+        return [responses[invoice_id] for invoice_id in invoice_ids if invoice_id in responses]
     
     def smart_categorization(self, line_item_id: int) -> SmartCategorizationResponse:
         """Predict category for invoice line item"""
@@ -328,17 +595,16 @@ class APAIService:
                 float(result.unit_price) if result.unit_price else 0,
                 float(result.quantity) if result.quantity else 0,
                 float(result.line_total) if result.line_total else 0,
-                hash(result.vendor_category.value) % 1000 if result.vendor_category else 0,
+                _category_code(result.vendor_category),
             ]])
             
             # Predict category
-            if (self.categorization_model and 
-                hasattr(self.categorization_model, 'predict_proba') and
-                len(self.categorization_model.classes_) > 0):
+            categorization_model = self.categorization_model
+            if categorization_model is not None and len(categorization_model.classes_) > 0:
                 
-                probabilities = self.categorization_model.predict_proba(feature_vector)[0]
+                probabilities = categorization_model.predict_proba(feature_vector)[0]
                 predicted_idx = np.argmax(probabilities)
-                predicted_category = self.categorization_model.classes_[predicted_idx]
+                predicted_category = categorization_model.classes_[predicted_idx]
                 confidence = probabilities[predicted_idx] * 100
                 
                 # Get alternative categories
@@ -347,7 +613,7 @@ class APAIService:
                 for i in sorted_indices[1:4]:  # Top 3 alternatives
                     if probabilities[i] > 0.1:  # Only if probability > 10%
                         alternatives.append({
-                            "category": self.categorization_model.classes_[i],
+                            "category": categorization_model.classes_[i],
                             "confidence": probabilities[i] * 100
                         })
             else:
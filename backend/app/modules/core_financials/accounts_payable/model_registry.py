@@ -0,0 +1,216 @@
+"""
+Versioned registry for fitted AP machine learning models.
+
+Models are trained offline (see ``train_ap_models`` in app.core.celery_app),
+serialized with joblib and published as numbered versions together with the
+watermark of the training data and per-feature statistics used for drift
+detection. Request-serving processes load the current version lazily, once
+per process, with numpy arrays memory-mapped from the artifact so workers
+share the pages instead of each holding a copy.
+
+Layout::
+
+    <MODEL_REGISTRY_DIR>/<tenant>/<model name>/manifest.json
+    <MODEL_REGISTRY_DIR>/<tenant>/<model name>/v0001.joblib
+"""
+import json
+import os
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+
+from app.core.config import settings
+from app.core.db.tenant_middleware import tenant_context
+
+MODEL_REGISTRY_DIR = getattr(settings, 'MODEL_REGISTRY_DIR', os.path.join("models", "registry"))
+
+# Versions kept on disk per model, including the current one
+KEEP_VERSIONS = 3
+
+
+@dataclass
+class ModelVersion:
+    """Manifest entry of a published model version."""
+    name: str
+    version: int
+    path: str
+    trained_at: str
+    # Latest created_at of the rows the model was trained on
+    watermark: Optional[str]
+    n_samples: int
+    feature_mean: List[float] = field(default_factory=list)
+    feature_std: List[float] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def watermark_datetime(self) -> Optional[datetime]:
+        return datetime.fromisoformat(self.watermark) if self.watermark else None
+
+    @property
+    def age_days(self) -> float:
+        return (datetime.utcnow() - datetime.fromisoformat(self.trained_at)).total_seconds() / 86400
+
+
+def feature_drift(version: ModelVersion, features: np.ndarray, exclude: Sequence[int] = ()) -> float:
+    """
+    Largest shift of a feature mean from its training mean, in training
+    standard deviations. Features in ``exclude`` (by column index) are left
+    out, e.g. ones that move with the clock rather than with the data.
+    """
+    if not len(features) or not version.feature_mean:
+        return 0.0
+    mean = np.asarray(version.feature_mean, dtype=float)
+    std = np.asarray(version.feature_std, dtype=float)
+    shift = np.abs(features.astype(float).mean(axis=0) - mean) / np.where(std > 0, std, 1.0)
+    shift = np.delete(shift, list(exclude))
+    return float(shift.max()) if len(shift) else 0.0
+
+
+def _write_atomic(path: str, write) -> None:
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ModelRegistry:
+    """Published model versions for one tenant."""
+
+    def __init__(self, tenant_key: str, root_dir: str = MODEL_REGISTRY_DIR):
+        self.tenant_key = tenant_key
+        self.root_dir = os.path.join(root_dir, tenant_key)
+        self._lock = threading.Lock()
+        # name -> (manifest mtime in ns, current version, loaded model)
+        self._loaded: Dict[str, Tuple[int, Optional[ModelVersion], Any]] = {}
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root_dir, name)
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self._model_dir(name), "manifest.json")
+
+    def versions(self, name: str) -> List[ModelVersion]:
+        """Published versions of a model, oldest first."""
+        try:
+            with open(self._manifest_path(name), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return []
+        return [ModelVersion(**entry) for entry in manifest.get("versions", [])]
+
+    def current(self, name: str) -> Optional[ModelVersion]:
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def publish(
+        self,
+        name: str,
+        model: Any,
+        features: np.ndarray,
+        watermark: Optional[datetime],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> ModelVersion:
+        """
+        Serialize a fitted model as the next version of ``name`` and make it
+        current. ``features`` is the training matrix, summarized for drift
+        checks. Artifacts are stored uncompressed so they can be memory-mapped.
+        """
+        directory = self._model_dir(name)
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            versions = self.versions(name)
+            number = versions[-1].version + 1 if versions else 1
+            path = os.path.join(directory, f"v{number:04d}.joblib")
+            _write_atomic(path, lambda tmp_path: joblib.dump(model, tmp_path))
+
+            features = np.asarray(features, dtype=float)
+            version = ModelVersion(
+                name=name,
+                version=number,
+                path=path,
+                trained_at=datetime.utcnow().isoformat(),
+                watermark=watermark.isoformat() if watermark else None,
+                n_samples=int(len(features)),
+                feature_mean=features.mean(axis=0).tolist() if len(features) else [],
+                feature_std=features.std(axis=0).tolist() if len(features) else [],
+                metadata=metadata or {}
+            )
+            versions.append(version)
+
+            retired, versions = versions[:-KEEP_VERSIONS], versions[-KEEP_VERSIONS:]
+            manifest = {"name": name, "versions": [asdict(v) for v in versions]}
+
+            def write_manifest(tmp_path: str) -> None:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2)
+
+            _write_atomic(self._manifest_path(name), write_manifest)
+
+            for old in retired:
+                if os.path.exists(old.path):
+                    os.remove(old.path)
+
+        return version
+
+    def load(self, name: str) -> Tuple[Optional[Any], Optional[ModelVersion]]:
+        """
+        Current version of a model and its manifest entry, or (None, None)
+        if none has been published.
+
+        The model is loaded once per process and reloaded only when a newer
+        version is published; checking costs one stat() of the manifest.
+        """
+        try:
+            mtime = os.stat(self._manifest_path(name)).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+
+        cached = self._loaded.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[2], cached[1]
+
+        with self._lock:
+            cached = self._loaded.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[2], cached[1]
+
+            version = self.current(name)
+            model = joblib.load(version.path, mmap_mode="r") if version else None
+            self._loaded[name] = (mtime, version, model)
+            return model, version
+
+
+def registered_tenants(root_dir: str = MODEL_REGISTRY_DIR) -> List[str]:
+    """Keys of the tenants that have a registry on disk."""
+    try:
+        return sorted(
+            entry.name for entry in os.scandir(root_dir) if entry.is_dir()
+        )
+    except FileNotFoundError:
+        return []
+
+
+_registries: Dict[str, ModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_ap_model_registry(tenant_id: Optional[str] = None) -> ModelRegistry:
+    """Process-wide registry of the current (or given) tenant."""
+    tenant_key = str(tenant_id or tenant_context.tenant_id or 'default')
+    registry = _registries.get(tenant_key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(tenant_key, ModelRegistry(tenant_key))
+    return registry
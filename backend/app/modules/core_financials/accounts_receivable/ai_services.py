@@ -11,6 +11,8 @@ from dataclasses import dataclass
 from enum import Enum
 import json
 
+from .cash_application import CashApplicationIndex, determine_match_type
+
 class RiskLevel(str, Enum):
     LOW = "low"
     MEDIUM = "medium"
@@ -451,73 +453,34 @@ class ARCashApplicationAI:
     
     def match_payment_to_invoices(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Intelligently match payments to invoices"""
-        
-        matches = []
-        confidence_scores = []
-        
-        # Extract payment information
-        amount = payment_data.get('amount', 0)
-        reference = payment_data.get('reference', '')
-        customer_info = payment_data.get('customer_info', '')
-        
-        # Find potential invoice matches
-        potential_invoices = self._find_potential_matches(amount, reference, customer_info)
-        
-        for invoice in potential_invoices:
-            confidence = self._calculate_match_confidence(payment_data, invoice)
-            if confidence > 0.7:
-                matches.append({
-                    'invoice_id': invoice['id'],
-                    'invoice_number': invoice['number'],
-                    'confidence': confidence,
-                    'match_type': self._determine_match_type(confidence),
-                    'suggested_amount': min(amount, invoice['balance'])
-                })
-        
-        return {
-            'payment_id': payment_data.get('id'),
-            'total_amount': amount,
-            'matches': sorted(matches, key=lambda x: x['confidence'], reverse=True),
-            'auto_apply': len(matches) == 1 and matches[0]['confidence'] > 0.95,
-            'requires_review': len(matches) == 0 or max([m['confidence'] for m in matches]) < 0.8
-        }
+        return self.match_payments(
+            [payment_data],
+            customer_ids=[payment_data['customer_id']] if payment_data.get('customer_id') is not None else None
+        )[0]
     
-    def _find_potential_matches(self, amount: float, reference: str, customer_info: str) -> List[Dict]:
-        """Find potential invoice matches"""
-        # In production, query database for matching invoices
-        return [
-            {'id': 1, 'number': 'INV-001', 'balance': amount, 'customer': 'ABC Corp'},
-            {'id': 2, 'number': 'INV-002', 'balance': amount * 0.5, 'customer': 'ABC Corp'}
-        ]
-    
-    def _calculate_match_confidence(self, payment_data: Dict, invoice_data: Dict) -> float:
-        """Calculate confidence score for payment-invoice match"""
-        confidence = 0.0
-        
-        # Exact amount match
-        if abs(payment_data.get('amount', 0) - invoice_data.get('balance', 0)) < 0.01:
-            confidence += 0.4
-        
-        # Reference number match
-        if invoice_data.get('number', '') in payment_data.get('reference', ''):
-            confidence += 0.3
-        
-        # Customer match
-        if invoice_data.get('customer', '').lower() in payment_data.get('customer_info', '').lower():
-            confidence += 0.2
-        
-        # Date proximity
-        confidence += 0.1  # Base score for date proximity
-        
-        return min(1.0, confidence)
+    def match_payments(
+        self,
+        payments: List[Dict[str, Any]],
+        customer_ids: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Match a remittance file or lockbox batch against open invoices.
+        
+        Open invoices are loaded once for the whole batch: for the given
+        customers, or for what the payments can match, i.e. the customers
+        they name directly, through the invoice numbers in their references
+        or by name, and the invoices their references name.
+        
+        Returns:
+            Per payment, in order: ranked matches with confidence, the
+            recommended allocation and whether it can be applied automatically
+        """
+        if customer_ids is None:
+            index = CashApplicationIndex.load_for_payments(self.db, payments)
+        else:
+            index = CashApplicationIndex.load(self.db, customer_ids)
+        return index.match_batch(payments)
     
     def _determine_match_type(self, confidence: float) -> str:
         """Determine type of match based on confidence"""
-        if confidence >= 0.95:
-            return 'exact_match'
-        elif confidence >= 0.8:
-            return 'high_confidence'
-        elif confidence >= 0.6:
-            return 'probable_match'
-        else:
-            return 'possible_match'
\ No newline at end of file
+        return determine_match_type(confidence)
@@ -0,0 +1,489 @@
+"""
+Cash application matching engine.
+
+Open AR invoices are loaded once per batch into an in-memory index,
+narrowed to what the batch can match: the customers the payments name,
+directly, through the invoice numbers in their references or by name, and
+the invoices the references name. Each customer's invoices are keyed by exact open balance (in cents) and by
+normalized invoice-number tokens, and a global token map resolves the
+customer of payments that only carry a remittance reference. Payments
+covering several invoices are matched with a bounded subset-sum search
+over the customer's oldest open invoices.
+
+Allocations accepted for automatic application reduce the indexed balances,
+so later payments of the same batch see what is still open.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from .models import Customer, Invoice, InvoiceStatus
+
+# Invoices in these states cannot receive cash
+CLOSED_STATUSES = (InvoiceStatus.DRAFT, InvoiceStatus.PAID, InvoiceStatus.VOID, InvoiceStatus.UNCOLLECTIBLE)
+
+# Customer ids bound per IN list when loading invoices
+LOAD_CHUNK_SIZE = 1000
+
+# Subset-sum search: oldest open invoices considered and search steps allowed
+MAX_SUBSET_INVOICES = 24
+MAX_SUBSET_STEPS = 20000
+
+# Payments within this many days of the due date score the date bonus
+DATE_PROXIMITY_DAYS = 60
+
+# Confidence weights
+AMOUNT_WEIGHT = 0.4
+REFERENCE_WEIGHT = 0.3
+PARTIAL_REFERENCE_WEIGHT = 0.2
+CUSTOMER_WEIGHT = 0.2
+DATE_WEIGHT = 0.1
+
+MIN_MATCH_CONFIDENCE = 0.7
+AUTO_APPLY_CONFIDENCE = 0.95
+REVIEW_CONFIDENCE = 0.8
+
+_WORD_RE = re.compile(r'[A-Z0-9]+(?:[-/._#][A-Z0-9]+)*')
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]')
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def to_cents(amount: Any) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    return (Decimal(cents) / 100).quantize(Decimal('0.01'))
+
+
+def _compact(text: str) -> str:
+    return _NON_ALNUM_RE.sub('', text.upper())
+
+
+def invoice_number_tokens(number: str) -> Tuple[str, Optional[str]]:
+    """
+    Normalized keys of an invoice number: the number without separators
+    (``INV-0042`` -> ``INV0042``) and its digits without leading zeros
+    (``42``), or None when it has no significant digits.
+    """
+    digits = ''.join(_DIGITS_RE.findall(number or '')).lstrip('0')
+    return _compact(number or ''), digits or None
+
+
+def reference_tokens(reference: str) -> Tuple[Set[str], Set[str]]:
+    """
+    Candidate invoice-number keys in a remittance reference: compacted
+    words and adjacent word pairs (``INV 0042``), and digit runs without
+    leading zeros.
+    """
+    words = _WORD_RE.findall((reference or '').upper())
+    compact = {_compact(word) for word in words}
+    compact.update(_compact(first + second) for first, second in zip(words, words[1:]))
+    digits = {run.lstrip('0') for run in _DIGITS_RE.findall(reference or '') if run.strip('0')}
+    return compact, digits
+
+
+def reference_numbers(reference: str) -> Set[str]:
+    """
+    Invoice numbers as they may be stored, for an indexed lookup: the words
+    of a remittance reference, and adjacent word pairs joined by a hyphen,
+    a space or nothing (``INV 0042`` -> ``INV-0042``).
+    """
+    words = _WORD_RE.findall((reference or '').upper())
+    numbers = set(words)
+    for first, second in zip(words, words[1:]):
+        numbers.update(first + separator + second for separator in ('-', ' ', ''))
+    return numbers
+
+
+def _normalize_name(name: str) -> str:
+    return ' '.join((name or '').lower().split())
+
+
+@dataclass
+class OpenInvoice:
+    id: Any
+    invoice_number: str
+    customer_id: int
+    customer_name: str
+    balance_cents: int
+    due_date: Optional[date]
+
+
+@dataclass
+class CustomerInvoices:
+    """Open invoices of one customer, by balance and by number token."""
+    invoices: Dict[Any, OpenInvoice] = field(default_factory=dict)
+    by_balance: Dict[int, List[OpenInvoice]] = field(default_factory=dict)
+    by_number: Dict[str, List[OpenInvoice]] = field(default_factory=dict)
+    by_digits: Dict[str, List[OpenInvoice]] = field(default_factory=dict)
+
+    def add(self, invoice: OpenInvoice) -> None:
+        self.invoices[invoice.id] = invoice
+        self.by_balance.setdefault(invoice.balance_cents, []).append(invoice)
+        number, digits = invoice_number_tokens(invoice.invoice_number)
+        self.by_number.setdefault(number, []).append(invoice)
+        if digits:
+            self.by_digits.setdefault(digits, []).append(invoice)
+
+    def reduce(self, invoice: OpenInvoice, cents: int) -> None:
+        """Take ``cents`` off an invoice's open balance, re-keying it by balance."""
+        same_balance = self.by_balance.get(invoice.balance_cents, [])
+        if invoice in same_balance:
+            same_balance.remove(invoice)
+        invoice.balance_cents -= cents
+        if invoice.balance_cents > 0:
+            self.by_balance.setdefault(invoice.balance_cents, []).append(invoice)
+
+    def open_by_age(self) -> List[OpenInvoice]:
+        return sorted(
+            (invoice for invoice in self.invoices.values() if invoice.balance_cents > 0),
+            key=lambda invoice: (invoice.due_date or date.max, invoice.invoice_number)
+        )
+
+
+def find_subset(invoices: List[OpenInvoice], target_cents: int) -> Optional[List[OpenInvoice]]:
+    """
+    Invoices whose balances add up exactly to ``target_cents``, preferring
+    the oldest, or None. The search is depth-first over at most
+    MAX_SUBSET_INVOICES invoices and gives up after MAX_SUBSET_STEPS steps.
+    """
+    candidates = [invoice for invoice in invoices if 0 < invoice.balance_cents <= target_cents]
+    candidates = candidates[:MAX_SUBSET_INVOICES]
+    # Balance still available after position i, for pruning
+    remaining = [0] * (len(candidates) + 1)
+    for i in range(len(candidates) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + candidates[i].balance_cents
+    if remaining[0] < target_cents:
+        return None
+
+    steps = 0
+    chosen: List[OpenInvoice] = []
+
+    def search(start: int, left: int) -> bool:
+        nonlocal steps
+        if left == 0:
+            return True
+        for i in range(start, len(candidates)):
+            steps += 1
+            if steps > MAX_SUBSET_STEPS or remaining[i] < left:
+                return False
+            balance = candidates[i].balance_cents
+            if balance > left:
+                continue
+            chosen.append(candidates[i])
+            if search(i + 1, left - balance):
+                return True
+            chosen.pop()
+        return False
+
+    return list(chosen) if search(0, target_cents) else None
+
+
+class CashApplicationIndex:
+    """Open AR invoices indexed for matching a batch of payments."""
+
+    def __init__(self, invoices: Iterable[OpenInvoice] = ()):
+        self.customers: Dict[int, CustomerInvoices] = {}
+        self.by_number: Dict[str, List[OpenInvoice]] = {}
+        self.customer_by_name: Dict[str, int] = {}
+        for invoice in invoices:
+            self.add(invoice)
+
+    def add(self, invoice: OpenInvoice) -> None:
+        self.customers.setdefault(invoice.customer_id, CustomerInvoices()).add(invoice)
+        self.by_number.setdefault(invoice_number_tokens(invoice.invoice_number)[0], []).append(invoice)
+        self.customer_by_name.setdefault(_normalize_name(invoice.customer_name), invoice.customer_id)
+
+    @staticmethod
+    def _open_invoices(db):
+        """Query of the open invoice columns the index is built from."""
+        return db.query(
+            Invoice.id,
+            Invoice.invoice_number,
+            Invoice.customer_id,
+            Customer.name,
+            Invoice.balance_due,
+            Invoice.due_date
+        ).join(
+            Customer, Invoice.customer_id == Customer.id
+        ).filter(
+            Invoice.balance_due > 0,
+            Invoice.status.notin_(CLOSED_STATUSES)
+        )
+
+    def _add_rows(self, rows) -> None:
+        for invoice_id, number, customer_id, customer_name, balance_due, due_date in rows:
+            self.add(OpenInvoice(
+                id=invoice_id,
+                invoice_number=number,
+                customer_id=customer_id,
+                customer_name=customer_name or '',
+                balance_cents=to_cents(balance_due),
+                due_date=due_date
+            ))
+
+    @classmethod
+    def load(cls, db, customer_ids: Iterable[int]) -> 'CashApplicationIndex':
+        """
+        Index the open invoices of the given customers, with one query per
+        LOAD_CHUNK_SIZE customers.
+        """
+        customer_ids = list(set(customer_ids))
+        index = cls()
+        for i in range(0, len(customer_ids), LOAD_CHUNK_SIZE):
+            index._add_rows(cls._open_invoices(db).filter(
+                Invoice.customer_id.in_(customer_ids[i:i + LOAD_CHUNK_SIZE])
+            ))
+        return index
+
+    @classmethod
+    def load_for_payments(cls, db, payments: List[Dict[str, Any]]) -> 'CashApplicationIndex':
+        """
+        Index the open invoices a batch of payments can match.
+
+        Customers named on the payments are loaded in full, as is the single
+        customer owning the invoices each other payment's reference names.
+        A payment whose reference resolves to no single customer can still
+        match the invoices it names, which are indexed on their own, and
+        the customer its ``customer_info`` names, which is looked up by name.
+        Every query is bounded by what the payments contain.
+        """
+        customer_ids: Set[int] = set()
+        unnamed: List[Dict[str, Any]] = []
+        for payment in payments:
+            if payment.get('customer_id') is not None:
+                customer_ids.add(payment['customer_id'])
+            else:
+                unnamed.append(payment)
+
+        referenced_rows: List[Tuple] = []
+        names: Set[str] = set()
+        if unnamed:
+            references = [reference_numbers(payment.get('reference', '')) for payment in unnamed]
+            numbers = sorted(set().union(*references))
+            owners: Dict[str, Set[int]] = {}
+            for i in range(0, len(numbers), LOAD_CHUNK_SIZE):
+                for row in cls._open_invoices(db).filter(
+                    Invoice.invoice_number.in_(numbers[i:i + LOAD_CHUNK_SIZE])
+                ):
+                    referenced_rows.append(row)
+                    owners.setdefault(row[1], set()).add(row[2])
+
+            for payment, referenced in zip(unnamed, references):
+                referenced_customers = set().union(*(owners.get(number, set()) for number in referenced))
+                if len(referenced_customers) == 1:
+                    customer_ids.update(referenced_customers)
+                elif payment.get('customer_info'):
+                    names.add(_normalize_name(payment['customer_info']))
+
+        if names:
+            names = sorted(names)
+            for i in range(0, len(names), LOAD_CHUNK_SIZE):
+                customer_ids.update(customer_id for customer_id, in db.query(Customer.id).filter(
+                    func.lower(Customer.name).in_(names[i:i + LOAD_CHUNK_SIZE])
+                ))
+
+        index = cls.load(db, customer_ids)
+        # Invoices named by unresolved references, of customers not loaded in full
+        index._add_rows(row for row in referenced_rows if row[2] not in customer_ids)
+        return index
+
+    def _resolve_customer(self, payment: Dict[str, Any], numbers: Set[str]) -> Optional[int]:
+        customer_id = payment.get('customer_id')
+        if customer_id is not None:
+            return customer_id
+        referenced = {invoice.customer_id for number in numbers for invoice in self.by_number.get(number, [])}
+        if len(referenced) == 1:
+            return referenced.pop()
+        return self.customer_by_name.get(_normalize_name(payment.get('customer_info', '')))
+
+    def _confidence(
+        self,
+        payment: Dict[str, Any],
+        invoice: OpenInvoice,
+        amount_matches: bool,
+        reference_weight: float,
+        customer_id: Optional[int]
+    ) -> float:
+        confidence = AMOUNT_WEIGHT if amount_matches else 0.0
+        confidence += reference_weight
+
+        customer_info = (payment.get('customer_info') or '').lower()
+        if payment.get('customer_id') is not None and payment['customer_id'] == invoice.customer_id:
+            confidence += CUSTOMER_WEIGHT
+        elif invoice.customer_name and invoice.customer_name.lower() in customer_info:
+            confidence += CUSTOMER_WEIGHT
+        elif customer_id == invoice.customer_id and reference_weight:
+            # Customer inferred from the remittance reference only
+            confidence += CUSTOMER_WEIGHT / 2
+
+        payment_date = payment.get('payment_date')
+        if payment_date is None or invoice.due_date is None:
+            confidence += DATE_WEIGHT
+        elif abs((payment_date - invoice.due_date).days) <= DATE_PROXIMITY_DAYS:
+            confidence += DATE_WEIGHT
+
+        return round(min(1.0, confidence), 4)
+
+    def match(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ranked invoice matches for one payment and the recommended allocation.
+
+        ``payment`` holds ``id``, ``amount``, ``reference`` and optionally
+        ``customer_id``, ``customer_info`` and ``payment_date``.
+        """
+        amount_cents = to_cents(payment.get('amount', 0))
+        numbers, digits = reference_tokens(payment.get('reference', ''))
+        customer_id = self._resolve_customer(payment, numbers)
+        customer = self.customers.get(customer_id) if customer_id is not None else None
+
+        # Invoices named by the reference, with the weight of the naming
+        referenced: Dict[Any, Tuple[OpenInvoice, float]] = {}
+        if customer_id is None:
+            number_index = self.by_number
+        else:
+            number_index = customer.by_number if customer is not None else {}
+        for number in numbers:
+            for invoice in number_index.get(number, []):
+                if invoice.balance_cents > 0:
+                    referenced[invoice.id] = (invoice, REFERENCE_WEIGHT)
+        if customer is not None:
+            for token in digits:
+                for invoice in customer.by_digits.get(token, []):
+                    if invoice.balance_cents > 0 and invoice.id not in referenced:
+                        referenced[invoice.id] = (invoice, PARTIAL_REFERENCE_WEIGHT)
+
+        candidates: Dict[Any, Dict[str, Any]] = {}
+
+        def consider(invoice: OpenInvoice, amount_matches: bool, suggested_cents: int, group: Optional[str]):
+            reference_weight = referenced.get(invoice.id, (None, 0.0))[1]
+            confidence = self._confidence(payment, invoice, amount_matches, reference_weight, customer_id)
+            current = candidates.get(invoice.id)
+            if current is not None and current['confidence'] >= confidence:
+                return
+            candidates[invoice.id] = {
+                'invoice_id': invoice.id,
+                'invoice_number': invoice.invoice_number,
+                'customer_id': invoice.customer_id,
+                'confidence': confidence,
+                'suggested_amount': from_cents(suggested_cents),
+                'group': group,
+                '_invoice': invoice,
+            }
+
+        # Exact balance matches
+        if customer is not None:
+            for invoice in customer.by_balance.get(amount_cents, []):
+                consider(invoice, True, amount_cents, None)
+
+        # Invoices named in the reference: exact, or jointly covering the payment
+        referenced_invoices = [invoice for invoice, _ in referenced.values()]
+        referenced_total = sum(invoice.balance_cents for invoice in referenced_invoices)
+        for invoice in referenced_invoices:
+            if len(referenced_invoices) > 1 and referenced_total == amount_cents:
+                consider(invoice, True, invoice.balance_cents, 'reference')
+            else:
+                consider(
+                    invoice,
+                    invoice.balance_cents == amount_cents,
+                    min(amount_cents, invoice.balance_cents),
+                    None
+                )
+
+        # Several invoices of the customer adding up to the payment
+        if customer is not None and not any(
+            candidate['confidence'] >= AUTO_APPLY_CONFIDENCE for candidate in candidates.values()
+        ):
+            subset = find_subset(customer.open_by_age(), amount_cents)
+            if subset and len(subset) > 1:
+                for invoice in subset:
+                    consider(invoice, True, invoice.balance_cents, 'subset')
+
+        matches = sorted(
+            (candidate for candidate in candidates.values() if candidate['confidence'] >= MIN_MATCH_CONFIDENCE),
+            key=lambda candidate: (-candidate['confidence'], candidate['_invoice'].due_date or date.max)
+        )
+        for candidate in matches:
+            candidate['match_type'] = determine_match_type(candidate['confidence'])
+
+        allocation = self._allocate(matches, amount_cents)
+        best = matches[0]['confidence'] if matches else 0.0
+        top = [candidate for candidate in matches if candidate['confidence'] == best]
+        unambiguous = len(top) == 1 or (len({candidate['group'] for candidate in top}) == 1 and top[0]['group'])
+
+        return {
+            'payment_id': payment.get('id'),
+            'total_amount': from_cents(amount_cents),
+            'customer_id': customer_id,
+            'matches': [
+                {key: value for key, value in candidate.items() if not key.startswith('_')}
+                for candidate in matches
+            ],
+            'allocation': [
+                {'invoice_id': invoice.id, 'invoice_number': invoice.invoice_number, 'amount': from_cents(cents)}
+                for invoice, cents in allocation
+            ],
+            'unapplied_amount': from_cents(amount_cents - sum(cents for _, cents in allocation)),
+            'auto_apply': bool(matches) and best >= AUTO_APPLY_CONFIDENCE and bool(unambiguous),
+            'requires_review': not matches or best < REVIEW_CONFIDENCE,
+            '_allocation': allocation,
+        }
+
+    @staticmethod
+    def _allocate(matches: List[Dict[str, Any]], amount_cents: int) -> List[Tuple[OpenInvoice, int]]:
+        """Spread the payment over the best match, or its whole group, oldest first."""
+        if not matches:
+            return []
+        best = matches[0]
+        if best['group']:
+            selected = [candidate['_invoice'] for candidate in matches if candidate['group'] == best['group']]
+            selected.sort(key=lambda invoice: invoice.due_date or date.max)
+        else:
+            selected = [best['_invoice']]
+
+        allocation = []
+        left = amount_cents
+        for invoice in selected:
+            cents = min(left, invoice.balance_cents)
+            if cents <= 0:
+                break
+            allocation.append((invoice, cents))
+            left -= cents
+        return allocation
+
+    def apply(self, result: Dict[str, Any]) -> None:
+        """Consume the allocation of a matched payment from the indexed balances."""
+        for invoice, cents in result.get('_allocation', []):
+            self.customers[invoice.customer_id].reduce(invoice, cents)
+
+    def match_batch(self, payments: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Match a remittance file or lockbox batch in order. Allocations of
+        payments that are applied automatically are consumed before the next
+        payment is matched.
+        """
+        results = []
+        for payment in payments:
+            result = self.match(payment)
+            if result['auto_apply']:
+                self.apply(result)
+            del result['_allocation']
+            results.append(result)
+        return results
+
+
+def determine_match_type(confidence: float) -> str:
+    """Determine type of match based on confidence"""
+    if confidence >= 0.95:
+        return 'exact_match'
+    elif confidence >= 0.8:
+        return 'high_confidence'
+    elif confidence >= 0.6:
+        return 'probable_match'
+    else:
+        return 'possible_match'
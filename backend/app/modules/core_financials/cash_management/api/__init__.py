@@ -10,7 +10,7 @@ This module contains the API endpoints for the Cash Management functionality.
 """
 
 from fastapi import APIRouter
-from . import bank_accounts, transactions, reconciliations
+from . import bank_accounts, transactions, reconciliations, operations
 
 router = APIRouter()
 
@@ -18,3 +18,4 @@ router = APIRouter()
 router.include_router(bank_accounts.router, prefix="/accounts", tags=["Bank Accounts"])
 router.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
 router.include_router(reconciliations.router, prefix="/reconciliations", tags=["Reconciliations"])
+router.include_router(operations.router, tags=["Cash Operations"])
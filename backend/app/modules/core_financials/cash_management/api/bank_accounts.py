@@ -16,7 +16,7 @@ from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.core.deps import get_current_active_user
-from app.schemas.user import User as UserSchema
+from app.schemas.user import UserInDB as UserSchema
 from .. import schemas, services, exceptions
 
 router = APIRouter()
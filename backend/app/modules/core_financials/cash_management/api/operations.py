@@ -0,0 +1,156 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+from app.core.database import get_db
+from app.core.deps import get_current_user
+from app.models.user import User
+from ..services import BankReconciliationService, CashFlowService
+
+router = APIRouter()
+
+@router.get('/cash-flow/forecast')
+def get_cash_flow_forecast(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    account_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get cash flow forecast from real data"""
+    cash_flow_service = CashFlowService()
+    forecast = cash_flow_service.get_cash_flow_forecast(db, start_date, end_date, account_id)
+    return forecast
+
+@router.get('/cash-position')
+def get_cash_position(
+    as_of_date: Optional[date] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get current cash position from real account data"""
+    from ..services import CashManagementService
+    cash_service = CashManagementService()
+    position = cash_service.get_cash_position(db, as_of_date)
+    return position
+
+@router.post('/payments')
+def process_payment(
+    payment_data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Process payment transaction with real database persistence"""
+    from ..services import CashManagementService
+    cash_service = CashManagementService()
+    result = cash_service.process_payment(db, payment_data, current_user.id)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+@router.post('/reconciliation/{reconciliation_id}/auto-reconcile')
+def auto_reconcile(
+    reconciliation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Perform automatic reconciliation with real matching logic"""
+    recon_service = BankReconciliationService()
+    result = recon_service.auto_reconcile(db, reconciliation_id, current_user.id)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+@router.post('/reconciliation')
+def create_reconciliation(
+    recon_data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create a new bank reconciliation"""
+    recon_service = BankReconciliationService()
+    result = recon_service.create_reconciliation(db, recon_data, current_user.id)
+    return result
+
+@router.get('/reconciliation/status/{account_id}')
+def get_reconciliation_status(
+    account_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get reconciliation status for an account"""
+    recon_service = BankReconciliationService()
+    status = recon_service.get_reconciliation_status(db, account_id)
+    return status
+
+@router.post('/bank-accounts/{account_id}/import-statement')
+def import_bank_statement(
+    account_id: int,
+    statement_data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import bank statement data with real processing"""
+    from ..services import CashManagementService
+    bank_service = CashManagementService()
+    result = bank_service.import_bank_statement(db, account_id, statement_data, current_user.id)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["message"])
+    return result
+
+@router.post('/bank-accounts/{account_id}/import-statement-file')
+def import_bank_statement_file(
+    account_id: int,
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, description="csv, ofx, camt053 or mt940; defaults to the file extension"),
+    statement_date: Optional[date] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import a bank statement file, streamed in chunks"""
+    from ..statement_import import import_statement, normalize_format, parse_statement
+    try:
+        file_format = normalize_format(file_format, file.filename)
+        if file_format == "json":
+            raise ValueError("JSON statements are imported through /import-statement")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    result = import_statement(
+        db,
+        account_id,
+        parse_statement(file.file, file_format),
+        current_user.id,
+        statement_date=statement_date,
+        file_name=file.filename,
+        file_format=file_format
+    )
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["message"])
+    return result
+
+@router.get('/banking-fees')
+def get_banking_fees(
+    account_id: Optional[int] = Query(None),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get banking fees from real data"""
+    from ..services import CashManagementService
+    bank_service = CashManagementService()
+    fees = bank_service.get_banking_fees(db, account_id, start_date, end_date)
+    return fees
+
+@router.post('/banking-fees')
+def create_banking_fee(
+    fee_data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create banking fee record with real database persistence"""
+    from ..services import CashManagementService
+    bank_service = CashManagementService()
+    result = bank_service.create_banking_fee(db, fee_data, current_user.id)
+    return result
\ No newline at end of file
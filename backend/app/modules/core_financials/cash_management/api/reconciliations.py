@@ -17,7 +17,7 @@ from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.core.deps import get_current_active_user
-from app.schemas.user import User as UserSchema
+from app.schemas.user import UserInDB as UserSchema
 from .. import schemas, services, exceptions
 
 router = APIRouter()
@@ -90,7 +90,7 @@ async def get_reconciliation(
 
 @router.get(
     "/",
-    response_model=schemas.PaginatedBankReconciliations,
+    response_model=schemas.PaginatedReconciliations,
     summary="List reconciliations with filtering"
 )
 async def list_reconciliations(
@@ -1,6 +1,7 @@
 """
 Cash Management Module - Exceptions
 """
+from decimal import Decimal
 from typing import Optional, List, Dict, Any
 from uuid import UUID
 
@@ -1,213 +1,6 @@
 """
-Cash Management models placeholder (conflicts resolved).
-Not required for active API routes.
+Cash Management models for bank accounts, transactions and reconciliations.
 """
-    currency = Column(String(3), default="USD", nullable=False)
-    
-    # Bank Information
-    bank_name = Column(String(255), nullable=False)
-    bank_code = Column(String(50))
-    routing_number = Column(String(50))
-    iban = Column(String(50))
-    swift_code = Column(String(50))
-    
-    # Balance Information
-    current_balance = Column(Numeric(19, 4), default=Decimal('0.00'), nullable=False)
-    available_balance = Column(Numeric(19, 4), default=Decimal('0.00'), nullable=False)
-    last_synced_balance = Column(Numeric(19, 4))
-    last_synced_date = Column(DateTime)
-    
-    # GL Integration
-    gl_account_id = Column(PG_UUID(as_uuid=True), ForeignKey('gl_accounts.id', ondelete='RESTRICT'))
-    
-    # Relationships
-    transactions = relationship("BankTransaction", back_populates="account", cascade="all, delete-orphan")
-    reconciliations = relationship("BankReconciliation", back_populates="account", cascade="all, delete-orphan")
-    gl_account = relationship("GLAccount", back_populates="bank_accounts")
-    
-    # Metadata
-    metadata_ = Column("metadata", JSONB, default=dict, nullable=False)
-    
-    # Indexes
-    __table_args__ = (
-        Index('ix_bank_accounts_bank_name_account_number', 'bank_name', 'account_number', unique=True),
-    )
-
-
-class BankTransaction(BaseModel, Base):
-    """Bank transaction records."""
-    __tablename__ = "bank_transactions"
-    
-    # Transaction Information
-    account_id = Column(PG_UUID(as_uuid=True), ForeignKey('bank_accounts.id', ondelete='CASCADE'), nullable=False, index=True)
-    transaction_date = Column(Date, nullable=False, index=True)
-    posted_date = Column(Date, index=True)
-    transaction_type = Column(SQLEnum(TransactionType), nullable=False, index=True)
-    status = Column(SQLEnum(TransactionStatus), default=TransactionStatus.PENDING, index=True)
-    
-    # Amounts
-    amount = Column(Numeric(19, 4), nullable=False)
-    running_balance = Column(Numeric(19, 4))
-    
-    # Transaction Details
-    reference_number = Column(String(100), index=True)
-    check_number = Column(String(50), index=True)
-    memo = Column(Text)
-    notes = Column(Text)
-    
-    # Categorization
-    category_id = Column(PG_UUID(as_uuid=True), ForeignKey('transaction_categories.id', ondelete='SET NULL'))
-    payment_method = Column(String(100))
-    payee = Column(String(255), index=True)
-    
-    # Reconciliation
-    is_reconciled = Column(Boolean, default=False, index=True)
-    reconciliation_id = Column(PG_UUID(as_uuid=True), ForeignKey('bank_reconciliations.id', ondelete='SET NULL'))
-    
-    # GL Integration
-    gl_entry_id = Column(PG_UUID(as_uuid=True), ForeignKey('gl_journal_entries.id', ondelete='SET NULL'))
-    
-    # Relationships
-    account = relationship("BankAccount", back_populates="transactions")
-    reconciliation = relationship("BankReconciliation", back_populates="transactions")
-    category = relationship("TransactionCategory", back_populates="transactions")
-    gl_entry = relationship("JournalEntry", foreign_keys=[gl_entry_id])
-    
-    # Metadata
-    metadata_ = Column("metadata", JSONB, default=dict, nullable=False)
-    
-    # Indexes
-    __table_args__ = (
-        Index('ix_bank_transactions_account_date', 'account_id', 'transaction_date'),
-        Index('ix_bank_transactions_reference', 'account_id', 'reference_number', unique=True),
-    )
-
-
-class BankReconciliation(BaseModel, Base):
-    """Bank reconciliation records."""
-    __tablename__ = "bank_reconciliations"
-    
-    # Reconciliation Information
-    account_id = Column(PG_UUID(as_uuid=True), ForeignKey('bank_accounts.id', ondelete='CASCADE'), nullable=False, index=True)
-    statement_date = Column(Date, nullable=False, index=True)
-    statement_ending_balance = Column(Numeric(19, 4), nullable=False)
-    reconciliation_date = Column(Date, nullable=False, index=True)
-    status = Column(SQLEnum(ReconciliationStatus), default=ReconciliationStatus.DRAFT, index=True)
-    
-    # Calculated Fields
-    cleared_balance = Column(Numeric(19, 4))
-    difference = Column(Numeric(19, 4))
-    
-    # GL Integration
-    gl_entry_id = Column(PG_UUID(as_uuid=True), ForeignKey('gl_journal_entries.id', ondelete='SET NULL'))
-    
-    # Relationships
-    account = relationship("BankAccount", back_populates="reconciliations")
-    transactions = relationship("BankTransaction", back_populates="reconciliation")
-    gl_entry = relationship("JournalEntry", foreign_keys=[gl_entry_id])
-    
-    # Metadata
-    notes = Column(Text)
-    metadata_ = Column("metadata", JSONB, default=dict, nullable=False)
-
-
-class TransactionCategory(BaseModel, Base):
-    """Transaction categories for bank transactions."""
-    __tablename__ = "transaction_categories"
-    
-    name = Column(String(100), nullable=False, unique=True, index=True)
-    description = Column(Text)
-    parent_id = Column(PG_UUID(as_uuid=True), ForeignKey('transaction_categories.id', ondelete='CASCADE'))
-    
-    # GL Integration
-    gl_account_id = Column(PG_UUID(as_uuid=True), ForeignKey('gl_accounts.id', ondelete='SET NULL'))
-    
-    # Relationships
-    parent = relationship("TransactionCategory", remote_side="TransactionCategory.id", backref="subcategories")
-    transactions = relationship("BankTransaction", back_populates="category")
-    gl_account = relationship("GLAccount")
-    
-    # Metadata
-    metadata_ = Column("metadata", JSONB, default=dict, nullable=False)
-
-
-class BankIntegration(BaseModel, Base):
-    """Bank integration configuration."""
-    __tablename__ = "bank_integrations"
-    
-    name = Column(String(100), nullable=False, unique=True, index=True)
-    provider = Column(String(100), nullable=False, index=True)  # e.g., 'plaid', 'stripe', 'custom'
-    is_active = Column(Boolean, default=True, index=True)
-    
-    # Authentication
-    api_key = Column(Text, nullable=True)  # Encrypted in production
-    client_id = Column(Text, nullable=True)  # Encrypted in production
-    secret = Column(Text, nullable=True)  # Encrypted in production
-    
-    # Configuration
-    config = Column(JSONB, default=dict, nullable=False)
-    
-    # Sync Information
-    last_sync = Column(DateTime)
-    sync_status = Column(String(50))
-    sync_interval_minutes = Column(Integer, default=1440)  # Default: 24 hours
-    
-    # Relationships
-    accounts = relationship("BankAccount", back_populates="integration")
-    
-    # Metadata
-    metadata_ = Column("metadata", JSONB, default=dict, nullable=False)
-
-
-class BankAccountStatement(BaseModel, Base):
-    """Bank account statements."""
-    __tablename__ = "bank_account_statements"
-    
-    account_id = Column(PG_UUID(as_uuid=True), ForeignKey('bank_accounts.id', ondelete='CASCADE'), nullable=False, index=True)
-    statement_date = Column(Date, nullable=False, index=True)
-    start_date = Column(Date, nullable=False)
-    end_date = Column(Date, nullable=False)
-    
-    # Balance Information
-    opening_balance = Column(Numeric(19, 4), nullable=False)
-    closing_balance = Column(Numeric(19, 4), nullable=False)
-    
-    # File Information
-    file_name = Column(String(255))
-    file_type = Column(String(50))  # e.g., 'pdf', 'csv', 'ofx'
-    file_size = Column(Integer)  # in bytes
-    file_url = Column(Text)  # URL or path to the statement file
-    
-    # Processing Information
-    is_processed = Column(Boolean, default=False, index=True)
-    processed_at = Column(DateTime)
-    
-    # Relationships
-    account = relationship("BankAccount", back_populates="statements")
-    
-    # Metadata
-    notes = Column(Text)
-    metadata_ = Column("metadata", JSONB, default=dict, nullable=False)
-    
-    # Indexes
-    __table_args__ = (
-        Index('ix_bank_account_statements_account_date', 'account_id', 'statement_date', unique=True),
-    )
-
-
-# Add back-references to GL Account
-from app.models.gl_models import GLAccount  # noqa: E402
-
-if not hasattr(GLAccount, 'bank_accounts'):
-    GLAccount.bank_accounts = relationship("BankAccount", back_populates="gl_account")
-
-# Add back-reference to BankAccount for statements
-BankAccount.statements = relationship("BankAccountStatement", back_populates="account", cascade="all, delete-orphan")
-
-# Add back-reference to BankAccount for integrations
-BankAccount.integration_id = Column(PG_UUID(as_uuid=True), ForeignKey('bank_integrations.id', ondelete='SET NULL'), index=True)
-BankAccount.integration = relationship("BankIntegration", back_populates="accounts")
-=======
 import enum
 from sqlalchemy import (
     Column, Integer, String, Text, Numeric, Date, DateTime, Boolean, ForeignKey, Index, 
@@ -218,7 +11,7 @@ from datetime import datetime, date
 from decimal import Decimal
 from typing import Optional
 
-from app.core.base import Base
+from app.core.database import Base
 
 class BankAccountType(str, enum.Enum):
     CHECKING = "checking"
@@ -309,8 +102,8 @@ class BankAccount(Base):
     updated_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Relationships
-    transactions = relationship("BankTransaction", back_populates="account", cascade="all, delete-orphan")
-    reconciliations = relationship("BankReconciliation", back_populates="account", cascade="all, delete-orphan")
+    transactions = relationship("app.modules.core_financials.cash_management.models.BankTransaction", back_populates="account", cascade="all, delete-orphan")
+    reconciliations = relationship("app.modules.core_financials.cash_management.models.BankReconciliation", back_populates="account", cascade="all, delete-orphan")
     cash_flows = relationship("CashFlowEntry", back_populates="account", cascade="all, delete-orphan")
     fees = relationship("BankingFee", back_populates="account", cascade="all, delete-orphan")
     
@@ -321,6 +114,20 @@ class BankAccount(Base):
         Index('idx_bank_account_bank', 'bank_name'),
     )
 
+class TransactionCategory(Base):
+    """Transaction categories for bank transactions"""
+    __tablename__ = "transaction_categories"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False, unique=True, index=True)
+    description = Column(Text)
+    parent_id = Column(Integer, ForeignKey("transaction_categories.id", ondelete="CASCADE"))
+    gl_account_id = Column(Integer, ForeignKey("gl_accounts.id", ondelete="SET NULL"))
+    metadata_ = Column("metadata", JSONB)
+    
+    # Relationships
+    parent = relationship("TransactionCategory", remote_side=[id], backref="subcategories")
+
 class BankTransaction(Base):
     __tablename__ = "cm_bank_transactions"
 
@@ -352,10 +159,16 @@ class BankTransaction(Base):
     reconciliation_id = Column(Integer, ForeignKey("cm_bank_reconciliations.id", ondelete="SET NULL"))
     reconciled_date = Column(Date)
     
+    # Statement Matching
+    statement_import_id = Column(Integer, ForeignKey("cm_bank_statement_imports.id", ondelete="SET NULL"), index=True)  # Set on lines imported from a bank statement
+    statement_transaction_id = Column(Integer, ForeignKey("cm_bank_transactions.id", ondelete="SET NULL"), index=True)  # Statement line a book transaction cleared against
+    match_type = Column(String(20))  # exact, date_window, grouped
+    fingerprint = Column(String(64))  # Identifies an imported statement line across imports
+    
     # Additional Information
     notes = Column(Text)
     attachments = Column(JSONB)
-    metadata = Column(JSONB)
+    metadata_ = Column("metadata", JSONB)
     
     # Audit fields
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -364,14 +177,15 @@ class BankTransaction(Base):
     updated_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Relationships
-    account = relationship("BankAccount", back_populates="transactions")
-    reconciliation = relationship("BankReconciliation", back_populates="transactions")
+    account = relationship("app.modules.core_financials.cash_management.models.BankAccount", back_populates="transactions")
+    reconciliation = relationship("app.modules.core_financials.cash_management.models.BankReconciliation", back_populates="transactions")
     
     # Indexes
     __table_args__ = (
         Index('idx_transaction_account_date', 'account_id', 'transaction_date'),
         Index('idx_transaction_type_status', 'transaction_type', 'status'),
         Index('idx_transaction_reconciled', 'is_reconciled'),
+        UniqueConstraint('account_id', 'fingerprint', name='uq_transaction_account_fingerprint'),
     )
 
 class BankReconciliation(Base):
@@ -413,7 +227,7 @@ class BankReconciliation(Base):
     reviewed_date = Column(DateTime(timezone=True))
     
     # Custom Fields
-    metadata = Column(JSONB)
+    metadata_ = Column("metadata", JSONB)
     
     # Audit fields
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -422,8 +236,8 @@ class BankReconciliation(Base):
     updated_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Relationships
-    account = relationship("BankAccount", back_populates="reconciliations")
-    transactions = relationship("BankTransaction", back_populates="reconciliation")
+    account = relationship("app.modules.core_financials.cash_management.models.BankAccount", back_populates="reconciliations")
+    transactions = relationship("app.modules.core_financials.cash_management.models.BankTransaction", back_populates="reconciliation")
     
     # Indexes
     __table_args__ = (
@@ -459,7 +273,7 @@ class CashFlowEntry(Base):
     # Additional Information
     description = Column(Text)
     notes = Column(Text)
-    metadata = Column(JSONB)
+    metadata_ = Column("metadata", JSONB)
     
     # Audit fields
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -468,7 +282,7 @@ class CashFlowEntry(Base):
     updated_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Relationships
-    account = relationship("BankAccount", back_populates="cash_flows")
+    account = relationship("app.modules.core_financials.cash_management.models.BankAccount", back_populates="cash_flows")
     
     # Indexes
     __table_args__ = (
@@ -510,7 +324,7 @@ class BankingFee(Base):
     waived_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Custom Fields
-    metadata = Column(JSONB)
+    metadata_ = Column("metadata", JSONB)
     
     # Audit fields
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -519,7 +333,7 @@ class BankingFee(Base):
     updated_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Relationships
-    account = relationship("BankAccount", back_populates="fees")
+    account = relationship("app.modules.core_financials.cash_management.models.BankAccount", back_populates="fees")
     
     # Indexes
     __table_args__ = (
@@ -559,11 +373,10 @@ class BankStatementImport(Base):
     created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     
     # Relationships
-    account = relationship("BankAccount")
+    account = relationship("app.modules.core_financials.cash_management.models.BankAccount")
     
     # Indexes
     __table_args__ = (
         Index('idx_statement_import_account_date', 'account_id', 'import_date'),
         Index('idx_statement_import_status', 'status'),
     )
->>>>>>> e96df7278ce4216131b6c65d411c0723f4de7f91
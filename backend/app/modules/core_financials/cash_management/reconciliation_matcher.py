@@ -0,0 +1,378 @@
+"""
+Bank statement auto-reconciliation.
+
+Statement lines (bank transactions imported from a statement, with
+``statement_import_id`` set) are matched against book transactions of the
+same account in three passes:
+
+1. Exact: same signed amount, date and normalized reference.
+2. Date window: same signed amount within MATCH_WINDOW_DAYS, pairing the
+   closest dates with a two-pointer scan over both sides sorted by
+   (amount, date).
+3. Grouped: several book transactions of the same direction, dated up to
+   MATCH_WINDOW_DAYS before a statement line, that add up to it (e.g. a
+   deposit batch): those sharing its reference, a whole day's transactions,
+   or, where few candidates exist, a bounded subset search.
+
+The period is processed in date-ordered chunks of CHUNK_DAYS. Each chunk
+loads only the columns needed for matching, and matched rows are updated in
+bulk before the next chunk is read, so memory stays flat on accounts with
+hundreds of thousands of lines per month.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, func, select, update
+from sqlalchemy.orm import Session
+
+from .models import BankReconciliation, BankTransaction, TransactionStatus, TransactionType
+
+# Days of statement lines matched per chunk
+CHUNK_DAYS = 3
+
+# Largest date difference between a statement line and its book transactions
+MATCH_WINDOW_DAYS = 3
+
+# Grouped matching: candidates considered per statement line, largest group
+# and search steps allowed
+MAX_GROUP_CANDIDATES = 20
+MAX_GROUP_SIZE = 8
+MAX_GROUP_STEPS = 5000
+
+INFLOW_TYPES = (
+    TransactionType.DEPOSIT,
+    TransactionType.TRANSFER_IN,
+    TransactionType.INTEREST,
+    TransactionType.REFUND,
+)
+
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]')
+
+
+class Line:
+    """Matching view of a bank transaction: id, day ordinal, signed cents, reference."""
+
+    __slots__ = ('id', 'day', 'cents', 'reference')
+
+    def __init__(self, id: int, day: int, cents: int, reference: str):
+        self.id = id
+        self.day = day
+        self.cents = cents
+        self.reference = reference
+
+    @classmethod
+    def from_row(cls, id: int, transaction_date: date, transaction_type, amount: Decimal, reference: Optional[str]) -> 'Line':
+        cents = int((Decimal(amount) * 100).to_integral_value())
+        if transaction_type not in INFLOW_TYPES:
+            cents = -cents
+        return cls(id, transaction_date.toordinal(), cents, normalize_reference(reference))
+
+
+def normalize_reference(reference: Optional[str]) -> str:
+    return _NON_ALNUM_RE.sub('', (reference or '').upper())
+
+
+Match = Tuple[int, List[int], str]
+
+
+def match_exact(statement: List[Line], book: List[Line], matched: Set[int]) -> List[Match]:
+    """Pair lines with the same amount, date and non-empty reference."""
+    by_key: Dict[Tuple[int, int, str], List[Line]] = {}
+    for line in book:
+        if line.reference and line.id not in matched:
+            by_key.setdefault((line.cents, line.day, line.reference), []).append(line)
+
+    matches = []
+    for line in statement:
+        if not line.reference or line.id in matched:
+            continue
+        candidates = by_key.get((line.cents, line.day, line.reference))
+        if candidates:
+            book_line = candidates.pop()
+            matched.update((line.id, book_line.id))
+            matches.append((line.id, [book_line.id], 'exact'))
+    return matches
+
+
+def match_date_window(
+    statement: List[Line],
+    book: List[Line],
+    matched: Set[int],
+    window: int = MATCH_WINDOW_DAYS
+) -> List[Match]:
+    """
+    Pair lines with the same amount at most ``window`` days apart. Both
+    sides are sorted by (amount, date) and scanned with two pointers; within
+    an amount the earliest compatible dates are paired, which maximizes the
+    number of pairs.
+    """
+    left = sorted((line for line in statement if line.id not in matched), key=lambda l: (l.cents, l.day, l.id))
+    right = sorted((line for line in book if line.id not in matched), key=lambda l: (l.cents, l.day, l.id))
+
+    matches = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        a, b = left[i], right[j]
+        if a.cents < b.cents:
+            i += 1
+        elif a.cents > b.cents:
+            j += 1
+        elif b.day < a.day - window:
+            j += 1
+        elif b.day > a.day + window:
+            i += 1
+        else:
+            matched.update((a.id, b.id))
+            matches.append((a.id, [b.id], 'date_window'))
+            i += 1
+            j += 1
+    return matches
+
+
+def _find_group(candidates: List[Line], target: int) -> Optional[List[Line]]:
+    """Two or more candidates adding up to ``target`` (all of one sign), or None."""
+    candidates = [line for line in candidates if 0 < abs(line.cents) <= abs(target)]
+    steps = 0
+    chosen: List[Line] = []
+
+    def search(start: int, left: int) -> bool:
+        nonlocal steps
+        if left == 0:
+            return len(chosen) > 1
+        if len(chosen) >= MAX_GROUP_SIZE:
+            return False
+        for k in range(start, len(candidates)):
+            steps += 1
+            if steps > MAX_GROUP_STEPS:
+                return False
+            value = abs(candidates[k].cents)
+            if value > left:
+                continue
+            chosen.append(candidates[k])
+            if search(k + 1, left - value):
+                return True
+            chosen.pop()
+        return False
+
+    return list(chosen) if search(0, abs(target)) else None
+
+
+def match_grouped(
+    statement: List[Line],
+    book: List[Line],
+    matched: Set[int],
+    window: int = MATCH_WINDOW_DAYS
+) -> List[Match]:
+    """
+    Match each remaining statement line to several book transactions of the
+    same direction dated within ``window`` days before it: those sharing the
+    line's reference, or all those of one day (checked against running
+    per-day totals). When at most MAX_GROUP_CANDIDATES transactions fall in
+    the window, a bounded subset search is tried as well.
+    """
+    by_reference: Dict[Tuple[bool, str], List[Line]] = {}
+    by_day: Dict[Tuple[bool, int], List[Line]] = {}
+    day_totals: Dict[Tuple[bool, int], int] = {}
+    sides: Dict[bool, List[Line]] = {True: [], False: []}
+    for line in book:
+        if line.id in matched or not line.cents:
+            continue
+        sign = line.cents > 0
+        if line.reference:
+            by_reference.setdefault((sign, line.reference), []).append(line)
+        by_day.setdefault((sign, line.day), []).append(line)
+        day_totals[(sign, line.day)] = day_totals.get((sign, line.day), 0) + line.cents
+        sides[sign].append(line)
+    for lines in sides.values():
+        lines.sort(key=lambda l: (l.day, l.id))
+    days = {sign: [line.day for line in lines] for sign, lines in sides.items()}
+
+    def take(group: List[Line]) -> None:
+        for book_line in group:
+            matched.add(book_line.id)
+            key = (book_line.cents > 0, book_line.day)
+            day_totals[key] -= book_line.cents
+
+    matches = []
+    for line in sorted(statement, key=lambda l: (l.day, l.id)):
+        if line.id in matched or not line.cents:
+            continue
+        sign = line.cents > 0
+        first_day = line.day - window
+
+        group = None
+        if line.reference:
+            same_reference = [
+                c for c in by_reference.get((sign, line.reference), [])
+                if c.id not in matched and first_day <= c.day <= line.day
+            ]
+            if len(same_reference) > 1 and sum(c.cents for c in same_reference) == line.cents:
+                group = same_reference
+        if group is None:
+            for day in range(line.day, first_day - 1, -1):
+                if day_totals.get((sign, day)) == line.cents:
+                    day_lines = [c for c in by_day[(sign, day)] if c.id not in matched]
+                    if len(day_lines) > 1:
+                        group = day_lines
+                        break
+        if group is None:
+            lo = bisect_left(days[sign], first_day)
+            hi = bisect_right(days[sign], line.day)
+            if hi - lo <= MAX_GROUP_CANDIDATES:
+                # Closest dates first
+                candidates = [c for c in reversed(sides[sign][lo:hi]) if c.id not in matched]
+                group = _find_group(candidates, line.cents)
+        if group:
+            matched.add(line.id)
+            take(group)
+            matches.append((line.id, [c.id for c in group], 'grouped'))
+    return matches
+
+
+def match_lines(statement: List[Line], book: List[Line], window: int = MATCH_WINDOW_DAYS) -> List[Match]:
+    """Run the exact, date window and grouped passes in order."""
+    matched: Set[int] = set()
+    return (
+        match_exact(statement, book, matched)
+        + match_date_window(statement, book, matched, window)
+        + match_grouped(statement, book, matched, window)
+    )
+
+
+def _unreconciled(account_id: int, start: date, end: date):
+    return and_(
+        BankTransaction.account_id == account_id,
+        BankTransaction.transaction_date >= start,
+        BankTransaction.transaction_date <= end,
+        BankTransaction.is_reconciled == False,
+        BankTransaction.status == TransactionStatus.POSTED
+    )
+
+
+def _load_lines(db: Session, account_id: int, start: date, end: date, statement: bool) -> List[Line]:
+    source = BankTransaction.statement_import_id.isnot(None) if statement else BankTransaction.statement_import_id.is_(None)
+    result = db.execute(
+        select(
+            BankTransaction.id,
+            BankTransaction.transaction_date,
+            BankTransaction.transaction_type,
+            BankTransaction.amount,
+            BankTransaction.reference_number
+        ).where(
+            _unreconciled(account_id, start, end), source
+        ).order_by(BankTransaction.transaction_date, BankTransaction.id)
+    )
+    return [Line.from_row(*row) for row in result]
+
+
+def auto_reconcile(db: Session, reconciliation_id: int, user_id: int) -> Dict[str, Any]:
+    """
+    Match the unreconciled statement lines of a reconciliation period to
+    book transactions and mark both sides reconciled.
+
+    Book transactions may be dated up to MATCH_WINDOW_DAYS before the period
+    (items outstanding at the previous statement), not after it.
+    """
+    recon_query = select(BankReconciliation).where(BankReconciliation.id == reconciliation_id)
+    recon_result = db.execute(recon_query)
+    reconciliation = recon_result.scalar_one_or_none()
+
+    if not reconciliation:
+        return {"error": "Reconciliation not found"}
+
+    account_id = reconciliation.account_id
+    period_start, period_end = reconciliation.period_start, reconciliation.period_end
+    window = timedelta(days=MATCH_WINDOW_DAYS)
+    today = date.today()
+
+    match_counts = {"exact": 0, "date_window": 0, "grouped": 0}
+    matched_statement_lines = 0
+    matched_transactions = 0
+
+    chunk_start = period_start
+    while chunk_start <= period_end:
+        chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), period_end)
+
+        statement = _load_lines(db, account_id, chunk_start, chunk_end, statement=True)
+        if statement:
+            book = _load_lines(
+                db, account_id, chunk_start - window, min(chunk_end + window, period_end), statement=False
+            )
+            matches = match_lines(statement, book)
+
+            updates = []
+            for statement_id, book_ids, match_type in matches:
+                match_counts[match_type] += 1
+                matched_statement_lines += 1
+                matched_transactions += len(book_ids)
+                updates.append({
+                    "id": statement_id,
+                    "is_reconciled": True,
+                    "reconciliation_id": reconciliation_id,
+                    "reconciled_date": today,
+                    "match_type": match_type,
+                    "updated_by": user_id
+                })
+                updates.extend({
+                    "id": book_id,
+                    "is_reconciled": True,
+                    "reconciliation_id": reconciliation_id,
+                    "reconciled_date": today,
+                    "statement_transaction_id": statement_id,
+                    "match_type": match_type,
+                    "updated_by": user_id
+                } for book_id in book_ids)
+
+            if updates:
+                db.execute(update(BankTransaction), updates)
+
+        chunk_start = chunk_end + timedelta(days=1)
+
+    # Cleared balance from every book transaction reconciled so far, so
+    # repeated runs over the same period stay consistent
+    signed_amount = case(
+        (BankTransaction.transaction_type.in_(INFLOW_TYPES), BankTransaction.amount),
+        else_=-BankTransaction.amount
+    )
+    cleared = db.scalar(
+        select(func.coalesce(func.sum(signed_amount), 0)).where(
+            BankTransaction.reconciliation_id == reconciliation_id,
+            BankTransaction.statement_import_id.is_(None)
+        )
+    )
+    unmatched = dict((db.execute(
+        select(BankTransaction.statement_import_id.isnot(None), func.count()).where(
+            _unreconciled(account_id, period_start, period_end)
+        ).group_by(BankTransaction.statement_import_id.isnot(None))
+    )).all())
+
+    cleared_balance = (reconciliation.statement_beginning_balance or Decimal('0')) + Decimal(cleared)
+    reconciliation.cleared_balance = cleared_balance
+    reconciliation.auto_reconciled_count = (reconciliation.auto_reconciled_count or 0) + matched_transactions
+    reconciliation.difference = reconciliation.statement_ending_balance - cleared_balance
+
+    if abs(reconciliation.difference) < Decimal('0.01'):
+        reconciliation.is_balanced = True
+        reconciliation.status = "completed"
+    else:
+        reconciliation.status = "in_progress"
+
+    reconciliation.updated_by = user_id
+    reconciliation.updated_at = datetime.utcnow()
+
+    db.commit()
+
+    return {
+        "reconciliation_id": reconciliation_id,
+        "matched_transactions": matched_transactions,
+        "matched_statement_lines": matched_statement_lines,
+        "match_counts": match_counts,
+        "unmatched_transactions": unmatched.get(False, 0),
+        "unmatched_statement_lines": unmatched.get(True, 0),
+        "status": reconciliation.status,
+        "difference": float(reconciliation.difference),
+        "is_balanced": reconciliation.is_balanced
+    }
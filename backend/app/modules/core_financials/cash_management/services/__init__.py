@@ -0,0 +1,20 @@
+"""
+Cash management services.
+"""
+from .bank_reconciliation_service import BankReconciliationService
+from .cash_flow_service import CashFlowService
+from .cash_management_service import (
+    BankAccountService,
+    CashManagementService,
+    ReconciliationService,
+    TransactionService,
+)
+
+__all__ = [
+    'BankAccountService',
+    'BankReconciliationService',
+    'CashFlowService',
+    'CashManagementService',
+    'ReconciliationService',
+    'TransactionService',
+]
@@ -1,14 +1,15 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from sqlalchemy import select, func, and_
 from typing import Optional
-from datetime import datetime, date
+from datetime import datetime
 from decimal import Decimal
 from ..models import BankReconciliation, BankTransaction, BankAccount
+from ..reconciliation_matcher import auto_reconcile
 
 class BankReconciliationService:
     """Service for bank reconciliation operations"""
     
-    async def create_reconciliation(self, db: AsyncSession, recon_data: dict, user_id: int):
+    def create_reconciliation(self, db: Session, recon_data: dict, user_id: int):
         """Create a new bank reconciliation"""
         reconciliation = BankReconciliation(
             account_id=recon_data["account_id"],
@@ -26,8 +27,8 @@ class BankReconciliationService:
         )
         
         db.add(reconciliation)
-        await db.commit()
-        await db.refresh(reconciliation)
+        db.commit()
+        db.refresh(reconciliation)
         
         return {
             "reconciliation_id": reconciliation.id,
@@ -38,81 +39,18 @@ class BankReconciliationService:
             "created_at": reconciliation.created_at.isoformat()
         }
     
-    async def auto_reconcile(self, db: AsyncSession, reconciliation_id: int, user_id: int):
-        """Perform automatic reconciliation with real matching logic"""
-        # Get reconciliation
-        recon_query = select(BankReconciliation).where(BankReconciliation.id == reconciliation_id)
-        recon_result = await db.execute(recon_query)
-        reconciliation = recon_result.scalar_one_or_none()
-        
-        if not reconciliation:
-            return {"error": "Reconciliation not found"}
-        
-        # Get unreconciled transactions for the period
-        trans_query = select(BankTransaction).where(
-            and_(
-                BankTransaction.account_id == reconciliation.account_id,
-                BankTransaction.transaction_date >= reconciliation.period_start,
-                BankTransaction.transaction_date <= reconciliation.period_end,
-                BankTransaction.is_reconciled == False,
-                BankTransaction.status == "posted"
-            )
-        )
-        
-        trans_result = await db.execute(trans_query)
-        transactions = trans_result.scalars().all()
-        
-        matched_count = 0
-        cleared_balance = Decimal('0')
-        
-        # Auto-match transactions within the statement period
-        for transaction in transactions:
-            if reconciliation.period_start <= transaction.transaction_date <= reconciliation.period_end:
-                transaction.is_reconciled = True
-                transaction.reconciliation_id = reconciliation_id
-                transaction.reconciled_date = date.today()
-                transaction.updated_by = user_id
-                
-                if transaction.transaction_type in ["deposit", "transfer_in", "interest"]:
-                    cleared_balance += transaction.amount
-                else:
-                    cleared_balance -= transaction.amount
-                    
-                matched_count += 1
-        
-        # Update reconciliation
-        reconciliation.cleared_balance = cleared_balance
-        reconciliation.auto_reconciled_count = matched_count
-        reconciliation.difference = reconciliation.statement_ending_balance - cleared_balance
-        
-        if abs(reconciliation.difference) < Decimal('0.01'):
-            reconciliation.is_balanced = True
-            reconciliation.status = "completed"
-        else:
-            reconciliation.status = "in_progress"
-        
-        reconciliation.updated_by = user_id
-        reconciliation.updated_at = datetime.utcnow()
-        
-        await db.commit()
-        
-        return {
-            "reconciliation_id": reconciliation_id,
-            "matched_transactions": matched_count,
-            "unmatched_transactions": len(transactions) - matched_count,
-            "status": reconciliation.status,
-            "difference": float(reconciliation.difference),
-            "is_balanced": reconciliation.is_balanced
-        }
+    def auto_reconcile(self, db: Session, reconciliation_id: int, user_id: int):
+        """Match statement lines to book transactions and reconcile both sides"""
+        return auto_reconcile(db, reconciliation_id, user_id)
     
-    async def get_reconciliation_status(self, db: AsyncSession, account_id: int):
+    def get_reconciliation_status(self, db: Session, account_id: int):
         """Get reconciliation status for an account"""
         # Get latest reconciliation
         latest_query = select(BankReconciliation).where(
             BankReconciliation.account_id == account_id
         ).order_by(BankReconciliation.reconciliation_date.desc()).limit(1)
         
-        result = await db.execute(latest_query)
+        result = db.execute(latest_query)
         latest_recon = result.scalar_one_or_none()
         
         # Get unreconciled transactions count
@@ -123,7 +61,7 @@ class BankReconciliationService:
                 BankTransaction.status == "posted"
             )
         )
-        unreconciled_count = await db.scalar(unreconciled_query)
+        unreconciled_count = db.scalar(unreconciled_query)
         
         return {
             "account_id": account_id,
@@ -1,4 +1,4 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from sqlalchemy import select, func, and_
 from typing import Optional
 from datetime import datetime, date, timedelta
@@ -8,18 +8,18 @@ from ..models import CashFlowEntry, BankAccount
 class CashFlowService:
     """Service for cash flow forecasting and analysis"""
     
-    async def get_cash_flow_forecast(self, db: AsyncSession, start_date: date, end_date: date, 
+    def get_cash_flow_forecast(self, db: Session, start_date: date, end_date: date, 
                                    account_id: Optional[int] = None):
         """Get comprehensive cash flow forecast"""
         # Get opening balance
         if account_id:
             account_query = select(BankAccount).where(BankAccount.id == account_id)
-            account_result = await db.execute(account_query)
+            account_result = db.execute(account_query)
             account = account_result.scalar_one_or_none()
             opening_balance = float(account.current_balance) if account else 0.0
         else:
             balance_query = select(func.sum(BankAccount.current_balance)).where(BankAccount.status == 'active')
-            opening_balance = float(await db.scalar(balance_query) or 0)
+            opening_balance = float(db.scalar(balance_query) or 0)
         
         # Get forecast entries
         query = select(CashFlowEntry).where(
@@ -32,7 +32,7 @@ class CashFlowService:
         if account_id:
             query = query.where(CashFlowEntry.account_id == account_id)
             
-        result = await db.execute(query)
+        result = db.execute(query)
         entries = result.scalars().all()
         
         # Calculate totals
@@ -10,6 +10,7 @@ This module provides services for managing bank accounts, transactions,
 reconciliations, and related financial operations.
 """
 
+import asyncio
 from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Optional, Dict, Any, Tuple, Union
@@ -18,18 +19,8 @@ from uuid import UUID, uuid4
 from sqlalchemy.orm import Session, joinedload, contains_eager
 from sqlalchemy import and_, or_, func, desc, text, update, case, cast, Date, Integer, Numeric, not_
 
-from app.core.exceptions import NotFoundError, ValidationError, BusinessRuleError
-"""
-Cash management services placeholder (conflicts resolved).
-"""
-from app.core.database import Base
-=======
-from app.core.db.base import Base
->>>>>>> e96df7278ce4216131b6c65d411c0723f4de7f91
-from app.core.security import get_password_hash, verify_password
-from . import models, schemas, exceptions
-from ..accounting.models import GLAccount, JournalEntry, JournalEntryLine, AccountType
-from ..accounting.schemas import JournalEntryCreate, JournalEntryLineCreate
+from .. import models, schemas, exceptions
+from app.services.currency.exchange_service import get_exchange_service
 
 
 class BankAccountService:
@@ -75,7 +66,7 @@ class BankAccountService:
             id=uuid4(),
             created_by_id=user_id,
             updated_by_id=user_id,
-            metadata=account.metadata or {}
+            metadata_=account.metadata or {}
         )
         
         self.db.add(db_account)
@@ -334,7 +325,7 @@ class TransactionService:
             id=uuid4(),
             created_by_id=user_id,
             updated_by_id=user_id,
-            metadata=transaction.metadata or {}
+            metadata_=transaction.metadata or {}
         )
         
         # Update account balance if transaction is posted
@@ -482,11 +473,7 @@ class TransactionService:
         account.last_updated = datetime.utcnow()
 
 
- 
 class ReconciliationService:
-=======
-class ReconciliationService(ReconciliationService):
->>>>>>> e96df7278ce4216131b6c65d411c0723f4de7f91
     """
     Service for managing bank reconciliation operations.
     
@@ -527,7 +514,7 @@ class ReconciliationService(ReconciliationService):
             id=uuid4(),
             created_by_id=user_id,
             updated_by_id=user_id,
-            metadata=reconciliation.metadata or {}
+            metadata_=reconciliation.metadata or {}
         )
         
         self.db.add(db_reconciliation)
@@ -654,10 +641,15 @@ class ReconciliationService(ReconciliationService):
                 reconciliation.status = schemas.ReconciliationStatus.COMPLETED
             else:
                 reconciliation.status = schemas.ReconciliationStatus.IN_PROGRESS
- 
-=======
+
+
+class CashManagementService:
+    """
+    Cash position, payments, statement imports and banking fees, on the
+    session of the request.
+    """
     
-    async def get_cash_flow_forecast(self, db: AsyncSession, start_date: date, end_date: date, account_id: Optional[int] = None):
+    def get_cash_flow_forecast(self, db: Session, start_date: date, end_date: date, account_id: Optional[int] = None):
         """Get cash flow forecast from real data"""
         from ..models import CashFlowEntry, BankAccount
         from sqlalchemy import select, func, and_
@@ -665,12 +657,12 @@ class ReconciliationService(ReconciliationService):
         # Get opening balance
         if account_id:
             account_query = select(BankAccount).where(BankAccount.id == account_id)
-            account_result = await db.execute(account_query)
+            account_result = db.execute(account_query)
             account = account_result.scalar_one_or_none()
             opening_balance = float(account.current_balance) if account else 0.0
         else:
             balance_query = select(func.sum(BankAccount.current_balance)).where(BankAccount.status == 'active')
-            opening_balance = float(await db.scalar(balance_query) or 0)
+            opening_balance = float(db.scalar(balance_query) or 0)
         
         # Get cash flow entries for the period
         query = select(CashFlowEntry).where(
@@ -683,7 +675,7 @@ class ReconciliationService(ReconciliationService):
         if account_id:
             query = query.where(CashFlowEntry.account_id == account_id)
             
-        result = await db.execute(query)
+        result = db.execute(query)
         entries = result.scalars().all()
         
         # Calculate totals
@@ -725,8 +717,11 @@ class ReconciliationService(ReconciliationService):
             "daily_forecast": daily_forecast
         }
     
-    async def get_cash_position(self, db: AsyncSession, as_of_date: Optional[date] = None):
-        """Get current cash position from real account data"""
+    def get_cash_position(self, db: Session, as_of_date: Optional[date] = None):
+        """
+        Get current cash position from real account data, consolidated into
+        the base currency at the rates of ``as_of_date``.
+        """
         from ..models import BankAccount
         from sqlalchemy import select, func
         
@@ -735,11 +730,22 @@ class ReconciliationService(ReconciliationService):
         
         # Get all active accounts
         query = select(BankAccount).where(BankAccount.status == 'active')
-        result = await db.execute(query)
+        result = db.execute(query)
         accounts = result.scalars().all()
         
-        total_cash = sum(float(account.current_balance) for account in accounts)
-        available_cash = sum(float(account.available_balance) for account in accounts)
+        # Balances and available balances converted as one column
+        exchange_service = get_exchange_service(db)
+        currencies = [account.currency_code or exchange_service.base_currency for account in accounts]
+        converted, _ = asyncio.run(exchange_service.convert_many(
+            [account.current_balance for account in accounts] + [account.available_balance for account in accounts],
+            currencies * 2,
+            exchange_service.base_currency,
+            [as_of_date] * (2 * len(accounts))
+        ))
+        base_balances, base_available = converted[:len(accounts)], converted[len(accounts):]
+        
+        total_cash = float(sum(base_balances, Decimal('0')))
+        available_cash = float(sum(base_available, Decimal('0')))
         restricted_cash = total_cash - available_cash
         
         account_details = [
@@ -751,20 +757,22 @@ class ReconciliationService(ReconciliationService):
                 "account_type": account.account_type,
                 "balance": float(account.current_balance),
                 "available": float(account.available_balance),
-                "currency": account.currency_code
+                "currency": account.currency_code,
+                "base_currency_balance": float(base_balance)
             }
-            for account in accounts
+            for account, base_balance in zip(accounts, base_balances)
         ]
         
         return {
             "as_of_date": as_of_date.isoformat(),
+            "currency": exchange_service.base_currency,
             "total_cash": total_cash,
             "available_cash": available_cash,
             "restricted_cash": restricted_cash,
             "accounts": account_details
         }
     
-    async def process_payment(self, db: AsyncSession, payment_data: dict, user_id: int):
+    def process_payment(self, db: Session, payment_data: dict, user_id: int):
         """Process payment transaction with real database persistence"""
         from ..models import BankTransaction, BankAccount
         from sqlalchemy import select
@@ -772,7 +780,7 @@ class ReconciliationService(ReconciliationService):
         
         # Get account
         account_query = select(BankAccount).where(BankAccount.id == payment_data["account_id"])
-        account_result = await db.execute(account_query)
+        account_result = db.execute(account_query)
         account = account_result.scalar_one_or_none()
         
         if not account:
@@ -786,7 +794,7 @@ class ReconciliationService(ReconciliationService):
                 return {"error": "Insufficient funds"}
         
         # Generate transaction number
-        transaction_count = await db.scalar(select(func.count(BankTransaction.id)))
+        transaction_count = db.scalar(select(func.count(BankTransaction.id)))
         reference_number = f"TXN-{datetime.now().strftime('%Y%m%d')}-{transaction_count + 1:06d}"
         
         # Create transaction
@@ -815,8 +823,8 @@ class ReconciliationService(ReconciliationService):
         account.updated_at = datetime.utcnow()
         
         db.add(transaction)
-        await db.commit()
-        await db.refresh(transaction)
+        db.commit()
+        db.refresh(transaction)
         
         return {
             "payment_id": transaction.id,
@@ -827,171 +835,26 @@ class ReconciliationService(ReconciliationService):
             "new_balance": float(account.current_balance)
         }
 
-    async def auto_reconcile(self, db: AsyncSession, reconciliation_id: int, user_id: int):
-        """Perform automatic reconciliation with real matching logic"""
-        from ..models import BankReconciliation, BankTransaction
-        from sqlalchemy import select, and_
-        from decimal import Decimal
-        
-        # Get reconciliation
-        recon_query = select(BankReconciliation).where(BankReconciliation.id == reconciliation_id)
-        recon_result = await db.execute(recon_query)
-        reconciliation = recon_result.scalar_one_or_none()
-        
-        if not reconciliation:
-            return {"error": "Reconciliation not found"}
-        
-        # Get unreconciled transactions for the period
-        trans_query = select(BankTransaction).where(
-            and_(
-                BankTransaction.account_id == reconciliation.account_id,
-                BankTransaction.transaction_date >= reconciliation.period_start,
-                BankTransaction.transaction_date <= reconciliation.period_end,
-                BankTransaction.is_reconciled == False,
-                BankTransaction.status == "posted"
-            )
-        )
-        
-        trans_result = await db.execute(trans_query)
-        transactions = trans_result.scalars().all()
-        
-        matched_count = 0
-        cleared_balance = Decimal('0')
-        
-        # Simple auto-matching logic (in production, this would be more sophisticated)
-        for transaction in transactions:
-            # Auto-match transactions that are within the statement period
-            if reconciliation.period_start <= transaction.transaction_date <= reconciliation.period_end:
-                transaction.is_reconciled = True
-                transaction.reconciliation_id = reconciliation_id
-                transaction.reconciled_date = date.today()
-                transaction.updated_by = user_id
-                
-                if transaction.transaction_type in ["deposit", "transfer_in", "interest"]:
-                    cleared_balance += transaction.amount
-                else:
-                    cleared_balance -= transaction.amount
-                    
-                matched_count += 1
-        
-        # Update reconciliation
-        reconciliation.cleared_balance = cleared_balance
-        reconciliation.auto_reconciled_count = matched_count
-        reconciliation.difference = reconciliation.statement_ending_balance - cleared_balance
-        
-        if abs(reconciliation.difference) < Decimal('0.01'):
-            reconciliation.is_balanced = True
-            reconciliation.status = "completed"
-        else:
-            reconciliation.status = "in_progress"
-        
-        reconciliation.updated_by = user_id
-        reconciliation.updated_at = datetime.utcnow()
-        
-        await db.commit()
-        
-        return {
-            "reconciliation_id": reconciliation_id,
-            "matched_transactions": matched_count,
-            "unmatched_transactions": len(transactions) - matched_count,
-            "status": reconciliation.status,
-            "difference": float(reconciliation.difference),
-            "is_balanced": reconciliation.is_balanced
-        }
+    def auto_reconcile(self, db: Session, reconciliation_id: int, user_id: int):
+        """Match statement lines to book transactions and reconcile both sides"""
+        from ..reconciliation_matcher import auto_reconcile
+        return auto_reconcile(db, reconciliation_id, user_id)
     
-    async def import_bank_statement(self, db: AsyncSession, account_id: int, statement_data: dict, user_id: int):
+    def import_bank_statement(self, db: Session, account_id: int, statement_data: dict, user_id: int):
         """Import bank statement data with real processing"""
-        from ..models import BankStatementImport, BankTransaction, BankAccount
-        from sqlalchemy import select, and_
-        from decimal import Decimal
+        from ..statement_import import import_statement, parse_transactions
         
-        # Create import record
-        import_record = BankStatementImport(
-            account_id=account_id,
+        return import_statement(
+            db,
+            account_id,
+            parse_transactions(statement_data.get("transactions", []), statement_data.get("mapping_rules")),
+            user_id,
             statement_date=datetime.strptime(statement_data["statement_date"], "%Y-%m-%d").date(),
             file_name=statement_data.get("file_name"),
-            file_format=statement_data.get("file_format", "csv"),
-            status="processing",
-            created_by=user_id
+            file_format=statement_data.get("file_format", "csv")
         )
-        
-        db.add(import_record)
-        await db.flush()
-        
-        imported_count = 0
-        duplicate_count = 0
-        failed_count = 0
-        
-        try:
-            transactions_data = statement_data.get("transactions", [])
-            import_record.total_transactions = len(transactions_data)
-            
-            for trans_data in transactions_data:
-                try:
-                    # Check for duplicates
-                    existing_query = select(BankTransaction).where(
-                        and_(
-                            BankTransaction.account_id == account_id,
-                            BankTransaction.transaction_date == datetime.strptime(trans_data["date"], "%Y-%m-%d").date(),
-                            BankTransaction.amount == Decimal(str(trans_data["amount"])),
-                            BankTransaction.reference_number == trans_data.get("reference")
-                        )
-                    )
-                    
-                    existing_result = await db.execute(existing_query)
-                    if existing_result.scalar_one_or_none():
-                        duplicate_count += 1
-                        continue
-                    
-                    # Create new transaction
-                    transaction = BankTransaction(
-                        account_id=account_id,
-                        transaction_date=datetime.strptime(trans_data["date"], "%Y-%m-%d").date(),
-                        transaction_type=trans_data.get("type", "deposit" if float(trans_data["amount"]) > 0 else "withdrawal"),
-                        amount=abs(Decimal(str(trans_data["amount"]))),
-                        reference_number=trans_data.get("reference"),
-                        memo=trans_data.get("description"),
-                        payee=trans_data.get("payee"),
-                        status="posted",
-                        created_by=user_id,
-                        updated_by=user_id
-                    )
-                    
-                    db.add(transaction)
-                    imported_count += 1
-                    
-                except Exception as e:
-                    failed_count += 1
-                    continue
-            
-            # Update import record
-            import_record.imported_transactions = imported_count
-            import_record.duplicate_transactions = duplicate_count
-            import_record.failed_transactions = failed_count
-            import_record.status = "completed"
-            
-            await db.commit()
-            
-            return {
-                "account_id": account_id,
-                "imported_transactions": imported_count,
-                "duplicate_transactions": duplicate_count,
-                "new_transactions": imported_count,
-                "failed_transactions": failed_count,
-                "import_date": datetime.utcnow().isoformat()
-            }
-            
-        except Exception as e:
-            import_record.status = "failed"
-            import_record.error_message = str(e)
-            await db.commit()
-            
-            return {
-                "error": "Import failed",
-                "message": str(e)
-            }
     
-    async def get_banking_fees(self, db: AsyncSession, account_id: Optional[int], start_date: Optional[date], end_date: Optional[date]):
+    def get_banking_fees(self, db: Session, account_id: Optional[int], start_date: Optional[date], end_date: Optional[date]):
         """Get banking fees from real data"""
         from ..models import BankingFee
         from sqlalchemy import select, and_, func
@@ -1011,7 +874,7 @@ class ReconciliationService(ReconciliationService):
         
         query = query.order_by(BankingFee.fee_date.desc())
         
-        result = await db.execute(query)
+        result = db.execute(query)
         fees = result.scalars().all()
         
         total_fees = sum(float(fee.amount) for fee in fees if not fee.is_waived)
@@ -1035,7 +898,7 @@ class ReconciliationService(ReconciliationService):
             "fee_breakdown": fee_breakdown
         }
     
-    async def create_banking_fee(self, db: AsyncSession, fee_data: dict, user_id: int):
+    def create_banking_fee(self, db: Session, fee_data: dict, user_id: int):
         """Create banking fee record with real database persistence"""
         from ..models import BankingFee
         from decimal import Decimal
@@ -1063,8 +926,8 @@ class ReconciliationService(ReconciliationService):
                 fee.next_fee_date = fee.fee_date + timedelta(days=365)
         
         db.add(fee)
-        await db.commit()
-        await db.refresh(fee)
+        db.commit()
+        db.refresh(fee)
         
         return {
             "fee_id": fee.id,
@@ -1075,4 +938,3 @@ class ReconciliationService(ReconciliationService):
             "is_recurring": fee.is_recurring,
             "created_at": fee.created_at.isoformat()
         }
->>>>>>> e96df7278ce4216131b6c65d411c0723f4de7f91
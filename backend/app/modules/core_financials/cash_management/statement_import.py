@@ -0,0 +1,571 @@
+"""
+Streaming bank statement import.
+
+Statement files (CSV, OFX/QFX, ISO 20022 CAMT.053 and SWIFT MT940) are
+parsed incrementally into ``StatementLine`` records and imported in chunks
+of IMPORT_CHUNK_SIZE lines, so memory use does not grow with the size of
+the statement.
+
+Each line gets a fingerprint of its date, signed amount, reference and
+description, plus its occurrence number among identical lines of the same
+file, so genuinely repeated lines (two equal fees on one day) are kept while
+re-importing a file is a no-op. Per chunk, duplicates are detected by:
+
+* ``INSERT ... ON CONFLICT (account_id, fingerprint) DO NOTHING`` against
+  previously imported lines, and
+* one query over the chunk's date window for statement rows imported
+  before fingerprints existed, compared on (date, amount, reference).
+  Only rows linked to a statement import are considered, so book
+  transactions entered by hand never suppress a statement line.
+
+Progress counters on the BankStatementImport record are committed after
+every chunk. Because inserts are idempotent, a failed import can simply be
+run again.
+"""
+import csv
+import hashlib
+import io
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import BankStatementImport, BankTransaction, TransactionStatus, TransactionType
+
+# Lines inserted per statement; keeps bind parameters well under driver limits
+IMPORT_CHUNK_SIZE = 2000
+
+# Bytes read from the file at a time by the OFX tokenizer
+READ_BLOCK_SIZE = 64 * 1024
+
+FILE_FORMATS = ("csv", "json", "ofx", "camt053", "mt940")
+
+_FORMAT_ALIASES = {
+    "qfx": "ofx",
+    "camt": "camt053",
+    "camt.053": "camt053",
+    "xml": "camt053",
+    "sta": "mt940",
+    "swift": "mt940",
+}
+
+DEFAULT_MAPPING = {
+    "date": "date",
+    "amount": "amount",
+    "debit": "debit",
+    "credit": "credit",
+    "reference": "reference",
+    "description": "description",
+    "payee": "payee",
+    "type": "type",
+    "check_number": "check_number",
+    "date_format": "%Y-%m-%d",
+}
+
+
+@dataclass
+class StatementLine:
+    transaction_date: date
+    amount: Decimal  # Signed: positive for money in
+    reference: Optional[str] = None
+    description: Optional[str] = None
+    payee: Optional[str] = None
+    transaction_type: Optional[str] = None
+    check_number: Optional[str] = None
+
+
+def normalize_format(file_format: Optional[str], file_name: Optional[str] = None) -> str:
+    """Canonical format name from an explicit format or the file extension."""
+    name = (file_format or "").lower().strip()
+    if not name and file_name and "." in file_name:
+        name = file_name.rsplit(".", 1)[1].lower()
+    name = _FORMAT_ALIASES.get(name, name)
+    if name not in FILE_FORMATS:
+        raise ValueError(f"Unsupported statement format: {file_format or file_name}")
+    return name
+
+
+def _parse_amount(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    text = str(value).strip()
+    if not text:
+        return None
+    negative = text.startswith("(") and text.endswith(")") or text.endswith("-")
+    text = re.sub(r"[^0-9.\-]", "", text.strip("()").rstrip("-"))
+    amount = Decimal(text)
+    return -abs(amount) if negative else amount
+
+
+def _clean(value: Any, length: int) -> Optional[str]:
+    if value is None:
+        return None
+    text = " ".join(str(value).split())
+    return text[:length] or None
+
+
+# CSV and JSON
+
+def _parse_date(text: str, date_format: str) -> date:
+    if date_format == "%Y-%m-%d":
+        # fromisoformat is much cheaper than strptime for the default format
+        try:
+            return date.fromisoformat(text)
+        except ValueError:
+            pass
+    return datetime.strptime(text, date_format).date()
+
+
+def _line_from_mapping(record: Dict[str, Any], mapping: Dict[str, str]) -> Optional[StatementLine]:
+    try:
+        raw_date = record.get(mapping["date"])
+        if isinstance(raw_date, date):
+            transaction_date = raw_date
+        else:
+            transaction_date = _parse_date(str(raw_date).strip(), mapping["date_format"])
+
+        amount = _parse_amount(record.get(mapping["amount"]))
+        if amount is None:
+            credit = _parse_amount(record.get(mapping["credit"])) or Decimal("0")
+            debit = _parse_amount(record.get(mapping["debit"])) or Decimal("0")
+            amount = abs(credit) - abs(debit)
+
+        return StatementLine(
+            transaction_date=transaction_date,
+            amount=amount,
+            reference=_clean(record.get(mapping["reference"]), 100),
+            description=_clean(record.get(mapping["description"]), 1000),
+            payee=_clean(record.get(mapping["payee"]), 255),
+            transaction_type=_clean(record.get(mapping["type"]), 20),
+            check_number=_clean(record.get(mapping["check_number"]), 50)
+        )
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        return None
+
+
+def parse_transactions(
+    records: Iterable[Dict[str, Any]],
+    mapping: Optional[Dict[str, str]] = None
+) -> Iterator[Optional[StatementLine]]:
+    """Statement lines from already decoded records (JSON payloads)."""
+    mapping = {**DEFAULT_MAPPING, **(mapping or {})}
+    for record in records:
+        yield _line_from_mapping(record, mapping)
+
+
+def parse_csv(stream: BinaryIO, mapping: Optional[Dict[str, str]] = None, encoding: str = "utf-8-sig") -> Iterator[Optional[StatementLine]]:
+    """Statement lines from a CSV file with a header row."""
+    text = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    yield from parse_transactions(csv.DictReader(text), mapping)
+
+
+# OFX / QFX
+
+_OFX_TAG_RE = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _ofx_tags(stream: BinaryIO, encoding: str) -> Iterator[tuple]:
+    """(closing, tag, value) tokens of an OFX 1.x (SGML) or 2.x (XML) file."""
+    pending = ""
+    while True:
+        block = stream.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        pending += block.decode(encoding, errors="replace") if isinstance(block, bytes) else block
+        # Keep the last, possibly incomplete, tag for the next block
+        cut = pending.rfind("<")
+        if cut <= 0:
+            continue
+        complete, pending = pending[:cut], pending[cut:]
+        for match in _OFX_TAG_RE.finditer(complete):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+    for match in _OFX_TAG_RE.finditer(pending):
+        yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+
+
+def parse_ofx(stream: BinaryIO, encoding: str = "cp1252") -> Iterator[Optional[StatementLine]]:
+    """Statement lines from the STMTTRN records of an OFX or QFX file."""
+    record: Optional[Dict[str, str]] = None
+    for closing, tag, value in _ofx_tags(stream, encoding):
+        if tag == "STMTTRN":
+            if not closing:
+                record = {}
+                continue
+            if record is not None:
+                yield _ofx_line(record)
+            record = None
+        elif record is not None and not closing and value:
+            record[tag] = value
+    if record:
+        yield _ofx_line(record)
+
+
+def _ofx_line(record: Dict[str, str]) -> Optional[StatementLine]:
+    try:
+        return StatementLine(
+            transaction_date=datetime.strptime(record["DTPOSTED"][:8], "%Y%m%d").date(),
+            amount=_parse_amount(record["TRNAMT"]),
+            reference=_clean(record.get("CHECKNUM") or record.get("REFNUM") or record.get("FITID"), 100),
+            description=_clean(record.get("MEMO"), 1000),
+            payee=_clean(record.get("NAME") or record.get("PAYEE"), 255),
+            check_number=_clean(record.get("CHECKNUM"), 50)
+        )
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        return None
+
+
+# ISO 20022 CAMT.053
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(element: Optional[ET.Element], *path: str) -> Optional[ET.Element]:
+    """Descendant by local element names, ignoring namespaces."""
+    for name in path:
+        if element is None:
+            return None
+        element = next((child for child in element if _local(child.tag) == name), None)
+    return element
+
+
+def _text(element: Optional[ET.Element], *path: str) -> Optional[str]:
+    found = _find(element, *path)
+    return found.text.strip() if found is not None and found.text else None
+
+
+def parse_camt053(stream: BinaryIO) -> Iterator[Optional[StatementLine]]:
+    """Statement lines from the Ntry entries of a CAMT.053 file."""
+    root = None
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = element
+        if event != "end" or _local(element.tag) != "Ntry":
+            continue
+        yield _camt_line(element)
+        # Drop parsed entries so memory stays flat
+        element.clear()
+        root.clear()
+
+
+def _camt_line(entry: ET.Element) -> Optional[StatementLine]:
+    try:
+        amount = Decimal(_text(entry, "Amt"))
+        if _text(entry, "CdtDbtInd") == "DBIT":
+            amount = -amount
+        booked = (
+            _text(entry, "BookgDt", "Dt") or _text(entry, "BookgDt", "DtTm")
+            or _text(entry, "ValDt", "Dt") or _text(entry, "ValDt", "DtTm")
+        )
+        details = _find(entry, "NtryDtls", "TxDtls")
+        end_to_end = _text(details, "Refs", "EndToEndId")
+        if end_to_end == "NOTPROVIDED":
+            end_to_end = None
+
+        remittance = _find(details, "RmtInf")
+        description = " ".join(
+            child.text.strip() for child in (remittance if remittance is not None else [])
+            if _local(child.tag) == "Ustrd" and child.text
+        ) or _text(entry, "AddtlNtryInf")
+
+        counterparty = "Cdtr" if amount < 0 else "Dbtr"
+        payee = _text(details, "RltdPties", counterparty, "Nm") or _text(details, "RltdPties", counterparty, "Pty", "Nm")
+
+        return StatementLine(
+            transaction_date=date.fromisoformat(booked[:10]),
+            amount=amount,
+            reference=_clean(end_to_end or _text(entry, "AcctSvcrRef"), 100),
+            description=_clean(description, 1000),
+            payee=_clean(payee, 255)
+        )
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+
+
+# SWIFT MT940
+
+_MT940_TAG_RE = re.compile(r"^:(\d{2}[A-Z]?):(.*)$")
+_MT940_61_RE = re.compile(
+    r"^(?P<date>\d{6})(?P<entry_date>\d{4})?(?P<mark>R?[CD])(?P<funds>[A-Z])?"
+    r"(?P<amount>\d+,\d*)(?P<type>[NFS][A-Z0-9]{3})(?P<reference>[^/\n]*?)"
+    r"(?://(?P<bank_reference>[^\n]*))?(?:\n(?P<details>.*))?$",
+    re.DOTALL
+)
+
+
+def parse_mt940(stream: BinaryIO, encoding: str = "latin-1") -> Iterator[Optional[StatementLine]]:
+    """Statement lines from the :61: (and following :86:) fields of an MT940 file."""
+    text = io.TextIOWrapper(stream, encoding=encoding, errors="replace")
+    tag, value = None, []
+    transaction: Optional[str] = None
+    information: Optional[str] = None
+
+    def fields():
+        for raw in text:
+            line = raw.rstrip("\r\n")
+            match = _MT940_TAG_RE.match(line)
+            if match:
+                yield match.group(1), match.group(2)
+            elif line.strip() == "-" or line.startswith("{") or line.startswith("-}"):
+                # End of message
+                yield "END", ""
+            else:
+                yield None, line
+        yield "END", ""
+
+    for field_tag, content in fields():
+        if field_tag is None:
+            if tag is not None:
+                value.append(content)
+            continue
+
+        # A new field closes the previous one
+        if tag == "61":
+            if transaction is not None:
+                yield _mt940_line(transaction, information)
+            transaction, information = "\n".join(value), None
+        elif tag == "86" and transaction is not None:
+            information = " ".join(part.strip() for part in value)
+        elif tag is not None and transaction is not None:
+            yield _mt940_line(transaction, information)
+            transaction, information = None, None
+
+        tag, value = field_tag, [content]
+        if field_tag == "END":
+            tag, value = None, []
+
+
+def _mt940_line(field: str, information: Optional[str]) -> Optional[StatementLine]:
+    match = _MT940_61_RE.match(field)
+    if not match:
+        return None
+    try:
+        value_date = datetime.strptime(match.group("date"), "%y%m%d").date()
+        amount = Decimal(match.group("amount").replace(",", "."))
+        # Debits and reversals of credits take money out
+        if match.group("mark") in ("D", "RC"):
+            amount = -amount
+        reference = match.group("reference").strip()
+        if reference in ("", "NONREF"):
+            reference = (match.group("bank_reference") or "").strip()
+        return StatementLine(
+            transaction_date=value_date,
+            amount=amount,
+            reference=_clean(reference, 100),
+            description=_clean(information or match.group("details"), 1000)
+        )
+    except (ValueError, InvalidOperation):
+        return None
+
+
+def parse_statement(
+    stream: BinaryIO,
+    file_format: str,
+    mapping: Optional[Dict[str, str]] = None
+) -> Iterator[Optional[StatementLine]]:
+    """
+    Statement lines of a file, read incrementally. Records that cannot be
+    parsed are yielded as None and counted as failed by the importer.
+    """
+    file_format = normalize_format(file_format)
+    if file_format == "csv":
+        return parse_csv(stream, mapping)
+    if file_format == "ofx":
+        return parse_ofx(stream)
+    if file_format == "camt053":
+        return parse_camt053(stream)
+    if file_format == "mt940":
+        return parse_mt940(stream)
+    raise ValueError("JSON statements are imported from decoded records, see parse_transactions")
+
+
+# Import
+
+def _base_key(line: StatementLine) -> bytes:
+    cents = int((line.amount * 100).to_integral_value())
+    key = "|".join((
+        line.transaction_date.isoformat(),
+        str(cents),
+        (line.reference or "").upper(),
+        (line.description or "").upper(),
+    ))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def fingerprint(base_key: bytes, occurrence: int) -> str:
+    """Fingerprint of the ``occurrence``-th line with a given base key in a file."""
+    return hashlib.sha256(base_key + occurrence.to_bytes(4, "big")).hexdigest()
+
+
+def _legacy_key(transaction_date: date, amount: Decimal, reference: Optional[str]) -> tuple:
+    return transaction_date, abs(Decimal(amount)).quantize(Decimal("0.01")), reference or None
+
+
+def _transaction_type(line: StatementLine) -> TransactionType:
+    """The line's own type when it is a known one, otherwise by direction."""
+    try:
+        return TransactionType(line.transaction_type.lower())
+    except (AttributeError, ValueError):
+        return TransactionType.DEPOSIT if line.amount > 0 else TransactionType.WITHDRAWAL
+
+
+def _insert_ignoring_duplicates(db: Session):
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(BankTransaction).on_conflict_do_nothing(
+        index_elements=["account_id", "fingerprint"]
+    ).returning(BankTransaction.id)
+
+
+def import_statement(
+    db: Session,
+    account_id: int,
+    lines: Iterable[Optional[StatementLine]],
+    user_id: int,
+    statement_date: Optional[date] = None,
+    file_name: Optional[str] = None,
+    file_format: str = "csv",
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Import parsed statement lines into ``account_id`` as posted bank
+    transactions linked to a new BankStatementImport record.
+
+    ``progress`` is called with the running counters after each chunk.
+    """
+    import_record = BankStatementImport(
+        account_id=account_id,
+        statement_date=statement_date or date.today(),
+        file_name=file_name,
+        file_format=file_format,
+        status="processing",
+        total_transactions=0,
+        imported_transactions=0,
+        duplicate_transactions=0,
+        failed_transactions=0,
+        created_by=user_id
+    )
+    db.add(import_record)
+    db.commit()
+
+    occurrences: Counter = Counter()
+    latest_date: Optional[date] = None
+    lines = iter(lines)
+
+    try:
+        while True:
+            chunk = list(islice(lines, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            import_record.total_transactions += len(chunk)
+
+            parsed = [line for line in chunk if line is not None and line.amount is not None]
+            import_record.failed_transactions += len(chunk) - len(parsed)
+            if parsed:
+                first = min(line.transaction_date for line in parsed)
+                last = max(line.transaction_date for line in parsed)
+                latest_date = max(latest_date or last, last)
+
+                # Statement rows imported before fingerprints existed, in the
+                # chunk's date window
+                legacy = Counter(
+                    _legacy_key(*row) for row in db.execute(
+                        select(
+                            BankTransaction.transaction_date,
+                            BankTransaction.amount,
+                            BankTransaction.reference_number
+                        ).where(
+                            BankTransaction.account_id == account_id,
+                            BankTransaction.transaction_date >= first,
+                            BankTransaction.transaction_date <= last,
+                            BankTransaction.statement_import_id.isnot(None),
+                            BankTransaction.fingerprint.is_(None)
+                        )
+                    )
+                )
+
+                rows = []
+                for line in parsed:
+                    base_key = _base_key(line)
+                    occurrence = occurrences[base_key]
+                    occurrences[base_key] += 1
+
+                    legacy_key = _legacy_key(line.transaction_date, line.amount, line.reference)
+                    if legacy[legacy_key] > 0:
+                        legacy[legacy_key] -= 1
+                        import_record.duplicate_transactions += 1
+                        continue
+
+                    rows.append({
+                        "account_id": account_id,
+                        "transaction_date": line.transaction_date,
+                        "transaction_type": _transaction_type(line),
+                        "status": TransactionStatus.POSTED,
+                        "amount": abs(line.amount),
+                        "reference_number": line.reference,
+                        "check_number": line.check_number,
+                        "memo": line.description,
+                        "payee": line.payee,
+                        "is_reconciled": False,
+                        "statement_import_id": import_record.id,
+                        "fingerprint": fingerprint(base_key, occurrence),
+                        "created_by": user_id,
+                        "updated_by": user_id
+                    })
+
+                if rows:
+                    inserted = len((db.execute(_insert_ignoring_duplicates(db), rows)).all())
+                    import_record.imported_transactions += inserted
+                    import_record.duplicate_transactions += len(rows) - inserted
+
+            db.commit()
+            if progress is not None:
+                progress(_counters(import_record))
+
+        if statement_date is None and latest_date is not None:
+            import_record.statement_date = latest_date
+        import_record.status = "completed"
+        db.commit()
+
+        return {
+            "import_id": import_record.id,
+            "account_id": account_id,
+            "total_transactions": import_record.total_transactions,
+            "imported_transactions": import_record.imported_transactions,
+            "duplicate_transactions": import_record.duplicate_transactions,
+            "new_transactions": import_record.imported_transactions,
+            "failed_transactions": import_record.failed_transactions,
+            "import_date": datetime.utcnow().isoformat()
+        }
+
+    except Exception as e:
+        db.rollback()
+        import_record.status = "failed"
+        import_record.error_message = str(e)
+        db.commit()
+
+        return {
+            "error": "Import failed",
+            "message": str(e)
+        }
+
+
+def _counters(import_record: BankStatementImport) -> Dict[str, Any]:
+    return {
+        "import_id": import_record.id,
+        "total_transactions": import_record.total_transactions,
+        "imported_transactions": import_record.imported_transactions,
+        "duplicate_transactions": import_record.duplicate_transactions,
+        "failed_transactions": import_record.failed_transactions,
+    }
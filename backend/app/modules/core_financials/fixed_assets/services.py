@@ -4,17 +4,26 @@ Fixed assets services placeholder (conflicts resolved).
 """
 Fixed Assets Module - Services
 """
+import time
 from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Optional, Dict, Any, Tuple, Union
 from uuid import UUID, uuid4
 
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, desc, text, update, case, cast, Date, Integer, Numeric
+from sqlalchemy import and_, or_, func, desc, text, update, case, cast, Date, Integer, Numeric, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dateutil.relativedelta import relativedelta
 
 from app.core.exceptions import NotFoundError, ValidationError, BusinessRuleError
+from app.crud.base import CRUDBase
+from app.services.accounting.balance_ledger import AccountBalanceLedger
+from app.services.numbering.document_number_service import (
+    DocumentNumberService,
+    last_number_in_use
+)
 from app.core.database import Base
-from . import models, schemas
+from . import depreciation_engine, models, schemas
 from ..accounting.models import GLAccount, JournalEntry, JournalEntryLine, AccountType
 from ..accounting.schemas import JournalEntryCreate, JournalEntryLineCreate
 
@@ -484,102 +493,12 @@ class FixedAssetService:
         if not as_of_date:
             as_of_date = date.today()
         
-        if asset.depreciation_method == schemas.DepreciationMethod.NONE or not asset.useful_life_years:
-            return {
-                'depreciation_method': asset.depreciation_method,
-                'useful_life_years': asset.useful_life_years,
-                'months_depreciated': 0,
-                'months_remaining': 0,
-                'depreciation_to_date': Decimal('0'),
-                'current_book_value': asset.purchase_cost,
-                'depreciation_expense': Decimal('0')
-            }
-        
-        # Get the depreciation start date (either the asset's start date or purchase date)
-        start_date = asset.start_depreciation_date or asset.purchase_date
-        
-        # Calculate months between dates
-        months_since_purchase = (as_of_date.year - start_date.year) * 12 + (as_of_date.month - start_date.month)
-        months_since_purchase = max(0, months_since_purchase)  # Ensure not negative
-        
-        total_months = asset.useful_life_years * 12
-        months_depreciated = min(months_since_purchase, total_months)
-        months_remaining = max(0, total_months - months_depreciated)
-        
-        # Calculate depreciation amounts based on method
-        if asset.depreciation_method == schemas.DepreciationMethod.STRAIGHT_LINE:
-            monthly_depreciation = (asset.purchase_cost - asset.salvage_value) / total_months
-            depreciation_to_date = monthly_depreciation * months_depreciated
-            current_book_value = max(asset.salvage_value, asset.purchase_cost - depreciation_to_date)
-            
-            # Current period depreciation (last month)
-            current_month_depreciation = (
-                monthly_depreciation 
-                if months_depreciated > 0 and months_depreciated <= total_months 
-                else Decimal('0')
-            )
-            
-        elif asset.depreciation_method == schemas.DepreciationMethod.DOUBLE_DECLINING:
-            # Double declining balance method
-            book_value = asset.purchase_cost
-            remaining_life = total_months
-            depreciation_to_date = Decimal('0')
-            
-            for _ in range(months_depreciated):
-                if remaining_life <= 0:
-                    break
-                    
-                # Calculate monthly rate (double the straight-line rate)
-                monthly_rate = (2 / total_months) / 100
-                monthly_depreciation = book_value * monthly_rate
-                
-                # Ensure we don't depreciate below salvage value
-                if book_value - monthly_depreciation < asset.salvage_value:
-                    monthly_depreciation = book_value - asset.salvage_value
-                
-                depreciation_to_date += monthly_depreciation
-                book_value -= monthly_depreciation
-                remaining_life -= 1
-            
-            current_book_value = max(asset.salvage_value, asset.purchase_cost - depreciation_to_date)
-            
-            # For current period, we'd need to calculate just the current month's depreciation
-            # This is a simplification - in practice, you'd want to track each period separately
-            if months_depreciated > 0 and months_depreciated <= total_months:
-                temp_book_value = asset.purchase_cost
-                for _ in range(months_depreciated - 1):
-                    if temp_book_value <= asset.salvage_value:
-                        break
-                    monthly_rate = (2 / total_months) / 100
-                    monthly_depreciation = temp_book_value * monthly_rate
-                    if temp_book_value - monthly_depreciation < asset.salvage_value:
-                        monthly_depreciation = temp_book_value - asset.salvage_value
-                    temp_book_value -= monthly_depreciation
-                
-                current_month_depreciation = min(
-                    temp_book_value - asset.salvage_value,
-                    temp_book_value * (2 / total_months) / 100
-                )
-                if current_month_depreciation < 0:
-                    current_month_depreciation = Decimal('0')
-            else:
-                current_month_depreciation = Decimal('0')
-                
-        else:
-            # For simplicity, default to straight-line if method not implemented
-            monthly_depreciation = (asset.purchase_cost - asset.salvage_value) / total_months
-            depreciation_to_date = monthly_depreciation * months_depreciated
-            current_book_value = max(asset.salvage_value, asset.purchase_cost - depreciation_to_date)
-            current_month_depreciation = monthly_depreciation if months_depreciated > 0 else Decimal('0')
+        position = depreciation_engine.depreciation_as_of(asset, as_of_date)
         
         return {
             'depreciation_method': asset.depreciation_method,
             'useful_life_years': asset.useful_life_years,
-            'months_depreciated': months_depreciated,
-            'months_remaining': months_remaining,
-            'depreciation_to_date': depreciation_to_date.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-            'current_book_value': current_book_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-            'depreciation_expense': current_month_depreciation.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            **position
         }
     
     def generate_depreciation_schedule(
@@ -598,50 +517,75 @@ class FixedAssetService:
             models.DepreciationSchedule.asset_id == asset_id
         ).delete(synchronize_session=False)
         
-        # Generate new schedule
-        start_date = asset.start_depreciation_date or asset.purchase_date
-        total_months = asset.useful_life_years * 12
+        # Generate the whole schedule in one pass
+        rows = depreciation_engine.generate_schedules(
+            [asset],
+            {'created_by_id': user_id, 'updated_by_id': user_id}
+        )
+        schedules = [models.DepreciationSchedule(id=uuid4(), **row) for row in rows]
+        
+        # Bulk insert the schedule
+        self.db.bulk_save_objects(schedules)
+        self.db.commit()
+        
+        return schedules
+    
+    def generate_depreciation_schedules(
+        self,
+        user_id: UUID,
+        asset_ids: Optional[List[UUID]] = None,
+        chunk_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Generate or regenerate depreciation schedules for many assets.
         
-        schedules = []
-        accumulated_depreciation = Decimal('0')
+        Assets are processed in chunks; each chunk replaces its existing
+        schedules with one delete and one bulk insert and is committed on
+        its own, so a policy-wide regeneration never holds every asset or
+        schedule row in memory at once.
         
-        for month in range(1, total_months + 1):
-            period_date = start_date + timedelta(days=30 * month)  # Approximate month
-            fiscal_year = period_date.year
-            period = (period_date.month - 1) // 3 + 1  # Quarter (1-4)
+        Args:
+            user_id: ID of the user regenerating the schedules
+            asset_ids: Optional list of asset IDs (defaults to all depreciable assets)
+            chunk_size: Number of assets per chunk
             
-            # Calculate depreciation for this period
-            dep_calc = self.calculate_depreciation(
-                asset,
-                period_date
-            )
+        Returns:
+            Dict with the number of assets processed and schedule rows written
+        """
+        query = self.db.query(models.Asset.id).filter(
+            models.Asset.depreciation_method != schemas.DepreciationMethod.NONE,
+            models.Asset.useful_life_years > 0
+        )
+        if asset_ids:
+            query = query.filter(models.Asset.id.in_(asset_ids))
+        ids = [row[0] for row in query.order_by(models.Asset.id).all()]
+        
+        extra = {'created_by_id': user_id, 'updated_by_id': user_id}
+        assets_processed = 0
+        rows_written = 0
+        
+        for offset in range(0, len(ids), chunk_size):
+            chunk_ids = ids[offset:offset + chunk_size]
+            assets = self.db.query(models.Asset).filter(models.Asset.id.in_(chunk_ids)).all()
             
-            period_depreciation = dep_calc['depreciation_to_date'] - accumulated_depreciation
-            accumulated_depreciation = dep_calc['depreciation_to_date']
+            self.db.query(models.DepreciationSchedule).filter(
+                models.DepreciationSchedule.asset_id.in_(chunk_ids)
+            ).delete(synchronize_session=False)
             
-            # Create schedule entry
-            schedule = models.DepreciationSchedule(
-                id=uuid4(),
-                asset_id=asset_id,
-                fiscal_year=fiscal_year,
-                period=period,
-                start_date=period_date.replace(day=1),
-                end_date=(period_date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1),
-                depreciation_amount=period_depreciation,
-                accumulated_depreciation=accumulated_depreciation,
-                book_value=dep_calc['current_book_value'],
-                is_posted=False,
-                created_by_id=user_id,
-                updated_by_id=user_id
-            )
+            rows = depreciation_engine.generate_schedules(assets, extra)
+            for row in rows:
+                row['id'] = uuid4()
+            self.db.bulk_insert_mappings(models.DepreciationSchedule, rows)
+            self.db.commit()
+            self.db.expunge_all()
             
-            schedules.append(schedule)
+            assets_processed += len(assets)
+            rows_written += len(rows)
         
-        # Bulk insert the schedule
-        self.db.bulk_save_objects(schedules)
-        self.db.commit()
-        
-        return schedules
+        return {
+            'assets_processed': assets_processed,
+            'schedule_rows': rows_written
+        }
     
     def post_depreciation(
         self,
@@ -720,6 +664,115 @@ class FixedAssetService:
         self.db.commit()
         return posted_schedules
     
+    def post_depreciation_bulk(
+        self,
+        period_date: date,
+        user_id: UUID,
+        company_id: UUID,
+        asset_ids: Optional[List[UUID]] = None,
+        summarize: bool = False,
+        chunk_size: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Post depreciation for a period as a set-based operation.
+        
+        Due schedule rows are resolved for all assets in one query and grouped
+        by the assets' (asset, accumulated depreciation, depreciation expense)
+        account triple. By default each chunk of a group becomes one journal
+        entry; with ``summarize`` the whole run is posted as a single entry
+        with one debit/credit pair per account triple.
+        
+        Journal entries, lines and schedule updates are written with bulk
+        statements and committed per chunk, together with the chunk's deltas
+        to the account balance ledger. Entry numbers come from the
+        ``DEP-YYYYMM`` document sequence. Only unposted rows are selected, so
+        an interrupted run is resumed by calling this method again.
+        
+        Args:
+            period_date: The end date of the period to post depreciation for
+            user_id: ID of the user posting the depreciation
+            company_id: Company the journal entries are posted to
+            asset_ids: Optional list of asset IDs to post depreciation for
+            summarize: Post the whole run as one summarized journal entry
+            chunk_size: Number of schedule rows per transaction
+            
+        Returns:
+            Dict with posting counts, total amount and per-chunk timings
+        """
+        started = time.perf_counter()
+        
+        schedules_generated = self._generate_missing_schedules(period_date, user_id, asset_ids)
+        due = self._get_due_depreciation(period_date, asset_ids)
+        
+        # Group due rows by account triple; rows without a full triple are
+        # marked posted without an entry, as in post_depreciation
+        groups: Dict[Tuple[UUID, UUID, UUID], List[Tuple[UUID, Decimal]]] = {}
+        unaccounted: List[UUID] = []
+        for schedule_id, amount, asset_account_id, accumulated_account_id, expense_account_id in due:
+            key = (asset_account_id, accumulated_account_id, expense_account_id)
+            if all(key):
+                groups.setdefault(key, []).append((schedule_id, Decimal(amount or 0)))
+            else:
+                unaccounted.append(schedule_id)
+        
+        if summarize:
+            batches = [list(groups.items())] if groups else []
+        else:
+            batches = [
+                [(key, rows[offset:offset + chunk_size])]
+                for key, rows in groups.items()
+                for offset in range(0, len(rows), chunk_size)
+            ]
+        
+        chunks = []
+        entries_created = 0
+        schedules_posted = 0
+        total_amount = Decimal('0')
+        entry_numbers = self._next_depreciation_entry_numbers(period_date, len(batches)) if batches else []
+        
+        for batch, entry_number in zip(batches, entry_numbers):
+            chunk_started = time.perf_counter()
+            entry_id, amount = self._insert_depreciation_entry(
+                period_date, company_id, user_id, entry_number, batch
+            )
+            schedule_ids = [schedule_id for _, rows in batch for schedule_id, _ in rows]
+            self._mark_schedules_posted(schedule_ids, user_id, entry_id, chunk_size)
+            self.db.commit()
+            
+            entries_created += 1
+            schedules_posted += len(schedule_ids)
+            total_amount += amount
+            chunks.append({
+                'schedules': len(schedule_ids),
+                'amount': amount,
+                'seconds': round(time.perf_counter() - chunk_started, 4)
+            })
+        
+        for offset in range(0, len(unaccounted), chunk_size):
+            chunk_started = time.perf_counter()
+            schedule_ids = unaccounted[offset:offset + chunk_size]
+            self._mark_schedules_posted(schedule_ids, user_id, None, chunk_size)
+            self.db.commit()
+            
+            schedules_posted += len(schedule_ids)
+            chunks.append({
+                'schedules': len(schedule_ids),
+                'amount': Decimal('0'),
+                'seconds': round(time.perf_counter() - chunk_started, 4)
+            })
+        
+        elapsed = time.perf_counter() - started
+        return {
+            'period_date': period_date,
+            'schedules_generated': schedules_generated,
+            'schedules_posted': schedules_posted,
+            'journal_entries_created': entries_created,
+            'total_amount': total_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            'chunks': chunks,
+            'elapsed_seconds': round(elapsed, 4),
+            'schedules_per_second': round(schedules_posted / elapsed, 2) if elapsed > 0 else None
+        }
+    
     # Helper Methods
     def _create_asset_acquisition_entry(
         self,
@@ -769,235 +822,197 @@ class FixedAssetService:
         user_id: UUID
     ) -> List[models.DepreciationSchedule]:
         """Internal method to generate depreciation schedule for an asset."""
-        # This is a helper method called by other methods to generate the schedule
-        # The actual implementation would be similar to the calculate_depreciation method
-        # but would create DepreciationSchedule records instead of just calculating values
-        return []
+        return self.generate_depreciation_schedule(asset.id, user_id)
+    
+    def _depreciable_assets_query(self, period_date: date, asset_ids: Optional[List[UUID]] = None):
+        """Active, depreciable assets not disposed of before the period."""
+        query = self.db.query(models.Asset.id).filter(
+            models.Asset.depreciation_method != schemas.DepreciationMethod.NONE,
+            models.Asset.useful_life_years > 0,
+            models.Asset.status == schemas.AssetStatus.ACTIVE,
+            or_(
+                models.Asset.disposed_date.is_(None),
+                models.Asset.disposed_date > period_date
+            )
+        )
+        if asset_ids:
+            query = query.filter(models.Asset.id.in_(asset_ids))
+        return query
+    
+    def _generate_missing_schedules(
+        self,
+        period_date: date,
+        user_id: UUID,
+        asset_ids: Optional[List[UUID]] = None
+    ) -> int:
+        """Generate schedules for depreciable assets that have none yet."""
+        has_schedule = self.db.query(models.DepreciationSchedule.id).filter(
+            models.DepreciationSchedule.asset_id == models.Asset.id
+        ).exists()
+        missing = [
+            row[0] for row in
+            self._depreciable_assets_query(period_date, asset_ids).filter(~has_schedule).all()
+        ]
+        if not missing:
+            return 0
+        return self.generate_depreciation_schedules(user_id, asset_ids=missing)['schedule_rows']
+    
+    def _get_due_depreciation(
+        self,
+        period_date: date,
+        asset_ids: Optional[List[UUID]] = None
+    ) -> List[Tuple]:
+        """Unposted schedule rows covering the period, with their asset accounts."""
+        eligible = self._depreciable_assets_query(period_date, asset_ids).subquery()
+        return self.db.query(
+            models.DepreciationSchedule.id,
+            models.DepreciationSchedule.depreciation_amount,
+            models.Asset.asset_account_id,
+            models.Asset.accumulated_depreciation_account_id,
+            models.Asset.depreciation_expense_account_id
+        ).join(
+            models.Asset, models.Asset.id == models.DepreciationSchedule.asset_id
+        ).filter(
+            models.DepreciationSchedule.asset_id.in_(self.db.query(eligible.c.id)),
+            models.DepreciationSchedule.start_date <= period_date,
+            models.DepreciationSchedule.end_date >= period_date,
+            models.DepreciationSchedule.is_posted == False  # noqa: E712
+        ).order_by(models.DepreciationSchedule.id).all()
+    
+    def _insert_depreciation_entry(
+        self,
+        period_date: date,
+        company_id: UUID,
+        user_id: UUID,
+        entry_number: str,
+        batch: List[Tuple[Tuple[UUID, UUID, UUID], List[Tuple[UUID, Decimal]]]]
+    ) -> Tuple[UUID, Decimal]:
+        """
+        Bulk insert one depreciation journal entry for a batch of schedule
+        rows: per account triple, debit depreciation expense and credit
+        accumulated depreciation. The posted lines are applied to the account
+        balance ledger on the entry date, which is the posting day of unified
+        journal entries.
+        """
+        entry_id = uuid4()
+        lines = []
+        ledger_totals: Dict[UUID, List[Decimal]] = {}
+        total = Decimal('0')
+        for (_, accumulated_account_id, expense_account_id), rows in batch:
+            amount = sum((row_amount for _, row_amount in rows), Decimal('0')).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP
+            )
+            description = f"Depreciation for {period_date:%B %Y} ({len(rows)} assets)"
+            lines.append({
+                'id': uuid4(),
+                'journal_entry_id': entry_id,
+                'account_id': expense_account_id,
+                'description': description,
+                'debit_amount': amount,
+                'credit_amount': Decimal('0'),
+                'line_number': len(lines) + 1
+            })
+            lines.append({
+                'id': uuid4(),
+                'journal_entry_id': entry_id,
+                'account_id': accumulated_account_id,
+                'description': description,
+                'debit_amount': Decimal('0'),
+                'credit_amount': amount,
+                'line_number': len(lines) + 1
+            })
+            ledger_totals.setdefault(expense_account_id, [Decimal('0'), Decimal('0')])[0] += amount
+            ledger_totals.setdefault(accumulated_account_id, [Decimal('0'), Decimal('0')])[1] += amount
+            total += amount
+        
+        self.db.bulk_insert_mappings(JournalEntry, [{
+            'id': entry_id,
+            'company_id': company_id,
+            'entry_number': entry_number,
+            'entry_date': period_date,
+            'description': f"Depreciation for {period_date:%B %Y}",
+            'reference': f"DEP-{period_date:%Y%m}",
+            'total_debit': total,
+            'total_credit': total,
+            'total_amount': total,
+            'status': 'posted',
+            'source_module': 'FA',
+            'created_by': str(user_id),
+            'updated_by': str(user_id)
+        }])
+        self.db.bulk_insert_mappings(JournalEntryLine, lines)
+        AccountBalanceLedger(self.db).record_amounts(period_date, ledger_totals)
+        return entry_id, total
+    
+    def _next_depreciation_entry_numbers(self, period_date: date, count: int) -> List[str]:
+        """Allocate ``count`` entry numbers from the period's DEP sequence."""
+        prefix = f"DEP-{period_date:%Y%m}"
+        return DocumentNumberService(self.db).next_numbers(
+            prefix,
+            count,
+            width=5,
+            seed=lambda: last_number_in_use(self.db, JournalEntry.entry_number, prefix)
+        )
+    
+    def _mark_schedules_posted(
+        self,
+        schedule_ids: List[UUID],
+        user_id: UUID,
+        journal_entry_id: Optional[UUID],
+        chunk_size: int
+    ) -> None:
+        """Mark schedule rows as posted with bulk UPDATE statements."""
+        values = {
+            'is_posted': True,
+            'posted_date': date.today(),
+            'journal_entry_id': journal_entry_id,
+            'updated_by_id': user_id,
+            'updated_at': datetime.utcnow()
+        }
+        for offset in range(0, len(schedule_ids), chunk_size):
+            self.db.query(models.DepreciationSchedule).filter(
+                models.DepreciationSchedule.id.in_(schedule_ids[offset:offset + chunk_size])
+            ).update(values, synchronize_session=False)
 
 
 # Service factory function
 def get_fixed_asset_service(db: Session) -> FixedAssetService:
     """Dependency function to get a FixedAssetService instance."""
     return FixedAssetService(db)
-=======
-from typing import List, Optional
-from decimal import Decimal
-from datetime import date, datetime
-from dateutil.relativedelta import relativedelta
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
-from app.crud.base import CRUDBase
-from .models import FixedAsset, DepreciationEntry, MaintenanceRecord, AssetCategory, AssetStatus, DepreciationMethod
-from .schemas import (
-    FixedAssetCreate, FixedAssetUpdate, DepreciationEntryCreate, 
-    MaintenanceRecordCreate, MaintenanceRecordUpdate, AssetCategoryCreate,
-    AssetDisposalRequest, AssetReport
-)
-
-class FixedAssetService(CRUDBase[FixedAsset, FixedAssetCreate, FixedAssetUpdate]):
-    def __init__(self):
-        super().__init__(FixedAsset)
-    
-    async def get_by_asset_number(self, db: AsyncSession, asset_number: str) -> Optional[FixedAsset]:
-        result = await db.execute(select(FixedAsset).where(FixedAsset.asset_number == asset_number))
-        return result.scalar_one_or_none()
-    
-    async def get_assets_by_category(self, db: AsyncSession, category: str) -> List[FixedAsset]:
-        result = await db.execute(
-            select(FixedAsset).where(
-                and_(FixedAsset.category == category, FixedAsset.is_active == True)
-            )
-        )
-        return result.scalars().all()
-    
-    async def get_assets_by_status(self, db: AsyncSession, status: AssetStatus) -> List[FixedAsset]:
-        result = await db.execute(
-            select(FixedAsset).where(
-                and_(FixedAsset.status == status, FixedAsset.is_active == True)
-            )
-        )
-        return result.scalars().all()
-    
-    async def calculate_depreciation(self, asset: FixedAsset, period_date: date) -> Decimal:
-        """Calculate depreciation for a specific period"""
-        if asset.status != AssetStatus.ACTIVE:
-            return Decimal('0')
-        
-        months_since_purchase = (period_date.year - asset.purchase_date.year) * 12 + \
-                               (period_date.month - asset.purchase_date.month)
-        
-        if months_since_purchase <= 0:
-            return Decimal('0')
-        
-        depreciable_amount = asset.purchase_cost - asset.salvage_value
-        
-        if asset.depreciation_method == DepreciationMethod.STRAIGHT_LINE:
-            monthly_depreciation = depreciable_amount / (asset.useful_life_years * 12)
-            return monthly_depreciation
-        
-        elif asset.depreciation_method == DepreciationMethod.DECLINING_BALANCE:
-            # Double declining balance method
-            rate = Decimal('2') / asset.useful_life_years
-            current_book_value = asset.purchase_cost - asset.accumulated_depreciation
-            annual_depreciation = current_book_value * rate
-            monthly_depreciation = annual_depreciation / 12
-            
-            # Ensure we don't depreciate below salvage value
-            remaining_depreciable = current_book_value - asset.salvage_value
-            return min(monthly_depreciation, remaining_depreciable)
-        
-        return Decimal('0')
-    
-    async def create_depreciation_entry(
-        self, 
-        db: AsyncSession, 
-        asset_id: int, 
-        period_date: date
-    ) -> Optional[DepreciationEntry]:
-        """Create a depreciation entry for an asset"""
-        asset = await self.get(db, asset_id)
-        if not asset:
-            return None
-        
-        depreciation_amount = await self.calculate_depreciation(asset, period_date)
-        if depreciation_amount <= 0:
-            return None
-        
-        new_accumulated = asset.accumulated_depreciation + depreciation_amount
-        book_value = asset.purchase_cost - new_accumulated
-        
-        # Create depreciation entry
-        entry = DepreciationEntry(
-            asset_id=asset_id,
-            period_date=period_date,
-            depreciation_amount=depreciation_amount,
-            accumulated_depreciation=new_accumulated,
-            book_value=book_value
-        )
-        
-        db.add(entry)
-        
-        # Update asset's accumulated depreciation
-        asset.accumulated_depreciation = new_accumulated
-        db.add(asset)
-        
-        await db.commit()
-        await db.refresh(entry)
-        return entry
-    
-    async def dispose_asset(
-        self, 
-        db: AsyncSession, 
-        asset_id: int, 
-        disposal_request: AssetDisposalRequest
-    ) -> Optional[FixedAsset]:
-        """Dispose of an asset"""
-        asset = await self.get(db, asset_id)
-        if not asset:
-            return None
-        
-        asset.status = AssetStatus.DISPOSED
-        asset.disposal_date = disposal_request.disposal_date
-        asset.disposal_amount = disposal_request.disposal_amount
-        asset.disposal_reason = disposal_request.disposal_reason
-        
-        db.add(asset)
-        await db.commit()
-        await db.refresh(asset)
-        return asset
-    
-    async def get_asset_report(self, db: AsyncSession) -> AssetReport:
-        """Generate asset summary report"""
-        # Get total counts and values
-        result = await db.execute(
-            select(
-                func.count(FixedAsset.id).label('total_assets'),
-                func.sum(FixedAsset.purchase_cost).label('total_cost'),
-                func.sum(FixedAsset.accumulated_depreciation).label('total_accumulated_depreciation')
-            ).where(FixedAsset.is_active == True)
-        )
-        
-        totals = result.first()
-        total_cost = totals.total_cost or Decimal('0')
-        total_accumulated = totals.total_accumulated_depreciation or Decimal('0')
-        
-        # Assets by category
-        category_result = await db.execute(
-            select(
-                FixedAsset.category,
-                func.count(FixedAsset.id).label('count'),
-                func.sum(FixedAsset.purchase_cost).label('total_cost')
-            ).where(FixedAsset.is_active == True)
-            .group_by(FixedAsset.category)
-        )
-        
-        assets_by_category = [
-            {
-                'category': row.category,
-                'count': row.count,
-                'total_cost': float(row.total_cost or 0)
-            }
-            for row in category_result
-        ]
-        
-        # Assets by status
-        status_result = await db.execute(
-            select(
-                FixedAsset.status,
-                func.count(FixedAsset.id).label('count')
-            ).where(FixedAsset.is_active == True)
-            .group_by(FixedAsset.status)
-        )
-        
-        assets_by_status = [
-            {
-                'status': row.status.value,
-                'count': row.count
-            }
-            for row in status_result
-        ]
-        
-        return AssetReport(
-            total_assets=totals.total_assets or 0,
-            total_cost=total_cost,
-            total_accumulated_depreciation=total_accumulated,
-            total_book_value=total_cost - total_accumulated,
-            assets_by_category=assets_by_category,
-            assets_by_status=assets_by_status
-        )
-
-class MaintenanceService(CRUDBase[MaintenanceRecord, MaintenanceRecordCreate, MaintenanceRecordUpdate]):
-    def __init__(self):
-        super().__init__(MaintenanceRecord)
-    
-    async def get_by_asset(self, db: AsyncSession, asset_id: int) -> List[MaintenanceRecord]:
-        result = await db.execute(
-            select(MaintenanceRecord)
-            .where(MaintenanceRecord.asset_id == asset_id)
-            .order_by(MaintenanceRecord.scheduled_date.desc())
-        )
-        return result.scalars().all()
-    
-    async def get_upcoming_maintenance(self, db: AsyncSession, days_ahead: int = 30) -> List[MaintenanceRecord]:
-        future_date = date.today() + relativedelta(days=days_ahead)
-        result = await db.execute(
-            select(MaintenanceRecord)
-            .where(
-                and_(
-                    MaintenanceRecord.scheduled_date <= future_date,
-                    MaintenanceRecord.scheduled_date >= date.today(),
-                    MaintenanceRecord.status == 'scheduled'
-                )
-            )
-            .order_by(MaintenanceRecord.scheduled_date)
-        )
-        return result.scalars().all()
-
-class AssetCategoryService(CRUDBase[AssetCategory, AssetCategoryCreate, None]):
-    def __init__(self):
-        super().__init__(AssetCategory)
-    
-    async def get_by_name(self, db: AsyncSession, name: str) -> Optional[AssetCategory]:
-        result = await db.execute(select(AssetCategory).where(AssetCategory.name == name))
-        return result.scalar_one_or_none()
->>>>>>> e96df7278ce4216131b6c65d411c0723f4de7f91
+
+
+class MaintenanceService(CRUDBase[models.MaintenanceRecord, schemas.MaintenanceRecordCreate, schemas.MaintenanceRecordUpdate]):
+    def __init__(self):
+        super().__init__(models.MaintenanceRecord)
+    
+    async def get_by_asset(self, db: AsyncSession, asset_id: int) -> List[models.MaintenanceRecord]:
+        result = await db.execute(
+            select(models.MaintenanceRecord)
+            .where(models.MaintenanceRecord.asset_id == asset_id)
+            .order_by(models.MaintenanceRecord.scheduled_date.desc())
+        )
+        return result.scalars().all()
+    
+    async def get_upcoming_maintenance(self, db: AsyncSession, days_ahead: int = 30) -> List[models.MaintenanceRecord]:
+        future_date = date.today() + relativedelta(days=days_ahead)
+        result = await db.execute(
+            select(models.MaintenanceRecord)
+            .where(
+                and_(
+                    models.MaintenanceRecord.scheduled_date <= future_date,
+                    models.MaintenanceRecord.scheduled_date >= date.today(),
+                    models.MaintenanceRecord.status == 'scheduled'
+                )
+            )
+            .order_by(models.MaintenanceRecord.scheduled_date)
+        )
+        return result.scalars().all()
+
+
+class AssetCategoryService(CRUDBase[models.AssetCategory, schemas.AssetCategoryCreate, None]):
+    def __init__(self):
+        super().__init__(models.AssetCategory)
+    
+    async def get_by_name(self, db: AsyncSession, name: str) -> Optional[models.AssetCategory]:
+        result = await db.execute(select(models.AssetCategory).where(models.AssetCategory.name == name))
+        return result.scalar_one_or_none()
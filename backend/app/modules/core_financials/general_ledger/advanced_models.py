@@ -3,7 +3,7 @@ Advanced General Ledger Models
 Multi-dimensional COA, real-time processing, and comprehensive audit trails
 """
 
-from sqlalchemy import Column, Integer, String, Text, Decimal, DateTime, Date, Boolean, ForeignKey, Enum as SQLEnum, JSON, Index, CheckConstraint
+from sqlalchemy import Column, Integer, String, Text, Numeric as Decimal, DateTime, Date, Boolean, ForeignKey, Enum as SQLEnum, JSON, Index, CheckConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
@@ -3,6 +3,7 @@ Advanced General Ledger Services
 Real-time processing, automated controls, and intelligent reconciliation
 """
 
+import asyncio
 from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, desc, asc, text
@@ -16,6 +17,7 @@ from .advanced_models import (
     GLPeriod, GLAccountBalance, GLIntegrationLog, GLRecurringTemplate,
     AccountType, JournalEntryStatus, JournalEntryType, PeriodStatus
 )
+from app.services.currency.exchange_service import get_exchange_service
 
 @dataclass
 class TrialBalanceItem:
@@ -667,10 +669,43 @@ class AdvancedGLService:
         # Implementation for accruals
         pass
     
-    def _process_fx_revaluation(self, period_id: int):
-        """Process foreign exchange revaluation"""
-        # Implementation for FX revaluation
-        pass
+    def _process_fx_revaluation(self, period_id: int) -> Dict[str, Any]:
+        """
+        Revalue the period's foreign currency balances at the closing rate.
+        
+        Every balance held in a currency other than the base currency is
+        converted at the period end date in one convert_many call, and its
+        base currency ending balance is set to the converted amount.
+        """
+        period = self.db.query(GLPeriod).filter(GLPeriod.id == period_id).first()
+        if not period:
+            raise ValueError("Period not found")
+        
+        exchange_service = get_exchange_service(self.db)
+        balances = self.db.query(GLAccountBalance).filter(
+            and_(
+                GLAccountBalance.period_id == period_id,
+                GLAccountBalance.currency_code != exchange_service.base_currency
+            )
+        ).all()
+        
+        adjustment = Decimal('0')
+        if balances:
+            converted, _ = asyncio.run(exchange_service.convert_many(
+                [balance.ending_balance_debit - balance.ending_balance_credit for balance in balances],
+                [balance.currency_code for balance in balances],
+                exchange_service.base_currency,
+                [period.end_date] * len(balances)
+            ))
+            for balance, amount in zip(balances, converted):
+                adjustment += amount - (balance.base_currency_ending_balance or Decimal('0'))
+                balance.base_currency_ending_balance = amount
+        
+        return {
+            'balances_revalued': len(balances),
+            'base_currency': exchange_service.base_currency,
+            'adjustment': adjustment
+        }
     
     def _validate_period_reconciliations(self, period_id: int) -> List[str]:
         """Validate all reconciliations for period"""
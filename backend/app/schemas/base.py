@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, List, Optional
 from pydantic import BaseModel, ConfigDict
 
 class BaseSchema(BaseModel):
@@ -15,4 +15,11 @@ class AuditResponseSchema(BaseSchema):
     id: int
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
-    is_active: bool = True
\ No newline at end of file
+    is_active: bool = True
+
+class PaginatedResponse(BaseModel):
+    items: List[Any]
+    total: int
+    page: int
+    pages: int
+    size: int
\ No newline at end of file
@@ -3,7 +3,7 @@ Schemas for period close operations.
 """
 from datetime import date, datetime
 from enum import Enum
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from uuid import UUID
 
 from pydantic import BaseModel, Field, validator
@@ -67,11 +67,13 @@ class PeriodCloseTaskResponse(BaseModel):
     """Schema for period close task response."""
     id: UUID = Field(..., description="Task ID")
     period_close_id: UUID = Field(..., description="Parent close ID")
+    task_key: Optional[str] = Field(None, description="Task key in the close DAG")
     task_name: str = Field(..., description="Task name")
     task_description: Optional[str] = Field(None, description="Task description")
     task_order: int = Field(..., description="Task order")
     is_required: bool = Field(..., description="Whether task is required")
     is_automated: bool = Field(..., description="Whether task is automated")
+    depends_on: Optional[List[str]] = Field(None, description="Keys of upstream tasks")
     status: CloseTaskStatus = Field(..., description="Task status")
     started_at: Optional[datetime] = Field(None, description="Task start timestamp")
     completed_at: Optional[datetime] = Field(None, description="Task completion timestamp")
@@ -79,6 +81,9 @@ class PeriodCloseTaskResponse(BaseModel):
     completed_by: Optional[UUID] = Field(None, description="User who completed task")
     result_message: Optional[str] = Field(None, description="Task result message")
     error_message: Optional[str] = Field(None, description="Task error message")
+    output: Optional[Dict[str, Any]] = Field(None, description="Checkpointed task output")
+    attempt_count: int = Field(0, description="Number of times the task has run")
+    duration_ms: Optional[int] = Field(None, description="Execution time of the last run")
     created_at: datetime = Field(..., description="Creation timestamp")
 
     class Config:
@@ -102,4 +107,31 @@ class PeriodCloseResponse(BaseModel):
     created_at: datetime = Field(..., description="Creation timestamp")
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class PeriodCloseRunRequest(BaseModel):
+    """Schema for running the automated tasks of a close."""
+    rerun_tasks: List[str] = Field([], description="Task keys to rerun, with everything downstream of them")
+
+
+class CloseTaskTelemetry(BaseModel):
+    """Duration of one close task."""
+    task_key: str = Field(..., description="Task key")
+    task_name: str = Field(..., description="Task name")
+    status: CloseTaskStatus = Field(..., description="Task status")
+    depends_on: List[str] = Field([], description="Keys of upstream tasks")
+    attempt_count: int = Field(0, description="Number of times the task has run")
+    started_at: Optional[datetime] = Field(None, description="Task start timestamp")
+    completed_at: Optional[datetime] = Field(None, description="Task completion timestamp")
+    duration_seconds: Optional[float] = Field(None, description="Time spent executing")
+    elapsed_seconds: Optional[float] = Field(None, description="Time from upstream completion to completion")
+    on_critical_path: bool = Field(False, description="Whether the task is on the critical path")
+
+
+class PeriodCloseTelemetryResponse(BaseModel):
+    """Schema for period close telemetry."""
+    period_close_id: UUID = Field(..., description="Close ID")
+    tasks: List[CloseTaskTelemetry] = Field([], description="Per-task durations")
+    critical_path: List[str] = Field([], description="Task keys on the critical path")
+    critical_path_seconds: float = Field(0, description="Length of the critical path")
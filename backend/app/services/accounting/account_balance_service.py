@@ -1,593 +1,30 @@
 """
-Account balance service placeholder.
-"""
-from datetime import datetime, timedelta, date
-from datetime import datetime, timedelta, date
-from typing import Dict, List, Optional, Tuple, Union, Any
-from typing import Dict, List, Optional, Tuple, Union, Any
-
-from ..exceptions import (
-from ..exceptions import (
-from ..models import (
-from ..models import (
-from core.database import SessionLocal
-from dateutil.relativedelta import relativedelta
-from dateutil.relativedelta import relativedelta
-from decimal import Decimal, ROUND_HALF_UP
-from decimal import Decimal, ROUND_HALF_UP
-from sqlalchemy import and_, case, func, or_, select, text
-from sqlalchemy import and_, case, func, or_, select, text
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy.orm import Session, aliased
-from uuid import UUID
-from uuid import UUID
-
-from app.core.database import SessionLocal
-
-"""
-Paksa Financial System 
-Account Balance Service
-
-This module provides services for managing and calculating account balances,
-including real-time and historical balance calculations.
-"""
-
-
-    AccountNotFoundException,
-    InvalidDateRangeException,
-    PeriodAlreadyClosedException,
-    PeriodNotClosedException,
-    InvalidBalancePeriodException,
-)
-    Account,
-    AccountBalance,
-    AccountType,
-    JournalEntry,
-    JournalEntryLine,
-    JournalEntryStatus,
-)
-
-
-class AccountBalanceService:
-    """Service for managing account balances and related operations."""
-    
-    def __init__(self, db: Optional[Session] = None):
-        self.db = db or SessionLocal()
-    
-    def __enter__(self):
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.db and not self.db.bind:
-            self.db.close()
-    
-    def get_account(self, account_id: UUID) -> Account:
-        account = self.db.get(Account, account_id)
-        if not account:
-            raise AccountNotFoundException(account_id)
-        return account
-    
-    def get_balance_as_of(self, account_id: UUID, as_of_date: datetime = None) -> Decimal:
-        """
-        Get the balance of an account as of a specific date.
-        
-        This method calculates the balance by considering:
-        1. The most recent balance snapshot (if any)
-        2. All transactions after the snapshot date up to as_of_date
-        
-        Args:
-            account_id: The ID of the account
-            as_of_date: The date to calculate the balance for (defaults to now)
-            
-        Returns:
-            Decimal: The account balance as of the specified date
-            
-        Raises:
-            AccountNotFoundException: If the account doesn't exist
-            InvalidDateRangeException: If the date range is invalid
-        """
-        if as_of_date is None:
-            as_of_date = datetime.utcnow()
-            
-        # Get the account to verify it exists and get its type
-        account = self.get_account(account_id)
-        
-        # Find the most recent balance snapshot before or on as_of_date
-        latest_snapshot = self.db.query(AccountBalance).filter(
-            AccountBalance.account_id == account_id,
-            AccountBalance.period_end <= as_of_date
-        ).order_by(AccountBalance.period_end.desc()).first()
-        
-        # Calculate the starting point for transaction aggregation
-        if latest_snapshot:
-            start_date = latest_snapshot.period_end
-            running_balance = latest_snapshot.closing_balance
-        else:
-            # No snapshot found, start from the beginning of time
-            start_date = datetime.min
-            running_balance = Decimal('0.00')
-        
-        # Calculate the net effect of all transactions between start_date and as_of_date
-        # This is a simplified version - in a real implementation, you'd want to optimize this
-        # for performance, especially for accounts with many transactions
-        query = self.db.query(
-            func.sum(
-                case(
-                    [
-                        (JournalEntryLine.is_debit == True, JournalEntryLine.amount),  # noqa: E712
-                        (JournalEntryLine.is_debit == False, -JournalEntryLine.amount)  # noqa: E712
-                    ],
-                    else_=0
-                )
-            ).label('net_effect')
-        ).join(
-            JournalEntry,
-            JournalEntry.id == JournalEntryLine.journal_entry_id
-        ).filter(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.posted_at > start_date,
-            JournalEntry.posted_at <= as_of_date
-        )
-        
-        net_effect = query.scalar() or Decimal('0.00')
-        balance = running_balance + net_effect
-        
-        # For contra accounts, we need to flip the sign
-        if account.is_contra:
-            balance = -balance
-            
-        return balance.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        
-    def get_balance_for_period(
-        self,
-        account_id: UUID,
-        start_date: datetime,
-        end_date: Optional[datetime] = None
-    ) -> Dict[str, Any]:
-        """Get Balance For Period."""
-        """
-        Get detailed balance information for an account over a specific period.
-        
-        Args:
-            account_id: The ID of the account
-            start_date: Start of the period
-            end_date: End of the period (defaults to now)
-            
-        Returns:
-            Dict containing:
-                - opening_balance: Balance at start_date
-                - closing_balance: Balance at end_date
-                - period_debit: Total debits during the period
-                - period_credit: Total credits during the period
-                - transactions: List of transactions in the period
-                
-        Raises:
-            AccountNotFoundException: If the account doesn't exist
-            InvalidDateRangeException: If the date range is invalid
-        """
-        if end_date is None:
-            end_date = datetime.utcnow()
-            
-        if start_date > end_date:
-            raise InvalidDateRangeException("Start date must be before end date")
-            
-        # Get the account to verify it exists and get its type
-        account = self.get_account(account_id)
-        
-        # Get the opening balance (as of start_date)
-        opening_balance = self.get_balance_as_of(account_id, start_date)
-        
-        # Get the closing balance (as of end_date)
-        closing_balance = self.get_balance_as_of(account_id, end_date)
-        
-        # Get the period transactions
-        period_transactions = self.db.query(
-            JournalEntryLine,
-            JournalEntry.reference,
-            JournalEntry.entry_date,
-            JournalEntry.posted_at
-        ).join(
-            JournalEntry,
-            JournalEntry.id == JournalEntryLine.journal_entry_id
-        ).filter(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.posted_at > start_date,
-            JournalEntry.posted_at <= end_date
-        ).order_by(JournalEntry.posted_at).all()
-        
-        # Calculate period totals
-        period_debit = Decimal('0.00')
-        period_credit = Decimal('0.00')
-        
-        transactions = []
-        for line, ref, entry_date, posted_at in period_transactions:
-            if line.is_debit:
-                period_debit += line.amount
-            else:
-                period_credit += line.amount
-                
-            transactions.append({
-                'id': str(line.id),
-                'journal_entry_id': str(line.journal_entry_id),
-                'reference': ref,
-                'entry_date': entry_date.isoformat(),
-                'posted_at': posted_at.isoformat(),
-                'description': line.description,
-                'amount': float(line.amount),
-                'is_debit': line.is_debit,
-                'entity_type': line.entity_type,
-                'entity_id': str(line.entity_id) if line.entity_id else None,
-            })
-        
-        return {
-            'account_id': str(account_id),
-            'account_code': account.code,
-            'account_name': account.name,
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat(),
-            'opening_balance': float(opening_balance),
-            'closing_balance': float(closing_balance),
-            'period_debit': float(period_debit),
-            'period_credit': float(period_credit),
-            'transactions': transactions
-        }
-        
-    def close_period(self, period_end: datetime) -> List[AccountBalance]:
-        """
-        Close an accounting period by creating balance records for all accounts.
-        
-        Args:
-            period_end: The end date of the period to close
-            
-        Returns:
-            List of created AccountBalance records
-            
-        Raises:
-            PeriodAlreadyClosedException: If the period is already closed
-            InvalidDateRangeException: If the period is invalid
-        """
-        # Check if the period is already closed
-        existing_balance = self.db.query(AccountBalance).filter(
-            func.date(AccountBalance.period_end) == period_end.date()
-        ).first()
-        
-        if existing_balance:
-            raise PeriodAlreadyClosedException(f"Period ending {period_end.date()} is already closed")
-            
-        # Find the previous period end date
-        prev_period = self.db.query(
-            func.max(AccountBalance.period_end)
-        ).filter(
-            AccountBalance.period_end < period_end
-        ).scalar()
-        
-        # Get all accounts
-        accounts = self.db.query(Account).filter(
-            Account.status == 'active'
-        ).all()
-        
-        balances = []
-        for account in accounts:
-            # Get the closing balance of the previous period
-            if prev_period:
-                prev_balance = self.db.query(AccountBalance).filter(
-                    AccountBalance.account_id == account.id,
-                    AccountBalance.period_end == prev_period
-                ).first()
-                
-                if prev_balance:
-                    opening_balance = prev_balance.closing_balance
-                else:
-                    # No previous balance, calculate from beginning of time
-                    opening_balance = self.get_balance_as_of(account.id, prev_period)
-            else:
-                # First period, start from 0
-                opening_balance = Decimal('0.00')
-            
-            # Calculate period activity
-            period_activity = self.db.query(
-                func.sum(
-                    case(
-                        [
-                            (JournalEntryLine.is_debit == True, JournalEntryLine.amount),  # noqa: E712
-                            (JournalEntryLine.is_debit == False, -JournalEntryLine.amount)  # noqa: E712
-                        ],
-                        else_=0
-                    )
-                )
-            ).join(
-                JournalEntry,
-                JournalEntry.id == JournalEntryLine.journal_entry_id
-            ).filter(
-                JournalEntryLine.account_id == account.id,
-                JournalEntry.status == JournalEntryStatus.POSTED,
-                JournalEntry.posted_at > (prev_period or datetime.min),
-                JournalEntry.posted_at <= period_end
-            ).scalar() or Decimal('0.00')
-            
-            # For contra accounts, flip the sign of the activity
-            if account.is_contra:
-                period_activity = -period_activity
-                
-            closing_balance = opening_balance + period_activity
-            
-            # Calculate period debit/credit totals
-            period_debit, period_credit = self.db.query(
-                func.sum(
-                    case([(JournalEntryLine.is_debit == True, JournalEntryLine.amount)], else_=0)  # noqa: E712
-                ),
-                func.sum(
-                    case([(JournalEntryLine.is_debit == False, JournalEntryLine.amount)], else_=0)  # noqa: E712
-                )
-            ).join(
-                JournalEntry,
-                JournalEntry.id == JournalEntryLine.journal_entry_id
-            ).filter(
-                JournalEntryLine.account_id == account.id,
-                JournalEntry.status == JournalEntryStatus.POSTED,
-                JournalEntry.posted_at > (prev_period or datetime.min),
-                JournalEntry.posted_at <= period_end
-            ).first() or (Decimal('0.00'), Decimal('0.00'))
-            
-            # Create the balance record
-            balance = AccountBalance(
-                account_id=account.id,
-                period_start=prev_period or datetime.min,
-                period_end=period_end,
-                opening_balance=opening_balance,
-                closing_balance=closing_balance,
-                period_debit=period_debit or Decimal('0.00'),
-                period_credit=period_credit or Decimal('0.00'),
-                is_closed=True
-            )
-            
-            self.db.add(balance)
-            balances.append(balance)
-        
-        # Commit all the new balance records
-        self.db.commit()
-        
-        return balances
-
-        """
-        if as_of_date is None:
-            as_of_date = datetime.utcnow()
-            
-        # Get the account
-        account = self.get_account(account_id)
-        
-        # Calculate balance from journal entries
-        stmt = select(
-            func.coalesce(
-                func.sum(
-                    case(
-                        [(JournalEntryLine.debit > 0, JournalEntryLine.debit)],
-                        else_=-JournalEntryLine.credit
-                    )
-                ),
-                0
-            )
-        ).join(
-            JournalEntryLine.journal_entry
-        ).where(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.entry_date <= as_of_date
-        )
-        
-        balance = self.db.scalar(stmt) or Decimal('0.00')
-        
-        # If this is a contra account, invert the balance
-        if account.is_contra:
-            balance = -balance
-            
-        return balance
-    
-    def get_balance_as_of(self, account_id: UUID, as_of_date: datetime = None) -> Decimal:
-        """
-        Get the balance of an account as of a specific date, using historical balances if available.
-        
-        Args:
-            account_id: UUID of the account
-            as_of_date: The date to get the balance for (defaults to now)
-            
-        Returns:
-            The account balance as of the specified date
-        """
-        if as_of_date is None:
-            as_of_date = datetime.utcnow()
-        
-        # First try to find a historical balance record
-        stmt = select(AccountBalance).where(
-            AccountBalance.account_id == account_id,
-            AccountBalance.period_start <= as_of_date,
-            or_(
-                AccountBalance.period_end.is_(None),
-                AccountBalance.period_end > as_of_date
-            )
-        ).order_by(AccountBalance.period_start.desc()).limit(1)
-        
-        balance_record = self.db.scalar(stmt)
-        
-        if balance_record:
-            return balance_record.closing_balance
-            
-        # If no historical balance found, calculate from journal entries
-        return self.calculate_account_balance(account_id, as_of_date)
-    
-    def get_balance_for_period(
-        self, 
-        account_id: UUID, 
-        start_date: datetime, 
-        end_date: datetime = None
-    ) -> Dict[str, Union[Decimal, datetime]]:
-        """Get Balance For Period."""
-        """
-        Get the balance details for an account over a specific period.
-        
-        Args:
-            account_id: The ID of the account
-            start_date: The start of the period
-            end_date: The end of the period (defaults to now)
-            
-        Returns:
-            A dictionary containing balance information for the period
-        """
-        if end_date is None:
-            end_date = datetime.utcnow()
-            
-        if start_date > end_date:
-            raise InvalidDateRangeException("Start date cannot be after end date")
-        
-        # Get the account
-        account = self.get_account(account_id)
-        
-        # Get opening balance (as of the day before the period starts)
-        opening_balance = self.get_balance_as_of(account_id, start_date - timedelta(seconds=1))
-        
-        # Get period activity
-        stmt = select(
-            func.coalesce(func.sum(JournalEntryLine.debit), 0).label('total_debit'),
-            func.coalesce(func.sum(JournalEntryLine.credit), 0).label('total_credit')
-        ).join(
-            JournalEntryLine.journal_entry
-        ).where(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.entry_date >= start_date,
-            JournalEntry.entry_date <= end_date
-        )
-        
-        result = self.db.execute(stmt).first()
-        period_debit = result[0] if result[0] is not None else Decimal('0.00')
-        period_credit = result[1] if result[1] is not None else Decimal('0.00')
-        
-        # Calculate net activity based on normal balance
-        if account.normal_balance == 'debit':
-            period_net = period_debit - period_credit
-        else:
-            period_net = period_credit - period_debit
-            
-        closing_balance = opening_balance + period_net
-        
-        return {
-            'account_id': account_id,
-            'account_code': account.code,
-            'account_name': account.name,
-            'opening_balance': opening_balance,
-            'period_debit': period_debit,
-            'period_credit': period_credit,
-            'period_net': period_net,
-            'closing_balance': closing_balance,
-            'start_date': start_date,
-            'end_date': end_date
-        }
-    
-    def create_periodic_balance(
-        self,
-        account_id: UUID,
-        period_start: datetime,
-        period_end: datetime = None,
-        commit: bool = True
-    ) -> AccountBalance:
-        """Create Periodic Balance."""
-        """
-        Create a periodic balance record for an account.
-        
-        Args:
-            account_id: The ID of the account
-            period_start: The start of the period
-            period_end: The end of the period (optional)
-            commit: Whether to commit the transaction (default: True)
-            
-        Returns:
-            The created AccountBalance record
-        """
-        # Get the account
-        account = self.get_account(account_id)
-        
-        # Calculate balances
-        balance_data = self.get_balance_for_period(account_id, period_start, period_end)
-        
-        # Create the balance record
-        balance = AccountBalance(
-            account_id=account_id,
-            period_start=period_start,
-            period_end=period_end,
-            opening_balance=balance_data['opening_balance'],
-            period_debit=balance_data['period_debit'],
-            period_credit=balance_data['period_credit'],
-            closing_balance=balance_data['closing_balance']
-        )
-        
-        self.db.add(balance)
-        
-        if commit:
-            self.db.commit()
-            self.db.refresh(balance)
-        
-        return balance
-    
-    def close_period(
-        self,
-        period_end: datetime,
-        commit: bool = True
-    ) -> List[AccountBalance]:
-        """Close Period."""
-        """
-        Close a period by creating balance records for all accounts.
-        
-        Args:
-            period_end: The end of the period to close
-            commit: Whether to commit the transaction (default: True)
-            
-        Returns:
-            A list of created AccountBalance records
-        """
-        # Find the previous period end to use as our period start
-        stmt = select(func.max(AccountBalance.period_end)).where(
-            AccountBalance.period_end < period_end
-        )
-        
-        period_start = self.db.scalar(stmt) or datetime.min.replace(tzinfo=period_end.tzinfo)
-        
-        # Get all active accounts
-        accounts = self.db.query(Account).filter(Account.status == 'active').all()
-        
-        balances = []
-        for account in accounts:
-            balance = self.create_periodic_balance(
-                account_id=account.id,
-                period_start=period_start,
-                period_end=period_end,
-                commit=False
-            )
-            balances.append(balance)
-        
-        if commit and balances:
-            self.db.commit()
-            for balance in balances:
-                self.db.refresh(balance)
-        
-        return balances
-=======
-"""
 Paksa Financial System 
 Account Balance Service
 
 This module provides services for managing and calculating account balances,
 including real-time and historical balance calculations.
 """
+from collections import defaultdict
+from datetime import datetime, timedelta, date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterator, List, Optional, Tuple, Union, Any
+from uuid import UUID
+
+from sqlalchemy import and_, case, func, or_, select, text
+from sqlalchemy.orm import Session, aliased
 
+from app.core.database import SessionLocal
 
+from ..exceptions import (
     AccountNotFoundException,
     InvalidDateRangeException,
     PeriodAlreadyClosedException,
     PeriodNotClosedException,
     InvalidBalancePeriodException,
 )
+from .balance_ledger import AccountBalanceLedger
+from ..models import (
     Account,
     AccountBalance,
     AccountType,
@@ -602,6 +39,7 @@ class AccountBalanceService:
     
     def __init__(self, db: Optional[Session] = None):
         self.db = db or SessionLocal()
+        self.ledger = AccountBalanceLedger(self.db)
     
     def __enter__(self):
         return self
@@ -621,8 +59,9 @@ class AccountBalanceService:
         Get the balance of an account as of a specific date.
         
         This method calculates the balance by considering:
-        1. The most recent balance snapshot (if any)
-        2. All transactions after the snapshot date up to as_of_date
+        1. The most recent closed-period balance snapshot (if any)
+        2. The movement since the snapshot, read from the per-day balance
+           ledger maintained on posting and voiding
         
         Args:
             account_id: The ID of the account
@@ -641,52 +80,63 @@ class AccountBalanceService:
         # Get the account to verify it exists and get its type
         account = self.get_account(account_id)
         
-        # Find the most recent balance snapshot before or on as_of_date
-        latest_snapshot = self.db.query(AccountBalance).filter(
-            AccountBalance.account_id == account_id,
-            AccountBalance.period_end <= as_of_date
-        ).order_by(AccountBalance.period_end.desc()).first()
-        
-        # Calculate the starting point for transaction aggregation
-        if latest_snapshot:
-            start_date = latest_snapshot.period_end
-            running_balance = latest_snapshot.closing_balance
-        else:
-            # No snapshot found, start from the beginning of time
-            start_date = datetime.min
-            running_balance = Decimal('0.00')
-        
-        # Calculate the net effect of all transactions between start_date and as_of_date
-        # This is a simplified version - in a real implementation, you'd want to optimize this
-        # for performance, especially for accounts with many transactions
-        query = self.db.query(
-            func.sum(
-                case(
-                    [
-                        (JournalEntryLine.is_debit == True, JournalEntryLine.amount),  # noqa: E712
-                        (JournalEntryLine.is_debit == False, -JournalEntryLine.amount)  # noqa: E712
-                    ],
-                    else_=0
-                )
-            ).label('net_effect')
-        ).join(
-            JournalEntry,
-            JournalEntry.id == JournalEntryLine.journal_entry_id
-        ).filter(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.posted_at > start_date,
-            JournalEntry.posted_at <= as_of_date
-        )
-        
-        net_effect = query.scalar() or Decimal('0.00')
-        balance = running_balance + net_effect
+        balance = self._net_balances_as_of([account_id], as_of_date, {account_id: account.is_contra})[account_id]
         
         # For contra accounts, we need to flip the sign
         if account.is_contra:
             balance = -balance
             
         return balance.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    def _net_balances_as_of(
+        self,
+        account_ids: List[UUID],
+        as_of_date: datetime,
+        contra: Dict[UUID, bool]
+    ) -> Dict[UUID, Decimal]:
+        """
+        Net debit balances as of a point in time, anchored on each account's
+        latest closed-period snapshot at or before it.
+        
+        A closed period keeps the closing balance of its snapshot; only the
+        ledger movement after the snapshot's period end is added to it.
+        """
+        balances = self.ledger.get_net_balances_as_of(account_ids, as_of_date)
+        
+        latest = self.db.query(
+            AccountBalance.account_id,
+            func.max(AccountBalance.period_end).label('period_end')
+        ).filter(
+            AccountBalance.account_id.in_(account_ids),
+            AccountBalance.period_end <= as_of_date
+        ).group_by(AccountBalance.account_id).subquery()
+        
+        snapshots = defaultdict(dict)
+        for snapshot_account_id, period_end, closing_balance in self.db.query(
+            AccountBalance.account_id,
+            AccountBalance.period_end,
+            AccountBalance.closing_balance
+        ).join(
+            latest,
+            and_(
+                AccountBalance.account_id == latest.c.account_id,
+                AccountBalance.period_end == latest.c.period_end
+            )
+        ):
+            snapshots[period_end][snapshot_account_id] = Decimal(closing_balance or 0)
+        
+        # Closing a period snapshots every account at the same period end
+        for period_end, closing_balances in snapshots.items():
+            at_period_end = self.ledger.get_net_balances_as_of(closing_balances, period_end)
+            for snapshot_account_id, closing_balance in closing_balances.items():
+                # Snapshots hold contra balances with their sign already flipped
+                if contra[snapshot_account_id]:
+                    closing_balance = -closing_balance
+                balances[snapshot_account_id] = (
+                    closing_balance + balances[snapshot_account_id] - at_period_end[snapshot_account_id]
+                )
+        
+        return balances
         
     def get_balance_for_period(
         self,
@@ -718,46 +168,13 @@ class AccountBalanceService:
         if end_date is None:
             end_date = datetime.utcnow()
             
-        if start_date > end_date:
-            raise InvalidDateRangeException("Start date must be before end date")
-            
         # Get the account to verify it exists and get its type
         account = self.get_account(account_id)
         
-        # Get the opening balance (as of start_date)
-        opening_balance = self.get_balance_as_of(account_id, start_date)
-        
-        # Get the closing balance (as of end_date)
-        closing_balance = self.get_balance_as_of(account_id, end_date)
-        
-        # Get the period transactions
-        period_transactions = self.db.query(
-            JournalEntryLine,
-            JournalEntry.reference,
-            JournalEntry.entry_date,
-            JournalEntry.posted_at
-        ).join(
-            JournalEntry,
-            JournalEntry.id == JournalEntryLine.journal_entry_id
-        ).filter(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.posted_at > start_date,
-            JournalEntry.posted_at <= end_date
-        ).order_by(JournalEntry.posted_at).all()
-        
-        # Calculate period totals
-        period_debit = Decimal('0.00')
-        period_credit = Decimal('0.00')
+        balance = self.get_balances_for_period_batch([account_id], start_date, end_date)[account_id]
         
-        transactions = []
-        for line, ref, entry_date, posted_at in period_transactions:
-            if line.is_debit:
-                period_debit += line.amount
-            else:
-                period_credit += line.amount
-                
-            transactions.append({
+        transactions = [
+            {
                 'id': str(line.id),
                 'journal_entry_id': str(line.journal_entry_id),
                 'reference': ref,
@@ -768,7 +185,11 @@ class AccountBalanceService:
                 'is_debit': line.is_debit,
                 'entity_type': line.entity_type,
                 'entity_id': str(line.entity_id) if line.entity_id else None,
-            })
+            }
+            for line, ref, entry_date, posted_at in self.iter_period_transactions(
+                [account_id], start_date, end_date
+            )
+        ]
         
         return {
             'account_id': str(account_id),
@@ -776,13 +197,144 @@ class AccountBalanceService:
             'account_name': account.name,
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat(),
-            'opening_balance': float(opening_balance),
-            'closing_balance': float(closing_balance),
-            'period_debit': float(period_debit),
-            'period_credit': float(period_credit),
+            'opening_balance': float(balance['opening_balance']),
+            'closing_balance': float(balance['closing_balance']),
+            'period_debit': float(balance['period_debit']),
+            'period_credit': float(balance['period_credit']),
             'transactions': transactions
         }
         
+    def get_balances_for_period_batch(
+        self,
+        account_ids: List[UUID],
+        start_date: datetime,
+        end_date: Optional[datetime] = None
+    ) -> Dict[UUID, Dict[str, Any]]:
+        """
+        Get balance information for many accounts over a specific period.
+        
+        Uses a fixed number of grouped queries regardless of how many
+        accounts are requested, so statement and trial balance pages can
+        fetch the whole chart at once.
+        
+        Args:
+            account_ids: The IDs of the accounts
+            start_date: Start of the period
+            end_date: End of the period (defaults to now)
+            
+        Returns:
+            Dict mapping each account ID to a dict containing:
+                - opening_balance: Balance at start_date
+                - closing_balance: Balance at end_date
+                - period_debit: Total debits during the period
+                - period_credit: Total credits during the period
+                
+        Raises:
+            AccountNotFoundException: If any of the accounts doesn't exist
+            InvalidDateRangeException: If the date range is invalid
+        """
+        if end_date is None:
+            end_date = datetime.utcnow()
+            
+        if start_date > end_date:
+            raise InvalidDateRangeException("Start date must be before end date")
+        
+        account_ids = list(dict.fromkeys(account_ids))
+        if not account_ids:
+            return {}
+        
+        contra = dict(
+            self.db.query(Account.id, Account.is_contra).filter(Account.id.in_(account_ids)).all()
+        )
+        missing = [account_id for account_id in account_ids if account_id not in contra]
+        if missing:
+            raise AccountNotFoundException(missing[0])
+        
+        opening = self._net_balances_as_of(account_ids, start_date, contra)
+        
+        period_totals = {
+            account_id: (period_debit or Decimal('0.00'), period_credit or Decimal('0.00'))
+            for account_id, period_debit, period_credit in self.db.query(
+                JournalEntryLine.account_id,
+                func.sum(
+                    case((JournalEntryLine.is_debit == True, JournalEntryLine.amount), else_=0)  # noqa: E712
+                ),
+                func.sum(
+                    case((JournalEntryLine.is_debit == False, JournalEntryLine.amount), else_=0)  # noqa: E712
+                )
+            ).join(
+                JournalEntry,
+                JournalEntry.id == JournalEntryLine.journal_entry_id
+            ).filter(
+                JournalEntryLine.account_id.in_(account_ids),
+                JournalEntry.status == JournalEntryStatus.POSTED,
+                JournalEntry.posted_at > start_date,
+                JournalEntry.posted_at <= end_date
+            ).group_by(JournalEntryLine.account_id).all()
+        }
+        
+        results = {}
+        for account_id in account_ids:
+            period_debit, period_credit = period_totals.get(
+                account_id, (Decimal('0.00'), Decimal('0.00'))
+            )
+            net_opening = opening.get(account_id, Decimal('0.00'))
+            net_closing = net_opening + period_debit - period_credit
+            
+            # For contra accounts, we need to flip the sign
+            if contra[account_id]:
+                net_opening, net_closing = -net_opening, -net_closing
+                
+            results[account_id] = {
+                'opening_balance': net_opening.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+                'closing_balance': net_closing.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+                'period_debit': Decimal(period_debit),
+                'period_credit': Decimal(period_credit),
+            }
+        
+        return results
+        
+    def iter_period_transactions(
+        self,
+        account_ids: List[UUID],
+        start_date: datetime,
+        end_date: datetime,
+        chunk_size: int = 1000
+    ) -> Iterator[Tuple[JournalEntryLine, str, date, datetime]]:
+        """
+        Stream the posted journal lines of many accounts over a period.
+        
+        Rows are fetched from the database in chunks of chunk_size, so
+        callers can walk very large periods without loading them whole.
+        
+        Args:
+            account_ids: The IDs of the accounts
+            start_date: Start of the period (exclusive)
+            end_date: End of the period (inclusive)
+            chunk_size: Number of rows fetched per round-trip
+            
+        Yields:
+            Tuples of (line, reference, entry_date, posted_at) ordered by
+            account and posting time
+        """
+        query = self.db.query(
+            JournalEntryLine,
+            JournalEntry.reference,
+            JournalEntry.entry_date,
+            JournalEntry.posted_at
+        ).join(
+            JournalEntry,
+            JournalEntry.id == JournalEntryLine.journal_entry_id
+        ).filter(
+            JournalEntryLine.account_id.in_(list(account_ids)),
+            JournalEntry.status == JournalEntryStatus.POSTED,
+            JournalEntry.posted_at > start_date,
+            JournalEntry.posted_at <= end_date
+        ).order_by(JournalEntryLine.account_id, JournalEntry.posted_at)
+        
+        for row in query.yield_per(chunk_size):
+            yield tuple(row)
+        
     def close_period(self, period_end: datetime) -> List[AccountBalance]:
         """
         Close an accounting period by creating balance records for all accounts.
@@ -839,10 +391,8 @@ class AccountBalanceService:
             period_activity = self.db.query(
                 func.sum(
                     case(
-                        [
-                            (JournalEntryLine.is_debit == True, JournalEntryLine.amount),  # noqa: E712
-                            (JournalEntryLine.is_debit == False, -JournalEntryLine.amount)  # noqa: E712
-                        ],
+                        (JournalEntryLine.is_debit == True, JournalEntryLine.amount),  # noqa: E712
+                        (JournalEntryLine.is_debit == False, -JournalEntryLine.amount),  # noqa: E712
                         else_=0
                     )
                 )
@@ -865,10 +415,10 @@ class AccountBalanceService:
             # Calculate period debit/credit totals
             period_debit, period_credit = self.db.query(
                 func.sum(
-                    case([(JournalEntryLine.is_debit == True, JournalEntryLine.amount)], else_=0)  # noqa: E712
+                    case((JournalEntryLine.is_debit == True, JournalEntryLine.amount), else_=0)  # noqa: E712
                 ),
                 func.sum(
-                    case([(JournalEntryLine.is_debit == False, JournalEntryLine.amount)], else_=0)  # noqa: E712
+                    case((JournalEntryLine.is_debit == False, JournalEntryLine.amount), else_=0)  # noqa: E712
                 )
             ).join(
                 JournalEntry,
@@ -900,225 +450,27 @@ class AccountBalanceService:
         
         return balances
 
+    def rebuild_daily_balances(self, account_ids: Optional[List[UUID]] = None) -> int:
         """
-        if as_of_date is None:
-            as_of_date = datetime.utcnow()
-            
-        # Get the account
-        account = self.get_account(account_id)
-        
-        # Calculate balance from journal entries
-        stmt = select(
-            func.coalesce(
-                func.sum(
-                    case(
-                        [(JournalEntryLine.debit > 0, JournalEntryLine.debit)],
-                        else_=-JournalEntryLine.credit
-                    )
-                ),
-                0
-            )
-        ).join(
-            JournalEntryLine.journal_entry
-        ).where(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.entry_date <= as_of_date
-        )
-        
-        balance = self.db.scalar(stmt) or Decimal('0.00')
-        
-        # If this is a contra account, invert the balance
-        if account.is_contra:
-            balance = -balance
-            
-        return balance
-    
-    def get_balance_as_of(self, account_id: UUID, as_of_date: datetime = None) -> Decimal:
-        """
-        Get the balance of an account as of a specific date, using historical balances if available.
-        
-        Args:
-            account_id: UUID of the account
-            as_of_date: The date to get the balance for (defaults to now)
-            
-        Returns:
-            The account balance as of the specified date
-        """
-        if as_of_date is None:
-            as_of_date = datetime.utcnow()
-        
-        # First try to find a historical balance record
-        stmt = select(AccountBalance).where(
-            AccountBalance.account_id == account_id,
-            AccountBalance.period_start <= as_of_date,
-            or_(
-                AccountBalance.period_end.is_(None),
-                AccountBalance.period_end > as_of_date
-            )
-        ).order_by(AccountBalance.period_start.desc()).limit(1)
-        
-        balance_record = self.db.scalar(stmt)
-        
-        if balance_record:
-            return balance_record.closing_balance
-            
-        # If no historical balance found, calculate from journal entries
-        return self.calculate_account_balance(account_id, as_of_date)
-    
-    def get_balance_for_period(
-        self, 
-        account_id: UUID, 
-        start_date: datetime, 
-        end_date: datetime = None
-    ) -> Dict[str, Union[Decimal, datetime]]:
-        """Get Balance For Period."""
-        """
-        Get the balance details for an account over a specific period.
-        
-        Args:
-            account_id: The ID of the account
-            start_date: The start of the period
-            end_date: The end of the period (defaults to now)
-            
-        Returns:
-            A dictionary containing balance information for the period
-        """
-        if end_date is None:
-            end_date = datetime.utcnow()
-            
-        if start_date > end_date:
-            raise InvalidDateRangeException("Start date cannot be after end date")
-        
-        # Get the account
-        account = self.get_account(account_id)
-        
-        # Get opening balance (as of the day before the period starts)
-        opening_balance = self.get_balance_as_of(account_id, start_date - timedelta(seconds=1))
-        
-        # Get period activity
-        stmt = select(
-            func.coalesce(func.sum(JournalEntryLine.debit), 0).label('total_debit'),
-            func.coalesce(func.sum(JournalEntryLine.credit), 0).label('total_credit')
-        ).join(
-            JournalEntryLine.journal_entry
-        ).where(
-            JournalEntryLine.account_id == account_id,
-            JournalEntry.status == JournalEntryStatus.POSTED,
-            JournalEntry.entry_date >= start_date,
-            JournalEntry.entry_date <= end_date
-        )
-        
-        result = self.db.execute(stmt).first()
-        period_debit = result[0] if result[0] is not None else Decimal('0.00')
-        period_credit = result[1] if result[1] is not None else Decimal('0.00')
-        
-        # Calculate net activity based on normal balance
-        if account.normal_balance == 'debit':
-            period_net = period_debit - period_credit
-        else:
-            period_net = period_credit - period_debit
-            
-        closing_balance = opening_balance + period_net
-        
-        return {
-            'account_id': account_id,
-            'account_code': account.code,
-            'account_name': account.name,
-            'opening_balance': opening_balance,
-            'period_debit': period_debit,
-            'period_credit': period_credit,
-            'period_net': period_net,
-            'closing_balance': closing_balance,
-            'start_date': start_date,
-            'end_date': end_date
-        }
-    
-    def create_periodic_balance(
-        self,
-        account_id: UUID,
-        period_start: datetime,
-        period_end: datetime = None,
-        commit: bool = True
-    ) -> AccountBalance:
-        """Create Periodic Balance."""
-        """
-        Create a periodic balance record for an account.
+        Rebuild the per-day balance ledger from posted journal entries.
         
         Args:
-            account_id: The ID of the account
-            period_start: The start of the period
-            period_end: The end of the period (optional)
-            commit: Whether to commit the transaction (default: True)
+            account_ids: Optional subset of accounts to rebuild (defaults to all)
             
         Returns:
-            The created AccountBalance record
+            Number of daily balance rows written
         """
-        # Get the account
-        account = self.get_account(account_id)
-        
-        # Calculate balances
-        balance_data = self.get_balance_for_period(account_id, period_start, period_end)
-        
-        # Create the balance record
-        balance = AccountBalance(
-            account_id=account_id,
-            period_start=period_start,
-            period_end=period_end,
-            opening_balance=balance_data['opening_balance'],
-            period_debit=balance_data['period_debit'],
-            period_credit=balance_data['period_credit'],
-            closing_balance=balance_data['closing_balance']
-        )
-        
-        self.db.add(balance)
-        
-        if commit:
-            self.db.commit()
-            self.db.refresh(balance)
+        return self.ledger.rebuild(account_ids)
         
-        return balance
-    
-    def close_period(
-        self,
-        period_end: datetime,
-        commit: bool = True
-    ) -> List[AccountBalance]:
-        """Close Period."""
+    def verify_daily_balances(self, account_ids: Optional[List[UUID]] = None) -> List[Dict[str, Any]]:
         """
-        Close a period by creating balance records for all accounts.
+        Check the per-day balance ledger against the journal.
         
         Args:
-            period_end: The end of the period to close
-            commit: Whether to commit the transaction (default: True)
+            account_ids: Optional subset of accounts to check (defaults to all)
             
         Returns:
-            A list of created AccountBalance records
+            List of accounts whose ledger balance differs from the journal;
+            empty when the ledger is consistent
         """
-        # Find the previous period end to use as our period start
-        stmt = select(func.max(AccountBalance.period_end)).where(
-            AccountBalance.period_end < period_end
-        )
-        
-        period_start = self.db.scalar(stmt) or datetime.min.replace(tzinfo=period_end.tzinfo)
-        
-        # Get all active accounts
-        accounts = self.db.query(Account).filter(Account.status == 'active').all()
-        
-        balances = []
-        for account in accounts:
-            balance = self.create_periodic_balance(
-                account_id=account.id,
-                period_start=period_start,
-                period_end=period_end,
-                commit=False
-            )
-            balances.append(balance)
-        
-        if commit and balances:
-            self.db.commit()
-            for balance in balances:
-                self.db.refresh(balance)
-        
-        return balances
->>>>>>> e96df7278ce4216131b6c65d411c0723f4de7f91:backend/app/services/accounting/account_balance_service.py
+        return self.ledger.verify(account_ids)
@@ -0,0 +1,349 @@
+"""
+Paksa Financial System
+Account Balance Ledger
+
+This module maintains the running per-account, per-day balance ledger
+(``account_daily_balances``). The ledger is updated incrementally when
+journal entries are posted or voided so that balance-as-of lookups become a
+single indexed read instead of a scan of every posted journal line since the
+last closed period.
+
+Journal entries are the unified ``journal_entries`` rows: they count on their
+entry date, and their lines carry debit and credit amounts.
+
+The ledger can always be rebuilt from the journal and checked against it.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import AccountDailyBalance, ChartOfAccounts, JournalEntry, JournalEntryLine
+
+ZERO = Decimal('0.00')
+
+# Status of journal entries that count towards balances
+POSTED = 'posted'
+
+
+def _as_day(as_of: Union[date, datetime]) -> date:
+    return as_of.date() if isinstance(as_of, datetime) else as_of
+
+
+class AccountBalanceLedger:
+    """Maintains and reads the per-account, per-day running balance ledger.
+
+    All balances handled here are net debit balances (debits minus credits);
+    contra-account sign handling stays with the caller.
+    """
+
+    REBUILD_CHUNK_SIZE = 5000
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    def record_posting(self, journal_entry: JournalEntry) -> None:
+        """Apply a newly posted journal entry to the ledger."""
+        self._apply_entry(journal_entry, sign=1)
+
+    def record_void(self, journal_entry: JournalEntry) -> None:
+        """Remove a previously posted journal entry from the ledger.
+
+        The reversal is applied on the original entry date, mirroring the
+        journal where the voided entry simply stops counting as posted.
+        """
+        self._apply_entry(journal_entry, sign=-1)
+
+    def _apply_entry(self, journal_entry: JournalEntry, sign: int) -> None:
+        if not journal_entry.entry_date:
+            return
+
+        totals: Dict[UUID, List[Decimal]] = defaultdict(lambda: [ZERO, ZERO])
+        for line in journal_entry.lines:
+            totals[line.account_id][0] += Decimal(line.debit_amount or 0)
+            totals[line.account_id][1] += Decimal(line.credit_amount or 0)
+
+        self.record_amounts(_as_day(journal_entry.entry_date), {
+            account_id: (debit * sign, credit * sign)
+            for account_id, (debit, credit) in totals.items()
+        })
+
+    def record_amounts(
+        self,
+        balance_date: date,
+        totals: Dict[UUID, Tuple[Decimal, Decimal]]
+    ) -> None:
+        """Apply per-account (debit, credit) totals posted on ``balance_date``.
+
+        Used by bulk posting paths that insert journal rows directly instead
+        of going through ``record_posting``.
+        """
+        for account_id, (debit, credit) in totals.items():
+            self._apply_delta(account_id, balance_date, debit, credit)
+
+    def _apply_delta(
+        self,
+        account_id: UUID,
+        balance_date: date,
+        debit: Decimal,
+        credit: Decimal
+    ) -> None:
+        net = debit - credit
+
+        # Postings to one account are serialized on its chart row, so the
+        # closing balance a new day starts from cannot change underneath it
+        self.db.query(ChartOfAccounts.id).filter(
+            ChartOfAccounts.id == account_id
+        ).with_for_update().first()
+
+        if self.db.get_bind().dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(AccountDailyBalance).values(
+            account_id=account_id,
+            balance_date=balance_date,
+            period_debit=debit,
+            period_credit=credit,
+            closing_balance=self._closing_before(account_id, balance_date) + net
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["account_id", "balance_date"],
+            set_={
+                "period_debit": AccountDailyBalance.period_debit + stmt.excluded.period_debit,
+                "period_credit": AccountDailyBalance.period_credit + stmt.excluded.period_credit,
+                "closing_balance": AccountDailyBalance.closing_balance + net,
+                "updated_at": datetime.utcnow()
+            }
+        )
+        self.db.execute(stmt)
+
+        # Back-dated postings roll forward into every later day in one statement
+        if net:
+            self.db.query(AccountDailyBalance).filter(
+                AccountDailyBalance.account_id == account_id,
+                AccountDailyBalance.balance_date > balance_date
+            ).update(
+                {AccountDailyBalance.closing_balance: AccountDailyBalance.closing_balance + net},
+                synchronize_session=False
+            )
+
+    def _closing_before(self, account_id: UUID, balance_date: date) -> Decimal:
+        closing = self.db.query(AccountDailyBalance.closing_balance).filter(
+            AccountDailyBalance.account_id == account_id,
+            AccountDailyBalance.balance_date < balance_date
+        ).order_by(AccountDailyBalance.balance_date.desc()).limit(1).scalar()
+        return closing if closing is not None else ZERO
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get_net_balance_as_of(self, account_id: UUID, as_of: Union[date, datetime]) -> Decimal:
+        """
+        Get the net debit balance of an account as of a day.
+
+        Journal entries are dated by day, so a point in time reads the closing
+        balance of its day, which includes every entry dated on it.
+
+        Args:
+            account_id: The ID of the account
+            as_of: The day, or a point in time on the day, to get the balance for
+
+        Returns:
+            Decimal: Net debit balance (debits minus credits)
+        """
+        closing = self.db.query(AccountDailyBalance.closing_balance).filter(
+            AccountDailyBalance.account_id == account_id,
+            AccountDailyBalance.balance_date <= _as_day(as_of)
+        ).order_by(AccountDailyBalance.balance_date.desc()).limit(1).scalar()
+        return Decimal(closing) if closing is not None else ZERO
+
+    def get_net_balances_as_of(
+        self,
+        account_ids: Iterable[UUID],
+        as_of: Union[date, datetime]
+    ) -> Dict[UUID, Decimal]:
+        """
+        Get net debit balances for many accounts as of a day, with one
+        grouped ledger read regardless of the account count.
+
+        Args:
+            account_ids: The IDs of the accounts
+            as_of: The day, or a point in time on the day, to get the balances for
+
+        Returns:
+            Dict mapping account ID to net debit balance; accounts without
+            any posted activity map to zero
+        """
+        account_ids = list(account_ids)
+        balances: Dict[UUID, Decimal] = {account_id: ZERO for account_id in account_ids}
+        if not account_ids:
+            return balances
+
+        latest = self.db.query(
+            AccountDailyBalance.account_id,
+            func.max(AccountDailyBalance.balance_date).label('balance_date')
+        ).filter(
+            AccountDailyBalance.account_id.in_(account_ids),
+            AccountDailyBalance.balance_date <= _as_day(as_of)
+        ).group_by(AccountDailyBalance.account_id).subquery()
+
+        rows = self.db.query(
+            AccountDailyBalance.account_id,
+            AccountDailyBalance.closing_balance
+        ).join(
+            latest,
+            (AccountDailyBalance.account_id == latest.c.account_id)
+            & (AccountDailyBalance.balance_date == latest.c.balance_date)
+        ).all()
+        for account_id, closing in rows:
+            balances[account_id] = Decimal(closing or 0)
+
+        return balances
+
+    # ------------------------------------------------------------------
+    # Rebuild and consistency check
+    # ------------------------------------------------------------------
+
+    def rebuild(self, account_ids: Optional[Iterable[UUID]] = None, commit: bool = True) -> int:
+        """
+        Rebuild the ledger from posted journal entries.
+
+        Args:
+            account_ids: Optional subset of accounts to rebuild (defaults to all)
+            commit: Whether to commit the transaction (default: True)
+
+        Returns:
+            Number of daily balance rows written
+        """
+        account_ids = list(account_ids) if account_ids is not None else None
+
+        delete_query = self.db.query(AccountDailyBalance)
+        if account_ids is not None:
+            delete_query = delete_query.filter(AccountDailyBalance.account_id.in_(account_ids))
+        delete_query.delete(synchronize_session=False)
+
+        query = self.db.query(
+            JournalEntryLine.account_id,
+            JournalEntry.entry_date.label('balance_date'),
+            func.sum(func.coalesce(JournalEntryLine.debit_amount, 0)).label('period_debit'),
+            func.sum(func.coalesce(JournalEntryLine.credit_amount, 0)).label('period_credit')
+        ).join(
+            JournalEntry,
+            JournalEntry.id == JournalEntryLine.journal_entry_id
+        ).filter(
+            JournalEntry.status == POSTED
+        )
+        if account_ids is not None:
+            query = query.filter(JournalEntryLine.account_id.in_(account_ids))
+        query = query.group_by(
+            JournalEntryLine.account_id, JournalEntry.entry_date
+        ).order_by(
+            JournalEntryLine.account_id, JournalEntry.entry_date
+        )
+
+        written = 0
+        chunk: List[Dict[str, Any]] = []
+        current_account = None
+        running = ZERO
+        for account_id, balance_date, period_debit, period_credit in query.yield_per(self.REBUILD_CHUNK_SIZE):
+            if account_id != current_account:
+                current_account = account_id
+                running = ZERO
+            period_debit = Decimal(period_debit or 0)
+            period_credit = Decimal(period_credit or 0)
+            running += period_debit - period_credit
+            if isinstance(balance_date, str):
+                balance_date = date.fromisoformat(balance_date)
+            chunk.append({
+                'account_id': account_id,
+                'balance_date': balance_date,
+                'period_debit': period_debit,
+                'period_credit': period_credit,
+                'closing_balance': running,
+            })
+            if len(chunk) >= self.REBUILD_CHUNK_SIZE:
+                self.db.bulk_insert_mappings(AccountDailyBalance, chunk)
+                written += len(chunk)
+                chunk = []
+
+        if chunk:
+            self.db.bulk_insert_mappings(AccountDailyBalance, chunk)
+            written += len(chunk)
+
+        if commit:
+            self.db.commit()
+
+        return written
+
+    def verify(self, account_ids: Optional[Iterable[UUID]] = None) -> List[Dict[str, Any]]:
+        """
+        Compare the ledger's latest balances against the journal.
+
+        Args:
+            account_ids: Optional subset of accounts to check (defaults to all)
+
+        Returns:
+            List of discrepancies, one dict per account whose ledger balance
+            does not match the sum of its posted journal lines. Empty when
+            the ledger is consistent.
+        """
+        account_ids = list(account_ids) if account_ids is not None else None
+
+        latest = self.db.query(
+            AccountDailyBalance.account_id,
+            func.max(AccountDailyBalance.balance_date).label('balance_date')
+        ).group_by(AccountDailyBalance.account_id)
+        if account_ids is not None:
+            latest = latest.filter(AccountDailyBalance.account_id.in_(account_ids))
+        latest = latest.subquery()
+
+        ledger_rows = self.db.query(
+            AccountDailyBalance.account_id,
+            AccountDailyBalance.closing_balance
+        ).join(
+            latest,
+            (AccountDailyBalance.account_id == latest.c.account_id)
+            & (AccountDailyBalance.balance_date == latest.c.balance_date)
+        ).all()
+
+        journal_query = self.db.query(
+            JournalEntryLine.account_id,
+            func.sum(
+                func.coalesce(JournalEntryLine.debit_amount, 0)
+                - func.coalesce(JournalEntryLine.credit_amount, 0)
+            )
+        ).join(
+            JournalEntry,
+            JournalEntry.id == JournalEntryLine.journal_entry_id
+        ).filter(
+            JournalEntry.status == POSTED
+        )
+        if account_ids is not None:
+            journal_query = journal_query.filter(JournalEntryLine.account_id.in_(account_ids))
+        journal_rows = journal_query.group_by(JournalEntryLine.account_id).all()
+
+        ledger: Dict[UUID, Decimal] = {row[0]: Decimal(row[1] or 0) for row in ledger_rows}
+        journal: Dict[UUID, Decimal] = {row[0]: Decimal(row[1] or 0) for row in journal_rows}
+
+        discrepancies = []
+        for account_id in sorted(set(ledger) | set(journal), key=str):
+            ledger_balance = ledger.get(account_id, ZERO)
+            journal_balance = journal.get(account_id, ZERO)
+            if ledger_balance != journal_balance:
+                discrepancies.append({
+                    'account_id': account_id,
+                    'ledger_balance': ledger_balance,
+                    'journal_balance': journal_balance,
+                    'difference': ledger_balance - journal_balance,
+                })
+        return discrepancies
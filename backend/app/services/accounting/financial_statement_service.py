@@ -7,33 +7,33 @@ This module provides services for generating financial statements from the gener
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional, Tuple, Union, Any, TypedDict, Literal
 
-from ...base.service import BaseService
-from ..exceptions import (
-from ..models import (
-from .gl_period_service import GLPeriodService
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy import and_, or_, func, case, text, select, literal_column
 from sqlalchemy.orm import Session, joinedload, aliased
 from uuid import UUID
 
-
-
+from ...base.service import BaseService
+from ..exceptions import (
     FinancialStatementException,
     PeriodNotFoundException,
     InvalidPeriodException
 )
+from ..models import (
     Account,
     AccountType,
     AccountBalance,
     GLPeriod,
     JournalEntry,
     JournalEntryLine,
+    JournalEntryStatus,
     FinancialStatement,
     FinancialStatementType,
     FinancialStatementLine,
     FinancialStatementLineType
 )
+from .gl_period_service import GLPeriodService
+from .statement_dataset import StatementDataset
 
 
 class FinancialStatementService(BaseService):
@@ -45,291 +45,6 @@ class FinancialStatementService(BaseService):
         super().__init__(db)
         self.period_service = GLPeriodService(db)
     
-    def generate_balance_sheet(
-        self,
-        as_of_date: date,
-        currency: str = 'USD',
-        include_comparative: bool = False,
-        include_notes: bool = True,
-        format_currency: bool = True
-    ) -> Dict[str, Any]:
-        """Generate Balance Sheet."""
-        """
-        Generate a balance sheet as of a specific date.
-        
-        Args:
-            as_of_date: The date to generate the balance sheet for
-            currency: The reporting currency
-            include_comparative: Whether to include prior period comparison
-            include_notes: Whether to include notes and disclosures
-            format_currency: Whether to format numbers as currency strings
-            
-        Returns:
-            Dictionary containing the balance sheet data
-        """
-        # Get the period for the as_of_date
-        period = self.period_service.get_period_for_date(as_of_date)
-        if not period:
-            raise PeriodNotFoundException(f"No open period found for date: {as_of_date}")
-        
-        # Get the previous period for comparison if requested
-        prev_period = None
-        if include_comparative:
-            prev_period = self._get_previous_period(period)
-        
-        # Get account balances
-        current_balances = self._get_account_balances_for_period(period.id)
-        prev_balances = self._get_account_balances_for_period(prev_period.id) if prev_period else {}
-        
-        # Prepare the balance sheet structure
-        balance_sheet = {
-            'type': FinancialStatementType.BALANCE_SHEET.value,
-            'as_of_date': as_of_date.isoformat(),
-            'currency': currency,
-            'period': {
-                'id': str(period.id),
-                'name': period.name,
-                'start_date': period.start_date.isoformat(),
-                'end_date': period.end_date.isoformat(),
-                'fiscal_year': period.fiscal_year
-            },
-            'sections': [],
-            'metadata': {
-                'generated_at': datetime.utcnow().isoformat(),
-                'include_comparative': include_comparative,
-                'include_notes': include_notes
-            }
-        }
-        
-        # Define balance sheet sections
-        sections = [
-            {
-                'name': 'Assets',
-                'account_types': [
-                    AccountType.ASSET_CURRENT.value,
-                    AccountType.ASSET_FIXED.value,
-                    AccountType.ASSET_INTANGIBLE.value,
-                    AccountType.ASSET_NON_CURRENT.value,
-                    AccountType.ASSET_PREPAYMENT.value
-                ],
-                'is_debit_positive': True
-            },
-            {
-                'name': 'Liabilities',
-                'account_types': [
-                    AccountType.LIABILITY_CURRENT.value,
-                    AccountType.LIABILITY_LONG_TERM.value,
-                    AccountType.LIABILITY_PROVISION.value
-                ],
-                'is_debit_positive': False
-            },
-            {
-                'name': 'Equity',
-                'account_types': [
-                    AccountType.EQUITY.value,
-                    AccountType.RETAINED_EARNINGS.value
-                ],
-                'is_debit_positive': False
-            }
-        ]
-        
-        # Process each section
-        for section in sections:
-            section_data = {
-                'name': section['name'],
-                'total': Decimal('0'),
-                'lines': [],
-                'subtotals': {}
-            }
-            
-            if include_comparative and prev_balances:
-                section_data['total_prev'] = Decimal('0')
-            
-            # Process each account type in the section
-            for account_type in section['account_types']:
-                accounts = self._get_accounts_by_type(account_type)
-                type_total = Decimal('0')
-                type_prev_total = Decimal('0')
-                
-                for account in accounts:
-                    # Get current period balance
-                    balance = current_balances.get(account.id, {
-                        'account_id': account.id,
-                        'account_code': account.code,
-                        'account_name': account.name,
-                        'balance': Decimal('0')
-                    })
-                    
-                    # Get previous period balance if available
-                    prev_balance = prev_balances.get(account.id, {
-                        'balance': Decimal('0')
-                    }) if include_comparative and prev_balances else None
-                    
-                    # Calculate the balance based on account type
-                    if section['is_debit_positive']:
-                        current_balance = balance['balance']
-                        prev_balance_val = prev_balance['balance'] if prev_balance else Decimal('0')
-                    else:
-                        current_balance = -balance['balance']
-                        prev_balance_val = -prev_balance['balance'] if prev_balance else Decimal('0')
-                    
-                    # Add to type total
-                    type_total += current_balance
-                    if include_comparative and prev_balances:
-                        type_prev_total += prev_balance_val
-                    
-                    # Add account line
-                    line = {
-                        'account_id': str(account.id),
-                        'account_code': account.code,
-                        'account_name': account.name,
-                        'amount': self._format_amount(current_balance, format_currency, currency),
-                        'is_header': False
-                    }
-                    
-                    if include_comparative and prev_balances:
-                        line['amount_prev'] = self._format_amount(prev_balance_val, format_currency, currency)
-                    
-                    section_data['lines'].append(line)
-                
-                # Add account type subtotal
-                if accounts:
-                    subtotal = {
-                        'name': f"Total {account_type.replace('_', ' ').title()}",
-                        'amount': self._format_amount(type_total, format_currency, currency),
-                        'is_subtotal': True
-                    }
-                    
-                    if include_comparative and prev_balances:
-                        subtotal['amount_prev'] = self._format_amount(type_prev_total, format_currency, currency)
-                    
-                    section_data['lines'].append(subtotal)
-                    section_data['subtotals'][account_type] = {
-                        'current': type_total,
-                        'previous': type_prev_total if include_comparative and prev_balances else None
-                    }
-                    
-                    section_data['total'] += type_total
-                    if include_comparative and prev_balances:
-                        section_data['total_prev'] += type_prev_total
-            
-            # Format section total
-            section_data['total'] = self._format_amount(section_data['total'], format_currency, currency)
-            if include_comparative and prev_balances:
-                section_data['total_prev'] = self._format_amount(section_data['total_prev'], format_currency, currency)
-            
-            balance_sheet['sections'].append(section_data)
-        
-        # Calculate total equity (assets - liabilities)
-        assets_section = next((s for s in balance_sheet['sections'] if s['name'] == 'Assets'), None)
-        liabilities_section = next((s for s in balance_sheet['sections'] if s['name'] == 'Liabilities'), None)
-        equity_section = next((s for s in balance_sheet['sections'] if s['name'] == 'Equity'), None)
-        
-        if assets_section and liabilities_section and equity_section:
-            # Calculate total assets and liabilities
-            total_assets = self._parse_amount(assets_section['total'])
-            total_liabilities = self._parse_amount(liabilities_section['total'])
-            
-            # Calculate total equity (assets - liabilities)
-            calculated_equity = total_assets - total_liabilities
-            
-            # Add calculated equity line
-            equity_line = {
-                'name': 'Calculated Equity (Assets - Liabilities)',
-                'amount': self._format_amount(calculated_equity, format_currency, currency),
-                'is_calculated': True,
-                'is_header': True
-            }
-            
-            if include_comparative and prev_balances:
-                total_assets_prev = self._parse_amount(assets_section['total_prev'])
-                total_liabilities_prev = self._parse_amount(liabilities_section['total_prev'])
-                calculated_equity_prev = total_assets_prev - total_liabilities_prev
-                equity_line['amount_prev'] = self._format_amount(calculated_equity_prev, format_currency, currency)
-            
-            # Add the calculated equity line to the equity section
-            equity_section['lines'].insert(0, equity_line)
-        
-        return balance_sheet
-    
-    def _get_account_balances_for_period(self, period_id: UUID) -> Dict[UUID, Dict[str, Any]]:
-        """
-        Get account balances for a specific period.
-        
-        Args:
-            period_id: The ID of the period
-            
-        Returns:
-            Dictionary mapping account IDs to balance information
-        """
-        from sqlalchemy import func, case
-        from decimal import Decimal
-        from ..models import Account, JournalEntry, JournalEntryLine
-        
-        # Get the period to ensure it exists
-        period = self.db.query(GLPeriod).filter(GLPeriod.id == period_id).first()
-        if not period:
-            raise PeriodNotFoundException(f"Period with ID {period_id} not found")
-        
-        # Query to get all account balances for the period
-        query = (
-            self.db.query(
-                Account.id,
-                Account.code,
-                Account.name,
-                Account.type,
-                func.sum(
-                    case(
-                        [
-                            (JournalEntryLine.is_debit == True, JournalEntryLine.amount),
-                            (JournalEntryLine.is_debit == False, -JournalEntryLine.amount)
-                        ],
-                        else_=0
-                    )
-                ).label('balance')
-            )
-            .join(JournalEntryLine, Account.id == JournalEntryLine.account_id)
-            .join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id)
-            .filter(
-                JournalEntry.period_id == period_id,
-                JournalEntry.status == 'posted'
-            )
-            .group_by(Account.id, Account.code, Account.name, Account.type)
-        )
-        
-        # Execute the query and build the result dictionary
-        balances = {}
-        for account_id, code, name, acc_type, balance in query.all():
-            if balance is None:
-                balance = Decimal('0')
-                
-            balances[account_id] = {
-                'account_id': account_id,
-                'account_code': code,
-                'account_name': name,
-                'account_type': acc_type,
-                'balance': balance
-            }
-            
-        return balances
-    
-    def _get_accounts_by_type(self, account_type: str) -> List[Account]:
-        """
-        Get all accounts of a specific type.
-        
-        Args:
-            account_type: The account type to filter by
-            
-        Returns:
-            List of Account objects
-        """
-        return (
-            self.db.query(Account)
-            .filter(Account.type == account_type, Account.is_active == True)
-            .order_by(Account.code)
-            .all()
-        )
-    
     def _get_previous_period(self, period: GLPeriod) -> Optional[GLPeriod]:
         """
         Get the previous period for a given period.
@@ -396,7 +111,8 @@ class FinancialStatementService(BaseService):
         currency: str = 'USD',
         include_comparative: bool = False,
         include_ytd: bool = False,
-        format_currency: bool = True
+        format_currency: bool = True,
+        dataset: Optional[StatementDataset] = None
     ) -> Dict[str, Any]:
         """Generate Income Statement."""
         """
@@ -409,6 +125,8 @@ class FinancialStatementService(BaseService):
             include_comparative: Whether to include prior period comparison
             include_ytd: Whether to include year-to-date figures
             format_currency: Whether to format numbers as currency strings
+            dataset: Optional pre-fetched statement dataset with a 'current'
+                range and, where requested, 'prev' and 'ytd' ranges
             
         Returns:
             Dictionary containing the income statement data
@@ -439,19 +157,18 @@ class FinancialStatementService(BaseService):
             ytd_start_period = self._get_first_period_of_fiscal_year(fiscal_year)
             ytd_end_period = end_period
         
-        # Get account balances for all required periods
-        current_balances = self._get_account_balances_for_date_range(start_date, end_date)
+        # Fetch the balances for all required periods in one pass
+        if dataset is None:
+            ranges = {'current': (start_date, end_date)}
+            if include_comparative and prev_start_period and prev_end_period:
+                ranges['prev'] = (prev_start_period.start_date, prev_end_period.end_date)
+            if include_ytd and ytd_start_period and ytd_end_period:
+                ranges['ytd'] = (ytd_start_period.start_date, end_date)
+            dataset = StatementDataset(self.db, ranges=ranges)
         
-        prev_balances = {}
-        if include_comparative and prev_start_period and prev_end_period:
-            prev_start_date = prev_start_period.start_date
-            prev_end_date = prev_end_period.end_date
-            prev_balances = self._get_account_balances_for_date_range(prev_start_date, prev_end_date)
-        
-        ytd_balances = {}
-        if include_ytd and ytd_start_period and ytd_end_period:
-            ytd_start_date = ytd_start_period.start_date
-            ytd_balances = self._get_account_balances_for_date_range(ytd_start_date, end_date)
+        current_balances = dataset.balance_map('current')
+        prev_balances = dataset.balance_map('prev') if include_comparative else {}
+        ytd_balances = dataset.balance_map('ytd') if include_ytd else {}
         
         # Prepare the income statement structure
         income_statement = {
@@ -529,7 +246,7 @@ class FinancialStatementService(BaseService):
             
             # Process each account type in the section
             for account_type in section['account_types']:
-                accounts = self._get_accounts_by_type(account_type)
+                accounts = dataset.accounts_of_type(account_type)
                 type_total = Decimal('0')
                 type_prev_total = Decimal('0')
                 type_ytd_total = Decimal('0')
@@ -649,69 +366,6 @@ class FinancialStatementService(BaseService):
             .first()
         )
     
-    def _get_account_balances_for_date_range(
-        self, 
-        start_date: date, 
-        end_date: date,
-        account_ids: Optional[List[UUID]] = None
-    ) -> Dict[UUID, Dict[str, Any]]:
-        """ Get Account Balances For Date Range."""
-        """
-        Get account balances for a date range by aggregating journal entries.
-        
-        Args:
-            start_date: Start date of the period
-            end_date: End date of the period
-            account_ids: Optional list of account IDs to filter by
-            
-        Returns:
-            Dictionary mapping account IDs to balance information
-        """
-        # Start with a query to get all relevant journal entry lines
-        query = (
-            self.db.query(
-                JournalEntryLine.account_id,
-                func.sum(
-                    case(
-                        [(JournalEntryLine.is_debit == True, JournalEntryLine.amount)],
-                        else_=JournalEntryLine.amount * -1
-                    )
-                ).label('balance')
-            )
-            .join(JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id)
-            .filter(
-                JournalEntry.entry_date >= start_date,
-                JournalEntry.entry_date <= end_date,
-                JournalEntry.status == JournalEntryStatus.POSTED
-            )
-            .group_by(JournalEntryLine.account_id)
-        )
-        
-        # Filter by account IDs if provided
-        if account_ids:
-            query = query.filter(JournalEntryLine.account_id.in_(account_ids))
-        
-        # Execute the query
-        results = query.all()
-        
-        # Get account details for the balances
-        account_ids = [r[0] for r in results]
-        accounts = {a.id: a for a in self.db.query(Account).filter(Account.id.in_(account_ids)).all()}
-        
-        # Prepare the result dictionary
-        balances = {}
-        for account_id, balance in results:
-            account = accounts.get(account_id)
-            if account:
-                balances[account_id] = {
-                    'account_id': account_id,
-                    'account_code': account.code,
-                    'account_name': account.name,
-                    'balance': balance or Decimal('0')
-                }
-        
-        return balances
-    
     def _calculate_income_statement_totals(
         self, 
         income_statement: Dict[str, Any],
@@ -863,44 +517,32 @@ class FinancialStatementService(BaseService):
         fiscal_year_start = self._get_first_period_of_fiscal_year(period.fiscal_year)
         fiscal_year_start_date = fiscal_year_start.start_date if fiscal_year_start else period.start_date
         
-        # Get balances for assets, liabilities, and equity
-        current_balances = self._get_account_balances_as_of_date(as_of_date)
-        
-        # Get previous period balances if needed
-        prev_balances = {}
+        # Fetch current, comparative and YTD balances in one pass
+        as_of = {'current': as_of_date}
         if include_comparative and prev_period:
-            prev_balances = self._get_account_balances_as_of_date(prev_period.end_date)
-        
-        # Get YTD income/loss for the fiscal year
-        ytd_income_loss = Decimal('0')
-        ytd_balances = self._get_account_balances_for_date_range(
-            fiscal_year_start_date,
-            as_of_date
+            as_of['prev'] = prev_period.end_date
+        dataset = StatementDataset(
+            self.db,
+            ranges={'ytd': (fiscal_year_start_date, as_of_date)},
+            as_of=as_of
         )
         
+        current_balances = dataset.balance_map('current')
+        prev_balances = dataset.balance_map('prev') if include_comparative else {}
+        
         # Calculate YTD income/loss (revenue - expenses)
-        for account_id, balance in ytd_balances.items():
-            account = self.db.query(Account).get(account_id)
-            if not account:
-                continue
-                
-            # Revenue accounts (credit balance is positive)
-            if account.account_type in [
-                AccountType.REVENUE.value,
-                AccountType.REVENUE_OTHER.value
-            ]:
-                ytd_income_loss += balance['balance']
-            # Expense accounts (debit balance is positive)
-            elif account.account_type in [
-                AccountType.EXPENSE_OPERATING.value,
-                AccountType.EXPENSE_DEPRECIATION.value,
-                AccountType.EXPENSE_AMORTIZATION.value,
-                AccountType.EXPENSE_OTHER.value,
-                AccountType.EXPENSE_INTEREST.value,
-                AccountType.EXPENSE_TAX.value,
-                AccountType.COST_OF_GOODS_SOLD.value
-            ]:
-                ytd_income_loss -= balance['balance']
+        ytd_income_loss = dataset.total_for_types('ytd', [
+            AccountType.REVENUE.value,
+            AccountType.REVENUE_OTHER.value
+        ]) - dataset.total_for_types('ytd', [
+            AccountType.EXPENSE_OPERATING.value,
+            AccountType.EXPENSE_DEPRECIATION.value,
+            AccountType.EXPENSE_AMORTIZATION.value,
+            AccountType.EXPENSE_OTHER.value,
+            AccountType.EXPENSE_INTEREST.value,
+            AccountType.EXPENSE_TAX.value,
+            AccountType.COST_OF_GOODS_SOLD.value
+        ])
         
         # Prepare the balance sheet structure
         balance_sheet = {
@@ -978,7 +620,7 @@ class FinancialStatementService(BaseService):
             
             # Process each account type in the section
             for account_type in section['account_types']:
-                accounts = self._get_accounts_by_type(account_type)
+                accounts = dataset.accounts_of_type(account_type)
                 type_total = Decimal('0')
                 type_prev_total = Decimal('0')
                 
@@ -1097,68 +739,6 @@ class FinancialStatementService(BaseService):
         
         return balance_sheet
     
-    def _get_account_balances_as_of_date(
-        self, 
-        as_of_date: date,
-        account_ids: Optional[List[UUID]] = None
-    ) -> Dict[UUID, Dict[str, Any]]:
-        """ Get Account Balances As Of Date."""
-        """
-        Get account balances as of a specific date by aggregating journal entries.
-        
-        Args:
-            as_of_date: The date to get balances as of
-            account_ids: Optional list of account IDs to filter by
-            
-        Returns:
-            Dictionary mapping account IDs to balance information
-        """
-        # Start with a query to get all relevant journal entry lines
-        query = (
-            self.db.query(
-                JournalEntryLine.account_id,
-                func.sum(
-                    case(
-                        [(JournalEntryLine.is_debit == True, JournalEntryLine.amount)],
-                        else_=JournalEntryLine.amount * -1
-                    )
-                ).label('balance')
-            )
-            .join(JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id)
-            .filter(
-                JournalEntry.entry_date <= as_of_date,
-                JournalEntry.status == JournalEntryStatus.POSTED
-            )
-            .group_by(JournalEntryLine.account_id)
-        )
-        
-        # Filter by account IDs if provided
-        if account_ids:
-            query = query.filter(JournalEntryLine.account_id.in_(account_ids))
-        
-        # Execute the query
-        results = query.all()
-        
-        # Get account details for the balances
-        account_ids = [r[0] for r in results] if results else []
-        accounts = {}
-        if account_ids:
-            accounts = {a.id: a for a in self.db.query(Account).filter(Account.id.in_(account_ids)).all()}
-        
-        # Prepare the result dictionary
-        balances = {}
-        for account_id, balance in results:
-            account = accounts.get(account_id)
-            if account:
-                balances[account_id] = {
-                    'account_id': account_id,
-                    'account_code': account.code,
-                    'account_name': account.name,
-                    'balance': balance or Decimal('0')
-                }
-        
-        return balances
-    
     def _calculate_balance_sheet_totals(
         self, 
         balance_sheet: Dict[str, Any],
@@ -1242,23 +822,6 @@ class FinancialStatementService(BaseService):
                 
                 balance_sheet['is_balanced_prev'] = abs(total_assets_prev - total_liab_equity_prev) < Decimal('0.01')
     
-    def _get_accounts_by_type(self, account_type: str) -> List[Account]:
-        """
-        Get all accounts of a specific type.
-        
-        Args:
-            account_type: The account type to filter by
-            
-        Returns:
-            List of Account objects
-        """
-        return (
-            self.db.query(Account)
-            .filter(Account.account_type == account_type)
-            .order_by(Account.code)
-            .all()
-        )
-    
     def generate_cash_flow_statement(
         self,
         start_date: date,
@@ -1302,29 +865,32 @@ class FinancialStatementService(BaseService):
         fiscal_year_start = self._get_first_period_of_fiscal_year(start_period.fiscal_year)
         fiscal_year_start_date = fiscal_year_start.start_date if fiscal_year_start else start_period.start_date
         
-        # Get balances for the current and previous periods
-        current_balances = self._get_account_balances_as_of_date(end_date)
-        beginning_balances = self._get_account_balances_as_of_date(start_date - timedelta(days=1))
-        
-        # Get previous period balances if needed
-        prev_balances = {}
-        prev_beginning_balances = {}
+        # Fetch every balance, income statement figure and cash-side
+        # activity needed below in one pass
+        ranges = {'current': (start_date, end_date)}
+        as_of = {
+            'end': end_date,
+            'beginning': start_date - timedelta(days=1)
+        }
         if include_comparative and prev_start_period and prev_end_period:
-            prev_balances = self._get_account_balances_as_of_date(prev_end_period.end_date)
-            prev_beginning_balances = self._get_account_balances_as_of_date(prev_start_period.start_date - timedelta(days=1))
+            ranges['prev'] = (prev_start_period.start_date, prev_end_period.end_date)
+            as_of['prev_end'] = prev_end_period.end_date
+            as_of['prev_beginning'] = prev_start_period.start_date - timedelta(days=1)
+        dataset = StatementDataset(
+            self.db,
+            ranges=ranges,
+            as_of=as_of,
+            cash_activity_range=(start_date, end_date)
+        )
         
-        # Get all journal entries for the period
-        journal_entries = self._get_journal_entries_for_date_range(start_date, end_date)
+        current_balances = dataset.balance_map('end')
+        beginning_balances = dataset.balance_map('beginning')
+        prev_balances = dataset.balance_map('prev_end')
+        prev_beginning_balances = dataset.balance_map('prev_beginning')
         
-        # Get all accounts for categorization
-        all_accounts = {a.id: a for a in self.db.query(Account).all()}
-        
-        # Categorize accounts
-        cash_accounts = [
-            a for a in all_accounts.values() 
-            if a.account_type == AccountType.ASSET_CURRENT.value 
-            and 'cash' in a.name.lower()
-        ]
+        # Accounts for categorization
+        all_accounts = dataset.accounts
+        cash_accounts = dataset.cash_accounts
         
         if not cash_accounts:
             raise ValueError("No cash accounts found. Please ensure you have at least one cash account configured.")
@@ -1407,7 +973,8 @@ class FinancialStatementService(BaseService):
             end_date, 
             currency=currency, 
             include_comparative=include_comparative,
-            format_currency=format_currency
+            format_currency=format_currency,
+            dataset=dataset
         )
         
         net_income = self._parse_amount(income_statement['net_income']['amount'])
@@ -1433,7 +1000,7 @@ class FinancialStatementService(BaseService):
         # This is a simplified version - in a real app, you'd have more sophisticated logic
         
         # Depreciation and amortization
-        deprec_amort = self._calculate_depreciation_amortization(start_date, end_date)
+        deprec_amort = self._calculate_depreciation_amortization(dataset)
         if deprec_amort != 0:
             section_data['Cash Flows from Operating Activities']['lines'].append({
                 'name': 'Depreciation and Amortization',
@@ -1460,10 +1027,7 @@ class FinancialStatementService(BaseService):
             section_data['Cash Flows from Operating Activities']['total'] += change['amount']
         
         # 3. Calculate cash flows from investing activities
-        investing_activities = self._calculate_investing_activities(
-            journal_entries, 
-            all_accounts
-        )
+        investing_activities = self._calculate_investing_activities(dataset)
         
         for activity in investing_activities:
             section_data['Cash Flows from Investing Activities']['lines'].append({
@@ -1474,10 +1038,7 @@ class FinancialStatementService(BaseService):
             section_data['Cash Flows from Investing Activities']['total'] += activity['amount']
         
         # 4. Calculate cash flows from financing activities
-        financing_activities = self._calculate_financing_activities(
-            journal_entries, 
-            all_accounts
-        )
+        financing_activities = self._calculate_financing_activities(dataset)
         
         for activity in financing_activities:
             section_data['Cash Flows from Financing Activities']['lines'].append({
@@ -1576,48 +1137,20 @@ class FinancialStatementService(BaseService):
         
         return cash_flow
     
-    def _calculate_depreciation_amortization(
-        self, 
-        start_date: date, 
-        end_date: date
-    ) -> Decimal:
-        """ Calculate Depreciation Amortization."""
+    def _calculate_depreciation_amortization(self, dataset: StatementDataset) -> Decimal:
         """
-        Calculate total depreciation and amortization for a date range.
+        Calculate total depreciation and amortization for the dataset's current range.
         
         Args:
-            start_date: Start date of the period
-            end_date: End date of the period
+            dataset: The statement dataset with a 'current' range
             
         Returns:
             Total depreciation and amortization as a Decimal
         """
-        # Get all depreciation and amortization journal entries
-        deprec_amort_entries = (
-            self.db.query(JournalEntryLine)
-            .join(Account, JournalEntryLine.account_id == Account.id)
-            .join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id)
-            .filter(
-                JournalEntry.entry_date >= start_date,
-                JournalEntry.entry_date <= end_date,
-                JournalEntry.status == JournalEntryStatus.POSTED,
-                or_(
-                    Account.account_type == AccountType.EXPENSE_DEPRECIATION.value,
-                    Account.account_type == AccountType.EXPENSE_AMORTIZATION.value
-                )
-            )
-            .all()
-        )
-        
-        # Sum up all depreciation and amortization amounts
-        total = Decimal('0')
-        for entry in deprec_amort_entries:
-            if entry.is_debit:
-                total += entry.amount
-            else:
-                total -= entry.amount
-        
-        return total
+        return dataset.total_for_types('current', [
+            AccountType.EXPENSE_DEPRECIATION.value,
+            AccountType.EXPENSE_AMORTIZATION.value
+        ])
     
     def _calculate_working_capital_changes(
         self,
@@ -1678,21 +1211,15 @@ class FinancialStatementService(BaseService):
         
         return changes
     
-    def _calculate_investing_activities(
-        self,
-        journal_entries: List[JournalEntry],
-        all_accounts: Dict[UUID, Account]
-    ) -> List[Dict[str, Any]]:
-        """ Calculate Investing Activities."""
+    def _calculate_investing_activities(self, dataset: StatementDataset) -> List[Dict[str, Any]]:
         """
         Calculate cash flows from investing activities.
         
         Args:
-            journal_entries: List of journal entries for the period
-            all_accounts: Dictionary of all accounts by ID
+            dataset: The statement dataset, loaded with cash-side activity
             
         Returns:
-            List of investing activities
+            List of investing activities, one per account
         """
         activities = []
         
@@ -1705,54 +1232,33 @@ class FinancialStatementService(BaseService):
             AccountType.INVESTMENT_DEBT.value
         ]
         
-        # Process each journal entry
-        for entry in journal_entries:
-            for line in entry.lines:
-                account = all_accounts.get(line.account_id)
-                if not account or account.account_type not in investing_types:
+        for account_type in investing_types:
+            for account in dataset.accounts_of_type(account_type):
+                # Net cash effect of entries touching both cash and this account
+                amount = dataset.cash_activity.get(account.id, Decimal('0'))
+                if amount == 0:
                     continue
                 
-                # Only consider cash transactions
-                cash_line = next((l for l in entry.lines if 
-                                all_accounts.get(l.account_id, Account()).account_type == AccountType.ASSET_CURRENT.value and 
-                                'cash' in all_accounts.get(l.account_id, Account()).name.lower()), None)
-                
-                if not cash_line:
-                    continue
-                
-                # Determine if this is an inflow or outflow of cash
-                is_inflow = (cash_line.is_debit and line.is_credit) or (not cash_line.is_debit and not line.is_credit)
-                amount = line.amount if is_inflow else -line.amount
-                
-                # Add to activities
                 activity_name = f"{'Purchase' if amount < 0 else 'Proceeds from sale'} of {account.name}"
                 activities.append({
                     'name': activity_name,
                     'amount': amount,
                     'account_id': account.id,
                     'account_code': account.code,
-                    'account_name': account.name,
-                    'journal_entry_id': str(entry.id),
-                    'date': entry.entry_date.isoformat()
+                    'account_name': account.name
                 })
         
         return activities
     
-    def _calculate_financing_activities(
-        self,
-        journal_entries: List[JournalEntry],
-        all_accounts: Dict[UUID, Account]
-    ) -> List[Dict[str, Any]]:
-        """ Calculate Financing Activities."""
+    def _calculate_financing_activities(self, dataset: StatementDataset) -> List[Dict[str, Any]]:
         """
         Calculate cash flows from financing activities.
         
         Args:
-            journal_entries: List of journal entries for the period
-            all_accounts: Dictionary of all accounts by ID
+            dataset: The statement dataset, loaded with cash-side activity
             
         Returns:
-            List of financing activities
+            List of financing activities, one per account
         """
         activities = []
         
@@ -1764,30 +1270,17 @@ class FinancialStatementService(BaseService):
             AccountType.EQUITY_DIVIDENDS.value
         ]
         
-        # Process each journal entry
-        for entry in journal_entries:
-            for line in entry.lines:
-                account = all_accounts.get(line.account_id)
-                if not account or account.account_type not in financing_types:
+        for account_type in financing_types:
+            for account in dataset.accounts_of_type(account_type):
+                # Net cash effect of entries touching both cash and this account
+                amount = dataset.cash_activity.get(account.id, Decimal('0'))
+                if amount == 0:
                     continue
                 
-                # Only consider cash transactions
-                cash_line = next((l for l in entry.lines if 
-                                all_accounts.get(l.account_id, Account()).account_type == AccountType.ASSET_CURRENT.value and 
-                                'cash' in all_accounts.get(l.account_id, Account()).name.lower()), None)
-                
-                if not cash_line:
-                    continue
-                
-                # Determine if this is an inflow or outflow of cash
-                is_inflow = (cash_line.is_debit and line.is_credit) or (not cash_line.is_debit and not line.is_credit)
-                amount = line.amount if is_inflow else -line.amount
-                
                 # Special handling for dividends (always an outflow)
                 if account.account_type == AccountType.EQUITY_DIVIDENDS.value:
                     amount = -abs(amount)
                 
-                # Add to activities
                 activity_name = account.name
                 if 'loan' in account.name.lower() or 'debt' in account.name.lower():
                     activity_name = f"{'Repayment' if amount < 0 else 'Proceeds from'} {account.name}"
@@ -1801,37 +1294,7 @@ class FinancialStatementService(BaseService):
                     'amount': amount,
                     'account_id': account.id,
                     'account_code': account.code,
-                    'account_name': account.name,
-                    'journal_entry_id': str(entry.id),
-                    'date': entry.entry_date.isoformat()
+                    'account_name': account.name
                 })
         
         return activities
-    
-    def _get_journal_entries_for_date_range(
-        self,
-        start_date: date,
-        end_date: date
-    ) -> List[JournalEntry]:
-        """ Get Journal Entries For Date Range."""
-        """
-        Get all journal entries for a date range.
-        
-        Args:
-            start_date: Start date of the period
-            end_date: End date of the period
-            
-        Returns:
-            List of JournalEntry objects
-        """
-        return (
-            self.db.query(JournalEntry)
-            .options(joinedload(JournalEntry.lines))
-            .filter(
-                JournalEntry.entry_date >= start_date,
-                JournalEntry.entry_date <= end_date,
-                JournalEntry.status == JournalEntryStatus.POSTED
-            )
-            .order_by(JournalEntry.entry_date, JournalEntry.created_at)
-            .all()
-        )
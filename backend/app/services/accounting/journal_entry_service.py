@@ -7,18 +7,14 @@ This module provides services for managing journal entries in the general ledger
 from datetime import datetime, date, timedelta
 from typing import List, Dict, Optional, Tuple, Union, Any
 
-from ...base.service import BaseService
-from ..exceptions import (
-from ..models import (
-from .gl_period_service import GLPeriodService
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy import and_, or_, func, case, text
 from sqlalchemy.orm import Session, joinedload
 from uuid import UUID, uuid4
 
-
-
+from ...base.service import BaseService
+from ..exceptions import (
     JournalEntryNotFoundException,
     InvalidJournalEntryException,
     PeriodClosedException,
@@ -30,6 +26,7 @@ from uuid import UUID, uuid4
     JournalEntryAlreadyReversedException,
     InvalidRecurringEntryException
 )
+from ..models import (
     JournalEntry,
     JournalEntryLine,
     JournalEntryStatus,
@@ -38,6 +35,8 @@ from uuid import UUID, uuid4
     Account,
     AccountType
 )
+from .balance_ledger import AccountBalanceLedger
+from .gl_period_service import GLPeriodService
 
 
 class JournalEntryService(BaseService):
@@ -46,6 +45,7 @@ class JournalEntryService(BaseService):
     def __init__(self, db: Session):
         super().__init__(db)
         self.period_service = GLPeriodService(db)
+        self.balance_ledger = AccountBalanceLedger(db)
     
     def create_journal_entry(
         self,
@@ -214,6 +214,45 @@ class JournalEntryService(BaseService):
             if period:
                 journal_entry.period_id = period.id
         
+        self.balance_ledger.record_posting(journal_entry)
+        
+        self.db.commit()
+        self.db.refresh(journal_entry)
+        
+        return journal_entry
+    
+    def void_journal_entry(self, entry_id: UUID, voided_by: UUID) -> JournalEntry:
+        """
+        Void a posted journal entry.
+        
+        Args:
+            entry_id: The ID of the journal entry to void
+            voided_by: ID of the user voiding the entry
+            
+        Returns:
+            The updated JournalEntry object
+            
+        Raises:
+            JournalEntryNotFoundException: If the journal entry doesn't exist
+            JournalEntryNotPostedException: If the entry is not posted
+            PeriodClosedException: If the period is closed
+        """
+        journal_entry = self._get_journal_entry(entry_id)
+        
+        if journal_entry.status != JournalEntryStatus.POSTED:
+            raise JournalEntryNotPostedException("Only posted journal entries can be voided")
+        
+        if not self.period_service.is_period_open(journal_entry.entry_date):
+            raise PeriodClosedException(
+                f"The period for {journal_entry.entry_date} is closed"
+            )
+        
+        self.balance_ledger.record_void(journal_entry)
+        
+        journal_entry.status = JournalEntryStatus.VOIDED
+        journal_entry.updated_by = voided_by
+        journal_entry.updated_at = datetime.utcnow()
+        
         self.db.commit()
         self.db.refresh(journal_entry)
         
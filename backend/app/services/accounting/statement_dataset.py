@@ -0,0 +1,187 @@
+"""
+Paksa Financial System
+Financial Statement Dataset
+
+This module provides the shared data-gathering stage for financial statements.
+A StatementDataset fetches every aggregate a statement request needs in a
+fixed number of grouped queries (accounts, balances for all requested windows,
+and optionally cash-side activity), so the balance sheet, income statement,
+cash flow statement and their comparative columns all render from the same
+in-memory data instead of issuing their own queries per period and per
+account type.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, case, exists, func
+from sqlalchemy.orm import Session, aliased
+
+from ..models import (
+    Account,
+    AccountType,
+    JournalEntry,
+    JournalEntryLine,
+    JournalEntryStatus,
+)
+
+ZERO = Decimal('0')
+
+
+class StatementDataset:
+    """
+    In-memory aggregates backing one financial statement request.
+
+    Windows are named either as date ranges (activity between two dates,
+    inclusive) or as-of points (cumulative balance up to a date, inclusive).
+    All balances are net debit balances (debits minus credits).
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        ranges: Optional[Dict[str, Tuple[date, date]]] = None,
+        as_of: Optional[Dict[str, date]] = None,
+        cash_activity_range: Optional[Tuple[date, date]] = None
+    ):
+        self.db = db
+        self.ranges = dict(ranges or {})
+        self.as_of = dict(as_of or {})
+        self.cash_activity_range = cash_activity_range
+
+        self.accounts: Dict[UUID, Account] = {}
+        self.accounts_by_type: Dict[str, List[Account]] = defaultdict(list)
+        self.balances: Dict[str, Dict[UUID, Decimal]] = {}
+        self.cash_activity: Dict[UUID, Decimal] = {}
+
+        self._load_accounts()
+        self._load_balances()
+        if cash_activity_range:
+            self._load_cash_activity()
+
+    def _load_accounts(self) -> None:
+        for account in self.db.query(Account).order_by(Account.code).all():
+            self.accounts[account.id] = account
+            self.accounts_by_type[account.account_type].append(account)
+
+    def _load_balances(self) -> None:
+        windows = list(self.ranges) + list(self.as_of)
+        for name in windows:
+            self.balances[name] = {}
+        if not windows:
+            return
+
+        signed_amount = case(
+            (JournalEntryLine.is_debit == True, JournalEntryLine.amount),  # noqa: E712
+            else_=JournalEntryLine.amount * -1
+        )
+
+        columns = []
+        for name, (start_date, end_date) in self.ranges.items():
+            columns.append(func.sum(case(
+                (and_(JournalEntry.entry_date >= start_date, JournalEntry.entry_date <= end_date), signed_amount),
+                else_=0
+            )).label(name))
+        for name, as_of_date in self.as_of.items():
+            columns.append(func.sum(case(
+                (JournalEntry.entry_date <= as_of_date, signed_amount),
+                else_=0
+            )).label(name))
+
+        latest_date = max(
+            [end_date for _, end_date in self.ranges.values()] + list(self.as_of.values())
+        )
+
+        query = (
+            self.db.query(JournalEntryLine.account_id, *columns)
+            .join(JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id)
+            .filter(
+                JournalEntry.entry_date <= latest_date,
+                JournalEntry.status == JournalEntryStatus.POSTED
+            )
+            .group_by(JournalEntryLine.account_id)
+        )
+        if not self.as_of:
+            earliest_date = min(start_date for start_date, _ in self.ranges.values())
+            query = query.filter(JournalEntry.entry_date >= earliest_date)
+
+        for row in query.all():
+            account_id = row[0]
+            for index, name in enumerate(windows, start=1):
+                amount = row[index]
+                if amount:
+                    self.balances[name][account_id] = Decimal(amount)
+
+    def _load_cash_activity(self) -> None:
+        """Net cash effect per non-cash account of entries that touch cash."""
+        cash_account_ids = [account.id for account in self.cash_accounts]
+        if not cash_account_ids:
+            return
+
+        start_date, end_date = self.cash_activity_range
+        cash_line = aliased(JournalEntryLine)
+        rows = (
+            self.db.query(
+                JournalEntryLine.account_id,
+                func.sum(case(
+                    (JournalEntryLine.is_debit == True, JournalEntryLine.amount * -1),  # noqa: E712
+                    else_=JournalEntryLine.amount
+                ))
+            )
+            .join(JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id)
+            .filter(
+                JournalEntry.entry_date >= start_date,
+                JournalEntry.entry_date <= end_date,
+                JournalEntry.status == JournalEntryStatus.POSTED,
+                JournalEntryLine.account_id.notin_(cash_account_ids),
+                exists().where(and_(
+                    cash_line.journal_entry_id == JournalEntryLine.journal_entry_id,
+                    cash_line.account_id.in_(cash_account_ids)
+                ))
+            )
+            .group_by(JournalEntryLine.account_id)
+            .all()
+        )
+        self.cash_activity = {account_id: Decimal(amount) for account_id, amount in rows if amount}
+
+    @property
+    def cash_accounts(self) -> List[Account]:
+        return [
+            account for account in self.accounts_by_type.get(AccountType.ASSET_CURRENT.value, [])
+            if 'cash' in (account.name or '').lower()
+        ]
+
+    def has_window(self, name: str) -> bool:
+        return name in self.balances
+
+    def accounts_of_type(self, account_type: str) -> List[Account]:
+        return self.accounts_by_type.get(account_type, [])
+
+    def balance(self, name: str, account_id: UUID) -> Decimal:
+        return self.balances.get(name, {}).get(account_id, ZERO)
+
+    def total_for_types(self, name: str, account_types: Iterable[str]) -> Decimal:
+        total = ZERO
+        for account_type in account_types:
+            for account in self.accounts_of_type(account_type):
+                total += self.balance(name, account.id)
+        return total
+
+    def balance_map(self, name: str) -> Dict[UUID, Dict[str, Any]]:
+        """
+        Balances for a window keyed by account ID, in the shape the statement
+        builders consume. Accounts without activity in the window are omitted.
+        """
+        balances = {}
+        for account_id, amount in self.balances.get(name, {}).items():
+            account = self.accounts.get(account_id)
+            if account:
+                balances[account_id] = {
+                    'account_id': account_id,
+                    'account_code': account.code,
+                    'account_name': account.name,
+                    'balance': amount
+                }
+        return balances
@@ -6,15 +6,12 @@ from typing import List, Optional, Dict, Any
 
 from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy import and_, or_, func, desc
-from sqlalchemy.orm import Session
-from uuid import UUID
+from sqlalchemy.orm import Session, selectinload
+from uuid import UUID, uuid4
 
 from app.core.exceptions import NotFoundException, ValidationException
+from app.core.db.tenant_middleware import tenant_context
 from app.models.allocation import (
-from app.models.journal_entry import JournalEntry, JournalEntryLine, JournalEntryStatus
-
-
-
     AllocationRule, 
     AllocationRuleLine, 
     Allocation, 
@@ -22,13 +19,41 @@ from app.models.journal_entry import JournalEntry, JournalEntryLine, JournalEntr
     AllocationMethod,
     AllocationStatus
 )
+from app.models.journal_entry import JournalEntry, JournalEntryLine, JournalEntryStatus
+from app.services.accounting.balance_ledger import AccountBalanceLedger
+from app.services.numbering.document_number_service import (
+    DocumentNumberService,
+    last_number_in_use
+)
+from app.services.allocation.rule_index import (
+    CompiledRule,
+    RuleIndex,
+    get_rule_index,
+    invalidate_rule_index
+)
 
 
 class AllocationEngine:
     """Engine for processing allocation rules and creating allocations."""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, tenant_id: Optional[str] = None):
         self.db = db
+        self.tenant_key = str(tenant_id or tenant_context.tenant_id or 'default')
+        self._rule_index: Optional[RuleIndex] = None
+        self.numbers = DocumentNumberService(db, self.tenant_key)
+        self.ledger = AccountBalanceLedger(db)
+    
+    @property
+    def rule_index(self) -> RuleIndex:
+        """Compiled rule index, resolved once per engine instance."""
+        if self._rule_index is None:
+            self._rule_index = get_rule_index(self.db, self.tenant_key)
+        return self._rule_index
+    
+    def invalidate_rules(self) -> None:
+        """Drop the compiled rules after a rule change."""
+        invalidate_rule_index(self.tenant_key)
+        self._rule_index = None
     
     def create_allocation_rule(self, rule_data: Dict[str, Any], created_by: UUID) -> AllocationRule:
         if not rule_data.get('rule_code'):
@@ -66,6 +91,7 @@ class AllocationEngine:
         
         self.db.commit()
         self.db.refresh(rule)
+        self.invalidate_rules()
         
         return rule
     
@@ -104,14 +130,193 @@ class AllocationEngine:
         
         allocation_entries = self._create_allocation_entries(allocation, rule, total_amount, created_by)
         
-        for entry in allocation_entries:
-            je = self._create_allocation_journal_entry(entry, journal_entry, created_by)
+        for line_number, entry in enumerate(allocation_entries, 1):
+            je = self._create_allocation_journal_entry(entry, journal_entry, created_by, line_number)
             entry.journal_entry_id = je.id
         
         self.db.commit()
         self.db.refresh(allocation)
         
         return allocation
+
+    def process_allocations_batch(
+        self,
+        created_by: UUID,
+        journal_entry_ids: Optional[List[UUID]] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        dry_run: bool = False,
+        chunk_size: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Allocate a batch of journal entries.
+        
+        Entries are selected by ID or by entry date range; entries that were
+        already allocated, and allocation journals themselves, are skipped.
+        Allocations are computed in memory against the compiled rule index and
+        written per chunk of source entries with bulk inserts of allocations,
+        allocation entries, journal entries and lines, one commit per chunk.
+        The posted allocation journals are applied to the balance ledger in
+        the same transaction.
+        
+        With ``dry_run`` nothing is written and the result only previews the
+        totals per target account.
+        
+        Args:
+            created_by: ID of the user running the allocation
+            journal_entry_ids: Journal entries to allocate
+            start_date: Start of the entry date range to allocate
+            end_date: End of the entry date range to allocate
+            dry_run: Compute totals without writing anything
+            chunk_size: Number of source journal entries per chunk
+            
+        Returns:
+            Dict with entry, allocation and line counts, the total allocated
+            and totals per target account
+        """
+        if not journal_entry_ids and not (start_date and end_date):
+            raise ValidationException("Either journal_entry_ids or start_date and end_date are required")
+        
+        already_allocated = self.db.query(Allocation.id).filter(
+            Allocation.source_journal_entry_id == JournalEntry.id
+        ).exists()
+        query = self.db.query(JournalEntry.id).filter(
+            ~already_allocated,
+            ~JournalEntry.entry_number.like('ALLOC-%')
+        )
+        if journal_entry_ids:
+            query = query.filter(JournalEntry.id.in_(journal_entry_ids))
+        if start_date and end_date:
+            query = query.filter(
+                JournalEntry.entry_date >= start_date,
+                JournalEntry.entry_date <= end_date
+            )
+        source_ids = [row[0] for row in query.order_by(JournalEntry.entry_date, JournalEntry.id).all()]
+        
+        target_totals: Dict[UUID, Decimal] = {}
+        entries_processed = 0
+        allocations_created = 0
+        lines_created = 0
+        total_allocated = Decimal('0')
+        
+        for offset in range(0, len(source_ids), chunk_size):
+            journal_entries = self.db.query(JournalEntry)\
+                .options(selectinload(JournalEntry.lines))\
+                .filter(JournalEntry.id.in_(source_ids[offset:offset + chunk_size]))\
+                .order_by(JournalEntry.entry_date, JournalEntry.id)\
+                .all()
+            
+            planned = []
+            for journal_entry in journal_entries:
+                entries_processed += 1
+                matching_rules = self._find_matching_rules(journal_entry)
+                if not matching_rules:
+                    continue
+                
+                rule = matching_rules[0]
+                total_amount = sum(line.amount for line in journal_entry.lines if line.is_debit)
+                if total_amount <= 0:
+                    continue
+                
+                lines = self._plan_allocation(rule, total_amount)
+                planned.append((journal_entry, rule, total_amount, lines))
+                for line in lines:
+                    target_totals[line['target_account_id']] = (
+                        target_totals.get(line['target_account_id'], Decimal('0')) + line['allocated_amount']
+                    )
+                    total_allocated += line['allocated_amount']
+                lines_created += len(lines)
+            
+            allocations_created += len(planned)
+            if not dry_run and planned:
+                self._write_allocations(planned, created_by)
+                self.db.commit()
+            self.db.expunge_all()
+        
+        return {
+            'dry_run': dry_run,
+            'entries_processed': entries_processed,
+            'allocations': allocations_created,
+            'allocation_lines': lines_created,
+            'total_allocated': total_allocated,
+            'target_totals': [
+                {'target_account_id': account_id, 'amount': amount}
+                for account_id, amount in target_totals.items()
+            ]
+        }
+    
+    def _write_allocations(self, planned: List[tuple], created_by: UUID) -> None:
+        """Bulk insert planned allocations with their entries and journals."""
+        allocations = []
+        allocation_entries = []
+        journal_entries = []
+        journal_lines = []
+        ledger_totals: Dict[UUID, List[Decimal]] = {}
+        posted_at = datetime.utcnow()
+        audit = {'created_by': created_by, 'updated_by': created_by}
+        
+        numbers = self._allocation_numbers(len(planned))
+        for (source_je, rule, total_amount, lines), allocation_number in zip(planned, numbers):
+            allocation_id = uuid4()
+            allocations.append({
+                'id': allocation_id,
+                'allocation_number': allocation_number,
+                'allocation_date': source_je.entry_date,
+                'source_journal_entry_id': source_je.id,
+                'source_amount': total_amount,
+                'allocation_rule_id': rule.id,
+                'status': 'posted',
+                'description': f"Allocation based on rule: {rule.rule_name}",
+                **audit
+            })
+            
+            source_account_id = source_je.lines[0].account_id
+            for line_number, line in enumerate(lines, 1):
+                je_id = uuid4()
+                allocation_entries.append({
+                    'id': uuid4(),
+                    'allocation_id': allocation_id,
+                    'journal_entry_id': je_id,
+                    **line,
+                    **audit
+                })
+                journal_entries.append({
+                    'id': je_id,
+                    'entry_number': self._allocation_entry_number(allocation_number, line_number),
+                    'entry_date': source_je.entry_date,
+                    'description': f"Allocation: {line['description']}",
+                    'reference': source_je.reference,
+                    'status': JournalEntryStatus.POSTED,
+                    'posted_at': posted_at,
+                    **audit
+                })
+                journal_lines.append({
+                    'id': uuid4(),
+                    'journal_entry_id': je_id,
+                    'account_id': line['target_account_id'],
+                    'description': line['description'],
+                    'amount': line['allocated_amount'],
+                    'is_debit': True,
+                    **audit
+                })
+                journal_lines.append({
+                    'id': uuid4(),
+                    'journal_entry_id': je_id,
+                    'account_id': source_account_id,
+                    'description': f"Allocation from {line['description']}",
+                    'amount': line['allocated_amount'],
+                    'is_debit': False,
+                    **audit
+                })
+                self._add_ledger_amounts(
+                    ledger_totals, line['target_account_id'], source_account_id, line['allocated_amount']
+                )
+        
+        self.db.bulk_insert_mappings(Allocation, allocations)
+        self.db.bulk_insert_mappings(JournalEntry, journal_entries)
+        self.db.bulk_insert_mappings(JournalEntryLine, journal_lines)
+        self.db.bulk_insert_mappings(AllocationEntry, allocation_entries)
+        self.ledger.record_amounts(posted_at.date(), ledger_totals)
     
     def get_allocation_rules(self, skip: int = 0, limit: int = 100) -> List[AllocationRule]:
         return self.db.query(AllocationRule)\
@@ -123,52 +328,62 @@ class AllocationEngine:
             AllocationRule.id == rule_id
         ).first()
     
-    def _find_matching_rules(self, journal_entry: JournalEntry) -> List[AllocationRule]:
-        query = self.db.query(AllocationRule).filter(
-            and_(
-                AllocationRule.status == AllocationStatus.ACTIVE,
-                AllocationRule.effective_from <= journal_entry.entry_date,
-                or_(
-                    AllocationRule.effective_to.is_(None),
-                    AllocationRule.effective_to >= journal_entry.entry_date
-                )
-            )
+    def _find_matching_rules(self, journal_entry: JournalEntry) -> List[CompiledRule]:
+        """
+        Active rules effective on the entry date, ordered by priority. Rules
+        with a source account only match entries that have a line on it.
+        """
+        return self.rule_index.match(
+            journal_entry.entry_date,
+            (line.account_id for line in journal_entry.lines)
         )
-        
-        return query.order_by(AllocationRule.priority).all()
     
     def _create_allocation_entries(
         self, 
         allocation: Allocation, 
-        rule: AllocationRule, 
+        rule: CompiledRule, 
         total_amount: Decimal,
         created_by: UUID
     ) -> List[AllocationEntry]:
         """Create allocation entries based on the rule."""
         entries = []
         
+        for line in self._plan_allocation(rule, total_amount):
+            entry = AllocationEntry(
+                allocation_id=allocation.id,
+                created_by=created_by,
+                updated_by=created_by,
+                **line
+            )
+            
+            self.db.add(entry)
+            entries.append(entry)
+        
+        return entries
+    
+    def _plan_allocation(self, rule: CompiledRule, total_amount: Decimal) -> List[Dict[str, Any]]:
+        """
+        Compute the allocation lines for an amount without touching the session.
+        
+        Each line has target_account_id, allocated_amount, allocation_percentage
+        and description.
+        """
         if rule.allocation_method == AllocationMethod.PERCENTAGE:
-            entries = self._allocate_by_percentage(allocation, rule, total_amount, created_by)
+            return self._allocate_by_percentage(rule, total_amount)
         elif rule.allocation_method == AllocationMethod.EQUAL:
-            entries = self._allocate_equally(allocation, rule, total_amount, created_by)
+            return self._allocate_equally(rule, total_amount)
         elif rule.allocation_method == AllocationMethod.FIXED_AMOUNT:
-            entries = self._allocate_by_fixed_amount(allocation, rule, total_amount, created_by)
+            return self._allocate_by_fixed_amount(rule, total_amount)
         elif rule.allocation_method == AllocationMethod.WEIGHTED:
-            entries = self._allocate_by_weight(allocation, rule, total_amount, created_by)
+            return self._allocate_by_weight(rule, total_amount)
         elif rule.allocation_method == AllocationMethod.FORMULA:
-            entries = self._allocate_by_formula(allocation, rule, total_amount, created_by)
+            return self._allocate_by_formula(rule, total_amount)
         
-        return entries
+        return []
     
-    def _allocate_by_percentage(
-        self, 
-        allocation: Allocation, 
-        rule: AllocationRule, 
-        total_amount: Decimal,
-        created_by: UUID
-    ) -> List[AllocationEntry]:
+    def _allocate_by_percentage(self, rule: CompiledRule, total_amount: Decimal) -> List[Dict[str, Any]]:
         """Allocate amount based on percentages."""
-        entries = []
+        lines = []
         
         for line in rule.allocation_lines:
             if line.allocation_percentage:
@@ -176,64 +391,40 @@ class AllocationEngine:
                     Decimal('0.01'), rounding=ROUND_HALF_UP
                 )
                 
-                entry = AllocationEntry(
-                    allocation_id=allocation.id,
-                    target_account_id=line.target_account_id,
-                    allocated_amount=allocated_amount,
-                    allocation_percentage=line.allocation_percentage,
-                    description=f"Allocation {line.allocation_percentage}% of {total_amount}",
-                    created_by=created_by,
-                    updated_by=created_by
-                )
-                
-                self.db.add(entry)
-                entries.append(entry)
-        
-        return entries
+                lines.append({
+                    'target_account_id': line.target_account_id,
+                    'allocated_amount': allocated_amount,
+                    'allocation_percentage': line.allocation_percentage,
+                    'description': f"Allocation {line.allocation_percentage}% of {total_amount}"
+                })
+        
+        return lines
     
-    def _allocate_equally(
-        self, 
-        allocation: Allocation, 
-        rule: AllocationRule, 
-        total_amount: Decimal,
-        created_by: UUID
-    ) -> List[AllocationEntry]:
+    def _allocate_equally(self, rule: CompiledRule, total_amount: Decimal) -> List[Dict[str, Any]]:
         """Allocate amount equally among targets."""
-        entries = []
+        lines = []
         line_count = len(rule.allocation_lines)
         
         if line_count == 0:
-            return entries
+            return lines
         
         amount_per_line = (total_amount / line_count).quantize(
             Decimal('0.01'), rounding=ROUND_HALF_UP
         )
         
         for line in rule.allocation_lines:
-            entry = AllocationEntry(
-                allocation_id=allocation.id,
-                target_account_id=line.target_account_id,
-                allocated_amount=amount_per_line,
-                allocation_percentage=Decimal('100') / line_count,
-                description=f"Equal allocation of {amount_per_line}",
-                created_by=created_by,
-                updated_by=created_by
-            )
-            
-            self.db.add(entry)
-            entries.append(entry)
-        
-        return entries
+            lines.append({
+                'target_account_id': line.target_account_id,
+                'allocated_amount': amount_per_line,
+                'allocation_percentage': Decimal('100') / line_count,
+                'description': f"Equal allocation of {amount_per_line}"
+            })
+        
+        return lines
     
-    def _allocate_by_fixed_amount(
-        self,
-        allocation: Allocation,
-        rule: AllocationRule,
-        total_amount: Decimal,
-        created_by: UUID
-    ) -> List[AllocationEntry]:
+    def _allocate_by_fixed_amount(self, rule: CompiledRule, total_amount: Decimal) -> List[Dict[str, Any]]:
         """Allocate fixed amounts to targets."""
-        entries = []
+        lines = []
         
         for line in rule.allocation_lines:
             if line.fixed_amount:
@@ -242,34 +433,22 @@ class AllocationEngine:
                     Decimal('0.01'), rounding=ROUND_HALF_UP
                 )
                 
-                entry = AllocationEntry(
-                    allocation_id=allocation.id,
-                    target_account_id=line.target_account_id,
-                    allocated_amount=allocated_amount,
-                    allocation_percentage=percentage,
-                    description=f"Fixed allocation of {allocated_amount}",
-                    created_by=created_by,
-                    updated_by=created_by
-                )
-                
-                self.db.add(entry)
-                entries.append(entry)
-        
-        return entries
+                lines.append({
+                    'target_account_id': line.target_account_id,
+                    'allocated_amount': allocated_amount,
+                    'allocation_percentage': percentage,
+                    'description': f"Fixed allocation of {allocated_amount}"
+                })
+        
+        return lines
     
-    def _allocate_by_weight(
-        self,
-        allocation: Allocation,
-        rule: AllocationRule,
-        total_amount: Decimal,
-        created_by: UUID
-    ) -> List[AllocationEntry]:
+    def _allocate_by_weight(self, rule: CompiledRule, total_amount: Decimal) -> List[Dict[str, Any]]:
         """Allocate based on weights."""
-        entries = []
+        lines = []
         total_weight = sum(line.weight or Decimal('0') for line in rule.allocation_lines)
         
         if total_weight == 0:
-            return entries
+            return lines
         
         for line in rule.allocation_lines:
             if line.weight:
@@ -280,73 +459,54 @@ class AllocationEngine:
                     Decimal('0.01'), rounding=ROUND_HALF_UP
                 )
                 
-                entry = AllocationEntry(
-                    allocation_id=allocation.id,
-                    target_account_id=line.target_account_id,
-                    allocated_amount=allocated_amount,
-                    allocation_percentage=percentage,
-                    description=f"Weighted allocation {line.weight}/{total_weight} = {percentage}%",
-                    created_by=created_by,
-                    updated_by=created_by
-                )
-                
-                self.db.add(entry)
-                entries.append(entry)
-        
-        return entries
+                lines.append({
+                    'target_account_id': line.target_account_id,
+                    'allocated_amount': allocated_amount,
+                    'allocation_percentage': percentage,
+                    'description': f"Weighted allocation {line.weight}/{total_weight} = {percentage}%"
+                })
+        
+        return lines
     
-    def _allocate_by_formula(
-        self,
-        allocation: Allocation,
-        rule: AllocationRule,
-        total_amount: Decimal,
-        created_by: UUID
-    ) -> List[AllocationEntry]:
+    def _allocate_by_formula(self, rule: CompiledRule, total_amount: Decimal) -> List[Dict[str, Any]]:
         """Allocate based on formula evaluation."""
-        entries = []
+        lines = []
         
         for line in rule.allocation_lines:
             if line.formula:
-                try:
-                    context = {'total': float(total_amount)}
-                    result = eval(line.formula, {"__builtins__": {}}, context)
-                    allocated_amount = Decimal(str(result)).quantize(
-                        Decimal('0.01'), rounding=ROUND_HALF_UP
-                    )
-                    percentage = (allocated_amount / total_amount * 100).quantize(
-                        Decimal('0.01'), rounding=ROUND_HALF_UP
-                    )
-                    
-                    entry = AllocationEntry(
-                        allocation_id=allocation.id,
-                        target_account_id=line.target_account_id,
-                        allocated_amount=allocated_amount,
-                        allocation_percentage=percentage,
-                        description=f"Formula allocation: {line.formula} = {allocated_amount}",
-                        created_by=created_by,
-                        updated_by=created_by
-                    )
-                    
-                    self.db.add(entry)
-                    entries.append(entry)
-                except Exception as e:
-                    raise ValidationException(f"Formula evaluation failed: {str(e)}")
-        
-        return entries
+                allocated_amount = line.evaluate(total_amount).quantize(
+                    Decimal('0.01'), rounding=ROUND_HALF_UP
+                )
+                percentage = (allocated_amount / total_amount * 100).quantize(
+                    Decimal('0.01'), rounding=ROUND_HALF_UP
+                )
+                
+                lines.append({
+                    'target_account_id': line.target_account_id,
+                    'allocated_amount': allocated_amount,
+                    'allocation_percentage': percentage,
+                    'description': f"Formula allocation: {line.formula} = {allocated_amount}"
+                })
+        
+        return lines
     
     def _create_allocation_journal_entry(
         self, 
         allocation_entry: AllocationEntry, 
         source_je: JournalEntry,
-        created_by: UUID
+        created_by: UUID,
+        line_number: int = 1
     ) -> JournalEntry:
-        """Create a journal entry for an allocation entry."""
+        """Create a posted journal entry for an allocation entry."""
         je = JournalEntry(
-            entry_number=f"ALLOC-{allocation_entry.allocation.allocation_number}",
+            entry_number=self._allocation_entry_number(
+                allocation_entry.allocation.allocation_number, line_number
+            ),
             entry_date=allocation_entry.allocation.allocation_date,
             description=f"Allocation: {allocation_entry.description}",
             reference=source_je.reference,
             status=JournalEntryStatus.POSTED,
+            posted_at=datetime.utcnow(),
             created_by=created_by,
             updated_by=created_by
         )
@@ -378,36 +538,44 @@ class AllocationEngine:
         self.db.add(debit_line)
         self.db.add(credit_line)
         
+        ledger_totals: Dict[UUID, List[Decimal]] = {}
+        self._add_ledger_amounts(
+            ledger_totals, allocation_entry.target_account_id, source_account_id,
+            allocation_entry.allocated_amount
+        )
+        self.ledger.record_amounts(je.posted_at.date(), ledger_totals)
+        
         return je
     
+    @staticmethod
+    def _allocation_entry_number(allocation_number: str, line_number: int) -> str:
+        """Journal entry number of one allocation line, unique per allocation."""
+        return f"{allocation_number}-{line_number:03d}"
+    
+    @staticmethod
+    def _add_ledger_amounts(
+        totals: Dict[UUID, List[Decimal]],
+        debit_account_id: UUID,
+        credit_account_id: UUID,
+        amount: Decimal
+    ) -> None:
+        totals.setdefault(debit_account_id, [Decimal('0'), Decimal('0')])[0] += amount
+        totals.setdefault(credit_account_id, [Decimal('0'), Decimal('0')])[1] += amount
+    
     def _generate_rule_code(self) -> str:
-        last_rule = self.db.query(AllocationRule)\
-            .order_by(desc(AllocationRule.created_at))\
-            .first()
-        
-        if last_rule and last_rule.rule_code.startswith('AR'):
-            try:
-                last_num = int(last_rule.rule_code.split('-')[1])
-                next_num = last_num + 1
-            except (IndexError, ValueError):
-                next_num = 1
-        else:
-            next_num = 1
-        
-        return f"AR-{next_num:04d}"
+        return self.numbers.next_number(
+            'AR',
+            width=4,
+            seed=lambda: last_number_in_use(self.db, AllocationRule.rule_code, 'AR')
+        )
     
     def _generate_allocation_number(self) -> str:
-        last_allocation = self.db.query(Allocation)\
-            .order_by(desc(Allocation.created_at))\
-            .first()
-        
-        if last_allocation and last_allocation.allocation_number.startswith('ALLOC'):
-            try:
-                last_num = int(last_allocation.allocation_number.split('-')[1])
-                next_num = last_num + 1
-            except (IndexError, ValueError):
-                next_num = 1
-        else:
-            next_num = 1
-        
-        return f"ALLOC-{next_num:06d}"
\ No newline at end of file
+        return self._allocation_numbers(1)[0]
+    
+    def _allocation_numbers(self, count: int) -> List[str]:
+        """Reserve ``count`` consecutive allocation numbers."""
+        return self.numbers.next_numbers(
+            'ALLOC',
+            count,
+            seed=lambda: last_number_in_use(self.db, Allocation.allocation_number, 'ALLOC')
+        )
@@ -1,29 +1,140 @@
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+"""
+Budget vs actual analytics.
 
-from fastapi import HTTPException
-from sqlalchemy import func
+Every analysis is a projection of one budget-vs-actual cube: budgeted and
+actual amounts by budget, account, budget year and period, filled by a single grouped
+query over budgets and their line items. The cube is cached per company, and
+per tenant for the all-companies view, and replaced whenever a budget or
+budget line item is written.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional
+import logging
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, exists, func, inspect, null, select, union_all
 from sqlalchemy.orm import Session
 
-from app.models import Budget, BudgetLine, BudgetAllocation
-from app.services.ap import APService
-from app.services.ar import ARService
-from app.services.budget import BudgetService
-from app.services.gl import GLService
-from app.services.payroll import PayrollService
-from app.services.procurement import ProcurementService
+from app.core.db.tenant_middleware import tenant_context
+from app.core.performance.caching_service import get_caching_service
+from app.models import Budget, BudgetLineItem
+
+if TYPE_CHECKING:
+    from app.services.ap import APService
+    from app.services.ar import ARService
+    from app.services.budget import BudgetService
+    from app.services.gl import GLService
+    from app.services.payroll import PayrollService
+    from app.services.procurement import ProcurementService
+
+logger = logging.getLogger(__name__)
+
+# Budgets in these statuses count as active
+ACTIVE_BUDGET_STATUSES = ("approved", "active")
+
+# Periods the budget trend can be broken down by
+TREND_PERIODS = ("month", "year")
+
+
+class BudgetCubeCell(NamedTuple):
+    """
+    Budgeted and actual amounts of one budget, account, budget year and period.
+    Budgets with line items are broken down by the items' accounts and periods;
+    a budget without line items is a single cell on its own account, without
+    a period.
+    """
+    budget_id: Any
+    account_id: Any
+    year: int
+    period: Optional[str]
+    is_active: bool
+    budgeted: Decimal
+    actual: Decimal
+
+
+def _company_key(company_id: Any = None) -> str:
+    """Cache key of a company's cube, or of the tenant's all-companies cube."""
+    if company_id:
+        return str(company_id)
+    return f"all:{tenant_context.tenant_id or 'default'}"
+
+
+def _cube_id(value: Any) -> Any:
+    """IDs as they round-trip through the JSON cache."""
+    return value if value is None or isinstance(value, int) else str(value)
+
+
+def _same(value: Any, key: Any) -> bool:
+    return value is not None and str(value) == str(key)
+
+
+def _variance(budgeted: Decimal, actual: Decimal) -> Dict:
+    return {
+        "budgeted": budgeted,
+        "actual": actual,
+        "variance": budgeted - actual,
+        "variance_percentage": (actual - budgeted) / budgeted * 100 if budgeted > 0 else 0
+    }
+
+
+def _month_index(period: Optional[str]) -> Optional[int]:
+    """Month of a period budgeted for one month (``YYYY-MM``), as year * 12 + month - 1."""
+    try:
+        month = datetime.strptime((period or '')[:7], "%Y-%m")
+    except ValueError:
+        return None
+    return month.year * 12 + month.month - 1
+
+
+def _unsupported_dimension(dimension: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Budgets carry no {dimension}, so they cannot be analyzed by {dimension}"
+    )
+
+
+def _totals(cells: Iterable[BudgetCubeCell], key) -> Dict[Any, List[Decimal]]:
+    """Budgeted and actual totals of the cells, by ``key(cell)``."""
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for cell in cells:
+        total = totals[key(cell)]
+        total[0] += cell.budgeted
+        total[1] += cell.actual
+    return totals
+
+
+def _monthly_totals(cells: Iterable[BudgetCubeCell]) -> Dict[int, List[Decimal]]:
+    """
+    Budgeted and actual totals of the cells by month index. Cells without a
+    month are spread evenly over the twelve months of their budget year.
+    """
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for cell in cells:
+        month = _month_index(cell.period)
+        months = [month] if month is not None else range(cell.year * 12, cell.year * 12 + 12)
+        for index in months:
+            total = totals[index]
+            total[0] += cell.budgeted / len(months)
+            total[1] += cell.actual / len(months)
+    return {
+        month: [budgeted.quantize(Decimal('0.01')), actual.quantize(Decimal('0.01'))]
+        for month, (budgeted, actual) in totals.items()
+    }
 
 
 class BudgetAnalyticsService:
     def __init__(
         self,
         db: Session,
-        budget_service: BudgetService,
-        gl_service: GLService,
-        ap_service: APService,
-        ar_service: ARService,
-        procurement_service: ProcurementService,
-        payroll_service: PayrollService
+        budget_service: "BudgetService",
+        gl_service: "GLService",
+        ap_service: "APService",
+        ar_service: "ARService",
+        procurement_service: "ProcurementService",
+        payroll_service: "PayrollService",
+        company_id: Optional[str] = None
     ):
         """  Init  ."""
         self.db = db
@@ -33,203 +144,193 @@ class BudgetAnalyticsService:
         self.ar_service = ar_service
         self.procurement_service = procurement_service
         self.payroll_service = payroll_service
+        # The cube is scoped and cached by the same company, so writes find it
+        self.company_id = company_id or tenant_context.company_id
+
+    def get_budget_cube(self) -> List[BudgetCubeCell]:
+        """
+        Get the budget-vs-actual cube of the company, from the cache unless a
+        budget or budget line item has been written since it was built.
+        """
+        company_key = _company_key(self.company_id)
+        cache = get_caching_service()
+        version, cells = cache.get_budget_cube(company_key)
+        if cells is None:
+            cells = [self._serialize_cell(row) for row in self._query_budget_cube()]
+            cache.cache_budget_cube(company_key, version, cells)
+        return [self._parse_cell(cell) for cell in cells]
+
+    def _query_budget_cube(self):
+        """
+        Line item amounts, plus the header amounts of budgets without line
+        items, as one stream of facts grouped into cube cells in a single
+        statement.
+        """
+        line_items = select(
+            BudgetLineItem.budget_id.label('budget_id'),
+            BudgetLineItem.account_id.label('account_id'),
+            BudgetLineItem.period.label('period'),
+            BudgetLineItem.budgeted_amount.label('budgeted'),
+            BudgetLineItem.actual_amount.label('actual')
+        )
+        headers = select(
+            Budget.id,
+            Budget.account_id,
+            null(),
+            Budget.budgeted_amount,
+            Budget.actual_amount
+        ).where(
+            ~exists().where(BudgetLineItem.budget_id == Budget.id)
+        )
+        facts = union_all(line_items, headers).subquery()
+
+        cube = select(
+            facts.c.budget_id,
+            facts.c.account_id,
+            facts.c.period,
+            Budget.budget_year,
+            Budget.status,
+            func.sum(facts.c.budgeted).label('budgeted'),
+            func.sum(facts.c.actual).label('actual')
+        ).join(
+            Budget, Budget.id == facts.c.budget_id
+        ).group_by(
+            facts.c.budget_id,
+            facts.c.account_id,
+            facts.c.period,
+            Budget.budget_year,
+            Budget.status
+        )
+        if self.company_id:
+            cube = cube.where(Budget.company_id == self.company_id)
+        return self.db.execute(cube)
+
+    @staticmethod
+    def _serialize_cell(row) -> Dict:
+        """A cube row in a form that can be cached as JSON."""
+        status = getattr(row.status, 'value', row.status)
+        return {
+            "budget_id": _cube_id(row.budget_id),
+            "account_id": _cube_id(row.account_id),
+            "year": int(row.budget_year),
+            "period": row.period,
+            "is_active": str(status or '').lower() in ACTIVE_BUDGET_STATUSES,
+            "budgeted": str(row.budgeted or 0),
+            "actual": str(row.actual or 0)
+        }
+
+    @staticmethod
+    def _parse_cell(cell: Dict) -> BudgetCubeCell:
+        return BudgetCubeCell(
+            budget_id=cell["budget_id"],
+            account_id=cell["account_id"],
+            year=cell["year"],
+            period=cell.get("period"),
+            is_active=cell["is_active"],
+            budgeted=Decimal(cell["budgeted"]),
+            actual=Decimal(cell["actual"])
+        )
 
     def get_budget_performance(self, department_id: Optional[int] = None, project_id: Optional[int] = None) -> Dict:
         """
         Get budget performance metrics.
+
+        Budgets carry no department or project, so filtering by either is
+        rejected.
         """
-        # Get active budgets
-        active_budgets = self.budget_service.get_active_budgets()
-        
-        # Calculate budgeted vs actual
-        budgeted_amount = 0
-        actual_amount = 0
-        
-        for budget in active_budgets:
-            if (department_id and budget.department_id != department_id) or \
-               (project_id and budget.project_id != project_id):
-                continue
-                
-            # Calculate budgeted amount
-            budgeted_amount += sum(line.amount for line in budget.lines)
-            
-            # Calculate actual spending
-            allocations = self.db.query(BudgetAllocation).filter(
-                BudgetAllocation.budget_id == budget.id
-            ).all()
-            
-            actual_amount += sum(alloc.amount for alloc in allocations)
-        
+        if department_id:
+            raise _unsupported_dimension("department")
+        if project_id:
+            raise _unsupported_dimension("project")
+
+        budgeted_amount = Decimal('0')
+        actual_amount = Decimal('0')
+        for cell in self.get_budget_cube():
+            if cell.is_active:
+                budgeted_amount += cell.budgeted
+                actual_amount += cell.actual
+
+        variance = _variance(budgeted_amount, actual_amount)
         return {
             "budgeted_amount": budgeted_amount,
             "actual_amount": actual_amount,
-            "variance": budgeted_amount - actual_amount,
-            "variance_percentage": ((actual_amount - budgeted_amount) / budgeted_amount * 100) if budgeted_amount > 0 else 0
+            "variance": variance["variance"],
+            "variance_percentage": variance["variance_percentage"]
         }
 
     def get_departmental_budget_analysis(self) -> List[Dict]:
         """
-        Get budget analysis by department.
+        Get budget analysis by department. Budgets carry no department, so
+        the analysis is rejected.
         """
-        result = []
-        
-        # Get all departments with budgets
-        departments = self.db.query(
-            Budget.department_id,
-            func.sum(BudgetLine.amount).label('total_budget')
-        ).join(
-            BudgetLine,
-            Budget.id == BudgetLine.budget_id
-        ).group_by(
-            Budget.department_id
-        ).all()
-        
-        for dept_id, total_budget in departments:
-            # Get actual spending
-            actual_spending = self.db.query(
-                func.sum(BudgetAllocation.amount).label('total_spent')
-            ).filter(
-                BudgetAllocation.department_id == dept_id
-            ).scalar()
-            
-            result.append({
-                "department_id": dept_id,
-                "total_budget": total_budget,
-                "total_spent": actual_spending or 0,
-                "variance": total_budget - (actual_spending or 0),
-                "variance_percentage": ((actual_spending or 0) - total_budget) / total_budget * 100 if total_budget > 0 else 0
-            })
-        
-        return result
+        raise _unsupported_dimension("department")
 
     def get_project_budget_analysis(self) -> List[Dict]:
         """
-        Get budget analysis by project.
+        Get budget analysis by project. Budgets carry no project, so the
+        analysis is rejected.
         """
-        result = []
-        
-        # Get all projects with budgets
-        projects = self.db.query(
-            Budget.project_id,
-            func.sum(BudgetLine.amount).label('total_budget')
-        ).join(
-            BudgetLine,
-            Budget.id == BudgetLine.budget_id
-        ).group_by(
-            Budget.project_id
-        ).all()
-        
-        for proj_id, total_budget in projects:
-            # Get actual spending
-            actual_spending = self.db.query(
-                func.sum(BudgetAllocation.amount).label('total_spent')
-            ).filter(
-                BudgetAllocation.project_id == proj_id
-            ).scalar()
-            
-            result.append({
-                "project_id": proj_id,
-                "total_budget": total_budget,
-                "total_spent": actual_spending or 0,
-                "variance": total_budget - (actual_spending or 0),
-                "variance_percentage": ((actual_spending or 0) - total_budget) / total_budget * 100 if total_budget > 0 else 0
-            })
-        
-        return result
+        raise _unsupported_dimension("project")
 
     def get_budget_trend_analysis(self, period: str = 'month', months: int = 12) -> List[Dict]:
         """
         Get budget trend analysis over time.
+
+        By ``month``, the trend has one entry per month of the last ``months``
+        months. Line items budgeted for a month (``YYYY-MM``) count in that
+        month; budgets and line items without one are spread evenly over their
+        budget year. By ``year``, it has one entry per budget year touched by
+        the last ``months`` months.
         """
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=months*30)
-        
+        if period not in TREND_PERIODS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported trend period: {period}. Supported periods are: {', '.join(TREND_PERIODS)}"
+            )
+
+        today = datetime.now().date()
+        current_month = today.year * 12 + today.month - 1
+        cells = self.get_budget_cube()
+        if period == 'month':
+            totals = _monthly_totals(cells)
+            periods = [
+                (month, f"{month // 12}-{month % 12 + 1:02d}")
+                for month in range(current_month - months + 1, current_month + 1)
+            ]
+        else:
+            totals = _totals(cells, lambda cell: cell.year)
+            periods = [(year, str(year)) for year in range((current_month - months) // 12, today.year + 1)]
+
         result = []
-        
-        current_date = start_date
-        while current_date <= end_date:
-            # Get budgeted amount for period
-            budgeted_amount = self.db.query(
-                func.sum(BudgetLine.amount)
-            ).join(
-                Budget,
-                Budget.id == BudgetLine.budget_id
-            ).filter(
-                Budget.start_date <= current_date,
-                Budget.end_date >= current_date
-            ).scalar()
-            
-            # Get actual spending for period
-            actual_amount = self.db.query(
-                func.sum(BudgetAllocation.amount)
-            ).filter(
-                BudgetAllocation.created_at >= current_date,
-                BudgetAllocation.created_at < current_date + timedelta(days=30)
-            ).scalar()
-            
+        for key, label in periods:
+            budgeted_amount, actual_amount = totals[key] if key in totals else (Decimal('0'), Decimal('0'))
             result.append({
-                "period": current_date.strftime('%Y-%m'),
-                "budgeted_amount": budgeted_amount or 0,
-                "actual_amount": actual_amount or 0,
-                "variance": (budgeted_amount or 0) - (actual_amount or 0),
-                "variance_percentage": ((actual_amount or 0) - (budgeted_amount or 0)) / (budgeted_amount or 1) * 100
+                "period": label,
+                "budgeted_amount": budgeted_amount,
+                "actual_amount": actual_amount,
+                "variance": budgeted_amount - actual_amount,
+                "variance_percentage": (actual_amount - budgeted_amount) / (budgeted_amount or 1) * 100
             })
-            
-            current_date += timedelta(days=30)
-        
+
         return result
 
     def get_budget_allocation_analysis(self, account_id: int) -> Dict:
         """
-        Get budget allocation analysis for a specific account.
+        Get budget allocation analysis for a specific account: how its
+        budgeted amount is spread over budgets.
         """
-        # Get total budgeted amount
-        total_budgeted = self.db.query(
-            func.sum(BudgetLine.amount)
-        ).join(
-            Budget,
-            Budget.id == BudgetLine.budget_id
-        ).filter(
-            BudgetLine.account_id == account_id
-        ).scalar()
-        
-        # Get department-wise allocation
-        dept_allocations = self.db.query(
-            BudgetAllocation.department_id,
-            func.sum(BudgetAllocation.amount).label('amount')
-        ).filter(
-            BudgetAllocation.account_id == account_id
-        ).group_by(
-            BudgetAllocation.department_id
-        ).all()
-        
-        # Get project-wise allocation
-        proj_allocations = self.db.query(
-            BudgetAllocation.project_id,
-            func.sum(BudgetAllocation.amount).label('amount')
-        ).filter(
-            BudgetAllocation.account_id == account_id
-        ).group_by(
-            BudgetAllocation.project_id
-        ).all()
-        
+        cells = [cell for cell in self.get_budget_cube() if _same(cell.account_id, account_id)]
+        total_budgeted = sum((cell.budgeted for cell in cells), Decimal('0'))
+
         return {
-            "total_budgeted": total_budgeted or 0,
-            "department_allocations": [
+            "total_budgeted": total_budgeted,
+            "budget_allocations": [
                 {
-                    "department_id": dept_id,
+                    "budget_id": budget_id,
                     "amount": amount,
                     "percentage": (amount / (total_budgeted or 1)) * 100
                 }
-                for dept_id, amount in dept_allocations
-            ],
-            "project_allocations": [
-                {
-                    "project_id": proj_id,
-                    "amount": amount,
-                    "percentage": (amount / (total_budgeted or 1)) * 100
-                }
-                for proj_id, amount in proj_allocations
+                for budget_id, (amount, _) in _totals(cells, lambda cell: cell.budget_id).items()
             ]
         }
 
@@ -237,100 +338,61 @@ class BudgetAnalyticsService:
         """
         Get detailed budget variance analysis.
         """
-        # Get all active budgets
-        active_budgets = self.budget_service.get_active_budgets()
-        
-        result = {
-            "overall": {
-                "budgeted": 0,
-                "actual": 0,
-                "variance": 0,
-                "variance_percentage": 0
-            },
-            "by_department": {},
-            "by_project": {},
-            "by_account": {}
+        cells = [cell for cell in self.get_budget_cube() if cell.is_active]
+
+        def by(key) -> Dict:
+            return {
+                value: _variance(budgeted, actual)
+                for value, (budgeted, actual) in _totals(cells, key).items()
+            }
+
+        overall = _totals(cells, lambda cell: None).get(None, [Decimal('0'), Decimal('0')])
+        return {
+            "overall": _variance(*overall),
+            "by_budget": by(lambda cell: cell.budget_id),
+            "by_account": by(lambda cell: cell.account_id),
+            "by_year": by(lambda cell: cell.year)
         }
-        
-        for budget in active_budgets:
-            # Calculate budgeted amount
-            budgeted = sum(line.amount for line in budget.lines)
-            
-            # Calculate actual spending
-            allocations = self.db.query(BudgetAllocation).filter(
-                BudgetAllocation.budget_id == budget.id
-            ).all()
-            actual = sum(alloc.amount for alloc in allocations)
-            
-            # Update overall totals
-            result["overall"]["budgeted"] += budgeted
-            result["overall"]["actual"] += actual
-            result["overall"]["variance"] = result["overall"]["budgeted"] - result["overall"]["actual"]
-            result["overall"]["variance_percentage"] = \
-                (result["overall"]["actual"] - result["overall"]["budgeted"]) / result["overall"]["budgeted"] * 100 \
-                if result["overall"]["budgeted"] > 0 else 0
-            
-            # Update department totals
-            if budget.department_id not in result["by_department"]:
-                result["by_department"][budget.department_id] = {
-                    "budgeted": 0,
-                    "actual": 0,
-                    "variance": 0,
-                    "variance_percentage": 0
-                }
-            
-            result["by_department"][budget.department_id]["budgeted"] += budgeted
-            result["by_department"][budget.department_id]["actual"] += actual
-            result["by_department"][budget.department_id]["variance"] = \
-                result["by_department"][budget.department_id]["budgeted"] - \
-                result["by_department"][budget.department_id]["actual"]
-            result["by_department"][budget.department_id]["variance_percentage"] = \
-                (result["by_department"][budget.department_id]["actual"] - 
-                 result["by_department"][budget.department_id]["budgeted"]) / \
-                result["by_department"][budget.department_id]["budgeted"] * 100 \
-                if result["by_department"][budget.department_id]["budgeted"] > 0 else 0
-            
-            # Update project totals
-            if budget.project_id not in result["by_project"]:
-                result["by_project"][budget.project_id] = {
-                    "budgeted": 0,
-                    "actual": 0,
-                    "variance": 0,
-                    "variance_percentage": 0
-                }
-            
-            result["by_project"][budget.project_id]["budgeted"] += budgeted
-            result["by_project"][budget.project_id]["actual"] += actual
-            result["by_project"][budget.project_id]["variance"] = \
-                result["by_project"][budget.project_id]["budgeted"] - \
-                result["by_project"][budget.project_id]["actual"]
-            result["by_project"][budget.project_id]["variance_percentage"] = \
-                (result["by_project"][budget.project_id]["actual"] - 
-                 result["by_project"][budget.project_id]["budgeted"]) / \
-                result["by_project"][budget.project_id]["budgeted"] * 100 \
-                if result["by_project"][budget.project_id]["budgeted"] > 0 else 0
-            
-            # Update account totals
-            for line in budget.lines:
-                if line.account_id not in result["by_account"]:
-                    result["by_account"][line.account_id] = {
-                        "budgeted": 0,
-                        "actual": 0,
-                        "variance": 0,
-                        "variance_percentage": 0
-                    }
-                
-                result["by_account"][line.account_id]["budgeted"] += line.amount
-                result["by_account"][line.account_id]["actual"] += \
-                    sum(alloc.amount for alloc in allocations 
-                        if alloc.account_id == line.account_id)
-                result["by_account"][line.account_id]["variance"] = \
-                    result["by_account"][line.account_id]["budgeted"] - \
-                    result["by_account"][line.account_id]["actual"]
-                result["by_account"][line.account_id]["variance_percentage"] = \
-                    (result["by_account"][line.account_id]["actual"] - 
-                     result["by_account"][line.account_id]["budgeted"]) / \
-                    result["by_account"][line.account_id]["budgeted"] * 100 \
-                    if result["by_account"][line.account_id]["budgeted"] > 0 else 0
-        
-        return result
+
+
+# Cube invalidation: a committed write to a budget or line item moves its
+# company, and its tenant's all-companies view, to a new cube version, so the
+# next read rebuilds the cube.
+
+def _budget_company_id(session, obj) -> Any:
+    budget = obj
+    if not isinstance(obj, Budget):
+        budget = inspect(obj).dict.get("budget")
+        if budget is None and obj.budget_id is not None:
+            with session.no_autoflush:
+                budget = session.get(Budget, obj.budget_id)
+    return getattr(budget, "company_id", None)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_budget_writes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Budget, BudgetLineItem)):
+            companies = session.info.setdefault("budget_cube_companies", set())
+            companies.add(_company_key())
+            company_id = _budget_company_id(session, obj)
+            if company_id:
+                companies.add(_company_key(company_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_budget_cubes(session):
+    companies = session.info.pop("budget_cube_companies", None)
+    if not companies:
+        return
+    try:
+        cache = get_caching_service()
+        for company_key in companies:
+            cache.invalidate_budget_cube(company_key)
+    except Exception as e:
+        logger.warning(f"Could not invalidate budget cube: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_budget_writes(session):
+    session.info.pop("budget_cube_companies", None)
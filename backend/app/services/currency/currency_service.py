@@ -11,6 +11,7 @@ from uuid import UUID
 
 from app.core.exceptions import NotFoundException, ValidationException
 from app.models.currency import Currency, ExchangeRate, ExchangeRateType, CurrencyStatus
+from app.services.currency.rate_cache import rate_cache
 
 
 
@@ -358,6 +359,9 @@ class CurrencyService:
         self.db.commit()
         self.db.refresh(exchange_rate)
         
+        # Cached rates of both currencies may now resolve to the new rate
+        rate_cache.invalidate_currencies(source_currency.code, target_currency.code)
+        
         return exchange_rate
     
     def _unset_existing_base_currency(self) -> None:
@@ -1,22 +1,22 @@
 """Currency exchange rate service for handling multi-currency support."""
-from datetime import datetime, timedelta
+from datetime import date as date_type, datetime, timedelta
 from functools import lru_cache
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 import json
 import os
 
 from decimal import Decimal, ROUND_HALF_UP
 from fastapi import HTTPException
 from pydantic import BaseModel, Field, validator
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session, aliased
 import httpx
 import logging
 
 from app.core.config import settings
 from app.models.currency import ExchangeRate, Currency
 from app.schemas.currency_schemas import ExchangeRateCreate, ExchangeRateUpdate
-
-
+from app.services.currency.rate_cache import rate_cache
 
 
 logger = logging.getLogger(__name__)
@@ -49,6 +49,7 @@ class ExchangeService:
             'fallback': self._get_fallback_rate
         }
         self.active_providers = settings.EXCHANGE_RATE_PROVIDERS
+        self.rate_cache = rate_cache
         
     async def get_rate(
         self,
@@ -101,7 +102,7 @@ class ExchangeService:
                 rate_result = await self.providers[provider](from_currency, to_currency, date)
                 if rate_result:
                     # Cache the result
-                    self._cache_rate(rate_result)
+                    self._cache_rate(rate_result, date)
                     return rate_result
             except Exception as e:
                 logger.warning(f"Failed to get rate from {provider}: {str(e)}")
@@ -113,19 +114,10 @@ class ExchangeService:
                 rate1 = await self.get_rate(from_currency, self.base_currency, date, force_refresh)
                 rate2 = await self.get_rate(self.base_currency, to_currency, date, force_refresh)
                 
-                calculated_rate = rate1.rate * rate2.rate
-                
-                result = ExchangeRateResult(
-                    from_currency=from_currency,
-                    to_currency=to_currency,
-                    rate=calculated_rate.quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP),
-                    date=rate1.date,
-                    source=f"calculated_via_{self.base_currency}",
-                    is_reversed=False
-                )
+                result = self._cross_rate(from_currency, to_currency, rate1, rate2)
                 
                 # Cache the calculated rate
-                self._cache_rate(result)
+                self._cache_rate(result, date)
                 return result
                 
             except Exception as e:
@@ -174,6 +166,181 @@ class ExchangeService:
         
         return converted, rate_result
     
+    async def get_rates(
+        self,
+        pairs: Iterable[Tuple[str, str]],
+        date: Optional[datetime] = None,
+        force_refresh: bool = False
+    ) -> Dict[Tuple[str, str], ExchangeRateResult]:
+        """
+        Get exchange rates for many currency pairs on one date.
+        
+        Rates are resolved with the same precedence as get_rate: the rate
+        cache (one Redis round trip for all in-process misses), then the
+        active providers in order, then a cross rate through the base
+        currency. The database fallback provider answers all remaining pairs
+        from one rate table query.
+        
+        Args:
+            pairs: (from_currency, to_currency) tuples
+            date: Date for historical rates (defaults to latest)
+            force_refresh: If True, bypass the cache
+            
+        Returns:
+            Dict mapping each normalized (from, to) pair to its rate
+            
+        Raises:
+            HTTPException: If a rate cannot be determined
+        """
+        wanted = {(from_currency.upper(), to_currency.upper()) for from_currency, to_currency in pairs}
+        results: Dict[Tuple[str, str], ExchangeRateResult] = {}
+        
+        for from_currency, to_currency in wanted:
+            if from_currency == to_currency:
+                results[(from_currency, to_currency)] = ExchangeRateResult(
+                    from_currency=from_currency,
+                    to_currency=to_currency,
+                    rate=Decimal('1.0'),
+                    date=date or datetime.utcnow(),
+                    source='1:1',
+                    is_reversed=False
+                )
+        
+        missing = wanted - set(results)
+        if missing and not force_refresh:
+            for pair, value in self.rate_cache.get_many(missing, date).items():
+                results[pair] = self._result_from_cache(value)
+            missing -= set(results)
+        
+        for provider in self.active_providers:
+            if not missing:
+                break
+            for pair, result in (await self._get_provider_rates(provider, missing, date)).items():
+                self._cache_rate(result, date)
+                results[pair] = result
+            missing -= set(results)
+        
+        cross = {pair for pair in missing if self.base_currency not in pair}
+        if cross:
+            legs = [(from_currency, self.base_currency) for from_currency, _ in cross]
+            legs += [(self.base_currency, to_currency) for _, to_currency in cross]
+            try:
+                leg_rates = await self.get_rates(legs, date, force_refresh)
+            except HTTPException as e:
+                logger.error(f"Failed to calculate cross rates via {self.base_currency}: {e.detail}")
+            else:
+                for from_currency, to_currency in cross:
+                    result = self._cross_rate(
+                        from_currency,
+                        to_currency,
+                        leg_rates[(from_currency, self.base_currency)],
+                        leg_rates[(self.base_currency, to_currency)]
+                    )
+                    self._cache_rate(result, date)
+                    results[(from_currency, to_currency)] = result
+                missing -= set(results)
+        
+        if missing:
+            from_currency, to_currency = sorted(missing)[0]
+            raise HTTPException(
+                status_code=400,
+                detail=f"Could not determine exchange rate from {from_currency} to {to_currency}"
+            )
+        
+        return results
+    
+    async def _get_provider_rates(
+        self,
+        provider: str,
+        pairs: Set[Tuple[str, str]],
+        date: Optional[datetime] = None
+    ) -> Dict[Tuple[str, str], ExchangeRateResult]:
+        """Rates one provider can give for several pairs; failures are skipped."""
+        if provider == 'fallback':
+            try:
+                currencies = {code for pair in pairs for code in pair}
+                table = self._load_rate_table(currencies, date)
+            except Exception as e:
+                logger.error(f"Database rate lookup error: {str(e)}")
+                return {}
+            resolved = {
+                pair: self._resolve_from_table(table, pair[0], pair[1])
+                for pair in pairs
+            }
+            return {pair: result for pair, result in resolved.items() if result}
+        
+        results = {}
+        for from_currency, to_currency in pairs:
+            try:
+                result = await self.providers[provider](from_currency, to_currency, date)
+            except Exception as e:
+                logger.warning(f"Failed to get rate from {provider}: {str(e)}")
+                continue
+            if result:
+                results[(from_currency, to_currency)] = result
+        return results
+    
+    async def convert_many(
+        self,
+        amounts: Sequence[Decimal],
+        from_currencies: Sequence[str],
+        to_currency: str,
+        dates: Optional[Sequence[Optional[date_type]]] = None,
+        decimal_places: int = 2,
+        force_refresh: bool = False
+    ) -> Tuple[List[Decimal], Dict[Tuple[str, Optional[date_type]], ExchangeRateResult]]:
+        """
+        Convert a column of amounts into one target currency.
+        
+        Inputs are parallel columns: amounts[i] in from_currencies[i] on
+        dates[i]. Rates are resolved once per distinct (source currency, date)
+        with one get_rates call per distinct date, and every converted amount
+        is rounded the same way (ROUND_HALF_UP to ``decimal_places``).
+        
+        Args:
+            amounts: Amounts to convert
+            from_currencies: Source currency code of each amount
+            to_currency: Target currency code
+            dates: Rate date of each amount (defaults to latest rates)
+            decimal_places: Decimal places of the converted amounts
+            force_refresh: If True, bypass the cache
+            
+        Returns:
+            Tuple of (converted amounts in input order, rates used keyed by
+            (source currency, date))
+        """
+        if len(amounts) != len(from_currencies) or (dates is not None and len(dates) != len(amounts)):
+            raise ValueError("amounts, from_currencies and dates must have the same length")
+        
+        to_currency = to_currency.upper()
+        sources = [currency.upper() for currency in from_currencies]
+        day_column = [
+            value.date() if isinstance(value, datetime) else value
+            for value in (dates if dates is not None else [None] * len(amounts))
+        ]
+        
+        currencies_by_date: Dict[Optional[date_type], Set[str]] = {}
+        for currency, day in zip(sources, day_column):
+            currencies_by_date.setdefault(day, set()).add(currency)
+        
+        rates: Dict[Tuple[str, Optional[date_type]], ExchangeRateResult] = {}
+        for day, currencies in currencies_by_date.items():
+            rate_date = datetime.combine(day, datetime.min.time()) if day else None
+            day_rates = await self.get_rates(
+                [(currency, to_currency) for currency in currencies],
+                rate_date,
+                force_refresh
+            )
+            for (currency, _), result in day_rates.items():
+                rates[(currency, day)] = result
+        
+        quantum = Decimal(1).scaleb(-decimal_places)
+        converted = [
+            (Decimal(amount) * rates[(currency, day)].rate).quantize(quantum, rounding=ROUND_HALF_UP)
+            for amount, currency, day in zip(amounts, sources, day_column)
+        ]
+        return converted, rates
+    
     async def get_historical_rates(
         self,
         base_currency: str,
@@ -358,58 +525,111 @@ class ExchangeService:
         """Get Fallback Rate."""
         """Fallback method to get exchange rate from database."""
         try:
-            # Try to get rate from database
-            query = self.db.query(ExchangeRate).filter(
-                ExchangeRate.from_currency == from_currency,
-                ExchangeRate.to_currency == to_currency,
-                ExchangeRate.is_active == True
-            )
-            
-            if date:
-                query = query.filter(ExchangeRate.effective_date <= date)
-            
-            rate = query.order_by(ExchangeRate.effective_date.desc()).first()
-            
-            if rate:
-                return ExchangeRateResult(
-                    from_currency=from_currency,
-                    to_currency=to_currency,
-                    rate=rate.rate,
-                    date=rate.effective_date,
-                    source=rate.source or 'database',
-                    is_reversed=False
-                )
-                
-            # Try the reverse rate
-            reverse_rate = self.db.query(ExchangeRate).filter(
-                ExchangeRate.from_currency == to_currency,
-                ExchangeRate.to_currency == from_currency,
-                ExchangeRate.is_active == True
-            )
-            
-            if date:
-                reverse_rate = reverse_rate.filter(ExchangeRate.effective_date <= date)
-            
-            reverse_rate = reverse_rate.order_by(ExchangeRate.effective_date.desc()).first()
-            
-            if reverse_rate:
-                return ExchangeRateResult(
-                    from_currency=from_currency,
-                    to_currency=to_currency,
-                    rate=Decimal('1') / reverse_rate.rate,
-                    date=reverse_rate.effective_date,
-                    source=f"1/{reverse_rate.source or 'database'}",
-                    is_reversed=True
-                )
-                
-            return None
-            
+            table = self._load_rate_table({from_currency, to_currency}, date)
+            return self._resolve_from_table(table, from_currency, to_currency)
         except Exception as e:
             logger.error(f"Database rate lookup error: {str(e)}")
             return None
     
     # --- Helper Methods ---
     
+    def _load_rate_table(
+        self,
+        currencies: Set[str],
+        date: Optional[datetime] = None
+    ) -> Dict[Tuple[str, str], Tuple[Decimal, date_type, Optional[str]]]:
+        """
+        Latest stored rate on or before the date for every pair among the
+        given currencies, in one query.
+        
+        Returns a dict mapping (from, to) to (rate, effective_date, source).
+        """
+        source = aliased(Currency)
+        target = aliased(Currency)
+        
+        filters = [ExchangeRate.is_active == True]
+        if date:
+            filters.append(ExchangeRate.effective_date <= (date.date() if isinstance(date, datetime) else date))
+        
+        latest = self.db.query(
+            ExchangeRate.source_currency_id,
+            ExchangeRate.target_currency_id,
+            func.max(ExchangeRate.effective_date).label('effective_date')
+        ).filter(*filters).group_by(
+            ExchangeRate.source_currency_id,
+            ExchangeRate.target_currency_id
+        ).subquery()
+        
+        rows = self.db.query(
+            source.code,
+            target.code,
+            ExchangeRate.rate,
+            ExchangeRate.effective_date,
+            ExchangeRate.source
+        ).join(
+            latest,
+            and_(
+                latest.c.source_currency_id == ExchangeRate.source_currency_id,
+                latest.c.target_currency_id == ExchangeRate.target_currency_id,
+                latest.c.effective_date == ExchangeRate.effective_date
+            )
+        ).join(
+            source, source.id == ExchangeRate.source_currency_id
+        ).join(
+            target, target.id == ExchangeRate.target_currency_id
+        ).filter(
+            *filters,
+            source.code.in_(currencies),
+            target.code.in_(currencies)
+        ).all()
+        
+        return {
+            (from_code, to_code): (Decimal(rate), effective_date, rate_source)
+            for from_code, to_code, rate, effective_date, rate_source in rows
+        }
+    
+    def _resolve_from_table(
+        self,
+        table: Dict[Tuple[str, str], Tuple[Decimal, date_type, Optional[str]]],
+        from_currency: str,
+        to_currency: str
+    ) -> Optional[ExchangeRateResult]:
+        """Rate for a pair from a loaded rate table, stored directly or inverted."""
+        if (from_currency, to_currency) in table:
+            rate, effective_date, rate_source = table[(from_currency, to_currency)]
+            rate_source, is_reversed = rate_source or 'database', False
+        elif (to_currency, from_currency) in table:
+            rate, effective_date, rate_source = table[(to_currency, from_currency)]
+            rate, rate_source, is_reversed = Decimal('1') / rate, f"1/{rate_source or 'database'}", True
+        else:
+            return None
+        
+        return ExchangeRateResult(
+            from_currency=from_currency,
+            to_currency=to_currency,
+            rate=rate,
+            date=datetime.combine(effective_date, datetime.min.time()),
+            source=rate_source,
+            is_reversed=is_reversed
+        )
+    
+    def _cross_rate(
+        self,
+        from_currency: str,
+        to_currency: str,
+        to_base: ExchangeRateResult,
+        from_base: ExchangeRateResult
+    ) -> ExchangeRateResult:
+        """Rate for a pair from its two legs through the base currency."""
+        return ExchangeRateResult(
+            from_currency=from_currency,
+            to_currency=to_currency,
+            rate=(to_base.rate * from_base.rate).quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP),
+            date=to_base.date,
+            source=f"calculated_via_{self.base_currency}",
+            is_reversed=False
+        )
+    
     def _get_cached_rate(
         self,
         from_currency: str,
@@ -418,26 +638,43 @@ class ExchangeService:
     ) -> Optional[ExchangeRateResult]:
         """ Get Cached Rate."""
         """Get exchange rate from cache."""
-        # This is a simplified implementation
-        # In production, you'd use Redis or similar
         try:
-            cache_key = f"rate:{from_currency}:{to_currency}:{date.date() if date else 'latest'}"
-            # Implement actual caching logic here
-            return None
+            value = self.rate_cache.get(from_currency, to_currency, date)
+            return self._result_from_cache(value) if value else None
         except Exception as e:
             logger.warning(f"Cache lookup error: {str(e)}")
             return None
     
-    def _cache_rate(self, rate_result: ExchangeRateResult) -> None:
-        # This is a simplified implementation
-        # In production, you'd use Redis or similar with appropriate TTL
+    def _cache_rate(self, rate_result: ExchangeRateResult, date: Optional[datetime] = None) -> None:
+        """Cache a rate under the date it was requested for."""
         try:
-            cache_key = f"rate:{rate_result.from_currency}:{rate_result.to_currency}:{rate_result.date.date()}"
-            # Implement actual caching logic here
-            pass
+            self.rate_cache.set(
+                rate_result.from_currency,
+                rate_result.to_currency,
+                date,
+                {
+                    'from_currency': rate_result.from_currency,
+                    'to_currency': rate_result.to_currency,
+                    'rate': str(rate_result.rate),
+                    'date': rate_result.date.isoformat(),
+                    'source': rate_result.source,
+                    'is_reversed': rate_result.is_reversed
+                }
+            )
         except Exception as e:
             logger.warning(f"Cache store error: {str(e)}")
     
+    @staticmethod
+    def _result_from_cache(value: Dict[str, Any]) -> ExchangeRateResult:
+        return ExchangeRateResult(
+            from_currency=value['from_currency'],
+            to_currency=value['to_currency'],
+            rate=Decimal(value['rate']),
+            date=datetime.fromisoformat(value['date']),
+            source=value['source'],
+            is_reversed=value['is_reversed']
+        )
+    
     def _load_ecb_rates(self) -> List[Dict]:
         # In production, implement proper ECB API integration
         # This is just a placeholder with sample data
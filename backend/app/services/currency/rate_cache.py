@@ -0,0 +1,144 @@
+"""Two-tier exchange rate cache."""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.cache import CacheManager, cache_manager
+from app.core.config import settings
+
+KEY_PREFIX = "exchange_rates"
+
+# Latest rates move during the day; historical rates never change
+LATEST_RATE_TTL = getattr(settings, "EXCHANGE_RATE_LATEST_TTL", 300)
+MAX_CACHED_RATES = getattr(settings, "EXCHANGE_RATE_CACHE_SIZE", 50000)
+
+
+def _as_date(value: Optional[Any]) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+class RateCache:
+    """
+    Exchange rates keyed by currency pair and date.
+
+    The first tier is an in-process LRU shared by every ExchangeService in
+    the worker; the second tier is Redis through CacheManager, shared across
+    workers. Rates for past dates are cached in Redis without expiry until a
+    rate is entered for one of their currencies, which invalidates them
+    (see invalidate_currencies). Latest and same-day rates expire after
+    LATEST_RATE_TTL seconds in both tiers. The in-process tier never keeps a
+    rate longer than LATEST_RATE_TTL, nor longer than Redis has left on it,
+    so other workers pick up an invalidation within that time.
+
+    Values are the JSON-safe dicts stored in Redis.
+    """
+
+    def __init__(
+        self,
+        backend: CacheManager = cache_manager,
+        max_entries: int = MAX_CACHED_RATES,
+        latest_ttl: int = LATEST_RATE_TTL
+    ):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.latest_ttl = latest_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(from_currency: str, to_currency: str, on_date: Optional[Any] = None) -> str:
+        on_date = _as_date(on_date)
+        return f"{KEY_PREFIX}:{from_currency}:{to_currency}:{on_date.isoformat() if on_date else 'latest'}"
+
+    def ttl_for(self, on_date: Optional[Any]) -> Optional[int]:
+        """Seconds to keep a rate, or None for rates that can no longer change."""
+        on_date = _as_date(on_date)
+        if on_date is not None and on_date < datetime.utcnow().date():
+            return None
+        return self.latest_ttl
+
+    def get(self, from_currency: str, to_currency: str, on_date: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        return self.get_many([(from_currency, to_currency)], on_date).get((from_currency, to_currency))
+
+    def get_many(
+        self,
+        pairs: Iterable[Tuple[str, str]],
+        on_date: Optional[Any] = None
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Cached rates for several pairs; Redis is read once for all memory misses."""
+        keys = {self.key(from_currency, to_currency, on_date): (from_currency, to_currency)
+                for from_currency, to_currency in pairs}
+        found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        missing: List[str] = []
+
+        now = time.monotonic()
+        with self._lock:
+            for key, pair in keys.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    missing.append(key)
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[pair] = value
+
+        if missing:
+            for key, (value, ttl) in self.backend.get_many_with_ttl(missing).items():
+                self._remember(key, value, ttl)
+                found[keys[key]] = value
+        return found
+
+    def set(
+        self,
+        from_currency: str,
+        to_currency: str,
+        on_date: Optional[Any],
+        value: Dict[str, Any]
+    ) -> None:
+        key = self.key(from_currency, to_currency, on_date)
+        ttl = self.ttl_for(on_date)
+        self._remember(key, value, ttl)
+        self.backend.set(key, value, ttl)
+
+    def invalidate_currencies(self, *currencies: str) -> None:
+        """
+        Drop every cached rate from or to any of ``currencies``, on any date.
+
+        A new rate can change the rate resolved for its pair, its reverse and
+        the cross rates through either currency on its date and every later
+        date, so all of them are dropped.
+        """
+        codes = set(currencies)
+        with self._lock:
+            for key in [key for key in self._entries if set(key.split(":")[1:3]) & codes]:
+                del self._entries[key]
+        for code in codes:
+            self.backend.clear_pattern(f"{KEY_PREFIX}:{code}:*")
+            self.backend.clear_pattern(f"{KEY_PREFIX}:*:{code}:*")
+
+    def clear(self) -> None:
+        """Drop every cached rate in both tiers."""
+        with self._lock:
+            self._entries.clear()
+        self.backend.clear_pattern(f"{KEY_PREFIX}:*")
+
+    def _remember(self, key: str, value: Dict[str, Any], ttl: Optional[float]) -> None:
+        ttl = self.latest_ttl if ttl is None else min(ttl, self.latest_ttl)
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Shared by every ExchangeService in the process
+rate_cache = RateCache()
@@ -2,101 +2,255 @@
 Dashboard Service - Real-time KPIs, Charts, Alerts, Quick Actions, Activity Feed
 """
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 import json
+import logging
+import time
 
 from decimal import Decimal
-from sqlalchemy import text, func, and_, or_
+from sqlalchemy import event, inspect, text, func, and_, or_
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.db.tenant_middleware import tenant_context
+from app.core.performance.caching_service import get_caching_service
 from app.models.financial_core import *
 from app.models.workflow import WorkflowInstance
 
+logger = logging.getLogger(__name__)
+
+# Trends compare current KPI values with their values this many days ago
+KPI_TREND_DAYS = getattr(settings, 'DASHBOARD_KPI_TREND_DAYS', 30)
+# A stale section is recomputed on read if no worker refreshed it in time
+KPI_REFRESH_GRACE_SECONDS = getattr(settings, 'DASHBOARD_KPI_REFRESH_GRACE_SECONDS', 30)
+
+# Snapshot sections, each one derived table of the combined KPI query. Every
+# section is limited to :company_id unless :all_companies is set.
+KPI_SECTION_SQL = {
+    "balances": """
+        SELECT
+            SUM(CASE WHEN account_code LIKE '1000%' THEN current_balance ELSE 0 END) AS cash_balance,
+            SUM(CASE WHEN account_code LIKE '1200%' THEN current_balance ELSE 0 END) AS ar_balance,
+            SUM(CASE WHEN account_code LIKE '2000%' THEN current_balance ELSE 0 END) AS ap_balance,
+            SUM(CASE WHEN account_type = 'Revenue' THEN current_balance ELSE 0 END) AS revenue,
+            SUM(CASE WHEN account_type = 'Expense' THEN current_balance ELSE 0 END) AS expenses
+        FROM chart_of_accounts
+        WHERE :all_companies OR company_id = :company_id
+    """,
+    # Balance movement posted within the trend window, in each KPI's own sign
+    "movements": """
+        SELECT
+            SUM(CASE WHEN a.account_code LIKE '1000%' THEN COALESCE(l.debit_amount, 0) - COALESCE(l.credit_amount, 0) ELSE 0 END) AS cash_movement,
+            SUM(CASE WHEN a.account_code LIKE '1200%' THEN COALESCE(l.debit_amount, 0) - COALESCE(l.credit_amount, 0) ELSE 0 END) AS ar_movement,
+            SUM(CASE WHEN a.account_code LIKE '2000%' THEN COALESCE(l.credit_amount, 0) - COALESCE(l.debit_amount, 0) ELSE 0 END) AS ap_movement,
+            SUM(CASE WHEN a.account_type = 'Revenue' THEN COALESCE(l.credit_amount, 0) - COALESCE(l.debit_amount, 0) ELSE 0 END) AS revenue_movement,
+            SUM(CASE WHEN a.account_type = 'Expense' THEN COALESCE(l.debit_amount, 0) - COALESCE(l.credit_amount, 0) ELSE 0 END) AS expenses_movement
+        FROM journal_entry_lines l
+        JOIN journal_entries e ON e.id = l.journal_entry_id
+        JOIN chart_of_accounts a ON a.id = l.account_id
+        WHERE e.status = 'posted' AND e.entry_date >= :trend_start
+            AND (:all_companies OR e.company_id = :company_id)
+    """,
+    "invoices": """
+        SELECT
+            COUNT(CASE WHEN status != 'paid' THEN 1 END) AS overdue_invoices,
+            COUNT(CASE WHEN due_date < :trend_start AND created_at < :trend_start
+                        AND (status != 'paid' OR updated_at >= :trend_start) THEN 1 END) AS overdue_invoices_prior
+        FROM invoices
+        WHERE due_date < :now
+            AND (:all_companies OR company_id = :company_id)
+    """,
+    "approvals": """
+        SELECT
+            COUNT(CASE WHEN status = 'pending' THEN 1 END) AS pending_approvals,
+            COUNT(CASE WHEN created_at < :trend_start THEN 1 END) AS pending_approvals_prior
+        FROM workflow_instances
+        WHERE (status = 'pending' OR COALESCE(completed_at, updated_at) >= :trend_start)
+            AND (:all_companies OR company_id = :company_id)
+    """,
+}
+
+# Sections recomputed together; GL postings move both balances and movements
+KPI_SECTION_GROUPS = {
+    "balances": ("balances", "movements"),
+    "invoices": ("invoices",),
+    "approvals": ("approvals",),
+}
+
+# Tables whose committed changes make a snapshot section stale
+KPI_SOURCE_TABLES = {
+    "chart_of_accounts": "balances",
+    "journal_entries": "balances",
+    "invoices": "invoices",
+    "workflow_instances": "approvals",
+}
+# Columns whose updates affect the KPIs, by source table
+KPI_SOURCE_COLUMNS = {
+    "chart_of_accounts": ("current_balance", "balance", "account_type", "account_code"),
+    "journal_entries": ("status", "entry_date"),
+    "invoices": ("status", "due_date"),
+    "workflow_instances": ("status",),
+}
+
+
+def _company_scope(company_id: Optional[str] = None) -> Optional[str]:
+    """Company a snapshot covers: the given one or the request's, None for all companies"""
+    company_id = company_id or tenant_context.company_id
+    return str(company_id) if company_id else None
+
+
+def _company_key(company_id: Optional[str]) -> str:
+    """Cache key of a snapshot scope; the all-companies snapshot is keyed by tenant"""
+    return company_id or f"all:{tenant_context.tenant_id or 'default'}"
+
+
+def _change_percent(current: float, previous: float) -> float:
+    if not previous:
+        return 0.0
+    return round((current - previous) / abs(previous) * 100, 1)
+
+
+def _kpi(value, previous, label: str, trend: Optional[str] = None) -> Dict:
+    change = _change_percent(value, previous)
+    return {
+        "value": value,
+        "label": label,
+        "trend": trend or ("up" if change > 0 else "down" if change < 0 else "neutral"),
+        "change_percent": change
+    }
+
 
 class DashboardService:
     """Core dashboard data service"""
     
     @staticmethod
-    def get_financial_kpis(db: Session) -> Dict:
-        # Cash position
-        cash_balance = db.execute(text(
-            "SELECT SUM(current_balance) FROM chart_of_accounts WHERE account_code LIKE '1000%'"
-        )).scalar() or 0
-        
-        # Accounts receivable
-        ar_balance = db.execute(text(
-            "SELECT SUM(current_balance) FROM chart_of_accounts WHERE account_code LIKE '1200%'"
-        )).scalar() or 0
-        
-        # Accounts payable
-        ap_balance = db.execute(text(
-            "SELECT SUM(current_balance) FROM chart_of_accounts WHERE account_code LIKE '2000%'"
-        )).scalar() or 0
-        
-        # Revenue (current month)
-        current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        revenue_current = db.execute(text(
-            "SELECT SUM(current_balance) FROM chart_of_accounts WHERE account_type = 'Revenue'"
-        )).scalar() or 0
-        
-        # Expenses (current month)
-        expenses_current = db.execute(text(
-            "SELECT SUM(current_balance) FROM chart_of_accounts WHERE account_type = 'Expense'"
-        )).scalar() or 0
-        
-        # Net income
-        net_income = revenue_current - expenses_current
+    def get_financial_kpis(db: Session, company_id: Optional[str] = None) -> Dict:
+        """KPIs computed now, in one query, without going through the snapshot"""
+        trend_start, _ = DashboardService._trend_window()
+        sections = [name for names in KPI_SECTION_GROUPS.values() for name in names]
+        values = DashboardService._query_kpi_values(db, sections, trend_start, _company_scope(company_id))
+        return DashboardService._build_kpis(values)
+    
+    @staticmethod
+    async def get_kpi_snapshot(db: Session, company_id: Optional[str] = None) -> Dict:
+        """
+        KPIs of a company served from the cached snapshot, with when they
+        were computed and which sections have changed since. Without a
+        company, given or in the tenant context, all companies are summed.
+        """
+        company_id = _company_scope(company_id)
+        company_key = _company_key(company_id)
+        cache = get_caching_service()
+        trend_start, today = DashboardService._trend_window()
+        
+        snapshot = await cache.get_dashboard_data(company_key, trend_start.isoformat(), today.isoformat())
+        stale = cache.get_dashboard_stale(company_key)
+        if snapshot is None:
+            snapshot = await DashboardService.refresh_kpi_snapshot(db, company_id)
+        else:
+            # Normally a worker refreshes changed sections right after the commit
+            overdue = [
+                section for section, since in stale.items()
+                if time.time() - since > KPI_REFRESH_GRACE_SECONDS
+            ]
+            if overdue:
+                snapshot = await DashboardService.refresh_kpi_snapshot(db, company_id, overdue, snapshot)
+        stale = cache.get_dashboard_stale(company_key)
         
-        # Pending approvals count
-        pending_approvals = db.query(WorkflowInstance).filter(
-            WorkflowInstance.status == 'pending'
-        ).count()
+        as_of = datetime.fromisoformat(min(snapshot["as_of"].values()))
+        return {
+            "kpis": DashboardService._build_kpis(snapshot["values"]),
+            "as_of": as_of.isoformat(),
+            "age_seconds": round((datetime.utcnow() - as_of).total_seconds()),
+            "stale": bool(stale),
+            "stale_sections": sorted(stale)
+        }
+    
+    @staticmethod
+    async def refresh_kpi_snapshot(
+        db: Session,
+        company_id: Optional[str] = None,
+        sections: Optional[Iterable[str]] = None,
+        snapshot: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Recompute the given snapshot sections (all by default) in one query
+        and store the result; other sections are kept from the cached snapshot.
+        """
+        company_id = _company_scope(company_id)
+        company_key = _company_key(company_id)
+        cache = get_caching_service()
+        trend_start, today = DashboardService._trend_window()
+        period = (trend_start.isoformat(), today.isoformat())
+        started = time.time()
+        
+        groups = set(sections or KPI_SECTION_GROUPS) & set(KPI_SECTION_GROUPS)
+        if snapshot is None and groups != set(KPI_SECTION_GROUPS):
+            snapshot = await cache.get_dashboard_data(company_key, *period)
+        if snapshot is None:
+            groups = set(KPI_SECTION_GROUPS)
+            snapshot = {"values": {}, "as_of": {}}
+        
+        values = DashboardService._query_kpi_values(
+            db, [name for group in sorted(groups) for name in KPI_SECTION_GROUPS[group]], trend_start, company_id
+        )
+        computed_at = datetime.utcnow().isoformat()
+        snapshot = {
+            "values": {**snapshot["values"], **values},
+            "as_of": {**snapshot["as_of"], **{group: computed_at for group in groups}}
+        }
         
-        # Overdue invoices
-        overdue_invoices = db.query(Invoice).filter(
-            and_(
-                Invoice.due_date < datetime.now(),
-                Invoice.status != 'paid'
-            )
-        ).count()
+        await cache.cache_dashboard_data(company_key, *period, snapshot)
+        cache.clear_dashboard_stale(company_key, groups, started)
+        return snapshot
+    
+    @staticmethod
+    def _trend_window():
+        today = datetime.utcnow().date()
+        return today - timedelta(days=KPI_TREND_DAYS), today
+    
+    @staticmethod
+    def _query_kpi_values(db: Session, sections: List[str], trend_start, company_id: Optional[str] = None) -> Dict:
+        """All requested sections as derived tables of a single query"""
+        query = "SELECT * FROM " + " CROSS JOIN ".join(
+            f"({KPI_SECTION_SQL[name]}) AS {name}" for name in sections
+        )
+        row = db.execute(text(query), {
+            "trend_start": datetime.combine(trend_start, datetime.min.time()),
+            "now": datetime.now(),
+            "company_id": company_id,
+            "all_companies": company_id is None
+        }).mappings().one()
+        return {key: float(value or 0) for key, value in row.items()}
+    
+    @staticmethod
+    def _build_kpis(values: Dict) -> Dict:
+        net_income = values["revenue"] - values["expenses"]
+        net_income_prior = (
+            (values["revenue"] - values["revenue_movement"])
+            - (values["expenses"] - values["expenses_movement"])
+        )
         
         return {
-            "cash_balance": {
-                "value": float(cash_balance),
-                "label": "Cash Balance",
-                "trend": "up",
-                "change_percent": 5.2
-            },
-            "accounts_receivable": {
-                "value": float(ar_balance),
-                "label": "Accounts Receivable",
-                "trend": "down",
-                "change_percent": -2.1
-            },
-            "accounts_payable": {
-                "value": float(ap_balance),
-                "label": "Accounts Payable",
-                "trend": "up",
-                "change_percent": 3.8
-            },
-            "net_income": {
-                "value": float(net_income),
-                "label": "Net Income (MTD)",
-                "trend": "up" if net_income > 0 else "down",
-                "change_percent": 8.5
-            },
-            "pending_approvals": {
-                "value": pending_approvals,
-                "label": "Pending Approvals",
-                "trend": "neutral",
-                "change_percent": 0
-            },
-            "overdue_invoices": {
-                "value": overdue_invoices,
-                "label": "Overdue Invoices",
-                "trend": "down",
-                "change_percent": -15.3
-            }
+            "cash_balance": _kpi(
+                values["cash_balance"], values["cash_balance"] - values["cash_movement"], "Cash Balance"
+            ),
+            "accounts_receivable": _kpi(
+                values["ar_balance"], values["ar_balance"] - values["ar_movement"], "Accounts Receivable"
+            ),
+            "accounts_payable": _kpi(
+                values["ap_balance"], values["ap_balance"] - values["ap_movement"], "Accounts Payable"
+            ),
+            "net_income": _kpi(
+                net_income, net_income_prior, "Net Income (MTD)",
+                trend="up" if net_income > 0 else "down"
+            ),
+            "pending_approvals": _kpi(
+                int(values["pending_approvals"]), int(values["pending_approvals_prior"]), "Pending Approvals"
+            ),
+            "overdue_invoices": _kpi(
+                int(values["overdue_invoices"]), int(values["overdue_invoices_prior"]), "Overdue Invoices"
+            )
         }
     
     @staticmethod
@@ -525,4 +679,54 @@ class DashboardMetrics:
                 "benchmark": 15,
                 "trend": "neutral"
             }
-        }
\ No newline at end of file
+        }
+
+
+# Snapshot invalidation: committed changes to KPI source tables mark their
+# sections stale, in the snapshot of the changed row's company (the request's
+# when the row has none) and in the all-companies snapshot, and queue a
+# background refresh of just those sections.
+
+def _changed_kpi_section(session, obj) -> Optional[str]:
+    table = getattr(obj, "__tablename__", None)
+    if table not in KPI_SOURCE_TABLES:
+        return None
+    if obj in session.new or obj in session.deleted:
+        changed = table != "journal_entries" or getattr(obj, "status", None) == "posted"
+    else:
+        state = inspect(obj)
+        changed = any(
+            column in state.attrs.keys() and state.attrs[column].history.has_changes()
+            for column in KPI_SOURCE_COLUMNS[table]
+        )
+    return KPI_SOURCE_TABLES[table] if changed else None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_kpi_changes(session, flush_context):
+    changes = session.info.setdefault("dashboard_kpi_sections", {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        section = _changed_kpi_section(session, obj)
+        if section is not None:
+            for company_id in {None, _company_scope(getattr(obj, "company_id", None))}:
+                changes.setdefault(company_id, set()).add(section)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_kpi_refresh(session):
+    changes = session.info.pop("dashboard_kpi_sections", None)
+    if not changes:
+        return
+    for company_id, sections in changes.items():
+        try:
+            # Only the first change after a refresh needs to queue another one
+            if get_caching_service().mark_dashboard_stale(_company_key(company_id), sections):
+                from app.core.celery_app import refresh_dashboard_kpis_task
+                refresh_dashboard_kpis_task.delay(sorted(sections), company_id, tenant_context.tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not schedule dashboard KPI refresh: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_kpi_changes(session):
+    session.info.pop("dashboard_kpi_sections", None)
@@ -1,91 +1,282 @@
+import csv
+import io
+import tempfile
 from datetime import date
-from typing import List, Optional, Dict, Any
+from decimal import Decimal
+from typing import List, Optional, Any, Iterator, Tuple
+from uuid import UUID
 
 from fastapi import HTTPException, status
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 
 from app.models import ChartOfAccounts as GLAccount
 from app.models import JournalEntry, JournalEntryLine
 from app.schemas.gl_schemas import TrialBalance, TrialBalanceEntry
 
+# Account types whose balances are normally on the debit side
+DEBIT_NORMAL_TYPES = {"asset", "expense"}
+
+# Accounts fetched per round trip while streaming the trial balance
+TRIAL_BALANCE_FETCH_SIZE = 5000
+
+# Rows per chunk of a streamed CSV export
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_COLUMNS = [
+    'Account Code', 'Account Name', 'Account Type',
+    'Opening Balance', 'Period Activity', 'Ending Balance',
+    'Debit Amount', 'Credit Amount'
+]
+
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
 
 class TrialBalanceService:
     @staticmethod
     def get_trial_balance(
-        db: Session, 
-        start_date: date, 
-        end_date: date, 
-        include_zeros: bool = False
+        db: Session,
+        start_date: date,
+        end_date: date,
+        include_zeros: bool = False,
+        company_id: Optional[UUID] = None,
+        roll_up: bool = False
     ) -> TrialBalance:
         """Get Trial Balance."""
         """
         Generate a trial balance for the given date range
         """
-        # Get all active GL accounts
-        accounts = db.query(GLAccount).filter(GLAccount.is_active == True).all()
-        
-        # Initialize trial balance entries
         entries: List[TrialBalanceEntry] = []
-        total_debit = 0.0
-        total_credit = 0.0
-        
-        for account in accounts:
-            # Get opening balance (before start_date)
-            opening_balance = account.get_balance_as_of(db, start_date)
-            
-            # Get period activity (between start_date and end_date)
-            period_activity = account.get_period_activity(db, start_date, end_date)
-            
-            # Calculate ending balance
+        total_debit = Decimal('0')
+        total_credit = Decimal('0')
+
+        for entry, in_totals in TrialBalanceService._iter_entries(
+            db, start_date, end_date, include_zeros, company_id, roll_up
+        ):
+            entries.append(entry)
+            if in_totals:
+                total_debit += entry.debit_amount
+                total_credit += entry.credit_amount
+
+        return TrialBalance(
+            start_date=start_date,
+            end_date=end_date,
+            entries=entries,
+            total_debit=total_debit,
+            total_credit=total_credit,
+            difference=total_debit - total_credit
+        )
+
+    @staticmethod
+    def _account_balances(
+        db: Session,
+        start_date: date,
+        end_date: date,
+        company_id: Optional[UUID] = None
+    ):
+        """
+        Opening balance and period activity (debits less credits) of every
+        active account, from one grouped aggregate over posted journal lines.
+        """
+        net_amount = (
+            func.coalesce(JournalEntryLine.debit_amount, 0)
+            - func.coalesce(JournalEntryLine.credit_amount, 0)
+        )
+        lines = select(
+            JournalEntryLine.account_id,
+            func.sum(case((JournalEntry.entry_date < start_date, net_amount), else_=0)).label('opening'),
+            func.sum(case((JournalEntry.entry_date >= start_date, net_amount), else_=0)).label('activity')
+        ).join(
+            JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id
+        ).where(
+            JournalEntry.status == 'posted',
+            JournalEntry.entry_date <= end_date
+        ).group_by(JournalEntryLine.account_id)
+        if company_id:
+            lines = lines.where(JournalEntry.company_id == company_id)
+        lines = lines.subquery()
+
+        accounts = select(
+            GLAccount.id,
+            GLAccount.parent_id,
+            GLAccount.account_code,
+            GLAccount.account_name,
+            GLAccount.account_type,
+            func.coalesce(lines.c.opening, 0).label('opening'),
+            func.coalesce(lines.c.activity, 0).label('activity')
+        ).outerjoin(
+            lines, lines.c.account_id == GLAccount.id
+        ).where(
+            GLAccount.is_active == True
+        ).order_by(GLAccount.account_code)
+        if company_id:
+            accounts = accounts.where(GLAccount.company_id == company_id)
+
+        return db.execute(accounts.execution_options(yield_per=TRIAL_BALANCE_FETCH_SIZE))
+
+    @staticmethod
+    def _roll_up(rows) -> Iterator[Tuple[Any, Decimal, Decimal, bool]]:
+        """
+        Add each account's balances to all of its ancestors. Only top-level
+        accounts count towards the totals, as they already include their children.
+
+        A parent cycle is broken at the account where it is first entered, in
+        account code order, which is then treated as a top-level account.
+        """
+        rows = list(rows)
+        parents = {row.id: row.parent_id for row in rows}
+        acyclic = set()
+        for row in rows:
+            path = set()
+            account_id = row.id
+            while account_id in parents and account_id not in acyclic:
+                if account_id in path:
+                    parents[account_id] = None
+                    break
+                path.add(account_id)
+                account_id = parents[account_id]
+            acyclic |= path
+
+        rolled = {row.id: [Decimal(row.opening), Decimal(row.activity)] for row in rows}
+        for row in rows:
+            parent_id = parents[row.id]
+            while parent_id in rolled:
+                rolled[parent_id][0] += row.opening
+                rolled[parent_id][1] += row.activity
+                parent_id = parents[parent_id]
+        for row in rows:
+            opening, activity = rolled[row.id]
+            yield row, opening, activity, parents[row.id] not in rolled
+
+    @staticmethod
+    def _iter_entries(
+        db: Session,
+        start_date: date,
+        end_date: date,
+        include_zeros: bool = False,
+        company_id: Optional[UUID] = None,
+        roll_up: bool = False
+    ) -> Iterator[Tuple[TrialBalanceEntry, bool]]:
+        """Trial balance entries in account code order, with whether each counts towards the totals."""
+        rows = TrialBalanceService._account_balances(db, start_date, end_date, company_id)
+        if roll_up:
+            balances = TrialBalanceService._roll_up(rows)
+        else:
+            balances = ((row, row.opening, row.activity, True) for row in rows)
+
+        for row, opening_balance, period_activity, in_totals in balances:
+            # Balances are debits less credits; present them on the account's normal side
+            if (row.account_type or '').lower() not in DEBIT_NORMAL_TYPES:
+                opening_balance, period_activity = -opening_balance, -period_activity
             ending_balance = opening_balance + period_activity
-            
+
             # Skip zero balance accounts if requested
             if not include_zeros and ending_balance == 0:
                 continue
-                
+
             # Determine debit/credit amounts based on account type
-            if account.account_type.normal_balance == 'debit':
-                debit_amount = ending_balance if ending_balance > 0 else 0
-                credit_amount = -ending_balance if ending_balance < 0 else 0
+            if (row.account_type or '').lower() in DEBIT_NORMAL_TYPES:
+                debit_amount = ending_balance if ending_balance > 0 else Decimal('0')
+                credit_amount = -ending_balance if ending_balance < 0 else Decimal('0')
             else:
-                debit_amount = -ending_balance if ending_balance < 0 else 0
-                credit_amount = ending_balance if ending_balance > 0 else 0
-                
-            # Add to totals
-            total_debit += debit_amount
-            total_credit += credit_amount
-            
-            # Create trial balance entry
-            entries.append(TrialBalanceEntry(
-                account_code=account.code,
-                account_name=account.name,
-                account_type=account.account_type.name,
+                debit_amount = -ending_balance if ending_balance < 0 else Decimal('0')
+                credit_amount = ending_balance if ending_balance > 0 else Decimal('0')
+
+            yield TrialBalanceEntry(
+                account_code=row.account_code,
+                account_name=row.account_name,
+                account_type=row.account_type,
                 opening_balance=opening_balance,
                 period_activity=period_activity,
                 ending_balance=ending_balance,
                 debit_amount=debit_amount,
                 credit_amount=credit_amount
-            ))
-            
-        return TrialBalance(
-            start_date=start_date,
-            end_date=end_date,
-            entries=entries,
-            total_debit=total_debit,
-            total_credit=total_credit,
-            difference=total_debit - total_credit
-        )
-        
+            ), in_totals
+
     @staticmethod
     def export_trial_balance(
-        trial_balance: TrialBalance,
-        format: str = 'csv'  # 'csv' or 'excel'
-    ) -> bytes:
+        db: Session,
+        start_date: date,
+        end_date: date,
+        format: str = 'csv',  # 'csv' or 'excel'
+        include_zeros: bool = False,
+        company_id: Optional[UUID] = None,
+        roll_up: bool = False
+    ) -> Iterator[bytes]:
         """Export Trial Balance."""
         """
-        Export trial balance to the specified format
+        Export trial balance to the specified format, as a stream of bytes.
+        Accounts are read from the database in batches while the file is
+        written, so the whole trial balance is never held as entries in memory.
         """
-        # Implementation for exporting to different formats
-        # This is a placeholder - actual implementation would use a library like pandas
-        # or openpyxl for Excel export
-        pass
+        format = format.lower()
+        if format not in EXPORT_MEDIA_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format: {format}. Supported formats are: csv, excel"
+            )
+
+        entries = TrialBalanceService._iter_entries(
+            db, start_date, end_date, include_zeros, company_id, roll_up
+        )
+        if format == 'csv':
+            return TrialBalanceService._export_csv(entries)
+        return TrialBalanceService._export_xlsx(entries)
+
+    @staticmethod
+    def _export_rows(entries: Iterator[Tuple[TrialBalanceEntry, bool]]) -> Iterator[List[Any]]:
+        """Header, one row per entry, then a totals row."""
+        total_debit = Decimal('0')
+        total_credit = Decimal('0')
+
+        yield EXPORT_COLUMNS
+        for entry, in_totals in entries:
+            if in_totals:
+                total_debit += entry.debit_amount
+                total_credit += entry.credit_amount
+            yield [
+                entry.account_code,
+                entry.account_name,
+                entry.account_type,
+                entry.opening_balance,
+                entry.period_activity,
+                entry.ending_balance,
+                entry.debit_amount,
+                entry.credit_amount
+            ]
+        yield []
+        yield ['', '', 'TOTALS:', '', '', '', total_debit, total_credit]
+
+    @staticmethod
+    def _export_csv(entries: Iterator[Tuple[TrialBalanceEntry, bool]]) -> Iterator[bytes]:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for count, row in enumerate(TrialBalanceService._export_rows(entries), 1):
+            writer.writerow(row)
+            if count % EXPORT_CHUNK_ROWS == 0:
+                yield output.getvalue().encode('utf-8')
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _export_xlsx(entries: Iterator[Tuple[TrialBalanceEntry, bool]]) -> Iterator[bytes]:
+        from openpyxl import Workbook
+
+        # A write-only workbook serializes rows as they are appended
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Trial Balance")
+        for row in TrialBalanceService._export_rows(entries):
+            ws.append(row)
+
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+            wb.save(output)
+            output.seek(0)
+            while True:
+                chunk = output.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
@@ -0,0 +1,369 @@
+"""
+Gross-to-net engine for partitioned, parallel pay runs.
+
+The engine works on plain, picklable data only: the pay run's lookup tables
+(earning codes, deduction rules and tax tables) are built once from the
+database and handed to every worker process when the pool starts, and each
+shard carries the inputs of its employees. Workers never touch the database;
+they return ``payroll_slips`` and ``payroll_slip_lines`` rows ready for bulk
+insertion.
+"""
+import time
+import uuid
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+# Pay periods per year by pay frequency name
+PERIODS_PER_YEAR = {
+    "WEEKLY": 52,
+    "BI_WEEKLY": 26,
+    "BIWEEKLY": 26,
+    "SEMI_MONTHLY": 24,
+    "SEMIMONTHLY": 24,
+    "MONTHLY": 12,
+    "QUARTERLY": 4,
+}
+STANDARD_ANNUAL_HOURS = Decimal("2080")
+
+# Payslip summary column of a line, by category; other earnings are allowances
+# and other deductions and employee taxes are other deductions
+EARNING_COLUMNS = {
+    "OVERTIME": "overtime_pay",
+    "BONUS": "bonus",
+    "COMMISSION": "commission",
+}
+DEDUCTION_COLUMNS = {
+    "FEDERAL_TAX": "federal_tax",
+    "STATE_TAX": "state_tax",
+    "SOCIAL_SECURITY": "social_security",
+    "MEDICARE": "medicare",
+    "HEALTH_INSURANCE": "health_insurance",
+    "RETIREMENT_401K": "retirement_401k",
+}
+SUMMARY_COLUMNS = (
+    "overtime_pay", "bonus", "commission", "allowances", "federal_tax", "state_tax",
+    "social_security", "medicare", "health_insurance", "retirement_401k", "other_deductions",
+)
+
+
+def _money(value: Decimal) -> Decimal:
+    return value.quantize(CENT, ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class EarningRule:
+    """An earning payroll item as seen by the engine."""
+    code: str
+    name: str
+    earning_type: str
+    calculation_type: str = "FIXED_AMOUNT"  # FIXED_AMOUNT, PERCENTAGE_OF_BASE
+    is_taxable: bool = True
+    gl_account_code: Optional[str] = None
+    payroll_item_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class DeductionRule:
+    """A deduction payroll item as seen by the engine."""
+    code: str
+    name: str
+    deduction_type: str
+    calculation_type: str = "FIXED_AMOUNT"  # FIXED_AMOUNT, PERCENTAGE_OF_GROSS
+    is_pre_tax: bool = False
+    annual_max: Optional[Decimal] = None
+    gl_account_code: Optional[str] = None
+    payroll_item_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class TaxBracketRow:
+    lower_bound: Decimal
+    upper_bound: Optional[Decimal]
+    rate_type: str  # PERCENTAGE, FIXED_AMOUNT
+    rate: Decimal
+    additional_amount: Optional[Decimal] = None
+
+
+@dataclass(frozen=True)
+class TaxTable:
+    """
+    A tax payroll item of the pay run, with its brackets in ascending order.
+    ``tax_code_id`` is the ID of the tax's payroll item.
+
+    Brackets are compiled when the table is built: ``_starts`` holds the
+    income at which each bracket begins to apply and ``_base_tax`` the tax on
+    all brackets below it, so a bracketed calculation is one binary search.
+    """
+    tax_code_id: str
+    code: str
+    name: str
+    calculation_method: str  # FLAT_RATE, PERCENTAGE, BRACKETED
+    rate: Decimal = ZERO
+    is_employer_tax: bool = False
+    category: Optional[str] = None
+    gl_account_code: Optional[str] = None
+    state: Optional[str] = None
+    country: Optional[str] = None
+    applies_to_regular_pay: bool = True
+    annualization_factor: Optional[Decimal] = None
+    brackets: Tuple[TaxBracketRow, ...] = ()
+    _starts: Tuple[Decimal, ...] = field(init=False, repr=False, compare=False)
+    _base_tax: Tuple[Decimal, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        starts, base_tax = [], []
+        start, tax = ZERO, ZERO
+        for bracket in self.brackets:
+            starts.append(start)
+            base_tax.append(tax)
+            if bracket.upper_bound is None:
+                # An open-ended bracket takes all remaining income
+                break
+            width = max(ZERO, bracket.upper_bound - bracket.lower_bound)
+            tax += self._bracket_tax(bracket, width)
+            start += width
+        else:
+            if self.brackets:
+                # Income above the highest bounded bracket is not taxed
+                starts.append(start)
+                base_tax.append(tax)
+        object.__setattr__(self, "_starts", tuple(starts))
+        object.__setattr__(self, "_base_tax", tuple(base_tax))
+
+    @staticmethod
+    def _bracket_tax(bracket: TaxBracketRow, income_in_bracket: Decimal) -> Decimal:
+        if bracket.rate_type == "PERCENTAGE":
+            bracket_tax = income_in_bracket * (bracket.rate / 100)
+        else:
+            bracket_tax = bracket.rate
+        if bracket.additional_amount is not None:
+            bracket_tax += bracket.additional_amount
+        return bracket_tax
+
+    def applies_to(self, employee: "EmployeePayInput") -> bool:
+        return (
+            (self.state is None or employee.state is None or self.state == employee.state)
+            and (self.country is None or employee.country is None or self.country == employee.country)
+        )
+
+    def calculate(self, taxable_income: Decimal) -> Decimal:
+        """Tax on ``taxable_income`` for the pay period."""
+        if taxable_income <= 0:
+            return ZERO
+        if self.calculation_method == "FLAT_RATE":
+            return _money(self.rate)
+        if self.calculation_method == "PERCENTAGE":
+            return _money(taxable_income * (self.rate / 100))
+        if self.calculation_method != "BRACKETED":
+            return ZERO
+
+        # Highest bracket that starts below the income; all brackets under it are full
+        index = bisect_left(self._starts, taxable_income) - 1
+        if index < 0:
+            return ZERO
+        total_tax = self._base_tax[index]
+        if index < len(self.brackets):
+            total_tax += self._bracket_tax(self.brackets[index], taxable_income - self._starts[index])
+
+        if self.annualization_factor:
+            total_tax = total_tax / self.annualization_factor
+        return _money(total_tax)
+
+
+@dataclass(frozen=True)
+class PayrollTables:
+    """Immutable lookup tables shared by all shards of a pay run."""
+    earning_rules: Dict[str, EarningRule]
+    deduction_rules: Dict[str, DeductionRule]
+    tax_tables: Tuple[TaxTable, ...]
+    process_taxes: bool = True
+    process_benefits: bool = True
+    is_regular_pay: bool = True
+
+
+@dataclass(frozen=True)
+class EmployeePayInput:
+    """Everything the engine needs to pay one employee."""
+    employee_id: str
+    employee_code: str
+    base_salary: Decimal
+    pay_frequency: str
+    state: Optional[str] = None
+    country: Optional[str] = None
+    # (code, value) pairs; the value is an amount or a percentage, per the rule
+    earnings: Tuple[Tuple[str, Decimal], ...] = ()
+    deductions: Tuple[Tuple[str, Decimal], ...] = ()
+    # (tax_code_id, amount) pairs of taxes already withheld this year
+    ytd_taxes: Tuple[Tuple[str, Decimal], ...] = ()
+
+
+@dataclass
+class Shard:
+    index: int
+    pay_run_id: str
+    run_number: str
+    pay_period_start: date
+    pay_period_end: date
+    pay_date: date
+    employees: List[EmployeePayInput]
+
+
+@dataclass
+class ShardResult:
+    index: int
+    payslips: List[Dict] = field(default_factory=list)
+    lines: List[Dict] = field(default_factory=list)
+    compute_seconds: float = 0.0
+
+
+def partition(items: Sequence, shard_size: int) -> Iterator[Sequence]:
+    """Consecutive slices of at most ``shard_size`` items."""
+    for start in range(0, len(items), shard_size):
+        yield items[start:start + shard_size]
+
+
+# Tables of the pay run in the current worker process, set by the pool initializer
+_worker_tables: Optional[PayrollTables] = None
+
+
+def _init_worker(tables: PayrollTables) -> None:
+    global _worker_tables
+    _worker_tables = tables
+
+
+def create_pool(tables: PayrollTables, workers: int) -> ProcessPoolExecutor:
+    """Worker pool whose processes receive the lookup tables once, at startup."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tables,))
+
+
+def compute_shard(shard: Shard, tables: Optional[PayrollTables] = None) -> ShardResult:
+    """Gross-to-net for every employee of a shard."""
+    tables = tables or _worker_tables
+    if tables is None:
+        raise RuntimeError("Payroll lookup tables were not loaded in this process")
+
+    started = time.perf_counter()
+    result = ShardResult(index=shard.index)
+    for employee in shard.employees:
+        _pay_employee(employee, shard, tables, result)
+    result.compute_seconds = time.perf_counter() - started
+    return result
+
+
+def _line(payslip_id, line_type: str, payroll_item_id, category: str, name: str, amount: Decimal, **values) -> Dict:
+    """A payroll_slip_lines row; every row has the same keys so they insert as one batch."""
+    line = {
+        "payslip_id": payslip_id,
+        "payroll_item_id": payroll_item_id,
+        "line_type": line_type,
+        "category": category,
+        "name": name,
+        "amount": amount,
+        "taxable_amount": None,
+        "ytd_amount": None,
+        "is_taxable": False,
+        "is_pre_tax": False,
+        "is_employer_tax": False,
+        "gl_account": None
+    }
+    line.update(values)
+    return line
+
+
+def _pay_employee(employee: EmployeePayInput, shard: Shard, tables: PayrollTables, result: ShardResult) -> None:
+    payslip_id = uuid.uuid4()
+    periods = PERIODS_PER_YEAR.get(employee.pay_frequency.upper(), 12)
+    summary = dict.fromkeys(SUMMARY_COLUMNS, ZERO)
+
+    # Earnings
+    base_pay = _money(employee.base_salary / periods)
+    earnings = [_line(
+        payslip_id, "earning", None, "REGULAR", "Regular Pay", base_pay, is_taxable=True, gl_account="5000"
+    )]
+    for code, value in employee.earnings:
+        rule = tables.earning_rules.get(code)
+        if rule is None:
+            continue
+        amount = _money(base_pay * value / 100) if rule.calculation_type == "PERCENTAGE_OF_BASE" else _money(value)
+        if amount:
+            earnings.append(_line(
+                payslip_id, "earning", rule.payroll_item_id, rule.earning_type, rule.name, amount,
+                is_taxable=rule.is_taxable, gl_account=rule.gl_account_code
+            ))
+            summary[EARNING_COLUMNS.get(rule.earning_type, "allowances")] += amount
+    gross_pay = sum((e["amount"] for e in earnings), ZERO)
+    taxable_gross = sum((e["amount"] for e in earnings if e["is_taxable"]), ZERO)
+
+    # Deductions
+    deductions = []
+    if tables.process_benefits:
+        for code, value in employee.deductions:
+            rule = tables.deduction_rules.get(code)
+            if rule is None:
+                continue
+            if rule.calculation_type == "PERCENTAGE_OF_GROSS":
+                amount = _money(taxable_gross * value / 100)
+            else:
+                amount = _money(value)
+            if rule.annual_max is not None:
+                amount = min(amount, rule.annual_max)
+            if amount > 0:
+                deductions.append(_line(
+                    payslip_id, "deduction", rule.payroll_item_id, rule.deduction_type, rule.name, amount,
+                    is_pre_tax=rule.is_pre_tax, gl_account=rule.gl_account_code
+                ))
+                summary[DEDUCTION_COLUMNS.get(rule.deduction_type, "other_deductions")] += amount
+    pre_tax = sum((d["amount"] for d in deductions if d["is_pre_tax"]), ZERO)
+    post_tax = sum((d["amount"] for d in deductions if not d["is_pre_tax"]), ZERO)
+
+    # Taxes
+    taxable_income = max(ZERO, taxable_gross - pre_tax)
+    taxes = []
+    if tables.process_taxes:
+        ytd_taxes = dict(employee.ytd_taxes)
+        for table in tables.tax_tables:
+            if tables.is_regular_pay and not table.applies_to_regular_pay:
+                continue
+            if not table.applies_to(employee):
+                continue
+            amount = table.calculate(taxable_income)
+            if amount > 0:
+                taxes.append(_line(
+                    payslip_id, "tax", table.tax_code_id, table.category, table.name, amount,
+                    taxable_amount=taxable_income,
+                    ytd_amount=ytd_taxes.get(table.tax_code_id, ZERO) + amount,
+                    is_employer_tax=table.is_employer_tax,
+                    gl_account=table.gl_account_code
+                ))
+                if not table.is_employer_tax:
+                    summary[DEDUCTION_COLUMNS.get(table.category, "other_deductions")] += amount
+    employee_taxes = sum((t["amount"] for t in taxes if not t["is_employer_tax"]), ZERO)
+
+    net_pay = _money(gross_pay - pre_tax - employee_taxes - post_tax)
+    result.payslips.append({
+        "id": payslip_id,
+        "payslip_number": f"{shard.run_number}-{employee.employee_code}",
+        "pay_run_id": shard.pay_run_id,
+        "employee_id": employee.employee_id,
+        "pay_period_start": shard.pay_period_start,
+        "pay_period_end": shard.pay_period_end,
+        "pay_date": shard.pay_date,
+        "base_salary": base_pay,
+        **summary,
+        "gross_pay": gross_pay,
+        "total_deductions": pre_tax + post_tax + employee_taxes,
+        "net_pay": net_pay,
+        "regular_hours": _money(STANDARD_ANNUAL_HOURS / periods),
+        "overtime_hours": ZERO,
+        "is_paid": False
+    })
+    result.lines.extend(earnings)
+    result.lines.extend(deductions)
+    result.lines.extend(taxes)
@@ -1,35 +1,41 @@
 """
 Payroll processor service that handles the core payroll processing logic.
 """
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Union
 
-from ..models.payroll_models import (
-from ..schemas.payroll_schemas import (
 from decimal import Decimal, ROUND_HALF_UP
-from fastapi import HTTPException, status
 from sqlalchemy import and_, or_, func, select
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from uuid import UUID
 
 from app.core.config import settings
-from app.core.exceptions import AppException
+from app.core.exceptions import BadRequestException, InternalServerException, NotFoundException
 from app.core.logging import logger
-
-
-
-
-    Employee, PayPeriod, PayRun, Payslip, PayslipEarning, PayslipDeduction,
-    PayslipTax, PayslipBenefit, PayComponent, PayComponentType, PaySchedule,
-    TaxCode, BenefitPlan, BenefitEnrollment, LeaveRequest, AttendanceRecord,
-    BankAccount, PayRunStatus, PayFrequency, EmploymentType, PayRunStatus
+from app.core.observability import metrics_store
+from app.models.payroll_models import (
+    Employee, EmployeePayrollItem, PayFrequency, PayRun, PayrollItem, PayrollStatus,
+    Payslip, PayslipLine
 )
-    PayRunCreate, PayRunUpdate, PayRunResponse, PayslipResponse,
-    PayslipEarningResponse, PayslipDeductionResponse, PayslipTaxResponse,
-    PayslipBenefitResponse, PayrollProcessingRequest, PayrollProcessingResult,
-    PayrollCalculationResult, PayrollEarningItem, PayrollDeductionItem,
-    PayrollTaxItem, PayrollBenefitItem, PayrollNetPayCalculation
+from app.services.numbering.document_number_service import DocumentNumberService, last_number_in_use
+
+from .pay_run_engine import (
+    DeductionRule, EarningRule, EmployeePayInput, PayrollTables, Shard, ShardResult,
+    compute_shard, create_pool, partition
 )
+from .payroll_tax_calculator import PayrollTaxCalculator
+
+# Employees per shard; each shard is computed by one worker and written in one transaction
+PAYROLL_SHARD_SIZE = getattr(settings, 'PAYROLL_SHARD_SIZE', 1000)
+PAYROLL_WORKERS = getattr(settings, 'PAYROLL_WORKERS', None) or os.cpu_count() or 1
+PAYROLL_SHARD_MAX_ATTEMPTS = getattr(settings, 'PAYROLL_SHARD_MAX_ATTEMPTS', 3)
+# Rows per IN (...) list when loading employee assignments
+ASSIGNMENT_QUERY_SIZE = 1000
 
 class PayrollProcessor:
     """
@@ -38,12 +44,18 @@ class PayrollProcessor:
     
     def __init__(self, db: Session):
         self.db = db
+        self.tax_calculator = PayrollTaxCalculator(db)
+        # Throughput of each shard of the last processed pay run
+        self.shard_metrics: List[Dict] = []
     
     def initialize_pay_run(
         self,
-        pay_period_id: UUID,
-        created_by: UUID,
         company_id: UUID,
+        pay_period_start: date,
+        pay_period_end: date,
+        pay_date: date,
+        created_by: UUID,
+        pay_frequency: PayFrequency = PayFrequency.MONTHLY,
         process_taxes: bool = True,
         process_benefits: bool = True,
         dry_run: bool = False
@@ -53,9 +65,12 @@ class PayrollProcessor:
         Initialize a new pay run for the specified pay period.
         
         Args:
-            pay_period_id: ID of the pay period to process
-            created_by: ID of the user creating the pay run
             company_id: ID of the company
+            pay_period_start: First day of the pay period
+            pay_period_end: Last day of the pay period
+            pay_date: Date the employees are paid
+            created_by: ID of the user creating the pay run
+            pay_frequency: Pay frequency, which sets the share of annual salaries paid
             process_taxes: Whether to calculate taxes
             process_benefits: Whether to process benefits
             dry_run: If True, validate but don't save to database
@@ -64,42 +79,40 @@ class PayrollProcessor:
             The created PayRun object
             
         Raises:
-            AppException: If pay period is not found or already processed
+            BadRequestException: If the period is invalid or already has a pay run
         """
-        # Get the pay period
-        pay_period = self.db.query(PayPeriod).filter(
-            PayPeriod.id == pay_period_id,
-            PayPeriod.company_id == company_id
-        ).first()
-        
-        if not pay_period:
-            raise AppException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                message=f"Pay period {pay_period_id} not found"
+        if pay_period_end < pay_period_start or pay_date < pay_period_start:
+            raise BadRequestException(
+                f"Invalid pay period {pay_period_start} - {pay_period_end} with pay date {pay_date}"
             )
             
         # Check if pay period is already processed
         existing_run = self.db.query(PayRun).filter(
-            PayRun.pay_period_id == pay_period_id,
-            PayRun.status.in_([PayRunStatus.PROCESSING, PayRunStatus.COMPLETED])
+            PayRun.company_id == company_id,
+            PayRun.pay_period_start == pay_period_start,
+            PayRun.pay_period_end == pay_period_end,
+            PayRun.status.in_([PayrollStatus.PROCESSING.value, PayrollStatus.COMPLETED.value])
         ).first()
         
         if existing_run:
-            raise AppException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                message=f"Pay period {pay_period_id} already has a pay run in progress or completed"
+            raise BadRequestException(
+                f"Pay period {pay_period_start} - {pay_period_end} already has a pay run in progress or completed"
             )
         
         # Create the pay run
         pay_run = PayRun(
-            pay_period_id=pay_period_id,
             company_id=company_id,
-            status=PayRunStatus.DRAFT if dry_run else PayRunStatus.PROCESSING,
+            run_number=self._next_run_number(),
+            pay_period=f"{pay_period_start} - {pay_period_end}",
+            pay_period_start=pay_period_start,
+            pay_period_end=pay_period_end,
+            pay_date=pay_date,
+            pay_frequency=getattr(pay_frequency, "value", pay_frequency),
+            status=PayrollStatus.DRAFT.value if dry_run else PayrollStatus.PROCESSING.value,
             process_taxes=process_taxes,
             process_benefits=process_benefits,
-            created_by=created_by,
-            processed_at=datetime.utcnow() if not dry_run else None,
-            is_dry_run=dry_run
+            created_by=str(created_by),
+            processed_at=datetime.utcnow() if not dry_run else None
         )
         
         if not dry_run:
@@ -109,6 +122,12 @@ class PayrollProcessor:
         
         return pay_run
     
+    def _next_run_number(self) -> str:
+        return DocumentNumberService(self.db).next_number(
+            "PR",
+            seed=lambda: last_number_in_use(self.db, PayRun.run_number, "PR")
+        )
+    
     def process_pay_run(
         self,
         pay_run_id: UUID,
@@ -120,6 +139,12 @@ class PayrollProcessor:
         """
         Process a pay run by calculating payslips for all eligible employees.
         
+        Eligible employees are partitioned into shards of PAYROLL_SHARD_SIZE
+        that are computed in a pool of PAYROLL_WORKERS processes and written
+        back one shard per transaction. Employees that already have a payslip
+        in the run are skipped, so re-processing a failed run only computes
+        the shards that did not complete.
+        
         Args:
             pay_run_id: ID of the pay run to process
             processed_by: ID of the user processing the pay run
@@ -130,59 +155,310 @@ class PayrollProcessor:
             The updated PayRun object
             
         Raises:
-            AppException: If pay run is not found or already completed
+            NotFoundException: If the pay run is not found
+            BadRequestException: If the pay run is already completed
+            InternalServerException: If processing fails
         """
-        # Get the pay run with related data
-        pay_run = self.db.query(PayRun).filter(
-            PayRun.id == pay_run_id
-        ).options(
-            joinedload(PayRun.pay_period)
-        ).first()
+        pay_run = self.db.query(PayRun).filter(PayRun.id == pay_run_id).first()
         
         if not pay_run:
-            raise AppException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                message=f"Pay run {pay_run_id} not found"
-            )
+            raise NotFoundException(f"Pay run {pay_run_id} not found")
             
-        if pay_run.status == PayRunStatus.COMPLETED and not recalculate:
-            raise AppException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                message=f"Pay run {pay_run_id} is already completed"
-            )
+        if pay_run.status == PayrollStatus.COMPLETED.value and not recalculate:
+            raise BadRequestException(f"Pay run {pay_run_id} is already completed")
         
         try:
+            was_completed = pay_run.status == PayrollStatus.COMPLETED.value
+            
             # Update pay run status to processing
-            pay_run.status = PayRunStatus.PROCESSING
-            pay_run.processed_by = processed_by
+            pay_run.status = PayrollStatus.PROCESSING.value
+            pay_run.processed_by = str(processed_by)
             pay_run.processed_at = datetime.utcnow()
             self.db.commit()
             
-            # This is a placeholder - actual implementation will process each employee
+            if recalculate:
+                if was_completed:
+                    # Taxes are posted to the YTD accumulator per run; take them out again
+                    self.tax_calculator.post_ytd_taxes(pay_run.id, reverse=True)
+                self._delete_payslips(pay_run.id, employee_ids)
+            
+            employees = self._get_eligible_employees(pay_run, employee_ids)
+            completed = {
+                employee_id for (employee_id,) in
+                self.db.query(Payslip.employee_id).filter(Payslip.pay_run_id == pay_run.id)
+            }
+            employees = sorted(
+                (employee for employee in employees if employee.id not in completed),
+                key=lambda employee: str(employee.id)
+            )
+            
+            tables = self._load_payroll_tables(pay_run)
+            shards = [
+                self._shard(pay_run, index, self._load_employee_inputs(chunk, pay_run))
+                for index, chunk in enumerate(partition(employees, PAYROLL_SHARD_SIZE))
+            ]
+            
+            self.shard_metrics, failed = self._run_shards(pay_run, shards, tables)
+            if failed:
+                raise RuntimeError(
+                    f"{len(failed)} of {len(shards)} shards failed after {PAYROLL_SHARD_MAX_ATTEMPTS} attempts: "
+                    + "; ".join(f"shard {index}: {error}" for index, error in sorted(failed.items()))
+                )
             
-            # Update pay run status to completed
-            pay_run.status = PayRunStatus.COMPLETED
+            # Run totals over all payslips, including those of earlier attempts
+            count, gross, deductions, net = self.db.query(
+                func.count(Payslip.id),
+                func.coalesce(func.sum(Payslip.gross_pay), 0),
+                func.coalesce(func.sum(Payslip.total_deductions), 0),
+                func.coalesce(func.sum(Payslip.net_pay), 0)
+            ).filter(Payslip.pay_run_id == pay_run.id).one()
+            pay_run.employee_count = count
+            pay_run.total_gross = pay_run.total_gross_pay = gross
+            pay_run.total_deductions = deductions
+            pay_run.total_net = pay_run.total_net_pay = net
+            
+            # Finalize the payslips: post their taxes to the YTD accumulator
+            # and complete the pay run in one transaction
+            self.tax_calculator.post_ytd_taxes(pay_run.id)
+            pay_run.status = PayrollStatus.COMPLETED.value
             pay_run.completed_at = datetime.utcnow()
             self.db.commit()
             
             return pay_run
             
         except Exception as e:
+            self.db.rollback()
             # Update pay run status to failed
-            pay_run.status = PayRunStatus.FAILED
+            pay_run.status = PayrollStatus.FAILED.value
             pay_run.error_message = str(e)
             self.db.commit()
             
             logger.error(f"Error processing pay run {pay_run_id}: {str(e)}", exc_info=True)
-            raise AppException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                message=f"Failed to process pay run: {str(e)}"
+            raise InternalServerException(f"Failed to process pay run: {str(e)}")
+    
+    @staticmethod
+    def _shard(pay_run: PayRun, index: int, employees: List[EmployeePayInput]) -> Shard:
+        return Shard(
+            index=index,
+            pay_run_id=pay_run.id,
+            run_number=pay_run.run_number,
+            pay_period_start=pay_run.pay_period_start,
+            pay_period_end=pay_run.pay_period_end,
+            pay_date=pay_run.pay_date,
+            employees=employees
+        )
+    
+    def _run_shards(
+        self,
+        pay_run: PayRun,
+        shards: List[Shard],
+        tables: PayrollTables
+    ) -> Tuple[List[Dict], Dict[int, str]]:
+        """
+        Compute shards in a process pool and write each one as it completes.
+        
+        A shard whose computation or write fails is resubmitted, up to
+        PAYROLL_SHARD_MAX_ATTEMPTS times; shards already written are not
+        recomputed.
+        
+        Returns:
+            Per-shard throughput metrics and the errors of shards that failed
+        """
+        workers = min(PAYROLL_WORKERS, len(shards))
+        executor = create_pool(tables, workers) if workers > 1 else None
+        attempts: Dict[int, int] = defaultdict(int)
+        metrics: List[Dict] = []
+        failed: Dict[int, str] = {}
+        pending = list(shards)
+        
+        def submit(shard: Shard) -> Future:
+            attempts[shard.index] += 1
+            if executor is not None:
+                return executor.submit(compute_shard, shard)
+            future = Future()
+            try:
+                future.set_result(compute_shard(shard, tables))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        try:
+            while pending:
+                futures = {submit(shard): shard for shard in pending}
+                pending = []
+                pool_broken = False
+                
+                for future in as_completed(futures):
+                    shard = futures[future]
+                    try:
+                        result = future.result()
+                        write_seconds = self._write_shard(result)
+                    except Exception as e:
+                        pool_broken = pool_broken or isinstance(e, BrokenProcessPool)
+                        logger.warning(
+                            f"Pay run {pay_run.id} shard {shard.index} failed "
+                            f"(attempt {attempts[shard.index]}): {str(e)}"
+                        )
+                        metrics_store.record_job("payroll_shard", False, 0.0)
+                        if attempts[shard.index] < PAYROLL_SHARD_MAX_ATTEMPTS:
+                            pending.append(shard)
+                        else:
+                            failed[shard.index] = str(e)
+                        continue
+                    
+                    shard_metrics = self._shard_metrics(shard, result, write_seconds, attempts[shard.index])
+                    metrics.append(shard_metrics)
+                    metrics_store.record_job(
+                        "payroll_shard", True, (result.compute_seconds + write_seconds) * 1000
+                    )
+                    logger.info(
+                        f"Pay run {pay_run.id} shard {shard.index}: {shard_metrics['employees']} employees "
+                        f"in {shard_metrics['compute_seconds']}s compute + {shard_metrics['write_seconds']}s write "
+                        f"({shard_metrics['employees_per_second']}/s, attempt {shard_metrics['attempts']})"
+                    )
+                
+                if pool_broken and pending:
+                    # A worker died; the pool cannot take new work
+                    executor.shutdown(cancel_futures=True)
+                    executor = create_pool(tables, workers)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        return metrics, failed
+    
+    @staticmethod
+    def _shard_metrics(shard: Shard, result: ShardResult, write_seconds: float, attempts: int) -> Dict:
+        employees = len(shard.employees)
+        elapsed = result.compute_seconds + write_seconds
+        return {
+            "shard": shard.index,
+            "employees": employees,
+            "attempts": attempts,
+            "compute_seconds": round(result.compute_seconds, 3),
+            "write_seconds": round(write_seconds, 3),
+            "employees_per_second": round(employees / elapsed, 1) if elapsed else None
+        }
+    
+    def _write_shard(self, result: ShardResult) -> float:
+        """Insert a shard's payslips and lines in one transaction; returns seconds taken."""
+        started = time.perf_counter()
+        try:
+            self.db.bulk_insert_mappings(Payslip, result.payslips)
+            self.db.bulk_insert_mappings(PayslipLine, result.lines)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return time.perf_counter() - started
+    
+    def _delete_payslips(self, pay_run_id: UUID, employee_ids: Optional[List[UUID]] = None) -> None:
+        """Remove the payslips (and their lines) of a pay run before recalculation."""
+        payslips = select(Payslip.id).where(Payslip.pay_run_id == pay_run_id)
+        if employee_ids:
+            payslips = payslips.where(Payslip.employee_id.in_(employee_ids))
+        self.db.query(PayslipLine).filter(
+            PayslipLine.payslip_id.in_(payslips)
+        ).delete(synchronize_session=False)
+        self.db.query(Payslip).filter(
+            Payslip.id.in_(payslips)
+        ).delete(synchronize_session=False)
+        self.db.commit()
+    
+    def _load_payroll_tables(self, pay_run: PayRun) -> PayrollTables:
+        """
+        Build the pay run's lookup tables: earning and deduction payroll items
+        and the tax items with the brackets effective in the pay period.
+        """
+        earning_rules = {}
+        deduction_rules = {}
+        for item in self.db.query(PayrollItem).filter(PayrollItem.is_active == True):
+            is_percentage = item.calculation_method == "percentage"
+            if item.item_type == "earning":
+                earning_rules[item.code] = EarningRule(
+                    code=item.code,
+                    name=item.name,
+                    earning_type=(item.category or "OTHER").upper(),
+                    calculation_type="PERCENTAGE_OF_BASE" if is_percentage else "FIXED_AMOUNT",
+                    is_taxable=item.is_taxable,
+                    gl_account_code=item.expense_account,
+                    payroll_item_id=item.id
+                )
+            elif item.item_type == "deduction":
+                deduction_rules[item.code] = DeductionRule(
+                    code=item.code,
+                    name=item.name,
+                    deduction_type=(item.category or "OTHER").upper(),
+                    calculation_type="PERCENTAGE_OF_GROSS" if is_percentage else "FIXED_AMOUNT",
+                    is_pre_tax=item.is_pre_tax,
+                    gl_account_code=item.liability_account,
+                    payroll_item_id=item.id
+                )
+        
+        return PayrollTables(
+            earning_rules=earning_rules,
+            deduction_rules=deduction_rules,
+            tax_tables=self.tax_calculator.get_tax_tables(
+                pay_run.pay_date, pay_run.pay_period_start, pay_run.pay_period_end
+            ),
+            process_taxes=pay_run.process_taxes is not False,
+            process_benefits=pay_run.process_benefits is not False
+        )
+    
+    def _load_employee_inputs(
+        self,
+        employees: List[Employee],
+        pay_run: PayRun
+    ) -> List[EmployeePayInput]:
+        """Engine inputs for a shard of employees, with their assigned payroll items."""
+        assignments = defaultdict(lambda: ([], []))
+        for start in range(0, len(employees), ASSIGNMENT_QUERY_SIZE):
+            rows = self.db.query(EmployeePayrollItem, PayrollItem).join(
+                PayrollItem, PayrollItem.id == EmployeePayrollItem.payroll_item_id
+            ).filter(
+                EmployeePayrollItem.employee_id.in_([e.id for e in employees[start:start + ASSIGNMENT_QUERY_SIZE]]),
+                EmployeePayrollItem.is_active == True,
+                PayrollItem.is_active == True,
+                EmployeePayrollItem.effective_date <= pay_run.pay_period_end,
+                or_(
+                    EmployeePayrollItem.end_date.is_(None),
+                    EmployeePayrollItem.end_date >= pay_run.pay_period_start
+                )
             )
+            for assignment, item in rows:
+                if item.calculation_method == "percentage":
+                    percentage = assignment.percentage if assignment.percentage is not None else item.percentage
+                    value = (percentage or Decimal("0")) * 100
+                else:
+                    value = assignment.amount if assignment.amount is not None else item.default_amount
+                earnings, deductions = assignments[assignment.employee_id]
+                if item.item_type == "earning":
+                    earnings.append((item.code, value or Decimal("0.00")))
+                elif item.item_type == "deduction":
+                    deductions.append((item.code, value or Decimal("0.00")))
+        
+        ytd_taxes = defaultdict(list)
+        for (employee_id, tax_code_id), amount in self.tax_calculator.get_ytd_taxes(
+            [employee.id for employee in employees], pay_run.pay_date.year
+        ).items():
+            ytd_taxes[employee_id].append((tax_code_id, amount))
+        
+        return [
+            EmployeePayInput(
+                employee_id=employee.id,
+                employee_code=employee.employee_code,
+                base_salary=employee.salary or Decimal("0.00"),
+                pay_frequency=pay_run.pay_frequency or PayFrequency.MONTHLY.value,
+                earnings=tuple(assignments[employee.id][0]),
+                deductions=tuple(assignments[employee.id][1]),
+                ytd_taxes=tuple(ytd_taxes[employee.id])
+            )
+            for employee in employees
+        ]
     
     def _get_eligible_employees(
         self,
-        company_id: UUID,
-        pay_period: PayPeriod,
+        pay_run: PayRun,
         employee_ids: Optional[List[UUID]] = None
     ) -> List[Employee]:
         """ Get Eligible Employees."""
@@ -190,20 +466,19 @@ class PayrollProcessor:
         Get list of employees eligible for payroll processing.
         
         Args:
-            company_id: ID of the company
-            pay_period: The pay period
+            pay_run: The pay run, for its company and pay period
             employee_ids: Optional list of employee IDs to filter by
             
         Returns:
-            List of eligible Employee objects
+            List of active Employee objects employed during the pay period
         """
         query = self.db.query(Employee).filter(
-            Employee.company_id == company_id,
-            Employee.is_active == True,
-            Employee.hire_date <= pay_period.end_date,
+            Employee.company_id == pay_run.company_id,
+            Employee.status == "active",
+            Employee.hire_date <= pay_run.pay_period_end,
             or_(
                 Employee.termination_date.is_(None),
-                Employee.termination_date >= pay_period.start_date
+                Employee.termination_date >= pay_run.pay_period_start
             )
         )
         
@@ -215,38 +490,39 @@ class PayrollProcessor:
     def _calculate_employee_pay(
         self,
         employee: Employee,
-        pay_period: PayPeriod,
         pay_run: PayRun
     ) -> Dict:
         """ Calculate Employee Pay."""
         """
-        Calculate pay for a single employee for the pay period.
+        Calculate pay for a single employee for the pay run's period.
+        
+        Pay runs compute employees in bulk through the pay run engine; this
+        runs the same calculation for one employee.
         
         Args:
             employee: The employee
-            pay_period: The pay period
             pay_run: The pay run
             
         Returns:
             Dictionary containing pay calculation results
         """
-        # This is a placeholder - actual implementation will calculate:
-        # - Regular hours and pay
-        # - Overtime hours and pay
-        # - Bonuses and other earnings
-        # - Deductions (pre-tax and post-tax)
-        # - Tax calculations
-        # - Net pay
+        shard = self._shard(pay_run, 0, self._load_employee_inputs([employee], pay_run))
+        result = compute_shard(shard, self._load_payroll_tables(pay_run))
+        payslip = result.payslips[0]
+        
+        def lines(line_type: str) -> List[Dict]:
+            return [line for line in result.lines if line["line_type"] == line_type]
         
         return {
             "employee_id": employee.id,
-            "regular_hours": Decimal("80.00"),
-            "overtime_hours": Decimal("0.00"),
-            "regular_pay": employee.base_salary / 26 if employee.pay_frequency == PayFrequency.BI_WEEKLY else employee.base_salary / 12,
-            "overtime_pay": Decimal("0.00"),
-            "gross_pay": employee.base_salary / 26 if employee.pay_frequency == PayFrequency.BI_WEEKLY else employee.base_salary / 12,
-            "deductions": [],
-            "taxes": [],
+            "regular_hours": payslip["regular_hours"],
+            "overtime_hours": payslip["overtime_hours"],
+            "regular_pay": payslip["base_salary"],
+            "overtime_pay": payslip["overtime_pay"],
+            "gross_pay": payslip["gross_pay"],
+            "earnings": lines("earning"),
+            "deductions": lines("deduction"),
+            "taxes": lines("tax"),
             "benefits": [],
-            "net_pay": Decimal("0.00")
+            "net_pay": payslip["net_pay"]
         }
@@ -1,289 +1,235 @@
 """
 Payroll tax calculation utilities for the payroll processing service.
 """
+from collections import defaultdict
 from datetime import date
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from ..models.payroll_models import (
-from ..schemas.payroll_schemas import PayrollTaxItem
-from decimal import Decimal, ROUND_HALF_UP
-from sqlalchemy import and_, or_
+from decimal import Decimal
+from sqlalchemy import Integer, and_, cast, extract, func, or_, select
 from sqlalchemy.orm import Session
 from uuid import UUID
 
 from app.core.config import settings
 from app.core.logging import logger
+from app.models.payroll_models import (
+    PayRun, PayrollItem, PayrollTaxBracket, PayrollTaxYTD, Payslip, PayslipLine
+)
 
+from .pay_run_engine import EmployeePayInput, TaxBracketRow, TaxTable
 
+# Employee IDs per IN (...) list when loading YTD accumulators
+YTD_QUERY_SIZE = 1000
 
-
-    Employee, TaxCode, TaxBracket, TaxCalculation, Payslip, PayPeriod
-)
+# Engine calculation method of a tax payroll item's calculation_method
+TAX_CALCULATION_METHODS = {
+    "fixed": "FLAT_RATE",
+    "percentage": "PERCENTAGE",
+    "bracketed": "BRACKETED",
+}
 
 
 class PayrollTaxCalculator:
-    """Handles payroll tax calculations for employees."""
-    
+    """
+    Handles payroll tax calculations for employees.
+
+    Taxes are payroll items of type ``tax``; bracketed taxes have their
+    brackets in ``payroll_tax_brackets``.
+    """
+
     def __init__(self, db: Session):
         self.db = db
-    
+        # Compiled tax tables by (pay date, period start, period end)
+        self._tax_tables: Dict[Tuple[date, date, date], Tuple[TaxTable, ...]] = {}
+
     def calculate_taxes(
         self,
-        employee: Employee,
-        pay_period: PayPeriod,
+        employee: EmployeePayInput,
+        pay_run: PayRun,
         taxable_income: Decimal,
-        pay_date: date,
         is_regular_pay: bool = True
-    ) -> List[PayrollTaxItem]:
+    ) -> List[Dict]:
         """Calculate Taxes."""
         """
         Calculate all applicable taxes for an employee.
-        
+
+        Tax tables are compiled once per pay period and pay date, so calculating
+        many employees does not query tax items or brackets again.
+
         Args:
-            employee: The employee
-            pay_period: The pay period
+            employee: The employee's engine input, with their YTD taxes
+            pay_run: The pay run, for its pay period and pay date
             taxable_income: Taxable income amount
-            pay_date: Date of payment (for tax rate determination)
             is_regular_pay: Whether this is a regular pay run (affects tax calculations)
-            
+
         Returns:
             List of tax items with details
         """
+        ytd_taxes = dict(employee.ytd_taxes)
         taxes = []
-        
-        # Get all active tax codes for the employee's location
-        tax_codes = self._get_applicable_tax_codes(
-            employee=employee,
-            pay_date=pay_date,
-            is_regular_pay=is_regular_pay
-        )
-        
-        # Calculate each tax
-        for tax_code in tax_codes:
-            tax_amount = self._calculate_tax_amount(
-                tax_code=tax_code,
-                taxable_income=taxable_income,
-                pay_period=pay_period,
-                employee=employee
-            )
-            
+        for table in self.get_tax_tables(pay_run.pay_date, pay_run.pay_period_start, pay_run.pay_period_end):
+            if is_regular_pay and not table.applies_to_regular_pay:
+                continue
+            if not table.applies_to(employee):
+                continue
+
+            tax_amount = table.calculate(taxable_income)
             if tax_amount > 0:
-                taxes.append(
-                    PayrollTaxItem(
-                        code=tax_code.code,
-                        name=tax_code.name,
-                        amount=tax_amount,
-                        is_employer_tax=tax_code.is_employer_tax,
-                        ytd_amount=self._get_ytd_taxes(
-                            employee.id, 
-                            tax_code.id, 
-                            pay_period.end_date.year
-                        )
-                    )
-                )
-        
+                taxes.append({
+                    "code": table.code,
+                    "name": table.name,
+                    "amount": tax_amount,
+                    "is_employer_tax": table.is_employer_tax,
+                    "ytd_amount": ytd_taxes.get(table.tax_code_id, Decimal("0.00")) + tax_amount
+                })
+
         return taxes
-    
-    def _get_applicable_tax_codes(
-        self,
-        employee: Employee,
-        pay_date: date,
-        is_regular_pay: bool = True
-    ) -> List[TaxCode]:
-        """ Get Applicable Tax Codes."""
+
+    def get_tax_tables(self, pay_date: date, start_date: date, end_date: date) -> Tuple[TaxTable, ...]:
         """
-        Get all tax codes that apply to the employee based on their location.
-        
+        Tax items with the brackets effective in the pay period, compiled for
+        binary-search bracket lookup.
+
         Args:
-            employee: The employee
-            pay_date: Date to check tax code validity
-            is_regular_pay: Whether this is a regular pay run
-            
+            pay_date: Date of payment
+            start_date: First day of the pay period
+            end_date: Last day of the pay period
+
         Returns:
-            List of applicable tax codes
+            Compiled tax tables, cached for the lifetime of the calculator
         """
-        # Base query for active tax codes
-        query = self.db.query(TaxCode).filter(
-            TaxCode.is_active == True,
-            TaxCode.effective_date <= pay_date,
-            or_(
-                TaxCode.expiration_date.is_(None),
-                TaxCode.expiration_date >= pay_date
-            )
-        )
-        
-        # Filter by employee's location
-        if employee.state:
-            query = query.filter(
-                or_(
-                    and_(
-                        TaxCode.state.isnot(None),
-                        TaxCode.state == employee.state
-                    ),
-                    TaxCode.state.is_(None)
-                )
-            )
-        
-        if employee.country:
-            query = query.filter(
+        key = (pay_date, start_date, end_date)
+        if key not in self._tax_tables:
+            self._tax_tables[key] = self._compile_tax_tables(start_date, end_date)
+        return self._tax_tables[key]
+
+    def _compile_tax_tables(self, start_date: date, end_date: date) -> Tuple[TaxTable, ...]:
+        """Query the active tax items and their brackets once and compile them."""
+        tax_items = self.db.query(PayrollItem).filter(
+            PayrollItem.item_type == "tax",
+            PayrollItem.is_active == True
+        ).order_by(PayrollItem.code).all()
+
+        brackets = defaultdict(list)
+        if tax_items:
+            for bracket in self.db.query(PayrollTaxBracket).filter(
+                PayrollTaxBracket.payroll_item_id.in_([item.id for item in tax_items]),
+                PayrollTaxBracket.is_active == True,
+                PayrollTaxBracket.effective_date <= end_date,
                 or_(
-                    and_(
-                        TaxCode.country.isnot(None),
-                        TaxCode.country == employee.country
-                    ),
-                    TaxCode.country.is_(None)
+                    PayrollTaxBracket.end_date.is_(None),
+                    PayrollTaxBracket.end_date >= start_date
                 )
-            )
-        
-        # Filter by pay type if needed
-        if is_regular_pay:
-            query = query.filter(TaxCode.applies_to_regular_pay == True)
-        
-        return query.all()
-    
-    def _calculate_tax_amount(
+            ).order_by(PayrollTaxBracket.lower_bound.asc()):
+                brackets[bracket.payroll_item_id].append(TaxBracketRow(
+                    lower_bound=bracket.lower_bound,
+                    upper_bound=bracket.upper_bound,
+                    rate_type=(bracket.rate_type or "PERCENTAGE").upper(),
+                    rate=bracket.rate,
+                    additional_amount=bracket.additional_amount
+                ))
+
+        tax_tables = []
+        for item in tax_items:
+            calculation_method = TAX_CALCULATION_METHODS.get((item.calculation_method or "").lower())
+            if calculation_method is None:
+                logger.warning(f"Tax item {item.code} has unsupported calculation method {item.calculation_method}")
+                continue
+            if calculation_method == "BRACKETED" and not brackets[item.id]:
+                logger.warning(f"No active tax brackets found for tax item {item.code}")
+            if calculation_method == "FLAT_RATE":
+                rate = item.default_amount or Decimal("0.00")
+            else:
+                # Percentages are stored as fractions
+                rate = (item.percentage or Decimal("0")) * 100
+            tax_tables.append(TaxTable(
+                tax_code_id=item.id,
+                code=item.code,
+                name=item.name,
+                calculation_method=calculation_method,
+                rate=rate,
+                is_employer_tax=bool(item.is_employer_tax),
+                category=(item.category or "").upper() or None,
+                gl_account_code=item.liability_account,
+                brackets=tuple(brackets[item.id])
+            ))
+        return tuple(tax_tables)
+
+    def get_ytd_taxes(
         self,
-        tax_code: TaxCode,
-        taxable_income: Decimal,
-        pay_period: PayPeriod,
-        employee: Employee
-    ) -> Decimal:
-        """ Calculate Tax Amount."""
+        employee_ids: Iterable[UUID],
+        year: int
+    ) -> Dict[Tuple[UUID, UUID], Decimal]:
         """
-        Calculate tax amount based on tax code and taxable income.
-        
+        Get year-to-date taxes for a set of employees from the YTD accumulator.
+
         Args:
-            tax_code: The tax code to use for calculation
-            taxable_income: Taxable income amount
-            pay_period: The pay period
-            employee: The employee
-            
+            employee_ids: IDs of the employees
+            year: Calendar year
+
         Returns:
-            Calculated tax amount
+            Total YTD taxes by (employee_id, tax_code_id), from completed pay runs
         """
-        if taxable_income <= 0 or not tax_code.is_active:
-            return Decimal("0.00")
-        
-        # Get the appropriate tax calculation method
-        calculation = tax_code.calculation_method or "PERCENTAGE"
-        
-        if calculation == "FLAT_RATE":
-            return tax_code.rate.quantize(Decimal("0.01"), ROUND_HALF_UP)
-        
-        elif calculation == "PERCENTAGE":
-            return (taxable_income * (tax_code.rate / 100)).quantize(
-                Decimal("0.01"), 
-                ROUND_HALF_UP
-            )
-        
-        elif calculation == "BRACKETED":
-            return self._calculate_bracketed_tax(
-                tax_code=tax_code,
-                taxable_income=taxable_income,
-                pay_period=pay_period,
-                employee=employee
+        employee_ids = list(employee_ids)
+        ytd_taxes = {}
+        for start in range(0, len(employee_ids), YTD_QUERY_SIZE):
+            rows = self.db.query(
+                PayrollTaxYTD.employee_id,
+                PayrollTaxYTD.tax_code_id,
+                PayrollTaxYTD.amount
+            ).filter(
+                PayrollTaxYTD.employee_id.in_(employee_ids[start:start + YTD_QUERY_SIZE]),
+                PayrollTaxYTD.year == year
             )
-        
-        return Decimal("0.00")
-    
-    def _calculate_bracketed_tax(
-        self,
-        tax_code: TaxCode,
-        taxable_income: Decimal,
-        pay_period: PayPeriod,
-        employee: Employee
-    ) -> Decimal:
-        """ Calculate Bracketed Tax."""
+            for employee_id, tax_code_id, amount in rows:
+                ytd_taxes[(employee_id, tax_code_id)] = amount
+        return ytd_taxes
+
+    def post_ytd_taxes(self, pay_run_id: UUID, reverse: bool = False) -> None:
         """
-        Calculate tax using tax brackets.
-        
+        Add the taxes of a pay run's payslips to the YTD accumulator.
+
+        Runs as one INSERT ... SELECT ... ON CONFLICT DO UPDATE in the caller's
+        transaction, so it is committed together with the pay run's status.
+
         Args:
-            tax_code: The tax code
-            taxable_income: Taxable income amount
-            pay_period: The pay period
-            employee: The employee
-            
-        Returns:
-            Calculated tax amount
+            pay_run_id: ID of the pay run
+            reverse: If True, subtract the pay run's taxes instead (before recalculation)
         """
-        # Get applicable tax brackets
-        brackets = (
-            self.db.query(TaxBracket)
-            .filter(
-                TaxBracket.tax_code_id == tax_code.id,
-                TaxBracket.is_active == True,
-                TaxBracket.effective_date <= pay_period.end_date,
-                or_(
-                    TaxBracket.expiration_date.is_(None),
-                    TaxBracket.expiration_date >= pay_period.start_date
-                )
-            )
-            .order_by(TaxBracket.lower_bound.asc())
-            .all()
+        sign = -1 if reverse else 1
+        # Tax lines carry their tax payroll item, which is the accumulator's tax code
+        year = cast(extract("year", Payslip.pay_date), Integer)
+        totals = select(
+            Payslip.employee_id,
+            PayslipLine.payroll_item_id,
+            year,
+            func.sum(func.coalesce(PayslipLine.taxable_amount, 0)) * sign,
+            func.sum(PayslipLine.amount) * sign,
+            func.now()
+        ).join(
+            Payslip, Payslip.id == PayslipLine.payslip_id
+        ).where(
+            Payslip.pay_run_id == pay_run_id,
+            PayslipLine.line_type == "tax",
+            PayslipLine.payroll_item_id.isnot(None)
+        ).group_by(
+            Payslip.employee_id, PayslipLine.payroll_item_id, year
         )
-        
-        if not brackets:
-            logger.warning(f"No active tax brackets found for tax code {tax_code.code}")
-            return Decimal("0.00")
-        
-        # Calculate tax using the brackets
-        remaining_income = taxable_income
-        total_tax = Decimal("0.00")
-        
-        for bracket in brackets:
-            if remaining_income <= 0:
-                break
-                
-            # Calculate the amount of income in this bracket
-            bracket_width = (
-                bracket.upper_bound - bracket.lower_bound 
-                if bracket.upper_bound is not None 
-                else remaining_income
-            )
-            
-            income_in_bracket = min(remaining_income, bracket_width)
-            
-            # Calculate tax for this bracket
-            if bracket.rate_type == "PERCENTAGE":
-                bracket_tax = income_in_bracket * (bracket.rate / 100)
-            else:  # FIXED_AMOUNT
-                bracket_tax = bracket.rate
-            
-            # Add any additional amount
-            if bracket.additional_amount is not None:
-                bracket_tax += bracket.additional_amount
-            
-            total_tax += bracket_tax
-            remaining_income -= income_in_bracket
-        
-        # Apply any annualization factor for partial year calculations
-        if tax_code.is_annual and tax_code.annualization_factor:
-            total_tax = total_tax / Decimal(str(tax_code.annualization_factor))
-        
-        # Round to the nearest cent
-        return total_tax.quantize(Decimal("0.01"), ROUND_HALF_UP)
-    
-    def _get_ytd_taxes(
-        self,
-        employee_id: UUID,
-        tax_code_id: UUID,
-        year: int
-    ) -> Decimal:
-        """ Get Ytd Taxes."""
-        """
-        Get year-to-date taxes paid for a specific tax code.
-        
-        Args:
-            employee_id: ID of the employee
-            tax_code_id: ID of the tax code
-            year: Calendar year
-            
-        Returns:
-            Total YTD taxes for the tax code
-        """
-        # In a real implementation, this would query the payslips table
-        # to get the sum of taxes paid for the given employee and tax code
-        # for the specified year up to the current date
-        
-        # For now, return a placeholder value
-        return Decimal("0.00")
+
+        if self.db.get_bind().dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(PayrollTaxYTD).from_select(
+            ["employee_id", "tax_code_id", "year", "taxable_wages", "amount", "updated_at"],
+            totals
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["employee_id", "tax_code_id", "year"],
+            set_={
+                "taxable_wages": PayrollTaxYTD.taxable_wages + stmt.excluded.taxable_wages,
+                "amount": PayrollTaxYTD.amount + stmt.excluded.amount,
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        self.db.execute(stmt)
@@ -0,0 +1,363 @@
+"""
+Dependency-aware orchestration of period close tasks.
+
+The close is a DAG of tasks. Automated tasks whose upstream tasks are complete
+run concurrently in a pool of worker processes; each finished task is
+checkpointed with its output, so a rerun only executes the tasks downstream of
+what changed. Manual tasks are completed by users and gate their dependents.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db.tenant_middleware import tenant_context
+from app.core.observability import metrics_store
+from app.models.period_close import PeriodClose, PeriodCloseTask, CloseTaskStatus
+
+PERIOD_CLOSE_WORKERS = getattr(settings, 'PERIOD_CLOSE_WORKERS', None) or os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class CloseTaskSpec:
+    key: str
+    name: str
+    description: str
+    order: int
+    required: bool = True
+    automated: bool = False
+    depends_on: Tuple[str, ...] = ()
+
+
+# The standard close. Depreciation, accruals and revaluation are independent;
+# allocations distribute the expenses they post, and statements need everything.
+# Nothing posts accruals yet, so they are booked by hand and gate allocations.
+CLOSE_TASKS: Tuple[CloseTaskSpec, ...] = (
+    CloseTaskSpec('review_journals', 'Review Journal Entries', 'Review all journal entries for the period', 1),
+    CloseTaskSpec('depreciation', 'Run Depreciation', 'Calculate and post depreciation entries', 2, automated=True),
+    CloseTaskSpec('accruals', 'Process Accruals', 'Process month-end accruals', 3),
+    CloseTaskSpec('revaluation', 'Revalue Foreign Currency', 'Revalue foreign currency balances at period-end rates', 4, automated=True),
+    CloseTaskSpec('allocations', 'Process Allocations', 'Run allocation rules for the period', 5, automated=True,
+                  depends_on=('depreciation', 'accruals')),
+    CloseTaskSpec('bank_reconciliation', 'Reconcile Bank Accounts', 'Complete bank reconciliations', 6),
+    CloseTaskSpec('statements', 'Generate Financial Statements', 'Generate period-end financial statements', 7,
+                  automated=True,
+                  depends_on=('review_journals', 'allocations', 'revaluation', 'bank_reconciliation')),
+    CloseTaskSpec('review_statements', 'Review Financial Statements', 'Review and approve financial statements', 8,
+                  depends_on=('statements',)),
+)
+
+
+@dataclass
+class CloseTaskContext:
+    """What a worker needs to run one task: the period and its upstream outputs."""
+    period_close_id: str
+    period_start: date
+    period_end: date
+    upstream: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Workers do not share the request's context, so the caller's company and
+    # tenant travel with the task
+    executed_by: Any = None
+    tenant_id: Optional[str] = None
+    company_id: Any = None
+
+
+def _run_depreciation(db: Session, context: CloseTaskContext) -> Dict[str, Any]:
+    from app.modules.core_financials.fixed_assets.services import FixedAssetService
+
+    if context.company_id is None:
+        raise ValueError("Depreciation needs a company to post its journal entries to")
+    result = FixedAssetService(db).post_depreciation_bulk(
+        context.period_end, context.executed_by, context.company_id
+    )
+    return {
+        "message": f"Posted depreciation for {result['schedules_posted']} schedules",
+        "schedules_posted": result['schedules_posted'],
+        "journal_entries_created": result['journal_entries_created'],
+        "total_amount": str(result['total_amount'])
+    }
+
+
+def _revalue_currencies(db: Session, context: CloseTaskContext) -> Dict[str, Any]:
+    from app.modules.core_financials.general_ledger.advanced_services import AdvancedGLService
+
+    gl_service = AdvancedGLService(db)
+    period = gl_service._get_period_for_date(context.period_end)
+    result = gl_service._process_fx_revaluation(period.id)
+    return {
+        "message": f"Revalued {result['balances_revalued']} foreign currency balances",
+        "balances_revalued": result['balances_revalued'],
+        "base_currency": result['base_currency'],
+        "adjustment": str(result['adjustment'])
+    }
+
+
+def _process_allocations(db: Session, context: CloseTaskContext) -> Dict[str, Any]:
+    from app.services.allocation.allocation_engine import AllocationEngine
+
+    result = AllocationEngine(db, context.tenant_id).process_allocations_batch(
+        context.executed_by, start_date=context.period_start, end_date=context.period_end
+    )
+    return {
+        "message": f"Allocated {result['allocations']} of {result['entries_processed']} journal entries",
+        "entries_processed": result['entries_processed'],
+        "allocations": result['allocations'],
+        "allocation_lines": result['allocation_lines'],
+        "total_allocated": str(result['total_allocated'])
+    }
+
+
+def _generate_statements(db: Session, context: CloseTaskContext) -> Dict[str, Any]:
+    from app.services.gl.trial_balance_service import TrialBalanceService
+
+    trial_balance = TrialBalanceService.get_trial_balance(db, context.period_start, context.period_end)
+    if trial_balance.difference != 0:
+        raise ValueError(f"Trial balance is out of balance by {trial_balance.difference}")
+    return {
+        "message": "Financial statements generated successfully",
+        "accounts": len(trial_balance.entries),
+        "total_debit": str(trial_balance.total_debit),
+        "total_credit": str(trial_balance.total_credit)
+    }
+
+
+TASK_HANDLERS: Dict[str, Callable[[Session, CloseTaskContext], Dict[str, Any]]] = {
+    'depreciation': _run_depreciation,
+    'revaluation': _revalue_currencies,
+    'allocations': _process_allocations,
+    'statements': _generate_statements,
+}
+
+
+def _init_worker() -> None:
+    from app.core.db.session import engine
+
+    # Connections inherited from the parent process must not be reused here
+    engine.dispose(close=False)
+
+
+def create_pool(workers: int = PERIOD_CLOSE_WORKERS) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def run_close_task(key: str, context: CloseTaskContext) -> Tuple[Dict[str, Any], int]:
+    """Run an automated task in its own session; returns its output and duration in ms."""
+    from app.core.db.session import SessionLocal
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        output = TASK_HANDLERS[key](db, context)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return output, int((time.perf_counter() - started) * 1000)
+
+
+def downstream_of(keys: Iterable[str], depends_on: Dict[str, Tuple[str, ...]]) -> Set[str]:
+    """The given tasks and every task that transitively depends on them."""
+    dependents: Dict[str, List[str]] = {}
+    for key, upstream in depends_on.items():
+        for upstream_key in upstream:
+            dependents.setdefault(upstream_key, []).append(key)
+
+    affected = set()
+    stack = list(keys)
+    while stack:
+        key = stack.pop()
+        if key not in affected:
+            affected.add(key)
+            stack.extend(dependents.get(key, ()))
+    return affected
+
+
+def critical_path(
+    durations: Dict[str, float],
+    depends_on: Dict[str, Tuple[str, ...]]
+) -> Tuple[List[str], float]:
+    """Longest chain of dependent tasks by duration, and its total."""
+    finish: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    def finish_time(key: str) -> float:
+        if key not in finish:
+            upstream = [k for k in depends_on.get(key, ()) if k in depends_on]
+            previous = max(upstream, key=finish_time, default=None)
+            start = finish_time(previous) if previous else 0.0
+            finish[key] = (start + durations.get(key, 0.0), previous)
+        return finish[key][0]
+
+    if not depends_on:
+        return [], 0.0
+    last = max(depends_on, key=finish_time)
+    path = []
+    key: Optional[str] = last
+    while key:
+        path.append(key)
+        key = finish[key][1]
+    return list(reversed(path)), finish[last][0]
+
+
+class CloseOrchestrator:
+    """Runs the automated tasks of a period close in dependency order."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def keyed_tasks(period_close: PeriodClose) -> Dict[str, PeriodCloseTask]:
+        return {task.task_key: task for task in period_close.close_tasks if task.task_key}
+
+    @staticmethod
+    def _depends_on(tasks: Dict[str, PeriodCloseTask]) -> Dict[str, Tuple[str, ...]]:
+        return {key: tuple(k for k in (task.depends_on or []) if k in tasks) for key, task in tasks.items()}
+
+    def blocking_tasks(self, task: PeriodCloseTask, tasks: Dict[str, PeriodCloseTask]) -> List[PeriodCloseTask]:
+        """Upstream tasks that must complete before ``task`` can run."""
+        return [
+            tasks[key] for key in (task.depends_on or [])
+            if key in tasks and tasks[key].status not in (CloseTaskStatus.COMPLETED, CloseTaskStatus.SKIPPED)
+        ]
+
+    def reset_tasks(self, tasks: Dict[str, PeriodCloseTask], keys: Iterable[str]) -> Set[str]:
+        """Return the given tasks and everything downstream of them to pending."""
+        affected = downstream_of(keys, self._depends_on(tasks))
+        for key in affected:
+            task = tasks[key]
+            task.status = CloseTaskStatus.PENDING
+            task.started_at = None
+            task.completed_at = None
+            task.completed_by = None
+            task.result_message = None
+            task.error_message = None
+            task.output = None
+            task.duration_ms = None
+        return affected
+
+    def task_context(self, period_close: PeriodClose, tasks: Dict[str, PeriodCloseTask],
+                     task: PeriodCloseTask, executed_by=None, company_id=None) -> CloseTaskContext:
+        return CloseTaskContext(
+            period_close_id=str(period_close.id),
+            period_start=period_close.period.start_date,
+            period_end=period_close.period.end_date,
+            upstream={key: tasks[key].output or {} for key in (task.depends_on or []) if key in tasks},
+            executed_by=executed_by,
+            tenant_id=tenant_context.tenant_id,
+            company_id=company_id
+        )
+
+    def run(self, period_close: PeriodClose, executed_by, company_id=None,
+            rerun: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Run every automated task whose upstream tasks are complete, concurrently
+        where the DAG allows, until no more can run.
+
+        Completed tasks are kept from earlier runs; failed automated tasks are
+        retried, and tasks named in ``rerun`` are reset along with everything
+        downstream of them. Tasks post to ``company_id``, the caller's company.
+
+        Returns:
+            Final status of each task by key
+        """
+        tasks = self.keyed_tasks(period_close)
+        unknown = set(rerun or ()) - set(tasks)
+        if unknown:
+            raise ValueError(f"Unknown close tasks: {', '.join(sorted(unknown))}")
+        retry = [key for key, task in tasks.items() if task.is_automated and task.status == CloseTaskStatus.FAILED]
+        self.reset_tasks(tasks, list(rerun or ()) + retry)
+        self.db.commit()
+
+        running: Dict[Future, str] = {}
+        with create_pool() as pool:
+            while True:
+                for key, task in tasks.items():
+                    if (task.is_automated and task.status == CloseTaskStatus.PENDING
+                            and task.task_key in TASK_HANDLERS and not self.blocking_tasks(task, tasks)):
+                        task.status = CloseTaskStatus.IN_PROGRESS
+                        task.started_at = datetime.utcnow()
+                        task.assigned_to = executed_by
+                        task.attempt_count = (task.attempt_count or 0) + 1
+                        running[pool.submit(run_close_task, key, self.task_context(period_close, tasks, task, executed_by, company_id))] = key
+                self.db.commit()
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = tasks[running.pop(future)]
+                    self._checkpoint(task, future, executed_by)
+                self.db.commit()
+
+        return {key: task.status.value for key, task in tasks.items()}
+
+    def _checkpoint(self, task: PeriodCloseTask, future: Future, executed_by) -> None:
+        task.completed_at = datetime.utcnow()
+        try:
+            output, duration_ms = future.result()
+        except Exception as e:
+            task.status = CloseTaskStatus.FAILED
+            task.error_message = str(e)
+            task.duration_ms = int((task.completed_at - task.started_at).total_seconds() * 1000)
+        else:
+            task.status = CloseTaskStatus.COMPLETED
+            task.completed_by = executed_by
+            task.output = output
+            task.result_message = output.get("message")
+            task.duration_ms = duration_ms
+        metrics_store.record_job(
+            f"period_close.{task.task_key}",
+            task.status == CloseTaskStatus.COMPLETED,
+            float(task.duration_ms)
+        )
+
+    def telemetry(self, period_close: PeriodClose) -> Dict[str, Any]:
+        """
+        Per-task close durations and the critical path of the close.
+
+        ``duration_seconds`` is the time a task spent executing; ``elapsed_seconds``
+        runs from when its upstream tasks completed (or the close started) to its
+        completion, so waiting on people counts towards the critical path.
+        """
+        tasks = self.keyed_tasks(period_close)
+        depends_on = self._depends_on(tasks)
+
+        rows = {}
+        for key, task in sorted(tasks.items(), key=lambda item: item[1].task_order):
+            ready_at = max(
+                (tasks[k].completed_at for k in depends_on[key] if tasks[k].completed_at),
+                default=period_close.initiated_at
+            )
+            elapsed = None
+            if task.completed_at and ready_at:
+                elapsed = max(0.0, (task.completed_at - ready_at).total_seconds())
+            rows[key] = {
+                "task_key": key,
+                "task_name": task.task_name,
+                "status": task.status,
+                "depends_on": list(depends_on[key]),
+                "attempt_count": task.attempt_count or 0,
+                "started_at": task.started_at,
+                "completed_at": task.completed_at,
+                "duration_seconds": task.duration_ms / 1000 if task.duration_ms is not None else None,
+                "elapsed_seconds": elapsed,
+            }
+
+        path, total = critical_path(
+            {key: row["elapsed_seconds"] or 0.0 for key, row in rows.items()},
+            depends_on
+        )
+        for key, row in rows.items():
+            row["on_critical_path"] = key in path
+        return {
+            "period_close_id": period_close.id,
+            "tasks": list(rows.values()),
+            "critical_path": path,
+            "critical_path_seconds": total,
+        }
@@ -10,9 +10,6 @@ from uuid import UUID
 
 from app.core.exceptions import NotFoundException, ValidationException
 from app.models.period_close import (
-
-
-
     AccountingPeriod, 
     PeriodClose, 
     PeriodCloseTask,
@@ -20,6 +17,7 @@ from app.models.period_close import (
     PeriodStatus,
     CloseTaskStatus
 )
+from .close_orchestrator import CLOSE_TASKS, TASK_HANDLERS, CloseOrchestrator, run_close_task
 
 
 class PeriodCloseService:
@@ -27,6 +25,7 @@ class PeriodCloseService:
     
     def __init__(self, db: Session):
         self.db = db
+        self.orchestrator = CloseOrchestrator(db)
     
     def create_accounting_period(self, period_data: Dict[str, Any], created_by: UUID) -> AccountingPeriod:
         period = AccountingPeriod(
@@ -76,20 +75,41 @@ class PeriodCloseService:
         
         return period_close
     
-    def execute_close_task(self, task_id: UUID, executed_by: UUID) -> PeriodCloseTask:
+    def execute_close_task(self, task_id: UUID, executed_by: UUID, company_id: Optional[UUID] = None) -> PeriodCloseTask:
         task = self.get_close_task(task_id)
         if not task:
             raise NotFoundException(f"Task {task_id} not found")
         
-        if task.status != CloseTaskStatus.PENDING:
-            raise ValidationException(f"Task {task.task_name} is not pending")
+        tasks = self.orchestrator.keyed_tasks(task.period_close)
+        if not task.task_key:
+            if task.status != CloseTaskStatus.PENDING:
+                raise ValidationException(f"Task {task.task_name} is not pending")
+        else:
+            if task.status == CloseTaskStatus.IN_PROGRESS:
+                raise ValidationException(f"Task {task.task_name} is already running")
+            
+            blocking = self.orchestrator.blocking_tasks(task, tasks)
+            if blocking:
+                raise ValidationException(
+                    f"Task {task.task_name} is waiting on: {', '.join(t.task_name for t in blocking)}"
+                )
+            
+            # Running a task again invalidates everything downstream of it
+            if task.status != CloseTaskStatus.PENDING:
+                self.orchestrator.reset_tasks(tasks, [task.task_key])
         
         task.status = CloseTaskStatus.IN_PROGRESS
         task.started_at = datetime.utcnow()
         task.assigned_to = executed_by
+        task.attempt_count = (task.attempt_count or 0) + 1
         
         try:
-            result = self._execute_task_logic(task)
+            if task.is_automated and task.task_key in TASK_HANDLERS:
+                context = self.orchestrator.task_context(task.period_close, tasks, task, executed_by, company_id)
+                task.output, task.duration_ms = run_close_task(task.task_key, context)
+                result = task.output.get("message")
+            else:
+                result = self._execute_task_logic(task)
             
             task.status = CloseTaskStatus.COMPLETED
             task.completed_at = datetime.utcnow()
@@ -105,6 +125,40 @@ class PeriodCloseService:
         
         return task
     
+    def run_period_close(
+        self,
+        close_id: UUID,
+        executed_by: UUID,
+        company_id: Optional[UUID] = None,
+        rerun_tasks: Optional[List[str]] = None
+    ) -> PeriodClose:
+        """
+        Run the close's automated tasks in dependency order, independent tasks
+        concurrently, posting to ``company_id``. Only pending and failed tasks
+        run, plus ``rerun_tasks`` and everything downstream of them.
+        """
+        period_close = self.get_period_close(close_id)
+        if not period_close:
+            raise NotFoundException(f"Period close {close_id} not found")
+        
+        if period_close.status != PeriodStatus.CLOSING:
+            raise ValidationException(f"Period close {period_close.close_number} is not in progress")
+        
+        try:
+            self.orchestrator.run(period_close, executed_by, company_id, rerun=rerun_tasks)
+        except ValueError as e:
+            raise ValidationException(str(e))
+        
+        self.db.refresh(period_close)
+        return period_close
+    
+    def get_close_telemetry(self, close_id: UUID) -> Dict[str, Any]:
+        period_close = self.get_period_close(close_id)
+        if not period_close:
+            raise NotFoundException(f"Period close {close_id} not found")
+        
+        return self.orchestrator.telemetry(period_close)
+    
     def complete_period_close(self, close_id: UUID, completed_by: UUID) -> PeriodClose:
         period_close = self.get_period_close(close_id)
         if not period_close:
@@ -155,24 +209,16 @@ class PeriodCloseService:
                    .offset(skip).limit(limit).all()
     
     def _create_close_tasks(self, period_close: PeriodClose, created_by: UUID):
-        standard_tasks = [
-            {'name': 'Review Journal Entries', 'description': 'Review all journal entries for the period', 'order': 1, 'required': True, 'automated': False},
-            {'name': 'Process Accruals', 'description': 'Process month-end accruals', 'order': 2, 'required': True, 'automated': False},
-            {'name': 'Run Depreciation', 'description': 'Calculate and post depreciation entries', 'order': 3, 'required': True, 'automated': True},
-            {'name': 'Process Allocations', 'description': 'Run allocation rules for the period', 'order': 4, 'required': True, 'automated': True},
-            {'name': 'Reconcile Bank Accounts', 'description': 'Complete bank reconciliations', 'order': 5, 'required': True, 'automated': False},
-            {'name': 'Generate Financial Statements', 'description': 'Generate period-end financial statements', 'order': 6, 'required': True, 'automated': True},
-            {'name': 'Review Financial Statements', 'description': 'Review and approve financial statements', 'order': 7, 'required': True, 'automated': False}
-        ]
-        
-        for task_data in standard_tasks:
+        for spec in CLOSE_TASKS:
             task = PeriodCloseTask(
                 period_close_id=period_close.id,
-                task_name=task_data['name'],
-                task_description=task_data['description'],
-                task_order=task_data['order'],
-                is_required=task_data['required'],
-                is_automated=task_data['automated'],
+                task_key=spec.key,
+                task_name=spec.name,
+                task_description=spec.description,
+                task_order=spec.order,
+                is_required=spec.required,
+                is_automated=spec.automated,
+                depends_on=list(spec.depends_on),
                 status=CloseTaskStatus.PENDING,
                 created_by=created_by,
                 updated_by=created_by
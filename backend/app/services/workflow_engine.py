@@ -20,7 +20,7 @@ class WorkflowEngine:
     
     @staticmethod
     def create_workflow(db: Session, workflow_type: str, entity_id: str, 
-                       amount: float, created_by: str) -> str:
+                       amount: float, created_by: str, company_id: Optional[str] = None) -> str:
         """Create Workflow."""
         """Create new workflow instance"""
         from app.models.workflow import WorkflowInstance, WorkflowStep
@@ -38,6 +38,7 @@ class WorkflowEngine:
             total_steps=len(definition['steps']),
             amount=amount,
             created_by=created_by,
+            company_id=company_id,
             workflow_data=json.dumps(definition)
         )
         
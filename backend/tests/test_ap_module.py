@@ -2,6 +2,9 @@
 Tests for Accounts Payable (AP) module endpoints.
 """
 import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+
 from tests.conftest_simple import assert_success_response, assert_paginated_response, TEST_COMPANY_ID
 
 class TestAPEndpoints:
@@ -72,4 +75,147 @@ class TestAPValidation:
         
         # Test invalid page size
         response = client.get("/api/v1/ap/vendors?page_size=101")
-        assert response.status_code == 422
\ No newline at end of file
+        assert response.status_code == 422
+
+class TestAPFraudScoring:
+    """Test the batch fraud and duplicate scoring helpers"""
+    
+    def test_amounts_within_tolerance_share_nearby_buckets(self):
+        """Test amounts within the duplicate tolerance are at most the bucket reach apart"""
+        from app.modules.core_financials.accounts_payable.ai_services import (
+            AMOUNT_BUCKET_REACH, DUPLICATE_AMOUNT_TOLERANCE, _amount_bucket
+        )
+        
+        for amount in (Decimal("0.99"), Decimal("100.00"), Decimal("12345.67"), Decimal("999999.99")):
+            upper = amount * (1 + DUPLICATE_AMOUNT_TOLERANCE)
+            assert abs(_amount_bucket(upper) - _amount_bucket(amount)) <= AMOUNT_BUCKET_REACH
+        
+        assert _amount_bucket(Decimal("0")) is None
+        assert _amount_bucket(None) is None
+    
+    def test_date_buckets_span_the_duplicate_window(self):
+        """Test dates within the duplicate window fall in the same or adjacent bucket"""
+        from app.modules.core_financials.accounts_payable.ai_services import (
+            DUPLICATE_DATE_WINDOW, _date_bucket
+        )
+        
+        day = date(2024, 3, 1)
+        assert _date_bucket(day + DUPLICATE_DATE_WINDOW) - _date_bucket(day) == 1
+        assert _date_bucket(day) <= _date_bucket(day + timedelta(days=3)) <= _date_bucket(day) + 1
+    
+    def test_fraud_columns_build_feature_matrix(self):
+        """Test the projection rows become one feature row per invoice"""
+        from app.modules.core_financials.accounts_payable.ai_services import APAIService
+        
+        columns = APAIService._fraud_columns([
+            (1, Decimal("1000.00"), date(2024, 3, 1), date(2024, 3, 31), True, "low", 4),
+            (2, Decimal("250.00"), date(2024, 3, 5), date(2024, 3, 10), False, "critical", 0),
+        ])
+        
+        assert list(columns["ids"]) == [1, 2]
+        assert list(columns["terms"]) == [30, 5]
+        assert list(columns["risky_vendor"]) == [False, True]
+        features = columns["features"]
+        assert features.shape == (2, 7)
+        assert features[0][3] == 250.0
+        assert features[1][3] == 0.0
+    
+    def test_fraud_columns_without_rows(self):
+        """Test an empty batch yields an empty feature matrix"""
+        from app.modules.core_financials.accounts_payable.ai_services import APAIService
+        
+        assert APAIService._fraud_columns([])["features"].shape == (0, 7)
+
+
+class TestAPModelRegistry:
+    """Test the versioned AP model registry and its drift checks"""
+    
+    def test_publish_keeps_latest_versions(self, tmp_path):
+        """Test each publish adds a version and old artifacts are retired"""
+        import os
+        import numpy as np
+        from datetime import datetime
+        from app.modules.core_financials.accounts_payable.model_registry import KEEP_VERSIONS, ModelRegistry
+        
+        registry = ModelRegistry("tenant-a", root_dir=str(tmp_path))
+        features = np.array([[1.0, 10.0], [3.0, 30.0]])
+        published = [
+            registry.publish("model", {"weights": np.arange(3)}, features, datetime(2024, 3, 1))
+            for _ in range(KEEP_VERSIONS + 1)
+        ]
+        
+        versions = registry.versions("model")
+        assert [v.version for v in versions] == list(range(2, KEEP_VERSIONS + 2))
+        assert not os.path.exists(published[0].path)
+        assert versions[-1].feature_mean == [2.0, 20.0]
+        assert versions[-1].watermark_datetime == datetime(2024, 3, 1)
+    
+    def test_load_caches_until_a_new_version_is_published(self, tmp_path):
+        """Test the current model is loaded once, memory-mapped, and reloaded after a publish"""
+        import os
+        import numpy as np
+        from app.modules.core_financials.accounts_payable.model_registry import ModelRegistry
+        
+        registry = ModelRegistry("tenant-a", root_dir=str(tmp_path))
+        assert registry.load("model") == (None, None)
+        
+        features = np.ones((2, 2))
+        registry.publish("model", {"weights": np.arange(3)}, features, None)
+        model, version = registry.load("model")
+        assert isinstance(model["weights"], np.memmap)
+        assert registry.load("model")[0] is model
+        
+        registry.publish("model", {"weights": np.arange(5)}, features, None)
+        # Make sure the manifest mtime moves on filesystems with coarse timestamps
+        stat = os.stat(registry._manifest_path("model"))
+        os.utime(registry._manifest_path("model"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        model, version = registry.load("model")
+        assert version.version == 2
+        assert len(model["weights"]) == 5
+    
+    def test_feature_drift_skips_excluded_features(self, tmp_path):
+        """Test excluded columns do not count towards drift"""
+        import numpy as np
+        from app.modules.core_financials.accounts_payable.model_registry import ModelRegistry, feature_drift
+        
+        registry = ModelRegistry("tenant-a", root_dir=str(tmp_path))
+        version = registry.publish("model", None, np.array([[1.0, 0.0], [3.0, 10.0]]), None)
+        recent = np.array([[2.0, 500.0], [2.0, 600.0]])
+        
+        assert feature_drift(version, recent) > 100
+        assert feature_drift(version, recent, exclude=[1]) == 0.0
+        assert feature_drift(version, recent[:0]) == 0.0
+    
+    def test_invoice_age_does_not_trigger_retraining(self, tmp_path):
+        """Test newer invoices being younger is not reported as fraud model drift"""
+        import numpy as np
+        from app.modules.core_financials.accounts_payable.ai_services import (
+            APAIService, FRAUD_MODEL, FRAUD_TIME_FEATURES, MIN_DRIFT_SAMPLES
+        )
+        from app.modules.core_financials.accounts_payable.model_registry import ModelRegistry
+        
+        registry = ModelRegistry("tenant-a", root_dir=str(tmp_path))
+        training = np.tile([1000.0, 30.0, 2.0, 500.0, 1.0, 0.0, 200.0], (MIN_DRIFT_SAMPLES, 1))
+        training[::2] += 1.0
+        registry.publish(FRAUD_MODEL, None, training, None)
+        recent = training.copy()
+        recent[:, FRAUD_TIME_FEATURES] = 5.0
+        
+        service = APAIService(db=None, registry=registry)
+        service._extract_fraud_features = lambda since=None, until=None: recent
+        service._extract_categorization_features = lambda since=None, until=None: (np.empty((0, 5)), np.array([]))
+        
+        report = service.check_drift()[FRAUD_MODEL]
+        assert report["drift"] == 0.0
+        assert report["retrain"] is False
+    
+    def test_registered_tenants(self, tmp_path):
+        """Test every tenant with a registry directory is listed"""
+        import numpy as np
+        from app.modules.core_financials.accounts_payable.model_registry import ModelRegistry, registered_tenants
+        
+        assert registered_tenants(str(tmp_path / "missing")) == []
+        for tenant_key in ("tenant-b", "default", "tenant-a"):
+            ModelRegistry(tenant_key, root_dir=str(tmp_path)).publish("model", None, np.ones((1, 1)), None)
+        
+        assert registered_tenants(str(tmp_path)) == ["default", "tenant-a", "tenant-b"]
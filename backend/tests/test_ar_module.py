@@ -2,6 +2,10 @@
 Tests for Accounts Receivable (AR) module endpoints.
 """
 import pytest
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
 from tests.conftest import assert_success_response, assert_paginated_response, TEST_COMPANY_ID
 
 class TestAREndpoints:
@@ -163,4 +167,127 @@ class TestARValidation:
         
         response = client.post("/ar/customers", json=invalid_data)
         # Should handle validation gracefully
-        assert response.status_code in [400, 422]
\ No newline at end of file
+        assert response.status_code in [400, 422]
+
+class _RowsQuery:
+    """Query stand-in returning fixed rows whatever the filters"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+    
+    def join(self, *target):
+        return self
+    
+    def filter(self, *criteria):
+        return self
+    
+    def __iter__(self):
+        return iter(self.rows)
+
+class TestCashApplication:
+    """Test the cash application matching index"""
+    
+    def _index(self, *invoices):
+        from app.modules.core_financials.accounts_receivable.cash_application import (
+            CashApplicationIndex, OpenInvoice
+        )
+        
+        return CashApplicationIndex(
+            OpenInvoice(id=number, invoice_number=number, customer_id=customer_id, customer_name=name,
+                        balance_cents=cents, due_date=due_date)
+            for number, customer_id, name, cents, due_date in invoices
+        )
+    
+    def test_reference_numbers_join_adjacent_words(self):
+        """Test references yield stored invoice number candidates"""
+        from app.modules.core_financials.accounts_receivable.cash_application import reference_numbers
+        
+        numbers = reference_numbers("Payment inv 0042")
+        assert {"INV-0042", "INV 0042", "INV0042", "0042"} <= numbers
+        assert reference_numbers("") == set()
+    
+    def test_exact_reference_and_amount_auto_applies(self):
+        """Test a payment naming its customer and invoice is applied automatically"""
+        index = self._index(
+            ("INV-0042", 1, "Acme Corp", 15000, date(2024, 3, 1)),
+            ("INV-0043", 1, "Acme Corp", 15000, date(2024, 4, 1)),
+        )
+        
+        result = index.match({"id": "p1", "amount": Decimal("150.00"), "reference": "INV-0042",
+                              "customer_id": 1, "payment_date": date(2024, 3, 5)})
+        
+        assert result["auto_apply"] is True
+        assert result["matches"][0]["invoice_number"] == "INV-0042"
+        assert result["allocation"] == [
+            {"invoice_id": "INV-0042", "invoice_number": "INV-0042", "amount": Decimal("150.00")}
+        ]
+        assert result["unapplied_amount"] == Decimal("0.00")
+    
+    def test_batch_consumes_applied_balances(self):
+        """Test later payments of a batch only see what is still open"""
+        index = self._index(("INV-0042", 1, "Acme Corp", 15000, date(2024, 3, 1)))
+        payment = {"amount": Decimal("150.00"), "reference": "INV-0042", "customer_id": 1,
+                   "payment_date": date(2024, 3, 5)}
+        
+        first, second = index.match_batch([dict(payment, id="p1"), dict(payment, id="p2")])
+        
+        assert first["auto_apply"] is True
+        assert second["matches"] == []
+        assert second["requires_review"] is True
+    
+    def test_subset_of_open_invoices_covers_payment(self):
+        """Test a payment without reference matches invoices adding up to it"""
+        index = self._index(
+            ("INV-0001", 7, "Globex", 10000, date(2024, 1, 31)),
+            ("INV-0002", 7, "Globex", 2550, date(2024, 2, 29)),
+            ("INV-0003", 7, "Globex", 99999, date(2024, 3, 31)),
+        )
+        
+        result = index.match({"id": "p1", "amount": Decimal("125.50"), "reference": "", "customer_id": 7})
+        
+        assert {match["group"] for match in result["matches"]} == {"subset"}
+        assert [line["invoice_number"] for line in result["allocation"]] == ["INV-0001", "INV-0002"]
+        assert result["unapplied_amount"] == Decimal("0.00")
+    
+    def _load_for_payments(self, monkeypatch, payments, invoices=(), customers=()):
+        from app.modules.core_financials.accounts_receivable.cash_application import CashApplicationIndex
+        
+        loads = []
+        
+        def load(cls, db, customer_ids):
+            loads.append(set(customer_ids))
+            return cls()
+        
+        monkeypatch.setattr(CashApplicationIndex, "load", classmethod(load))
+        # Single-column queries look up customers by name, the others open invoices
+        db = SimpleNamespace(query=lambda *columns: _RowsQuery(list(customers if len(columns) == 1 else invoices)))
+        
+        index = CashApplicationIndex.load_for_payments(db, payments)
+        return loads, index
+    
+    def test_load_for_payments_narrows_to_referenced_customers(self, monkeypatch):
+        """Test customers are resolved from references and named customers"""
+        loads, index = self._load_for_payments(monkeypatch, [
+            {"id": "p1", "amount": 10, "reference": "inv 0042"},
+            {"id": "p2", "amount": 20, "reference": "", "customer_id": 5},
+        ], invoices=[(42, "INV-0042", 3, "Acme Corp", Decimal("10.00"), None)])
+        
+        assert loads == [{3, 5}]
+        assert index.by_number == {}
+    
+    def test_load_for_payments_never_loads_every_customer(self, monkeypatch):
+        """Test unresolved payments load only their named customer and referenced invoices"""
+        loads, index = self._load_for_payments(monkeypatch, [
+            {"id": "p1", "amount": 10, "reference": "thanks", "customer_info": "Globex  Inc"},
+            {"id": "p2", "amount": 30, "reference": "INV-0042 INV-0043"},
+        ], invoices=[
+            (42, "INV-0042", 3, "Acme Corp", Decimal("10.00"), None),
+            (43, "INV-0043", 4, "Initech", Decimal("20.00"), None),
+        ], customers=[(9,)])
+        
+        assert loads == [{9}]
+        assert sorted(index.customers) == [3, 4]
+        assert [invoice.id for invoice in index.by_number["INV0042"]] == [42]
+        
+        result = index.match({"id": "p2", "amount": Decimal("30.00"), "reference": "INV-0042 INV-0043"})
+        assert [line["invoice_number"] for line in result["allocation"]] == ["INV-0042", "INV-0043"]
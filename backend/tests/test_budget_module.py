@@ -1,6 +1,9 @@
 """
 Tests for Budget Management module endpoints.
 """
+from decimal import Decimal
+from uuid import uuid4
+
 import pytest
 from tests.conftest import assert_success_response, assert_paginated_response, assert_error_response, TEST_COMPANY_ID
 
@@ -191,4 +194,139 @@ class TestBudgetValidation:
         }
         
         response = client.post("/budgets/99999/approve", json=approval_data)
-        assert_error_response(response, 404)
\ No newline at end of file
+        assert_error_response(response, 404)
+
+
+class TestBudgetCube:
+    """Test the cached budget-vs-actual cube"""
+    
+    @pytest.fixture
+    def analytics(self, test_db, monkeypatch):
+        from app.core.performance.caching_service import CachingService
+        from app.models import Budget, BudgetLineItem
+        from app.services.budget import budget_analytics
+        
+        Budget.__table__.create(bind=test_db.get_bind(), checkfirst=True)
+        BudgetLineItem.__table__.create(bind=test_db.get_bind(), checkfirst=True)
+        # Nothing listens on this port, so the cube is cached in process
+        cache = CachingService("redis://127.0.0.1:1")
+        monkeypatch.setattr(budget_analytics, "get_caching_service", lambda: cache)
+        
+        def service(company_id=None):
+            return budget_analytics.BudgetAnalyticsService(test_db, None, None, None, None, None, None, company_id)
+        return service
+    
+    @staticmethod
+    def _budget(test_db, company_id, budgeted, actual, status="approved", account_id=None, lines=(), period="monthly"):
+        from app.models import Budget, BudgetLineItem
+        
+        budget = Budget(
+            company_id=company_id,
+            budget_name="Operating",
+            budget_year=2024,
+            account_id=account_id,
+            budgeted_amount=Decimal(budgeted),
+            actual_amount=Decimal(actual),
+            status=status
+        )
+        budget.line_items = [
+            BudgetLineItem(
+                account_id=line_account_id,
+                period=period,
+                budgeted_amount=Decimal(line_budgeted),
+                actual_amount=Decimal(line_actual)
+            )
+            for line_account_id, line_budgeted, line_actual in lines
+        ]
+        test_db.add(budget)
+        test_db.commit()
+        return budget
+    
+    def test_cube_uses_line_items_or_budget_header(self, analytics, test_db):
+        """Test budgets are broken down by line item, or counted whole without line items"""
+        company_id, rent, travel = uuid4(), uuid4(), uuid4()
+        itemized = self._budget(test_db, company_id, "999.00", "0", lines=[
+            (rent, "100.00", "80.00"), (rent, "50.00", "60.00"), (travel, "30.00", "10.00")
+        ])
+        whole = self._budget(test_db, company_id, "200.00", "150.00", account_id=travel)
+        
+        cells = {(cell.budget_id, cell.account_id): (cell.budgeted, cell.actual) for cell in analytics(company_id).get_budget_cube()}
+        assert cells == {
+            (str(itemized.id), str(rent)): (Decimal("150.00"), Decimal("140.00")),
+            (str(itemized.id), str(travel)): (Decimal("30.00"), Decimal("10.00")),
+            (str(whole.id), str(travel)): (Decimal("200.00"), Decimal("150.00")),
+        }
+    
+    def test_cube_is_scoped_to_company(self, analytics, test_db):
+        """Test a company's cube leaves out other companies' budgets"""
+        company_id, other_company_id = uuid4(), uuid4()
+        own = self._budget(test_db, company_id, "100.00", "20.00", account_id=uuid4())
+        self._budget(test_db, other_company_id, "500.00", "50.00", account_id=uuid4())
+        
+        assert [cell.budget_id for cell in analytics(company_id).get_budget_cube()] == [str(own.id)]
+    
+    def test_commit_replaces_cached_cubes(self, analytics, test_db):
+        """Test a committed write rebuilds both the company and all-companies cubes"""
+        company_id = uuid4()
+        budget = self._budget(test_db, company_id, "0", "0", lines=[(uuid4(), "100.00", "40.00")])
+        company, all_companies = analytics(company_id), analytics()
+        assert company.get_budget_performance()["actual_amount"] == Decimal("40.00")
+        all_actual = all_companies.get_budget_performance()["actual_amount"]
+        
+        budget.line_items[0].actual_amount = Decimal("90.00")
+        test_db.commit()
+        
+        assert company.get_budget_performance()["actual_amount"] == Decimal("90.00")
+        assert all_companies.get_budget_performance()["actual_amount"] == all_actual + Decimal("50.00")
+    
+    def test_variance_counts_active_budgets_only(self, analytics, test_db):
+        """Test draft budgets are left out of the variance analysis"""
+        company_id, account_id = uuid4(), uuid4()
+        self._budget(test_db, company_id, "100.00", "120.00", account_id=account_id)
+        self._budget(test_db, company_id, "300.00", "0", status="draft", account_id=account_id)
+        
+        variance = analytics(company_id).get_budget_variance_analysis()
+        assert variance["overall"]["variance"] == Decimal("-20.00")
+        assert variance["by_account"][str(account_id)]["variance_percentage"] == Decimal("20")
+        assert variance["by_year"][2024]["budgeted"] == Decimal("100.00")
+    
+    def test_trend_by_month(self, analytics, test_db, monkeypatch):
+        """Test month line items count in their month and annual amounts are spread over the year"""
+        from datetime import datetime
+        from app.services.budget import budget_analytics
+        
+        class Now(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls(2024, 3, 15)
+        
+        monkeypatch.setattr(budget_analytics, "datetime", Now)
+        company_id, account_id = uuid4(), uuid4()
+        self._budget(test_db, company_id, "0", "0", period="2024-02", lines=[(account_id, "100.00", "90.00")])
+        self._budget(test_db, company_id, "1200.00", "600.00", account_id=account_id)
+        
+        trend = analytics(company_id).get_budget_trend_analysis(period="month", months=3)
+        
+        assert [(entry["period"], entry["budgeted_amount"], entry["actual_amount"]) for entry in trend] == [
+            ("2024-01", Decimal("100.00"), Decimal("50.00")),
+            ("2024-02", Decimal("200.00"), Decimal("140.00")),
+            ("2024-03", Decimal("100.00"), Decimal("50.00")),
+        ]
+        by_year = analytics(company_id).get_budget_trend_analysis(period="year", months=3)
+        assert [(entry["period"], entry["budgeted_amount"]) for entry in by_year] == [("2023", Decimal("0")), ("2024", Decimal("1300.00"))]
+    
+    def test_unsupported_dimensions_are_rejected(self, analytics):
+        """Test department, project and unknown trend period analyses return 400"""
+        from fastapi import HTTPException
+        
+        service = analytics(uuid4())
+        for analysis in (
+            lambda: service.get_budget_performance(department_id=1),
+            lambda: service.get_budget_performance(project_id=1),
+            service.get_departmental_budget_analysis,
+            service.get_project_budget_analysis,
+            lambda: service.get_budget_trend_analysis(period="week"),
+        ):
+            with pytest.raises(HTTPException) as error:
+                analysis()
+            assert error.value.status_code == 400
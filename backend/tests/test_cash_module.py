@@ -2,6 +2,9 @@
 Tests for Cash Management module endpoints.
 """
 import pytest
+from datetime import date
+from decimal import Decimal
+
 from tests.conftest import assert_success_response, assert_paginated_response, TEST_COMPANY_ID
 
 class TestCashManagementEndpoints:
@@ -183,4 +186,210 @@ class TestCashManagementValidation:
         
         response = client.post("/cash/transactions", json=invalid_data)
         # Should handle validation gracefully
-        assert response.status_code in [400, 422]
\ No newline at end of file
+        assert response.status_code in [400, 422]
+
+class TestReconciliationMatcher:
+    """Test matching statement lines to book transactions"""
+    
+    def _line(self, id, day, amount, reference=""):
+        from app.modules.core_financials.cash_management.models import TransactionType
+        from app.modules.core_financials.cash_management.reconciliation_matcher import Line
+        
+        transaction_type = TransactionType.DEPOSIT if amount > 0 else TransactionType.WITHDRAWAL
+        return Line.from_row(id, date(2024, 3, day), transaction_type, Decimal(str(abs(amount))), reference)
+    
+    def test_line_signs_amount_by_direction(self):
+        """Test outflows become negative cents and references are normalized"""
+        line = self._line(1, 5, -12.34, "chk-0042 ")
+        
+        assert line.cents == -1234
+        assert line.reference == "CHK0042"
+        assert line.day == date(2024, 3, 5).toordinal()
+    
+    def test_exact_pass_requires_reference(self):
+        """Test same amount, date and reference pair in the exact pass"""
+        from app.modules.core_financials.cash_management.reconciliation_matcher import match_lines
+        
+        statement = [self._line(1, 5, 100, "DEP-1"), self._line(2, 5, 100)]
+        book = [self._line(11, 5, 100), self._line(12, 5, 100, "dep 1")]
+        
+        assert match_lines(statement, book) == [(1, [12], "exact"), (2, [11], "date_window")]
+    
+    def test_date_window_pairs_within_window_only(self):
+        """Test equal amounts are paired only when close enough in time"""
+        from app.modules.core_financials.cash_management.reconciliation_matcher import match_lines
+        
+        statement = [self._line(1, 10, -50), self._line(2, 20, -75)]
+        book = [self._line(11, 8, -50), self._line(12, 10, -75)]
+        
+        assert match_lines(statement, book) == [(1, [11], "date_window")]
+    
+    def test_grouped_pass_matches_deposits_of_a_day(self):
+        """Test a statement deposit matches several book deposits of one day"""
+        from app.modules.core_financials.cash_management.reconciliation_matcher import match_lines
+        
+        statement = [self._line(1, 12, 350)]
+        book = [self._line(11, 11, 100), self._line(12, 11, 250), self._line(13, 11, -350)]
+        
+        assert match_lines(statement, book) == [(1, [11, 12], "grouped")]
+
+
+class TestCashPosition:
+    """Test the consolidated cash position"""
+    
+    def test_cash_position_is_consolidated_in_base_currency(self, monkeypatch):
+        """Test account balances are converted to the base currency before totalling"""
+        from types import SimpleNamespace
+        from unittest.mock import MagicMock
+        from app.modules.core_financials.cash_management.services import cash_management_service
+        
+        accounts = [
+            SimpleNamespace(id=1, account_name="Operating", account_number="1", bank_name="A", account_type="checking",
+                            current_balance=Decimal("100"), available_balance=Decimal("80"), currency_code="EUR"),
+            SimpleNamespace(id=2, account_name="Payroll", account_number="2", bank_name="B", account_type="checking",
+                            current_balance=Decimal("50"), available_balance=Decimal("50"), currency_code="USD"),
+        ]
+        db = MagicMock()
+        db.execute = MagicMock(return_value=MagicMock(**{"scalars.return_value.all.return_value": accounts}))
+        conversions = []
+        
+        async def convert_many(amounts, currencies, to_currency, dates):
+            conversions.append((list(currencies), to_currency, set(dates)))
+            rates = {"EUR": Decimal("1.10"), "USD": Decimal("1")}
+            return [amount * rates[currency] for amount, currency in zip(amounts, currencies)], {}
+        
+        exchange_service = SimpleNamespace(base_currency="USD", convert_many=convert_many)
+        monkeypatch.setattr(cash_management_service, "get_exchange_service", lambda db: exchange_service)
+        
+        position = cash_management_service.CashManagementService().get_cash_position(db, date(2024, 3, 31))
+        
+        assert position["currency"] == "USD"
+        assert position["total_cash"] == 160.0
+        assert position["available_cash"] == 138.0
+        assert [account["base_currency_balance"] for account in position["accounts"]] == [110.0, 50.0]
+        assert conversions == [(["EUR", "USD", "EUR", "USD"], "USD", {date(2024, 3, 31)})]
+
+
+class TestStatementImport:
+    """Test statement file parsing and duplicate detection on import"""
+    
+    def test_csv_debit_and_credit_columns(self):
+        """Test CSV lines take their sign from debit/credit columns or parentheses"""
+        import io
+        from app.modules.core_financials.cash_management.statement_import import parse_statement
+        
+        data = (
+            "date,amount,debit,credit,reference,description\n"
+            "2024-03-01,,25.00,,CHK-1,Office  supplies\n"
+            "2024-03-02,,,1000.00,DEP-7,Customer deposit\n"
+            "2024-03-03,(12.50),,,FEE,Bank fee\n"
+            "not a date,1.00,,,X,Broken\n"
+        ).encode()
+        
+        lines = list(parse_statement(io.BytesIO(data), "csv"))
+        
+        assert [(line.transaction_date, line.amount) for line in lines[:3]] == [
+            (date(2024, 3, 1), Decimal("-25.00")),
+            (date(2024, 3, 2), Decimal("1000.00")),
+            (date(2024, 3, 3), Decimal("-12.50")),
+        ]
+        assert lines[0].description == "Office supplies"
+        assert lines[3] is None
+    
+    def test_ofx_records_across_read_blocks(self, monkeypatch):
+        """Test OFX tags split over read blocks are still parsed"""
+        import io
+        from app.modules.core_financials.cash_management import statement_import
+        
+        monkeypatch.setattr(statement_import, "READ_BLOCK_SIZE", 7)
+        data = (
+            b"OFXHEADER:100\n<OFX><BANKTRANLIST>"
+            b"<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000<TRNAMT>-42.10"
+            b"<FITID>F1<NAME>Utility Co<MEMO>March bill</STMTTRN>"
+            b"<STMTTRN><TRNTYPE>CHECK<DTPOSTED>20240306<TRNAMT>-100.00"
+            b"<FITID>F2<CHECKNUM>1001</STMTTRN>"
+            b"</BANKTRANLIST></OFX>"
+        )
+        
+        first, second = statement_import.parse_statement(io.BytesIO(data), "qfx")
+        
+        assert (first.transaction_date, first.amount, first.reference) == (date(2024, 3, 5), Decimal("-42.10"), "F1")
+        assert (first.payee, first.description) == ("Utility Co", "March bill")
+        assert (second.reference, second.check_number) == ("1001", "1001")
+    
+    def test_camt053_entries(self):
+        """Test CAMT.053 entries are signed by their credit/debit indicator"""
+        import io
+        from app.modules.core_financials.cash_management.statement_import import parse_statement
+        
+        data = b"""<?xml version="1.0"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>
+<Ntry><Amt Ccy="EUR">250.00</Amt><CdtDbtInd>DBIT</CdtDbtInd><BookgDt><Dt>2024-03-07</Dt></BookgDt>
+<NtryDtls><TxDtls><Refs><EndToEndId>E2E-9</EndToEndId></Refs>
+<RltdPties><Cdtr><Nm>Supplier AG</Nm></Cdtr></RltdPties>
+<RmtInf><Ustrd>Invoice 77</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>
+<Ntry><Amt Ccy="EUR">80.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><BookgDt><Dt>2024-03-08</Dt></BookgDt>
+<AcctSvcrRef>BANK-2</AcctSvcrRef><AddtlNtryInf>Refund</AddtlNtryInf></Ntry>
+</Stmt></BkToCstmrStmt></Document>"""
+        
+        debit, credit = parse_statement(io.BytesIO(data), "camt.053")
+        
+        assert (debit.amount, debit.reference, debit.payee, debit.description) == (
+            Decimal("-250.00"), "E2E-9", "Supplier AG", "Invoice 77"
+        )
+        assert (credit.transaction_date, credit.amount, credit.reference, credit.description) == (
+            date(2024, 3, 8), Decimal("80.00"), "BANK-2", "Refund"
+        )
+    
+    def test_mt940_statement_lines(self):
+        """Test MT940 :61: fields take their details from the following :86: field"""
+        import io
+        from app.modules.core_financials.cash_management.statement_import import parse_statement
+        
+        data = (
+            ":20:STMT1\r\n:25:12345678\r\n:60F:C240301EUR1000,00\r\n"
+            ":61:2403040304D15,75NMSCNONREF//BREF1\r\n:86:Card payment\r\n coffee\r\n"
+            ":61:240305C500,NTRFINV-88\r\n"
+            ":62F:C240305EUR1484,25\r\n-\r\n"
+        ).encode("latin-1")
+        
+        debit, credit = parse_statement(io.BytesIO(data), "mt940")
+        
+        assert (debit.transaction_date, debit.amount, debit.reference, debit.description) == (
+            date(2024, 3, 4), Decimal("-15.75"), "BREF1", "Card payment coffee"
+        )
+        assert (credit.amount, credit.reference) == (Decimal("500"), "INV-88")
+    
+    def test_duplicates_are_only_imported_statement_lines(self, test_db):
+        """Test book entries never suppress statement lines and re-imports add nothing"""
+        from app.modules.core_financials.cash_management.models import (
+            BankStatementImport, BankTransaction, TransactionStatus, TransactionType
+        )
+        from app.modules.core_financials.cash_management.statement_import import StatementLine, import_statement
+        
+        legacy_import = BankStatementImport(account_id=1, statement_date=date(2024, 2, 29), status="completed")
+        test_db.add(legacy_import)
+        test_db.flush()
+        test_db.add_all([
+            # Entered in the books, with the same date, amount and reference as a statement line
+            BankTransaction(account_id=1, transaction_date=date(2024, 3, 1), transaction_type=TransactionType.DEPOSIT,
+                            status=TransactionStatus.POSTED, amount=Decimal("100.00"), reference_number="DEP-1"),
+            # Imported from a statement before fingerprints existed
+            BankTransaction(account_id=1, transaction_date=date(2024, 3, 2), transaction_type=TransactionType.WITHDRAWAL,
+                            status=TransactionStatus.POSTED, amount=Decimal("5.00"), reference_number="FEE",
+                            statement_import_id=legacy_import.id),
+        ])
+        test_db.commit()
+        lines = [
+            StatementLine(date(2024, 3, 1), Decimal("100.00"), reference="DEP-1"),
+            StatementLine(date(2024, 3, 2), Decimal("-5.00"), reference="FEE"),
+            StatementLine(date(2024, 3, 3), Decimal("-5.00"), reference="FEE"),
+            None,
+        ]
+        
+        first = import_statement(test_db, 1, lines, user_id=None)
+        again = import_statement(test_db, 1, lines, user_id=None)
+        
+        assert (first["imported_transactions"], first["duplicate_transactions"], first["failed_transactions"]) == (2, 1, 1)
+        assert (again["imported_transactions"], again["duplicate_transactions"]) == (0, 3)
+        assert test_db.query(BankTransaction).filter(BankTransaction.fingerprint.isnot(None)).count() == 2
@@ -1,6 +1,10 @@
 """
 Enhanced tests for General Ledger (GL) module endpoints.
 """
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import uuid4
+
 import pytest
 from tests.conftest import assert_success_response, assert_paginated_response, assert_error_response, TEST_COMPANY_ID
 
@@ -375,4 +379,661 @@ class TestGLValidation:
         }
         
         response = client.post("/gl/journal-entries/", json=unbalanced_entry)
-        assert response.status_code in [400, 404, 405, 422]
\ No newline at end of file
+        assert response.status_code in [400, 404, 405, 422]
+
+class TestAccountBalanceLedger:
+    """Test the per-day account balance ledger"""
+    
+    @pytest.fixture
+    def ledger(self, test_db):
+        from app.models import AccountDailyBalance, JournalEntry, JournalEntryLine
+        from app.services.accounting.balance_ledger import AccountBalanceLedger
+        
+        for model in (AccountDailyBalance, JournalEntry, JournalEntryLine):
+            model.__table__.create(bind=test_db.get_bind(), checkfirst=True)
+        return AccountBalanceLedger(test_db)
+    
+    @staticmethod
+    def _entry(entry_date, *lines):
+        from app.models import JournalEntry, JournalEntryLine
+        
+        return JournalEntry(
+            id=uuid4(),
+            company_id=uuid4(),
+            entry_number=f"JE-{uuid4().hex[:12]}",
+            entry_date=entry_date,
+            description="Test entry",
+            status="posted",
+            lines=[
+                JournalEntryLine(
+                    account_id=account_id,
+                    debit_amount=Decimal(debit),
+                    credit_amount=Decimal(credit),
+                    line_number=number
+                )
+                for number, (account_id, debit, credit) in enumerate(lines, 1)
+            ]
+        )
+    
+    @staticmethod
+    def _closing_balances(test_db, account_id):
+        from app.models import AccountDailyBalance
+        
+        return [
+            (row.balance_date, row.closing_balance)
+            for row in test_db.query(AccountDailyBalance).filter(
+                AccountDailyBalance.account_id == account_id
+            ).order_by(AccountDailyBalance.balance_date)
+        ]
+    
+    def test_same_day_postings_share_one_row(self, ledger, test_db):
+        """Test postings on one day accumulate into a single daily balance"""
+        cash, revenue = uuid4(), uuid4()
+        ledger.record_posting(self._entry(date(2024, 3, 1), (cash, "100.00", "0"), (revenue, "0", "100.00")))
+        ledger.record_posting(self._entry(date(2024, 3, 1), (cash, "25.50", "0"), (revenue, "0", "25.50")))
+        test_db.flush()
+        
+        assert self._closing_balances(test_db, cash) == [(date(2024, 3, 1), Decimal("125.50"))]
+        assert self._closing_balances(test_db, revenue) == [(date(2024, 3, 1), Decimal("-125.50"))]
+    
+    def test_back_dated_posting_rolls_forward(self, ledger, test_db):
+        """Test a back-dated posting carries into every later day's closing balance"""
+        cash, revenue = uuid4(), uuid4()
+        ledger.record_posting(self._entry(date(2024, 3, 5), (cash, "100.00", "0"), (revenue, "0", "100.00")))
+        ledger.record_posting(self._entry(date(2024, 3, 10), (cash, "30.00", "0"), (revenue, "0", "30.00")))
+        ledger.record_posting(self._entry(date(2024, 3, 3), (cash, "7.00", "0"), (revenue, "0", "7.00")))
+        test_db.flush()
+        
+        assert self._closing_balances(test_db, cash) == [
+            (date(2024, 3, 3), Decimal("7.00")),
+            (date(2024, 3, 5), Decimal("107.00")),
+            (date(2024, 3, 10), Decimal("137.00")),
+        ]
+    
+    def test_void_reverses_posting(self, ledger, test_db):
+        """Test voiding an entry removes it from the ledger"""
+        cash, revenue = uuid4(), uuid4()
+        entry = self._entry(date(2024, 3, 5), (cash, "80.00", "0"), (revenue, "0", "80.00"))
+        ledger.record_posting(self._entry(date(2024, 3, 1), (cash, "20.00", "0"), (revenue, "0", "20.00")))
+        ledger.record_posting(entry)
+        ledger.record_void(entry)
+        test_db.flush()
+        
+        assert ledger.get_net_balance_as_of(cash, datetime(2024, 3, 31, 12)) == Decimal("20.00")
+        assert ledger.get_net_balance_as_of(revenue, date(2024, 3, 31)) == Decimal("-20.00")
+    
+    def test_balances_as_of_day(self, ledger, test_db):
+        """Test batch balances read the last closing balance on or before the day"""
+        cash, revenue, unused = uuid4(), uuid4(), uuid4()
+        ledger.record_posting(self._entry(date(2024, 3, 1), (cash, "50.00", "0"), (revenue, "0", "50.00")))
+        ledger.record_posting(self._entry(date(2024, 3, 20), (cash, "10.00", "0"), (revenue, "0", "10.00")))
+        test_db.flush()
+        
+        balances = ledger.get_net_balances_as_of([cash, revenue, unused], datetime(2024, 3, 19, 8))
+        assert balances == {cash: Decimal("50.00"), revenue: Decimal("-50.00"), unused: Decimal("0.00")}
+        assert ledger.get_net_balance_as_of(cash, date(2024, 3, 20)) == Decimal("60.00")
+    
+    def test_rebuild_and_verify_read_posted_journal(self, ledger, test_db):
+        """Test rebuild and verify agree with incremental postings on the journal"""
+        cash, expense = uuid4(), uuid4()
+        posted = [
+            self._entry(date(2024, 4, 1), (expense, "40.00", "0"), (cash, "0", "40.00")),
+            self._entry(date(2024, 4, 3), (expense, "2.50", "0"), (cash, "0", "2.50")),
+        ]
+        draft = self._entry(date(2024, 4, 2), (expense, "99.00", "0"), (cash, "0", "99.00"))
+        draft.status = "draft"
+        test_db.add_all(posted + [draft])
+        for entry in posted:
+            ledger.record_posting(entry)
+        test_db.flush()
+        
+        assert ledger.verify([cash, expense]) == []
+        incremental = self._closing_balances(test_db, expense)
+        
+        assert ledger.rebuild([cash, expense], commit=False) == 4
+        assert self._closing_balances(test_db, expense) == incremental == [
+            (date(2024, 4, 1), Decimal("40.00")),
+            (date(2024, 4, 3), Decimal("42.50")),
+        ]
+        assert ledger.verify([cash, expense]) == []
+    
+    def test_verify_accepts_bulk_posted_deltas(self, ledger, test_db):
+        """Test journals bulk-inserted with record_amounts deltas, as depreciation and allocations post them, verify clean"""
+        from app.models import JournalEntry, JournalEntryLine
+        
+        expense, accumulated = uuid4(), uuid4()
+        for day, amount in ((date(2024, 5, 31), Decimal("125.00")), (date(2024, 6, 30), Decimal("125.00"))):
+            entry_id = uuid4()
+            test_db.bulk_insert_mappings(JournalEntry, [{
+                'id': entry_id,
+                'company_id': uuid4(),
+                'entry_number': f"DEP-{day:%Y%m}-00001",
+                'entry_date': day,
+                'description': "Depreciation",
+                'status': 'posted'
+            }])
+            test_db.bulk_insert_mappings(JournalEntryLine, [
+                {'id': uuid4(), 'journal_entry_id': entry_id, 'account_id': expense,
+                 'debit_amount': amount, 'credit_amount': Decimal("0"), 'line_number': 1},
+                {'id': uuid4(), 'journal_entry_id': entry_id, 'account_id': accumulated,
+                 'debit_amount': Decimal("0"), 'credit_amount': amount, 'line_number': 2},
+            ])
+            ledger.record_amounts(day, {expense: (amount, Decimal("0")), accumulated: (Decimal("0"), amount)})
+        test_db.flush()
+        
+        assert ledger.verify([expense, accumulated]) == []
+        assert ledger.get_net_balance_as_of(accumulated, date(2024, 6, 30)) == Decimal("-250.00")
+
+
+class TestAllocationRuleIndex:
+    """Test the compiled allocation rule index"""
+    
+    @staticmethod
+    def _rule(name, source_account_id, effective_from, effective_to=None, priority=1, formula=None):
+        from types import SimpleNamespace
+        from app.services.allocation.rule_index import CompiledRule
+        
+        return CompiledRule(SimpleNamespace(
+            id=uuid4(),
+            rule_name=name,
+            rule_code=name.upper(),
+            allocation_method="formula" if formula else "percentage",
+            source_account_id=source_account_id,
+            source_department_id=None,
+            source_cost_center_id=None,
+            effective_from=effective_from,
+            effective_to=effective_to,
+            priority=priority,
+            allocation_lines=[SimpleNamespace(
+                id=uuid4(),
+                target_account_id=uuid4(),
+                target_department_id=None,
+                target_cost_center_id=None,
+                allocation_percentage=Decimal("100"),
+                fixed_amount=None,
+                weight=None,
+                formula=formula,
+                line_order=1
+            )]
+        ))
+    
+    def test_formula_evaluates_in_decimal(self):
+        """Test formulas are evaluated exactly over the source total"""
+        from app.services.allocation.rule_index import compile_formula
+        
+        assert compile_formula("round(total * 0.1 + max(5, abs(-7)), 2)")({"total": Decimal("100.06")}) == Decimal("17.01")
+    
+    def test_formula_rejects_unsupported_expressions(self):
+        """Test formulas cannot call arbitrary functions or name unknown variables"""
+        from app.core.exceptions import ValidationException
+        from app.services.allocation.rule_index import compile_formula
+        
+        for formula in ("__import__('os').getcwd()", "amount * 2", "total if total else 0"):
+            with pytest.raises(ValidationException):
+                compile_formula(formula)
+    
+    def test_formula_powers_are_bounded(self):
+        """Test powers need a small integer literal exponent"""
+        from app.core.exceptions import ValidationException
+        from app.services.allocation.rule_index import compile_formula
+        
+        assert compile_formula("total ** 2 + 2 ** -1")({"total": Decimal("3")}) == Decimal("9.5")
+        for formula in ("10 ** 10 ** 10", "total ** total", "2 ** 13", "2 ** 0.5"):
+            with pytest.raises(ValidationException):
+                compile_formula(formula)
+    
+    def test_match_by_account_date_and_priority(self):
+        """Test lookups return effective rules of the entry's accounts and global rules by priority"""
+        from app.services.allocation.rule_index import RuleIndex
+        
+        rent, travel = uuid4(), uuid4()
+        index = RuleIndex([
+            self._rule("rent", rent, date(2024, 1, 1), priority=2),
+            self._rule("rent expired", rent, date(2023, 1, 1), date(2023, 12, 31)),
+            self._rule("rent future", rent, date(2024, 6, 1)),
+            self._rule("travel", travel, date(2024, 1, 1)),
+            self._rule("global", None, date(2024, 1, 1), priority=1, formula="total / 2"),
+        ])
+        
+        assert len(index) == 5
+        assert [rule.rule_name for rule in index.match(date(2024, 3, 1), [rent, rent])] == ["global", "rent"]
+        assert [rule.rule_name for rule in index.match(date(2023, 6, 1), [rent, travel])] == ["rent expired"]
+        assert index.match(date(2024, 3, 1))[0].allocation_lines[0].evaluate(Decimal("9")) == Decimal("4.5")
+
+
+
+class TestTrialBalanceRollUp:
+    """Test trial balance roll-up and streamed export"""
+    
+    @staticmethod
+    def _row(account_code, account_type, opening, activity, parent_id=None):
+        from types import SimpleNamespace
+        
+        return SimpleNamespace(
+            id=uuid4(),
+            parent_id=parent_id,
+            account_code=account_code,
+            account_name=f"Account {account_code}",
+            account_type=account_type,
+            opening=Decimal(opening),
+            activity=Decimal(activity)
+        )
+    
+    def _entries(self, monkeypatch, rows, roll_up=True, include_zeros=False):
+        from app.services.gl.trial_balance_service import TrialBalanceService
+        
+        monkeypatch.setattr(TrialBalanceService, "_account_balances", staticmethod(lambda *args: iter(rows)))
+        return list(TrialBalanceService._iter_entries(
+            None, date(2024, 1, 1), date(2024, 1, 31), include_zeros, None, roll_up
+        ))
+    
+    def test_roll_up_adds_balances_to_every_ancestor(self):
+        """Test each account's balances are added to its parent and grandparent"""
+        from app.services.gl.trial_balance_service import TrialBalanceService
+        
+        assets = self._row("1000", "asset", "0", "0")
+        cash = self._row("1100", "asset", "10.00", "5.00", parent_id=assets.id)
+        petty_cash = self._row("1110", "asset", "1.00", "2.00", parent_id=cash.id)
+        
+        rolled = {
+            row.account_code: (opening, activity, in_totals)
+            for row, opening, activity, in_totals in TrialBalanceService._roll_up([assets, cash, petty_cash])
+        }
+        assert rolled == {
+            "1000": (Decimal("11.00"), Decimal("7.00"), True),
+            "1100": (Decimal("11.00"), Decimal("7.00"), False),
+            "1110": (Decimal("1.00"), Decimal("2.00"), False),
+        }
+    
+    def test_roll_up_breaks_parent_cycle_at_its_entry_point(self):
+        """Test a parent cycle is rolled up once, into the account where it is entered"""
+        from app.services.gl.trial_balance_service import TrialBalanceService
+        
+        first = self._row("1000", "asset", "1.00", "0")
+        second = self._row("1100", "asset", "2.00", "0", parent_id=first.id)
+        third = self._row("1200", "asset", "4.00", "0", parent_id=second.id)
+        first.parent_id = third.id
+        child = self._row("1300", "asset", "8.00", "0", parent_id=second.id)
+        
+        rolled = {
+            row.account_code: (opening, in_totals)
+            for row, opening, activity, in_totals in TrialBalanceService._roll_up([first, second, third, child])
+        }
+        assert rolled == {
+            "1000": (Decimal("15.00"), True),
+            "1100": (Decimal("14.00"), False),
+            "1200": (Decimal("4.00"), False),
+            "1300": (Decimal("8.00"), False),
+        }
+    
+    def test_rolled_up_totals_count_top_level_accounts_only(self, monkeypatch):
+        """Test rolled-up children are listed but not counted twice in the totals"""
+        assets = self._row("1000", "asset", "0", "0")
+        cash = self._row("1100", "asset", "0", "100.00", parent_id=assets.id)
+        revenue = self._row("4000", "revenue", "0", "-100.00")
+        
+        entries = self._entries(monkeypatch, [assets, cash, revenue])
+        
+        assert [(entry.account_code, entry.debit_amount, entry.credit_amount, in_totals) for entry, in_totals in entries] == [
+            ("1000", Decimal("100.00"), Decimal("0"), True),
+            ("1100", Decimal("100.00"), Decimal("0"), False),
+            ("4000", Decimal("0"), Decimal("100.00"), True),
+        ]
+    
+    def test_account_balances_from_posted_lines(self, test_db):
+        """Test opening balances and period activity are summed from the company's posted lines"""
+        from app.models import ChartOfAccounts, JournalEntry, JournalEntryLine
+        from app.services.gl.trial_balance_service import TrialBalanceService
+        
+        company_id, other_company_id = uuid4(), uuid4()
+        cash = ChartOfAccounts(company_id=company_id, account_code="TB-1100", account_name="Cash", account_type="asset")
+        revenue = ChartOfAccounts(company_id=company_id, account_code="TB-4000", account_name="Revenue", account_type="revenue")
+        idle = ChartOfAccounts(company_id=company_id, account_code="TB-5000", account_name="Idle", account_type="expense")
+        closed = ChartOfAccounts(company_id=company_id, account_code="TB-6000", account_name="Closed", account_type="expense", is_active=False)
+        test_db.add_all([cash, revenue, idle, closed])
+        test_db.flush()
+        
+        def post(number, entry_date, amount, status="posted", entry_company_id=company_id):
+            entry = JournalEntry(company_id=entry_company_id, entry_number=f"TB-{number}", entry_date=entry_date,
+                                 description="Sale", status=status)
+            test_db.add(entry)
+            test_db.flush()
+            test_db.add_all([
+                JournalEntryLine(journal_entry_id=entry.id, account_id=cash.id, debit_amount=Decimal(amount), line_number=1),
+                JournalEntryLine(journal_entry_id=entry.id, account_id=revenue.id, credit_amount=Decimal(amount), line_number=2),
+            ])
+        
+        post(1, date(2023, 12, 15), "100.00")
+        post(2, date(2024, 1, 10), "40.00")
+        post(3, date(2024, 1, 31), "2.50")
+        post(4, date(2024, 2, 1), "1000.00")
+        post(5, date(2024, 1, 20), "500.00", status="draft")
+        post(6, date(2024, 1, 20), "700.00", entry_company_id=other_company_id)
+        test_db.flush()
+        
+        rows = TrialBalanceService._account_balances(test_db, date(2024, 1, 1), date(2024, 1, 31), company_id)
+        
+        assert [(row.account_code, Decimal(row.opening), Decimal(row.activity)) for row in rows] == [
+            ("TB-1100", Decimal("100.00"), Decimal("42.50")),
+            ("TB-4000", Decimal("-100.00"), Decimal("-42.50")),
+            ("TB-5000", Decimal("0"), Decimal("0")),
+        ]
+    
+    def test_zero_balances_skipped_unless_requested(self, monkeypatch):
+        """Test accounts ending at zero are only listed with include_zeros"""
+        rows = [self._row("1000", "asset", "5.00", "-5.00"), self._row("2000", "liability", "0", "-1.00")]
+        
+        assert [entry.account_code for entry, _ in self._entries(monkeypatch, rows, roll_up=False)] == ["2000"]
+        assert [
+            entry.account_code for entry, _ in self._entries(monkeypatch, rows, roll_up=False, include_zeros=True)
+        ] == ["1000", "2000"]
+    
+    def test_csv_export_streams_rows_and_totals(self, monkeypatch):
+        """Test the CSV export is written in chunks and ends with the totals row"""
+        import csv
+        import io
+        from app.services.gl import trial_balance_service
+        from app.services.gl.trial_balance_service import TrialBalanceService
+        
+        monkeypatch.setattr(trial_balance_service, "EXPORT_CHUNK_ROWS", 2)
+        assets = self._row("1000", "asset", "0", "0")
+        cash = self._row("1100", "asset", "0", "40.00", parent_id=assets.id)
+        equity = self._row("3000", "equity", "0", "-40.00")
+        
+        chunks = list(TrialBalanceService._export_csv(iter(self._entries(monkeypatch, [assets, cash, equity]))))
+        rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+        
+        assert len(chunks) > 1
+        assert rows[0] == trial_balance_service.EXPORT_COLUMNS
+        assert [row[0] for row in rows[1:4]] == ["1000", "1100", "3000"]
+        assert rows[-1] == ["", "", "TOTALS:", "", "", "", "40.00", "40.00"]
+
+
+class TestExchangeRateCache:
+    """Test the two-tier exchange rate cache"""
+    
+    class FakeBackend:
+        """In-memory stand-in for the Redis CacheManager"""
+        
+        def __init__(self):
+            self.values = {}
+        
+        def get_many_with_ttl(self, keys):
+            return {key: self.values[key] for key in keys if key in self.values}
+        
+        def set(self, key, value, ttl=300):
+            self.values[key] = (value, ttl)
+        
+        def clear_pattern(self, pattern):
+            from fnmatch import fnmatch
+            
+            for key in [key for key in self.values if fnmatch(key, pattern)]:
+                del self.values[key]
+    
+    @pytest.fixture
+    def cache(self):
+        from app.services.currency.rate_cache import RateCache
+        
+        return RateCache(backend=self.FakeBackend(), latest_ttl=300)
+    
+    @staticmethod
+    def _rate(from_currency, to_currency, rate="1.10"):
+        return {"from_currency": from_currency, "to_currency": to_currency, "rate": rate}
+    
+    def test_past_rates_kept_in_redis_without_expiry(self, cache):
+        """Test past-date rates are stored without ttl and latest rates with one"""
+        cache.set("EUR", "USD", date(2024, 1, 2), self._rate("EUR", "USD"))
+        cache.set("EUR", "USD", None, self._rate("EUR", "USD", "1.20"))
+        
+        assert cache.backend.values[cache.key("EUR", "USD", date(2024, 1, 2))][1] is None
+        assert cache.backend.values[cache.key("EUR", "USD")][1] == 300
+        assert cache.get("EUR", "USD", date(2024, 1, 2))["rate"] == "1.10"
+    
+    def test_in_process_tier_rereads_redis_after_latest_ttl(self, cache):
+        """Test a past-date rate is not kept in process longer than the latest ttl"""
+        cache.latest_ttl = 0
+        cache.set("EUR", "USD", date(2024, 1, 2), self._rate("EUR", "USD"))
+        cache.backend.values[cache.key("EUR", "USD", date(2024, 1, 2))] = (self._rate("EUR", "USD", "1.30"), None)
+        
+        assert cache.get("EUR", "USD", date(2024, 1, 2))["rate"] == "1.30"
+    
+    def test_invalidate_currencies_drops_pairs_of_either_currency(self, cache):
+        """Test invalidation drops every pair and date touching the currencies, in both tiers"""
+        past = date(2024, 1, 2)
+        for pair in (("EUR", "USD"), ("USD", "EUR"), ("GBP", "EUR"), ("GBP", "JPY")):
+            cache.set(*pair, past, self._rate(*pair))
+            cache.set(*pair, None, self._rate(*pair))
+        
+        cache.invalidate_currencies("EUR")
+        
+        pairs = [("EUR", "USD"), ("USD", "EUR"), ("GBP", "EUR"), ("GBP", "JPY")]
+        assert list(cache.get_many(pairs, past)) == [("GBP", "JPY")]
+        assert list(cache.get_many(pairs)) == [("GBP", "JPY")]
+        assert set(cache.backend.values) == {cache.key("GBP", "JPY"), cache.key("GBP", "JPY", past)}
+    
+    def test_create_exchange_rate_invalidates_cached_rates(self, monkeypatch):
+        """Test entering a rate drops the cached rates of its currencies"""
+        from types import SimpleNamespace
+        from unittest.mock import MagicMock
+        from app.services.currency import currency_service
+        from app.services.currency.rate_cache import RateCache
+        
+        cache = RateCache(backend=self.FakeBackend())
+        monkeypatch.setattr(currency_service, "rate_cache", cache)
+        monkeypatch.setattr(currency_service, "ExchangeRate", MagicMock())
+        monkeypatch.setattr(
+            currency_service.CurrencyService, "get_currency_by_code",
+            lambda self, code: SimpleNamespace(id=code, code=code)
+        )
+        db = MagicMock()
+        db.query.return_value.filter.return_value.first.return_value = None
+        cache.set("EUR", "USD", date(2024, 1, 2), self._rate("EUR", "USD"))
+        cache.set("GBP", "JPY", date(2024, 1, 2), self._rate("GBP", "JPY"))
+        
+        currency_service.CurrencyService(db).create_exchange_rate({
+            "source_currency_code": "USD",
+            "target_currency_code": "EUR",
+            "rate": "0.90",
+            "effective_date": date(2024, 1, 1)
+        }, uuid4())
+        
+        assert db.commit.called
+        assert cache.get("EUR", "USD", date(2024, 1, 2)) is None
+        assert cache.get("GBP", "JPY", date(2024, 1, 2)) is not None
+
+
+class TestExchangeConversion:
+    """Test columnar currency conversion and the paths built on it"""
+    
+    @pytest.fixture
+    def exchange_service(self, monkeypatch):
+        from unittest.mock import MagicMock
+        from app.services.currency.exchange_service import ExchangeRateResult, ExchangeService
+        
+        service = ExchangeService(MagicMock())
+        service.base_currency = "USD"
+        rates = {"EUR": Decimal("1.10"), "GBP": Decimal("1.25"), "USD": Decimal("1")}
+        service.calls = []
+        
+        async def get_rates(pairs, date=None, force_refresh=False):
+            pairs = list(pairs)
+            service.calls.append((sorted(pairs), date))
+            return {
+                pair: ExchangeRateResult(
+                    from_currency=pair[0], to_currency=pair[1], rate=rates[pair[0]],
+                    date=date or datetime.utcnow(), source="test"
+                )
+                for pair in pairs
+            }
+        
+        monkeypatch.setattr(service, "get_rates", get_rates)
+        return service
+    
+    def test_convert_many_resolves_each_rate_once(self, exchange_service):
+        """Test one get_rates call per date and rounded amounts in input order"""
+        import asyncio
+        
+        converted, rates = asyncio.run(exchange_service.convert_many(
+            [Decimal("10.005"), Decimal("20"), Decimal("5")],
+            ["eur", "EUR", "gbp"],
+            "usd",
+            [date(2024, 1, 31), date(2024, 1, 31), date(2024, 1, 31)]
+        ))
+        
+        assert converted == [Decimal("11.01"), Decimal("22.00"), Decimal("6.25")]
+        assert set(rates) == {("EUR", date(2024, 1, 31)), ("GBP", date(2024, 1, 31))}
+        assert exchange_service.calls == [
+            ([("EUR", "USD"), ("GBP", "USD")], datetime(2024, 1, 31))
+        ]
+    
+    def test_convert_many_rejects_ragged_columns(self, exchange_service):
+        """Test the input columns must have the same length"""
+        import asyncio
+        
+        with pytest.raises(ValueError):
+            asyncio.run(exchange_service.convert_many([Decimal("1")], ["EUR", "GBP"], "USD"))
+    
+    def test_fx_revaluation_converts_foreign_balances_at_period_end(self, exchange_service, monkeypatch):
+        """Test the period's foreign balances are revalued in one conversion"""
+        from types import SimpleNamespace
+        from unittest.mock import MagicMock
+        from app.modules.core_financials.general_ledger import advanced_services
+        from app.modules.core_financials.general_ledger.advanced_models import GLAccountBalance, GLPeriod
+        
+        period = SimpleNamespace(id=7, end_date=date(2024, 1, 31))
+        balances = [
+            SimpleNamespace(currency_code="EUR", ending_balance_debit=Decimal("100"),
+                            ending_balance_credit=Decimal("0"), base_currency_ending_balance=Decimal("105")),
+            SimpleNamespace(currency_code="GBP", ending_balance_debit=Decimal("0"),
+                            ending_balance_credit=Decimal("40"), base_currency_ending_balance=None),
+        ]
+        db = MagicMock()
+        db.query.side_effect = lambda model: {
+            GLPeriod: MagicMock(**{"filter.return_value.first.return_value": period}),
+            GLAccountBalance: MagicMock(**{"filter.return_value.all.return_value": balances}),
+        }[model]
+        monkeypatch.setattr(advanced_services, "get_exchange_service", lambda db: exchange_service)
+        
+        result = advanced_services.AdvancedGLService(db)._process_fx_revaluation(7)
+        
+        assert [balance.base_currency_ending_balance for balance in balances] == [Decimal("110.00"), Decimal("-50.00")]
+        assert result == {"balances_revalued": 2, "base_currency": "USD", "adjustment": Decimal("-45.00")}
+        assert len(exchange_service.calls) == 1
+
+
+class TestCloseOrchestrator:
+    """Test period close task dependencies and the orchestrated run"""
+    
+    @staticmethod
+    def _depends_on():
+        from app.services.period_close.close_orchestrator import CLOSE_TASKS
+        
+        return {spec.key: spec.depends_on for spec in CLOSE_TASKS}
+    
+    @staticmethod
+    def _period_close():
+        from types import SimpleNamespace
+        from app.models.period_close import CloseTaskStatus
+        from app.services.period_close.close_orchestrator import CLOSE_TASKS
+        
+        tasks = [
+            SimpleNamespace(
+                task_key=spec.key, task_name=spec.name, task_order=spec.order, is_automated=spec.automated,
+                depends_on=list(spec.depends_on), status=CloseTaskStatus.PENDING, started_at=None,
+                completed_at=None, completed_by=None, assigned_to=None, attempt_count=0, duration_ms=None,
+                result_message=None, error_message=None, output=None
+            )
+            for spec in CLOSE_TASKS
+        ]
+        return SimpleNamespace(
+            id=uuid4(), close_tasks=tasks,
+            period=SimpleNamespace(start_date=date(2024, 1, 1), end_date=date(2024, 1, 31))
+        )
+    
+    def test_downstream_of_follows_dependents_transitively(self):
+        """Test a task's downstream set includes its dependents' dependents"""
+        from app.services.period_close.close_orchestrator import downstream_of
+        
+        depends_on = self._depends_on()
+        
+        assert downstream_of(["depreciation"], depends_on) == {"depreciation", "allocations", "statements", "review_statements"}
+        assert downstream_of(["revaluation", "review_statements"], depends_on) == {"revaluation", "statements", "review_statements"}
+        assert downstream_of([], depends_on) == set()
+    
+    def test_critical_path_is_longest_dependent_chain(self):
+        """Test the critical path follows the slowest upstream task of each task"""
+        from app.services.period_close.close_orchestrator import critical_path
+        
+        durations = {
+            "review_journals": 5.0, "depreciation": 1.0, "accruals": 30.0, "revaluation": 2.0,
+            "allocations": 4.0, "bank_reconciliation": 20.0, "statements": 1.0, "review_statements": 3.0
+        }
+        
+        assert critical_path(durations, self._depends_on()) == (
+            ["accruals", "allocations", "statements", "review_statements"], 38.0
+        )
+        assert critical_path({}, {}) == ([], 0.0)
+    
+    def test_reset_tasks_clears_downstream_checkpoints(self):
+        """Test resetting a task returns it and its downstream tasks to pending without their output"""
+        from app.models.period_close import CloseTaskStatus
+        from app.services.period_close.close_orchestrator import CloseOrchestrator
+        
+        orchestrator = CloseOrchestrator(None)
+        tasks = orchestrator.keyed_tasks(self._period_close())
+        for task in tasks.values():
+            task.status = CloseTaskStatus.COMPLETED
+            task.output = {"message": "done"}
+            task.duration_ms = 10
+        
+        assert orchestrator.reset_tasks(tasks, ["allocations"]) == {"allocations", "statements", "review_statements"}
+        assert {key for key, task in tasks.items() if task.status == CloseTaskStatus.PENDING} == {"allocations", "statements", "review_statements"}
+        assert (tasks["statements"].output, tasks["statements"].duration_ms) == (None, None)
+        assert tasks["depreciation"].output == {"message": "done"}
+    
+    def test_run_waits_on_manual_tasks_and_retries_failures(self, monkeypatch):
+        """Test automated tasks run once their upstream tasks complete, with the caller's company"""
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import MagicMock
+        from app.models.period_close import CloseTaskStatus
+        from app.services.period_close import close_orchestrator
+        
+        calls = []
+        failing = ["revaluation"]
+        
+        def run_close_task(key, context):
+            calls.append((key, context.company_id, sorted(context.upstream)))
+            if key in failing:
+                failing.remove(key)
+                raise ValueError("No accounting period found for date 2024-01-31")
+            return {"message": f"{key} done"}, 5
+        
+        monkeypatch.setattr(close_orchestrator, "create_pool", lambda: ThreadPoolExecutor(max_workers=2))
+        monkeypatch.setattr(close_orchestrator, "run_close_task", run_close_task)
+        orchestrator = close_orchestrator.CloseOrchestrator(MagicMock())
+        period_close = self._period_close()
+        tasks = orchestrator.keyed_tasks(period_close)
+        company_id, user_id = uuid4(), uuid4()
+        
+        statuses = orchestrator.run(period_close, user_id, company_id)
+        
+        assert sorted(key for key, _, _ in calls) == ["depreciation", "revaluation"]
+        assert {company for _, company, _ in calls} == {company_id}
+        assert statuses["depreciation"] == "completed"
+        assert statuses["revaluation"] == "failed"
+        assert statuses["accruals"] == statuses["allocations"] == statuses["statements"] == "pending"
+        
+        for key in ("review_journals", "accruals", "bank_reconciliation"):
+            tasks[key].status = CloseTaskStatus.COMPLETED
+        calls.clear()
+        statuses = orchestrator.run(period_close, user_id, company_id)
+        
+        assert [key for key, _, _ in calls if key != "revaluation"] == ["allocations", "statements"]
+        assert calls[-1] == ("statements", company_id, ["allocations", "bank_reconciliation", "revaluation", "review_journals"])
+        assert tasks["revaluation"].attempt_count == 2
+        assert all(status == "completed" for key, status in statuses.items() if key != "review_statements")
+        
+        calls.clear()
+        orchestrator.run(period_close, user_id, company_id, rerun=["depreciation"])
+        
+        assert [key for key, _, _ in calls] == ["depreciation", "allocations", "statements"]
@@ -2,6 +2,9 @@
 Tests for Payroll module endpoints.
 """
 import pytest
+from datetime import date
+from decimal import Decimal
+
 from tests.conftest import assert_success_response, assert_paginated_response, TEST_COMPANY_ID
 
 class TestPayrollEndpoints:
@@ -257,4 +260,234 @@ class TestPayrollValidation:
         }
         
         response = client.post("/payroll/pay-runs", json=invalid_data)
-        assert response.status_code in [400, 422]
\ No newline at end of file
+        assert response.status_code in [400, 422]
+
+class TestPayRunEngine:
+    """Test the pay run engine's tax tables and gross-to-net"""
+    
+    def test_bracketed_tax_matches_bracket_walk(self):
+        """Test each bracket taxes only the income falling inside it"""
+        from app.services.payroll.pay_run_engine import TaxBracketRow, TaxTable
+        
+        table = TaxTable(
+            tax_code_id="fit", code="FIT", name="Federal", calculation_method="BRACKETED",
+            brackets=(
+                TaxBracketRow(Decimal("0"), Decimal("10000"), "PERCENTAGE", Decimal("10")),
+                TaxBracketRow(Decimal("10000"), Decimal("40000"), "PERCENTAGE", Decimal("20")),
+                TaxBracketRow(Decimal("40000"), None, "PERCENTAGE", Decimal("30")),
+            )
+        )
+        
+        assert table.calculate(Decimal("0")) == Decimal("0.00")
+        assert table.calculate(Decimal("5000")) == Decimal("500.00")
+        assert table.calculate(Decimal("25000")) == Decimal("4000.00")
+        assert table.calculate(Decimal("50000")) == Decimal("10000.00")
+    
+    def test_income_above_bounded_top_bracket_is_untaxed(self):
+        """Test a table without an open-ended bracket stops taxing at its top"""
+        from app.services.payroll.pay_run_engine import TaxBracketRow, TaxTable
+        
+        table = TaxTable(
+            tax_code_id="sdi", code="SDI", name="Disability", calculation_method="BRACKETED",
+            brackets=(
+                TaxBracketRow(Decimal("0"), Decimal("1000"), "PERCENTAGE", Decimal("10")),
+                TaxBracketRow(Decimal("1000"), Decimal("2000"), "PERCENTAGE", Decimal("20")),
+            )
+        )
+        
+        assert table.calculate(Decimal("1500")) == Decimal("200.00")
+        assert table.calculate(Decimal("5000")) == Decimal("300.00")
+    
+    def test_compute_shard_gross_to_net(self):
+        """Test earnings, pre- and post-tax deductions and taxes of one payslip"""
+        from app.services.payroll.pay_run_engine import (
+            DeductionRule, EarningRule, EmployeePayInput, PayrollTables, Shard, TaxTable, compute_shard
+        )
+        
+        tables = PayrollTables(
+            earning_rules={"BONUS": EarningRule("BONUS", "Bonus", "BONUS")},
+            deduction_rules={
+                "401K": DeductionRule("401K", "401(k)", "RETIREMENT_401K", "PERCENTAGE_OF_GROSS", is_pre_tax=True),
+                "UNION": DeductionRule("UNION", "Union dues", "OTHER"),
+            },
+            tax_tables=(
+                TaxTable(tax_code_id="fit", code="FIT", name="Federal", calculation_method="PERCENTAGE",
+                         rate=Decimal("10"), category="FEDERAL_TAX"),
+                TaxTable(tax_code_id="futa", code="FUTA", name="Unemployment", calculation_method="PERCENTAGE",
+                         rate=Decimal("5"), is_employer_tax=True),
+            )
+        )
+        employee = EmployeePayInput(
+            employee_id="e1", employee_code="E001", base_salary=Decimal("120000"), pay_frequency="monthly",
+            earnings=(("BONUS", Decimal("500")),),
+            deductions=(("401K", Decimal("5")), ("UNION", Decimal("100"))),
+            ytd_taxes=(("fit", Decimal("2000.00")),)
+        )
+        shard = Shard(index=0, pay_run_id="r1", run_number="PR-000001", pay_period_start=date(2024, 3, 1),
+                      pay_period_end=date(2024, 3, 31), pay_date=date(2024, 3, 31), employees=[employee])
+        
+        result = compute_shard(shard, tables)
+        
+        payslip = result.payslips[0]
+        assert payslip["payslip_number"] == "PR-000001-E001"
+        assert (payslip["base_salary"], payslip["bonus"], payslip["gross_pay"]) == (
+            Decimal("10000.00"), Decimal("500.00"), Decimal("10500.00")
+        )
+        assert (payslip["federal_tax"], payslip["retirement_401k"], payslip["other_deductions"]) == (
+            Decimal("997.50"), Decimal("525.00"), Decimal("100.00")
+        )
+        assert payslip["total_deductions"] == Decimal("1622.50")
+        assert payslip["net_pay"] == Decimal("8877.50")
+        taxes = {line["name"]: line for line in result.lines if line["line_type"] == "tax"}
+        assert taxes["Federal"]["taxable_amount"] == Decimal("9975.00")
+        assert taxes["Unemployment"]["amount"] == Decimal("498.75")
+        assert taxes["Federal"]["ytd_amount"] == Decimal("2997.50")
+    
+    def test_partition_covers_all_items(self):
+        """Test shards are consecutive slices of at most the shard size"""
+        from app.services.payroll.pay_run_engine import partition
+        
+        assert [list(shard) for shard in partition(list(range(5)), 2)] == [[0, 1], [2, 3], [4]]
+    
+    def test_run_shards_writes_payslips_and_retries_failed_shards(self, test_db, monkeypatch):
+        """Test shards are computed, retried after a failed write and stored as payslips with lines"""
+        from app.models.payroll_models import PayRun, Payslip, PayslipLine
+        from app.services.payroll import payroll_processor
+        from app.services.payroll.pay_run_engine import (
+            EmployeePayInput, PayrollTables, TaxTable, partition
+        )
+        
+        monkeypatch.setattr(payroll_processor, "PAYROLL_WORKERS", 1)
+        pay_run = PayRun(
+            company_id="11111111-1111-1111-1111-111111111111", run_number="PR-000042",
+            pay_period_start=date(2024, 3, 1), pay_period_end=date(2024, 3, 31), pay_date=date(2024, 3, 31),
+            status="processing", pay_frequency="monthly"
+        )
+        test_db.add(pay_run)
+        test_db.commit()
+        employees = [
+            EmployeePayInput(employee_id=f"00000000-0000-0000-0000-00000000000{n}", employee_code=f"E{n}",
+                             base_salary=Decimal("60000"), pay_frequency="monthly")
+            for n in range(1, 4)
+        ]
+        tables = PayrollTables(earning_rules={}, deduction_rules={}, tax_tables=(
+            TaxTable(tax_code_id="22222222-2222-2222-2222-222222222222", code="FIT", name="Federal",
+                     calculation_method="PERCENTAGE", rate=Decimal("10"), category="FEDERAL_TAX"),
+        ))
+        processor = payroll_processor.PayrollProcessor(test_db)
+        shards = [processor._shard(pay_run, index, list(chunk)) for index, chunk in enumerate(partition(employees, 2))]
+        write_shard = processor._write_shard
+        writes = []
+        
+        def flaky_write(result):
+            writes.append(result.index)
+            if writes.count(result.index) == 1 and result.index == 1:
+                raise RuntimeError("connection reset")
+            return write_shard(result)
+        
+        monkeypatch.setattr(processor, "_write_shard", flaky_write)
+        metrics, failed = processor._run_shards(pay_run, shards, tables)
+        
+        assert failed == {}
+        assert sorted(writes) == [0, 1, 1]
+        assert {(m["shard"], m["employees"], m["attempts"]) for m in metrics} == {(0, 2, 1), (1, 1, 2)}
+        payslips = test_db.query(Payslip).filter(Payslip.pay_run_id == pay_run.id).order_by(Payslip.payslip_number).all()
+        assert [p.payslip_number for p in payslips] == ["PR-000042-E1", "PR-000042-E2", "PR-000042-E3"]
+        assert all(
+            (p.pay_period_start, p.pay_period_end, p.pay_date, p.gross_pay, p.federal_tax, p.net_pay)
+            == (date(2024, 3, 1), date(2024, 3, 31), date(2024, 3, 31), Decimal("5000.00"), Decimal("500.00"), Decimal("4500.00"))
+            for p in payslips
+        )
+        lines = test_db.query(PayslipLine).filter(PayslipLine.payslip_id.in_([p.id for p in payslips])).all()
+        assert sorted((line.line_type, line.amount) for line in lines) == [("earning", Decimal("5000.00"))] * 3 + [("tax", Decimal("500.00"))] * 3
+
+
+class TestPayrollTaxCalculator:
+    """Test tax table compilation and the YTD tax accumulator"""
+    
+    def test_tax_tables_are_compiled_once_per_pay_period(self, test_db):
+        """Test tax items and brackets are queried once per pay period and pay date"""
+        from sqlalchemy import event
+        from app.models.payroll_models import PayrollItem, PayrollTaxBracket
+        from app.services.payroll.payroll_tax_calculator import PayrollTaxCalculator
+        
+        item = PayrollItem(code="SIT-CACHE", name="State", item_type="tax", calculation_method="bracketed", category="state_tax")
+        test_db.add(item)
+        test_db.flush()
+        test_db.add_all([
+            PayrollTaxBracket(payroll_item_id=item.id, lower_bound=Decimal("0"), upper_bound=Decimal("1000"),
+                              rate=Decimal("5"), effective_date=date(2024, 1, 1)),
+            PayrollTaxBracket(payroll_item_id=item.id, lower_bound=Decimal("1000"), rate=Decimal("10"),
+                              effective_date=date(2024, 1, 1)),
+            PayrollTaxBracket(payroll_item_id=item.id, lower_bound=Decimal("0"), rate=Decimal("3"),
+                              effective_date=date(2023, 1, 1), end_date=date(2023, 12, 31)),
+        ])
+        test_db.flush()
+        calculator = PayrollTaxCalculator(test_db)
+        statements = []
+        
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(test_db.get_bind(), "before_cursor_execute", count)
+        try:
+            period = (date(2024, 3, 31), date(2024, 3, 1), date(2024, 3, 31))
+            tables = calculator.get_tax_tables(*period)
+            assert calculator.get_tax_tables(*period) is tables
+            assert len(statements) == 2
+            calculator.get_tax_tables(date(2024, 4, 30), date(2024, 4, 1), date(2024, 4, 30))
+            assert len(statements) == 4
+        finally:
+            event.remove(test_db.get_bind(), "before_cursor_execute", count)
+        
+        table = next(table for table in tables if table.code == "SIT-CACHE")
+        assert (table.calculation_method, table.category) == ("BRACKETED", "STATE_TAX")
+        assert [(row.lower_bound, row.rate) for row in table.brackets] == [(Decimal("0"), Decimal("5")), (Decimal("1000"), Decimal("10"))]
+        assert table.calculate(Decimal("2000")) == Decimal("150.00")
+    
+    def test_post_and_reverse_ytd_taxes(self, test_db):
+        """Test a pay run's tax lines are added to and subtracted from the YTD accumulator"""
+        import uuid
+        from app.models.payroll_models import PayRun, Payslip, PayslipLine
+        from app.services.payroll.payroll_tax_calculator import PayrollTaxCalculator
+        
+        federal, state = uuid.uuid4(), uuid.uuid4()
+        employees = [uuid.uuid4(), uuid.uuid4()]
+        pay_run = PayRun(
+            company_id="11111111-1111-1111-1111-111111111111", run_number="PR-YTD-001",
+            pay_period_start=date(2024, 3, 1), pay_period_end=date(2024, 3, 31), pay_date=date(2024, 3, 31),
+            status="processing"
+        )
+        test_db.add(pay_run)
+        test_db.flush()
+        for n, employee_id in enumerate(employees):
+            payslip = Payslip(
+                payslip_number=f"PR-YTD-001-E{n}", pay_run_id=pay_run.id, employee_id=employee_id,
+                pay_period_start=pay_run.pay_period_start, pay_period_end=pay_run.pay_period_end,
+                pay_date=pay_run.pay_date, gross_pay=Decimal("5000"), net_pay=Decimal("4000")
+            )
+            test_db.add(payslip)
+            test_db.flush()
+            test_db.add_all([
+                PayslipLine(payslip_id=payslip.id, line_type="earning", name="Regular Pay", amount=Decimal("5000")),
+                PayslipLine(payslip_id=payslip.id, payroll_item_id=federal, line_type="tax", name="Federal",
+                            amount=Decimal("500"), taxable_amount=Decimal("5000")),
+                PayslipLine(payslip_id=payslip.id, payroll_item_id=state, line_type="tax", name="State",
+                            amount=Decimal("200") * (n + 1), taxable_amount=Decimal("5000")),
+            ])
+        test_db.flush()
+        calculator = PayrollTaxCalculator(test_db)
+        
+        calculator.post_ytd_taxes(pay_run.id)
+        calculator.post_ytd_taxes(pay_run.id)
+        ytd = calculator.get_ytd_taxes(employees, 2024)
+        assert ytd == {
+            (employees[0], federal): Decimal("1000.00"), (employees[0], state): Decimal("400.00"),
+            (employees[1], federal): Decimal("1000.00"), (employees[1], state): Decimal("800.00"),
+        }
+        assert calculator.get_ytd_taxes(employees, 2023) == {}
+        
+        calculator.post_ytd_taxes(pay_run.id, reverse=True)
+        ytd = calculator.get_ytd_taxes(employees, 2024)
+        assert ytd[(employees[0], federal)] == Decimal("500.00")
+        assert ytd[(employees[1], state)] == Decimal("400.00")
@@ -2,6 +2,9 @@
 Tests for Tax Management module endpoints.
 """
 import pytest
+from datetime import date
+from decimal import Decimal
+
 from tests.conftest import assert_success_response, assert_paginated_response, TEST_COMPANY_ID
 
 class TestTaxEndpoints:
@@ -223,4 +226,206 @@ class TestTaxIntegration:
         
         response = client.get("/tax/integrations/ap")
         # Endpoint might not exist yet
-        assert response.status_code in [200, 404, 405]
\ No newline at end of file
+        assert response.status_code in [200, 404, 405]
+
+class TestTaxRuleIndex:
+    """Test the compiled jurisdiction tax rule index"""
+    
+    @staticmethod
+    def _rule(code, country, state=None, rate="5.0", tax_codes=None, **metadata):
+        from types import SimpleNamespace
+        
+        if tax_codes:
+            metadata["tax_codes"] = tax_codes
+        return SimpleNamespace(
+            code=code,
+            name=code,
+            type="sales_tax",
+            jurisdiction=SimpleNamespace(country_code=country, state_code=state, city=None),
+            rates=[SimpleNamespace(effective_from=date(2024, 1, 1), effective_to=None, rate=rate)],
+            is_active=True,
+            gl_account_code=None,
+            metadata=metadata
+        )
+    
+    def test_rules_resolve_country_first(self):
+        """Test country and state rules both apply, country level first"""
+        from app.core.tax.tax_rule_index import TaxRuleIndex
+        
+        index = TaxRuleIndex([
+            self._rule("CA_STATE", "US", "CA", rate="6.0"),
+            self._rule("US_FED", "US", rate="1.0"),
+            self._rule("NY_STATE", "US", "NY", rate="4.0"),
+        ])
+        
+        matched = index.match("us", "ca", None, None, date(2024, 6, 1))
+        assert [rule["code"] for rule in matched] == ["US_FED", "CA_STATE"]
+        assert matched[1]["rates"] == [{"rate": Decimal("6.0")}]
+    
+    def test_tax_code_rules_match_items_without_tax_code(self):
+        """Test tax code restrictions only exclude items with a different tax code"""
+        from app.core.tax.tax_rule_index import TaxRuleIndex
+        
+        index = TaxRuleIndex([
+            self._rule("GENERAL", "US"),
+            self._rule("FOOD", "US", tax_codes=["FOOD", "GROCERY"]),
+        ])
+        
+        def codes(tax_code):
+            return sorted(rule["code"] for rule in index.match("US", None, None, tax_code, date(2024, 6, 1)))
+        
+        assert codes(None) == ["FOOD", "GENERAL"]
+        assert codes("GROCERY") == ["FOOD", "GENERAL"]
+        assert codes("CLOTHING") == ["GENERAL"]
+    
+    def test_rate_follows_effective_dates(self):
+        """Test the rate in effect on the transaction date is used"""
+        from types import SimpleNamespace
+        from app.core.tax.tax_rule_index import TaxRuleIndex
+        
+        rule = self._rule("VAT", "GB")
+        rule.rates = [
+            SimpleNamespace(effective_from=date(2024, 1, 1), effective_to=date(2024, 6, 30), rate="20.0"),
+            SimpleNamespace(effective_from=date(2024, 7, 1), effective_to=None, rate="17.5"),
+        ]
+        index = TaxRuleIndex([rule])
+        
+        assert index.match("GB", None, None, None, date(2023, 12, 31)) == []
+        assert index.match("GB", None, None, None, date(2024, 6, 30))[0]["rates"] == [{"rate": Decimal("20.0")}]
+        assert index.match("GB", None, None, None, date(2024, 7, 1))[0]["rates"] == [{"rate": Decimal("17.5")}]
+    
+    def test_blanket_exemption_overlay(self):
+        """Test an exemption without certificate removes its tax types in its window"""
+        from types import SimpleNamespace
+        from app.core.tax.tax_rule_index import TaxRuleIndex
+        
+        exemption = SimpleNamespace(
+            certificate_required=False,
+            tax_types=["sales_tax"],
+            jurisdictions=[SimpleNamespace(country_code="US", state_code="OR", city=None)],
+            valid_from=date(2024, 1, 1),
+            valid_to=None
+        )
+        index = TaxRuleIndex([self._rule("US_FED", "US"), self._rule("OR_STATE", "US", "OR")], [exemption])
+        
+        assert index.match("US", "OR", None, None, date(2024, 6, 1)) == []
+        assert [rule["code"] for rule in index.match("US", "WA", None, None, date(2024, 6, 1))] == ["US_FED"]
+
+
+class TestTaxPolicyRules:
+    """Test tax rule maintenance on the tax policy service"""
+    
+    @staticmethod
+    def _rule(code):
+        from app.core.tax.tax_policy_service import TaxRule
+        
+        return TaxRule(
+            code=code,
+            name=code,
+            description=code,
+            type="sales",
+            jurisdiction={"country_code": "US"},
+            rates=[{"rate": 5.0, "effective_from": date(2024, 1, 1)}]
+        )
+    
+    def test_default_rules_keyed_like_lookups(self, tmp_path, monkeypatch):
+        """Test default rules are cached under upper-case codes, as lookups expect"""
+        import asyncio
+        from app.core.tax import tax_policy_service
+        
+        (tmp_path / "default_tax_rules.yaml").write_text(
+            "rules:\n"
+            "  - code: us-sales\n"
+            "    name: US sales\n"
+            "    description: US sales tax\n"
+            "    type: sales\n"
+            "    jurisdiction: {country_code: US}\n"
+            "    rates: [{rate: 5.0, effective_from: '2024-01-01'}]\n"
+        )
+        monkeypatch.setattr(tax_policy_service, "__file__", str(tmp_path / "tax_policy_service.py"))
+        service = tax_policy_service.TaxPolicyService(cache_enabled=False)
+        
+        asyncio.run(service._load_default_rules())
+        
+        assert list(service.tax_rules_cache) == ["US-SALES"]
+        assert asyncio.run(service.get_tax_rule("us-sales")).code == "us-sales"
+        service.remove_tax_rule("us-sales")
+        assert service.tax_rules_cache == {}
+    
+    def test_rule_changes_bump_rules_version(self):
+        """Test adding, replacing and removing rules each move the rules version"""
+        from app.core.tax.tax_policy_service import TaxPolicyService
+        
+        service = TaxPolicyService(cache_enabled=False)
+        
+        service.upsert_tax_rule(self._rule("GST"))
+        service.upsert_tax_rule(self._rule("GST").copy(update={"name": "Goods and services"}))
+        assert service.rules_version == 2
+        assert service.tax_rules_cache["GST"].name == "Goods and services"
+        
+        service.remove_tax_rule("gst")
+        service.remove_tax_rule("gst")
+        assert service.rules_version == 3
+
+
+class TestTaxLiabilityRollup:
+    """Test the daily tax liability rollup is maintained through dirty-day markers"""
+    
+    def _transaction(self, company_id, day, tax_amount):
+        import uuid
+        from app.models.core_models import TaxTransaction
+        
+        return TaxTransaction(
+            company_id=company_id,
+            entity_type="customer",
+            entity_id=uuid.uuid4(),
+            entity_name="Customer",
+            transaction_date=day,
+            taxable_amount=tax_amount * 10,
+            tax_amount=tax_amount,
+            total_amount=tax_amount * 11,
+            tax_rate=Decimal("0.1"),
+            tax_type="sales",
+            jurisdiction_code="CA"
+        )
+    
+    def test_writes_mark_days_and_refresh_recomputes_them(self, test_db):
+        """Test ORM writes mark their days and the refresh rebuilds only those days"""
+        import uuid
+        from app.core.tax.tax_liability_rollup import refresh_changed_tax_liability
+        from app.models.tax_liability_rollup import TaxLiabilityDaily, TaxLiabilityDirtyDay
+        
+        company_id = uuid.uuid4()
+        first = self._transaction(company_id, date(2024, 3, 1), Decimal("5.00"))
+        second = self._transaction(company_id, date(2024, 3, 1), Decimal("2.50"))
+        test_db.add_all([first, second])
+        test_db.commit()
+        
+        assert test_db.query(TaxLiabilityDirtyDay).count() == 1
+        assert refresh_changed_tax_liability(test_db) == 1
+        test_db.commit()
+        
+        row = test_db.query(TaxLiabilityDaily).one()
+        assert row.day == date(2024, 3, 1)
+        assert (row.tax_type, row.jurisdiction_code, row.transaction_count) == ("sales", "CA", 2)
+        assert row.tax_amount == Decimal("7.50")
+        assert test_db.query(TaxLiabilityDirtyDay).count() == 0
+        
+        # Moving a transaction marks both the old and the new day
+        second.transaction_date = date(2024, 3, 2)
+        test_db.commit()
+        refresh_changed_tax_liability(test_db)
+        test_db.commit()
+        
+        rows = test_db.query(TaxLiabilityDaily).order_by(TaxLiabilityDaily.day).all()
+        assert [(row.day, row.tax_amount) for row in rows] == [
+            (date(2024, 3, 1), Decimal("5.00")),
+            (date(2024, 3, 2), Decimal("2.50"))
+        ]
+        
+        test_db.delete(first)
+        test_db.commit()
+        refresh_changed_tax_liability(test_db)
+        test_db.commit()
+        
+        assert [row.day for row in test_db.query(TaxLiabilityDaily)] == [date(2024, 3, 2)]